@@ -0,0 +1,212 @@
+"""
+API lập lộ trình theo lô (batch) cho cả đội xe, chạy song song trên nhiều tiến trình.
+
+Bảng trạm sạc (tọa độ, radian, cos(vĩ độ) + tên + địa chỉ) được đặt một lần vào multiprocessing.shared_memory;
+mỗi tiến trình con gắn (attach) vào vùng nhớ chung khi khởi động và giữ nguyên ánh xạ suốt vòng đời:
+cột lat/lng của df_charge và các mảng của StationArrays là view trên vùng nhớ chung (không sao chép).
+Chuỗi tên / địa chỉ được giải mã thành đối tượng Python riêng của từng tiến trình; chỉ mục KD-tree và
+đồ thị trạm kề (nạp từ cache trên đĩa .cache/) cũng là bản riêng.
+
+Ví dụ:
+    from batch import plan_routes_batch, RouteRequest
+    for index, result in plan_routes_batch(requests, df_charge, workers=4):
+        ...
+"""
+import os
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import file as routing
+
+TEXT_COLUMNS = ('name', 'address') # Cột chuỗi được mã hóa UTF-8 vào vùng nhớ chung
+NUMERIC_ROWS = ('lat', 'lng', 'lat_rad', 'lng_rad', 'cos_lat') # Các hàng của mảng số (5, n) trong vùng nhớ chung
+
+
+class RouteRequest(NamedTuple):
+    """Một yêu cầu lập lộ trình (cùng tham số với run_astar_search / run_ucs_search)."""
+    car: Any
+    lat_start: float
+    lng_start: float
+    lat_end: float
+    lng_end: float
+    battery_percent: float
+    qua_tram_thu_phi: bool = False
+    algorithm: str = 'astar' # 'astar' | 'ucs' | 'bidirectional'
+
+
+class SharedStationTable:
+    """
+    Bảng trạm sạc trong shared memory:
+    - arrays: mảng (5, n) float64, mỗi hàng một cột NUMERIC_ROWS (lat, lng và các giá trị StationArrays tính sẵn)
+    - text: các chuỗi name/address nối liền (UTF-8), offsets: vị trí bắt đầu/kết thúc của từng chuỗi
+    spec (dict nhỏ, pickle được, kèm version = station_data_version) đủ để tiến trình con gắn vào các vùng nhớ này.
+    """
+
+    def __init__(self, blocks: Dict[str, shared_memory.SharedMemory], spec: Dict[str, Any], owner: bool):
+        self._blocks = blocks
+        self.spec = spec
+        self._owner = owner
+
+    @classmethod
+    def create(cls, df_charge: pd.DataFrame) -> 'SharedStationTable':
+        n = len(df_charge)
+        stations = routing.get_station_arrays(df_charge)
+        arrays = np.vstack([getattr(stations, row) for row in NUMERIC_ROWS])
+        columns = [col for col in TEXT_COLUMNS if col in df_charge.columns]
+        encoded = [str(value).encode('utf-8') for col in columns for value in df_charge[col].tolist()]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(b) for b in encoded])
+        text = b''.join(encoded)
+
+        blocks = {}
+        try:
+            for key, payload in (('arrays', arrays.tobytes()), ('offsets', offsets.tobytes()), ('text', text)):
+                block = shared_memory.SharedMemory(create=True, size=max(len(payload), 1))
+                block.buf[:len(payload)] = payload
+                blocks[key] = block
+        except Exception:
+            for block in blocks.values():
+                block.close()
+                block.unlink()
+            raise
+        spec = {'n': n, 'columns': columns, 'text_size': len(text), 'version': stations.version,
+                'names': {key: block.name for key, block in blocks.items()}}
+        return cls(blocks, spec, owner=True)
+
+    @classmethod
+    def attach(cls, spec: Dict[str, Any]) -> 'SharedStationTable':
+        blocks = {key: shared_memory.SharedMemory(name=name) for key, name in spec['names'].items()}
+        return cls(blocks, spec, owner=False)
+
+    @property
+    def arrays(self) -> np.ndarray:
+        """View (5, n) trên vùng nhớ chung; hàng thứ i là cột NUMERIC_ROWS[i]."""
+        return np.ndarray((len(NUMERIC_ROWS), self.spec['n']), dtype=np.float64, buffer=self._blocks['arrays'].buf)
+
+    def to_dataframe(self, copy: bool = True) -> pd.DataFrame:
+        """
+        Dựng lại df_charge (cùng thứ tự hàng, index 0..n-1) từ vùng nhớ chung.
+        copy=False: cột lat/lng là view trên vùng nhớ chung - chỉ dùng khi bảng còn mở (close() sẽ lỗi BufferError).
+        """
+        n, columns = self.spec['n'], self.spec['columns']
+        offsets = np.ndarray((len(columns) * n + 1,), dtype=np.int64, buffer=self._blocks['offsets'].buf)
+        text = bytes(self._blocks['text'].buf[:self.spec['text_size']])
+        data = {}
+        for c, col in enumerate(columns):
+            bounds = offsets[c * n:(c + 1) * n + 1].tolist()
+            data[col] = [text[bounds[i]:bounds[i + 1]].decode('utf-8') for i in range(n)]
+        arrays = self.arrays
+        data['lat'] = arrays[0].copy() if copy else arrays[0]
+        data['lng'] = arrays[1].copy() if copy else arrays[1]
+        return pd.DataFrame(data, copy=False)
+
+    def station_arrays(self, df_charge: pd.DataFrame) -> routing.StationArrays:
+        """StationArrays cho df_charge (từ to_dataframe(copy=False)) dùng thẳng các mảng trong vùng nhớ chung."""
+        return routing.StationArrays.from_arrays(df_charge, self.spec['version'], **dict(zip(NUMERIC_ROWS, self.arrays)))
+
+    def close(self) -> None:
+        for block in self._blocks.values():
+            block.close()
+            if self._owner:
+                block.unlink()
+        self._blocks = {}
+
+
+# --- Trạng thái trong tiến trình con ---
+_worker_table: Optional[SharedStationTable] = None # Giữ ánh xạ vùng nhớ chung tới khi tiến trình con kết thúc
+_worker_df: Optional[pd.DataFrame] = None
+
+
+def _init_worker(spec: Dict[str, Any]) -> None:
+    global _worker_table, _worker_df
+    _worker_table = SharedStationTable.attach(spec)
+    _worker_df = _worker_table.to_dataframe(copy=False)
+    routing.register_station_arrays(_worker_table.station_arrays(_worker_df))
+
+
+def run_route_request(df_charge: pd.DataFrame, request: RouteRequest, **kwargs: Any) -> Dict[str, Any]:
+    """Chạy một RouteRequest trong tiến trình hiện tại; kwargs (vd. cache, emit_stats) chuyển cho run_*_search."""
+    args = (request.car, request.lat_start, request.lng_start, request.lat_end, request.lng_end,
+            request.battery_percent, request.qua_tram_thu_phi, df_charge)
+    if request.algorithm == 'ucs':
+        return routing.run_ucs_search(*args, **kwargs)
+    if request.algorithm == 'bidirectional':
+        return routing.run_astar_search(*args, bidirectional=True, **kwargs)
+    if request.algorithm == 'astar':
+        return routing.run_astar_search(*args, **kwargs)
+    return {"error": f"Thuật toán không hợp lệ: {request.algorithm}"}
+
+
+def _plan_one(index: int, request: RouteRequest) -> Tuple[int, Dict[str, Any]]:
+    try:
+        return index, run_route_request(_worker_df, request)
+    except Exception as e:
+        return index, {"error": f"Lỗi khi tìm lộ trình: {e}"}
+
+
+class PlannerPool:
+    """
+    Pool tiến trình giữ sẵn bảng trạm sạc (gắn vào SharedStationTable một lần khi tiến trình con khởi động),
+    dùng lại được cho nhiều lô / yêu cầu (vd. service.py). cars: dựng trước đồ thị trạm kề cho các xe này để
+    tiến trình con chỉ việc nạp từ đĩa.
+    """
+
+    def __init__(self, df_charge: pd.DataFrame, workers: Optional[int] = None, cars: Optional[Iterable[Any]] = None):
+        if cars:
+            routing.prepare_station_graphs(df_charge, list(cars))
+        self.table = SharedStationTable.create(df_charge)
+        try:
+            self.pool = ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker, initargs=(self.table.spec,))
+        except Exception:
+            self.table.close()
+            raise
+
+    def submit(self, index: int, request: RouteRequest) -> Future:
+        """Future của (index, kết quả run_*_search); lỗi trong tiến trình con trả về dạng {"error": ...}."""
+        return self.pool.submit(_plan_one, index, request)
+
+    def close(self) -> None:
+        try:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+        finally:
+            self.table.close()
+
+    def __enter__(self) -> 'PlannerPool':
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+def plan_routes_batch(requests: Iterable[Any], df_charge: pd.DataFrame, workers: Optional[int] = None,
+                      ordered: bool = True) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Lập lộ trình cho nhiều yêu cầu song song. Trả về iterator (chỉ số yêu cầu, kết quả run_*_search):
+    - ordered=True: theo đúng thứ tự đầu vào
+    - ordered=False: theo thứ tự hoàn thành (kết quả đến sớm được trả sớm)
+    workers: số tiến trình (mặc định os.cpu_count()); workers=0 chạy tuần tự trong tiến trình hiện tại.
+    Mỗi yêu cầu là RouteRequest hoặc tuple cùng thứ tự trường.
+    """
+    requests = [req if isinstance(req, RouteRequest) else RouteRequest(*req) for req in requests]
+    if workers == 0:
+        for index, request in enumerate(requests):
+            yield index, run_route_request(df_charge, request)
+        return
+
+    with PlannerPool(df_charge, workers, cars=[req.car for req in requests]) as pool:
+        futures = [pool.submit(index, request) for index, request in enumerate(requests)]
+        if ordered:
+            for future in futures:
+                yield future.result()
+        else:
+            for future in as_completed(futures):
+                yield future.result()
+
+
+def plan_routes_batch_list(requests: Iterable[Any], df_charge: pd.DataFrame, workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Như plan_routes_batch nhưng trả về list kết quả theo thứ tự đầu vào."""
+    return [result for _, result in plan_routes_batch(requests, df_charge, workers=workers, ordered=True)]
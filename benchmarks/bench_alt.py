@@ -0,0 +1,55 @@
+"""
+So sánh A* với heuristic Haversine x ROAD_FACTOR và A* với heuristic ALT (trạm mốc):
+số nút mở rộng, số nhãn đẩy vào heap, thời gian và quãng đường tìm được.
+
+Bảng mốc được dựng (hoặc nạp từ .cache/) trước khi đo, nên thời gian chỉ gồm phần tìm kiếm.
+Chạy: python benchmarks/bench_alt.py [--landmarks 8]
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import file as routing  # noqa: E402
+import landmarks  # noqa: E402
+from models import cars  # noqa: E402
+from bench_dominance import QUERIES, load_stations, run_query  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--landmarks', type=int, default=landmarks.ALT_LANDMARKS, help="Số trạm mốc")
+    args = parser.parse_args()
+    landmarks.ALT_LANDMARKS = args.landmarks
+
+    df_charge = load_stations()
+    car_by_name = {car.name: car for car in cars}
+    stations = routing.get_station_arrays(df_charge)
+
+    t0 = time.perf_counter()
+    for car_name in sorted({q[0] for q in QUERIES}):
+        graph = routing.get_reachability_graph(stations, car_by_name[car_name].max_km_per_charge, routing.ROAD_FACTOR, stations.version)
+        landmarks.get_landmark_table(graph, stations.version, args.landmarks)
+    print(f"Chuẩn bị bảng mốc ({args.landmarks} mốc): {time.perf_counter() - t0:.2f}s")
+
+    print(f"{'Xe':<18} | {'Mở rộng H':>9} | {'Mở rộng ALT':>11} | {'Giảm':>6} | {'Đẩy H':>7} | {'Đẩy ALT':>7} | {'t H':>7} | {'t ALT':>7} | {'QĐ trùng':>8}")
+    print("-" * 104)
+    totals = [0, 0]
+    for car_name, start, end, pct in QUERIES:
+        car = car_by_name[car_name]
+        (_, _, dist_h), stats_h, t_h = run_query(routing.astar_charging_stations, df_charge, car, start, end, pct, dict(use_landmarks=False))
+        (_, _, dist_alt), stats_alt, t_alt = run_query(routing.astar_charging_stations, df_charge, car, start, end, pct, dict(use_landmarks=True))
+        totals[0] += stats_h['expanded']
+        totals[1] += stats_alt['expanded']
+        saved = 1 - stats_alt['expanded'] / stats_h['expanded'] if stats_h['expanded'] else 0.0
+        same = "có" if dist_h == dist_alt or (dist_h is not None and dist_alt is not None and abs(dist_h - dist_alt) < 1e-6) else "KHÔNG"
+        print(f"{car_name:<18} | {stats_h['expanded']:>9} | {stats_alt['expanded']:>11} | {saved:>6.1%} | {stats_h['pushed']:>7} | {stats_alt['pushed']:>7} | "
+              f"{t_h * 1000:>5.1f}ms | {t_alt * 1000:>5.1f}ms | {same:>8}")
+    if totals[0]:
+        print(f"\nTổng mở rộng: {totals[0]} -> {totals[1]} (giảm {1 - totals[1] / totals[0]:.1%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+A* anytime: thời gian tới lời giải đầu tiên, chất lượng lời giải theo thời gian và hệ số tối ưu đảm bảo,
+so với A* thường (trọng số 1.0).
+Chạy: python benchmarks/bench_anytime.py
+"""
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import file as routing  # noqa: E402
+from models import cars  # noqa: E402
+from bench_dominance import QUERIES, load_stations  # noqa: E402
+
+
+def main() -> None:
+    df_charge = load_stations()
+    car_by_name = {car.name: car for car in cars}
+    for car_name, start, end, pct in QUERIES:
+        car = car_by_name[car_name]
+        start_node = routing.find_nearest_node(*start, df_charge)
+        end_node = routing.find_nearest_node(*end, df_charge)
+        battery = car.max_km_per_charge * pct / 100
+
+        t0 = time.perf_counter()
+        _, _, dist_astar = routing.astar_charging_stations(df_charge, start_node, end_node, car.max_km_per_charge, battery, use_transit=False)
+        t_astar = (time.perf_counter() - t0) * 1000
+
+        incumbents = []
+        routing.anytime_astar_charging_stations(df_charge, start_node, end_node, car.max_km_per_charge, battery, on_incumbent=incumbents.append)
+        print(f"{car_name} {start} -> {end}: A* {dist_astar:.1f} km trong {t_astar:.1f} ms")
+        for inc in incumbents:
+            print(f"    w={inc['weight']:<4} {inc['elapsed_ms']:>7.1f} ms  {inc['total_dist']:>8.1f} km  hệ số <= {inc['bound']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Thông lượng của plan_routes_batch (PlannerPool) theo số tiến trình 1 / 2 / 4 / N (mặc định N = os.cpu_count()).
+Mỗi truy vấn trong QUERIES được lặp lại --repeat lần; so sánh với chạy tuần tự (workers=0).
+Thời gian dựng pool (khởi động tiến trình, chép bảng trạm vào shared memory) được in riêng, không tính vào thông lượng.
+Chạy: python benchmarks/bench_batch.py [--workers 8] [--repeat 4]
+
+Số liệu đã đo (--workers 4 --repeat 8, 88 truy vấn A*, 2 lần chạy) - chỉ có máy 1 lõi (os.cpu_count() = 1):
+  tuần tự      248-262 truy vấn/s  (1.00x)
+  1 tiến trình 202-203 truy vấn/s  (0.77-0.81x, chi phí gửi / nhận qua IPC)
+  2 tiến trình 272-296 truy vấn/s  (1.09-1.13x)
+  4 tiến trình 271-273 truy vấn/s  (1.04-1.09x)
+Trên 1 lõi các tiến trình chỉ chia nhau một CPU, nên 2/4 tiến trình chỉ nhỉnh hơn tuần tự nhờ chồng IPC với tính toán.
+Chưa đo được trên máy nhiều lõi: chưa có bằng chứng PlannerPool nhanh hơn tuần tự ở đó - cần chạy lại
+và ghi bổ sung bảng 1/2/4/N vào đây.
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from batch import PlannerPool, RouteRequest, run_route_request  # noqa: E402
+from models import cars  # noqa: E402
+from bench_dominance import QUERIES, load_stations  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="N lớn nhất (đo 1, 2, 4, ..., N)")
+    parser.add_argument('--repeat', type=int, default=4)
+    args = parser.parse_args()
+
+    df_charge = load_stations()
+    car_by_name = {car.name: car for car in cars}
+    requests = [RouteRequest(car_by_name[name], *start, *end, pct, False, 'astar')
+                for _ in range(args.repeat) for name, start, end, pct in QUERIES]
+
+    print(f"{len(requests)} truy vấn, os.cpu_count() = {os.cpu_count()}")
+    if (os.cpu_count() or 1) < 2:
+        print("Cảnh báo: máy chỉ có 1 lõi - số liệu dưới đây không phản ánh khả năng tăng tốc song song.")
+    print(f"{'Tiến trình':>10} | {'Thời gian':>9} | {'Truy vấn/s':>10} | {'Tăng tốc':>8}")
+    print("-" * 47)
+    baseline = None
+    counts = sorted({w for w in (1, 2, 4) if w < args.workers} | {args.workers})
+    for workers in [0] + counts:
+        if workers == 0:
+            t0 = time.perf_counter()
+            results = [run_route_request(df_charge, request) for request in requests]
+            elapsed = time.perf_counter() - t0
+        else:
+            t0 = time.perf_counter()
+            with PlannerPool(df_charge, workers, cars=[req.car for req in requests]) as pool:
+                # Khởi động đủ tiến trình trước khi bấm giờ
+                for future in [pool.submit(i, requests[i % len(requests)]) for i in range(workers)]:
+                    future.result()
+                startup = time.perf_counter() - t0
+                t0 = time.perf_counter()
+                results = [future.result()[1] for future in [pool.submit(i, request) for i, request in enumerate(requests)]]
+                elapsed = time.perf_counter() - t0
+        errors = sum('error' in result for result in results)
+        baseline = baseline or elapsed
+        label = "tuần tự" if workers == 0 else str(workers)
+        note = f"  (dựng pool {startup:.2f}s)" if workers else ""
+        note += f"  ({errors} lỗi)" if errors else ""
+        print(f"{label:>10} | {elapsed:>8.2f}s | {len(requests) / elapsed:>10.1f} | {baseline / elapsed:>7.2f}x{note}")
+
+
+if __name__ == "__main__":
+    main()
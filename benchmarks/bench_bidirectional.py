@@ -0,0 +1,41 @@
+"""
+So sánh tìm kiếm hai chiều với A* / UCS một chiều qua các entry point run_*_search:
+số nút mở rộng (xuôi / ngược), thời gian tìm kiếm và tổng quãng đường.
+
+Tìm kiếm hai chiều duyệt toàn bộ đồ thị trạm kề (không giới hạn 10 trạm/bước), nên cho
+đường ngắn nhất chính xác; A*/UCS một chiều có thể dài hơn.
+Chạy: python benchmarks/bench_bidirectional.py
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import file as routing  # noqa: E402
+from models import cars  # noqa: E402
+from bench_dominance import QUERIES, load_stations  # noqa: E402
+
+
+def main() -> None:
+    df_charge = load_stations()
+    car_by_name = {car.name: car for car in cars}
+    settings = [
+        ("A*", routing.run_astar_search, dict(use_transit=False)),
+        ("UCS", routing.run_ucs_search, {}),
+        ("Hai chiều", routing.run_astar_search, dict(bidirectional=True)),
+    ]
+    print(f"{'Xe':<18} | {'Chế độ':<9} | {'Mở rộng':>15} | {'Tìm kiếm':>9} | {'Tổng QĐ (km)':>12}")
+    print("-" * 76)
+    for car_name, start, end, pct in QUERIES:
+        for label, run, options in settings:
+            result = run(car_by_name[car_name], *start, *end, pct, False, df_charge, **options)
+            if 'error' in result:
+                print(f"{car_name:<18} | {label:<9} | {result['error']}")
+                continue
+            stats = result['stats']
+            expanded = f"{stats['expanded_forward']}+{stats['expanded_backward']}" if 'expanded_forward' in stats else str(stats['expanded'])
+            print(f"{car_name:<18} | {label:<9} | {expanded:>15} | {stats['search_time'] * 1000:>7.1f}ms | {result['total_dist']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
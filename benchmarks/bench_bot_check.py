@@ -0,0 +1,76 @@
+"""
+check_bot_stations vector hóa (mọi đoạn x mọi BOT, khoảng cách tới cung đường tròn lớn) so với cách cũ
+(df_bot.iterrows() trong vòng lặp đoạn, haversine vô hướng tới hai đầu mút) trên polyline nhiều điểm.
+Polyline: đường Hà Nội - TP.HCM nội suy thành N điểm, lệch ngẫu nhiên nhỏ.
+Chạy: python benchmarks/bench_bot_check.py [--points 10000] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from pdf_utils import BOT_PROXIMITY_THRESHOLD, check_bot_stations, haversine, load_bot_stations  # noqa: E402
+
+WAYPOINTS = [(21.0285, 105.854), (18.6796, 105.6813), (16.0544, 108.2022), (12.24, 109.19), (10.771, 106.701)]
+
+
+def legacy_check_bot_stations(route_points, df_bot):
+    """Cách kiểm tra cũ: chỉ so khoảng cách BOT tới hai đầu mút của mỗi đoạn."""
+    passed = {}
+    for i in range(len(route_points) - 1):
+        lat_a, lng_a = route_points[i]
+        lat_b, lng_b = route_points[i + 1]
+        for _, bot in df_bot.iterrows():
+            if haversine(lat_a, lng_a, bot['lat'], bot['lng']) < BOT_PROXIMITY_THRESHOLD or \
+                    haversine(lat_b, lng_b, bot['lat'], bot['lng']) < BOT_PROXIMITY_THRESHOLD:
+                passed.setdefault(bot['name'], bot['name'])
+    return list(passed)
+
+
+def make_polyline(points: int, seed: int):
+    rng = np.random.default_rng(seed)
+    waypoints = np.array(WAYPOINTS)
+    t = np.linspace(0, len(waypoints) - 1, points)
+    lat = np.interp(t, np.arange(len(waypoints)), waypoints[:, 0]) + rng.normal(0, 0.005, points)
+    lng = np.interp(t, np.arange(len(waypoints)), waypoints[:, 1]) + rng.normal(0, 0.005, points)
+    return list(zip(lat.tolist(), lng.tolist()))
+
+
+def timed(fn, repeat):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return result, best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--points', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df_bot = load_bot_stations(os.path.join(ROOT, 'BOT.csv'))
+    print(f"{len(df_bot)} trạm BOT")
+    print(f"{'Số điểm':>8} | {'Cũ':>9} | {'Vector hóa':>10} | {'Tăng tốc':>8} | {'BOT (cũ / mới)':>14}")
+    print("-" * 62)
+    for points in (100, 1000, args.points):
+        route_points = make_polyline(points, seed=points)
+        legacy, t_legacy = timed(lambda: legacy_check_bot_stations(route_points, df_bot), 1)
+        found, t_new = timed(lambda: check_bot_stations(route_points, df_bot), args.repeat)
+        print(f"{points:>8} | {t_legacy:>8.3f}s | {t_new:>9.4f}s | {t_legacy / t_new:>7.0f}x | {len(legacy):>6} / {len(found):<6}")
+
+    # Lộ trình thưa (điểm = trạm sạc, chặng dài): cách cũ bỏ sót BOT nằm giữa chặng
+    sparse = make_polyline(12, seed=0)
+    legacy = set(legacy_check_bot_stations(sparse, df_bot))
+    found = {bot['name'] for bot in check_bot_stations(sparse, df_bot)}
+    print(f"\nLộ trình 12 điểm: cũ tìm thấy {len(legacy)} BOT, mới tìm thấy {len(found)} (bỏ sót trước đây: {len(found - legacy)})")
+
+
+if __name__ == "__main__":
+    main()
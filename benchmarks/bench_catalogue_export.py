@@ -0,0 +1,94 @@
+"""
+Xuất danh mục trạm sạc lớn: export_pdf.py (đọc CSV theo khối, bảng nhiều cột, ghi trang ra file ngay khi xong)
+so với cách cũ (một FPDF giữ mọi trang trong bộ nhớ tới output(), một pdf.cell mỗi dòng CSV; chạy với font
+Arial.ttf vì font lõi của bản cũ không ghi được tiếng Việt). CSV giả lập từ dữ liệu thật, số dòng tăng dần.
+Mỗi lần đo chạy trong tiến trình con riêng để đo bộ nhớ đỉnh (ru_maxrss).
+Chạy: python benchmarks/bench_catalogue_export.py [--sizes 50000 200000 500000] [--legacy-max 200000]
+"""
+import argparse
+import csv
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def make_csv(path: str, size: int, seed: int = 0) -> None:
+    df = pd.read_csv(os.path.join(ROOT, 'charging_stations.csv'), skipinitialspace=True)
+    rng = np.random.default_rng(seed)
+    rows = df.iloc[rng.integers(0, len(df), size)].reset_index(drop=True)
+    rows['name'] = [f"{name} #{i}" for i, name in enumerate(rows['name'].tolist())]
+    rows.to_csv(path, index=False)
+
+
+def legacy_export(csv_path: str, pdf_path: str) -> None:
+    from fpdf import FPDF
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.add_font('ArialUnicode', '', os.path.join(ROOT, 'Arial.ttf'), uni=True)
+    pdf.set_font('ArialUnicode', '', 12)
+    pdf.cell(200, 10, txt="Danh sách trạm sạc", ln=True, align='C')
+    pdf.ln(10)
+    with open(csv_path, newline='', encoding='utf-8') as csvfile:
+        for row in csv.reader(csvfile):
+            pdf.cell(0, 10, txt=' | '.join(row), ln=True)
+    pdf.output(pdf_path)
+
+
+def child(mode: str, csv_path: str, pdf_path: str) -> None:
+    t0 = time.perf_counter()
+    if mode == 'legacy':
+        legacy_export(csv_path, pdf_path)
+    else:
+        import export_pdf
+        export_pdf.export_charging_stations_to_pdf(csv_path, pdf_path)
+    print(json.dumps({'seconds': time.perf_counter() - t0, 'maxrss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+
+
+def measure(mode: str, csv_path: str, pdf_path: str) -> dict:
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', mode, csv_path, pdf_path],
+                         capture_output=True, text=True, check=True).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    result['size_mb'] = os.path.getsize(pdf_path) / 1e6
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50000, 200000, 500000])
+    parser.add_argument('--legacy-max', type=int, default=200000, help="Bỏ qua cách cũ với CSV lớn hơn (chậm, tốn bộ nhớ)")
+    parser.add_argument('--child', nargs=3, metavar=('MODE', 'CSV', 'PDF'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(*args.child)
+        return
+
+    print(f"{'Số dòng':>8} | {'cách':>9} | {'thời gian':>9} | {'µs/dòng':>8} | {'RAM đỉnh':>9} | {'PDF':>8}")
+    print("-" * 66)
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            csv_path = os.path.join(tmp, f"stations_{size}.csv")
+            make_csv(csv_path, size)
+            for mode in ('legacy', 'streaming'):
+                if mode == 'legacy' and size > args.legacy_max:
+                    continue
+                r = measure(mode, csv_path, os.path.join(tmp, f"{mode}_{size}.pdf"))
+                print(f"{size:>8} | {mode:>9} | {r['seconds']:>8.1f}s | {r['seconds'] / size * 1e6:>8.0f} |"
+                      f" {r['maxrss_mb']:>6.0f} MB | {r['size_mb']:>5.1f} MB")
+            os.remove(csv_path)
+    for path in (os.path.join(ROOT, name) for name in ('Arial.pkl', 'Arial.cw127.pkl')): # add_font của fpdf ghi cạnh Arial.ttf
+        if os.path.exists(path):
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+So sánh số nút mở rộng / thời gian / độ lệch tối ưu giữa các chế độ loại trạng thái:
+- legacy: chỉ loại trạng thái trùng (trạm, pin) chính xác (hành vi cũ)
+- dominance: loại nhãn bị trội (pin <= và quãng đường >=)
+- dominance + lượng tử hóa pin (1 km, 5 km, 1%, 5%)
+
+Độ lệch được tính so với legacy: quãng đường giữa các trạm và tổng lượng sạc trên lộ trình.
+Chạy: python benchmarks/bench_dominance.py [--timeout 30]
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import data_loader  # noqa: E402
+import file as routing  # noqa: E402
+from models import cars  # noqa: E402
+
+QUERIES = [
+    ("VinFast VF8", (20.825, 105.351), (10.771, 106.701), 80),
+    ("VinFast VF e34", (20.825, 105.351), (20.734567, 105.267891), 70),
+    ("VinFast VF9", (20.825, 105.351), (20.5, 105.5), 90),
+    ("Tesla Model S", (21.0285, 105.854), (16.0544, 108.2022), 60),
+    ("VinFast VF e34", (21.0285, 105.854), (19.8, 105.77), 30),
+    ("BMW iX3", (10.771, 106.701), (12.24, 109.19), 50),
+    ("Nissan Leaf", (16.0544, 108.2022), (10.771, 106.701), 100),
+    ("Mercedes EQS 450+", (21.0285, 105.854), (10.771, 106.701), 20),
+    ("VinFast VF5", (10.771, 106.701), (21.0285, 105.854), 90),
+    ("VinFast VF e34", (21.8537, 106.7615), (9.1769, 105.1524), 80),
+    ("VinFast VF8", (21.8537, 106.7615), (9.1769, 105.1524), 80),
+]
+
+SETTINGS = [
+    ("legacy", dict(dominance=False)),
+    ("dominance", dict(dominance=True)),
+    ("dom + 1 km", dict(dominance=True, soc_bucket_km=1.0)),
+    ("dom + 5 km", dict(dominance=True, soc_bucket_km=5.0)),
+    ("dom + 1%", dict(dominance=True, soc_bucket_percent=1.0)),
+    ("dom + 5%", dict(dominance=True, soc_bucket_percent=5.0)),
+]
+
+
+def load_stations() -> pd.DataFrame:
+    return data_loader.load_charging_stations(os.path.join(ROOT, 'charging_stations.csv'))
+
+
+def run_query(search_fn, df_charge, car, start, end, battery_percent, options):
+    """Snap tới trạm gần nhất giống run_*_search rồi gọi hàm tìm kiếm lõi, trả về (kết quả, stats, thời gian)."""
+    battery_max = car.max_km_per_charge
+    start_node = routing.find_nearest_node(*start, df_charge)
+    end_node = routing.find_nearest_node(*end, df_charge)
+    first = df_charge[df_charge['name'] == start_node].iloc[0]
+    battery_at_first = int(battery_max * battery_percent / 100) - routing.haversine(*start, first['lat'], first['lng']) * routing.ROAD_FACTOR
+    options = dict(options)
+    bucket = routing.soc_bucket_to_km(battery_max, options.pop('soc_bucket_km', None), options.pop('soc_bucket_percent', None))
+    stats = {}
+    t0 = time.perf_counter()
+    result = search_fn(df_charge, start_node, end_node, battery_max, battery_at_first, False, soc_bucket_km=bucket, stats=stats, **options)
+    return result, stats, time.perf_counter() - t0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--timeout', type=float, default=30.0, help="Giới hạn thời gian mỗi truy vấn (giây)")
+    args = parser.parse_args()
+    routing.TIMEOUT_SECONDS = args.timeout
+
+    df_charge = load_stations()
+    car_by_name = {car.name: car for car in cars}
+    for algo, search_fn in (("A*", routing.astar_charging_stations), ("UCS", routing.ucs_charging_stations)):
+        print(f"\n=== {algo} ({len(QUERIES)} truy vấn, timeout {args.timeout:.0f}s) ===")
+        print(f"{'Chế độ':<12} | {'Tìm thấy':>8} | {'Mở rộng (tổng)':>14} | {'Loại bỏ':>9} | {'Thời gian':>9} | {'Lệch QĐ max':>11} | {'Lệch sạc TB':>11}")
+        print("-" * 94)
+        baseline = {}
+        for setting_name, options in SETTINGS:
+            found = expanded = pruned = 0
+            total_time = 0.0
+            dist_drift, charge_drift = [], []
+            for qi, (car_name, start, end, pct) in enumerate(QUERIES):
+                (path, log, dist), stats, elapsed = run_query(search_fn, df_charge, car_by_name[car_name], start, end, pct, options)
+                expanded += stats['expanded']
+                pruned += stats['pruned']
+                total_time += elapsed
+                if path is None:
+                    continue
+                found += 1
+                charged = sum(entry[2] for entry in log)
+                if setting_name == "legacy":
+                    baseline[qi] = (dist, charged)
+                elif qi in baseline:
+                    base_dist, base_charged = baseline[qi]
+                    dist_drift.append((dist - base_dist) / base_dist * 100 if base_dist else 0.0)
+                    charge_drift.append(charged - base_charged)
+            max_dist = f"{max(dist_drift, key=abs):+.3f}%" if dist_drift else "-"
+            avg_charge = f"{sum(charge_drift) / len(charge_drift):+.1f} km" if charge_drift else "-"
+            print(f"{setting_name:<12} | {found:>4}/{len(QUERIES):<3} | {expanded:>14} | {pruned:>9} | {total_time:>8.2f}s | {max_dist:>11} | {avg_charge:>11}")
+
+
+if __name__ == "__main__":
+    main()
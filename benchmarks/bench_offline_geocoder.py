@@ -0,0 +1,59 @@
+"""
+Tra ngược offline (offline_geocoder.py, KD-tree trên địa chỉ trạm sạc + BOT) so với quét tuyến tính
+(haversine tới mọi địa chỉ), cùng tỉ lệ truy vấn được trả lời offline theo ngưỡng khoảng cách.
+Truy vấn: tọa độ ngẫu nhiên quanh các trạm sạc (lệch chuẩn 0.02 độ ~ 2 km).
+Chạy: python benchmarks/bench_offline_geocoder.py [--queries 5000]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from offline_geocoder import build_offline_geocoder  # noqa: E402
+from spatial_index import R_EARTH  # noqa: E402
+
+
+def linear_nearest(geocoder, lat, lng):
+    lat1, lng1 = np.radians(lat), np.radians(lng)
+    lat2, lng2 = np.radians(geocoder.lat), np.radians(geocoder.lng)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    d = 2 * R_EARTH * np.arcsin(np.sqrt(a))
+    i = int(np.argmin(d))
+    return geocoder.addresses[i], float(d[i])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--queries', type=int, default=5000)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    geocoder = build_offline_geocoder(gazetteer_file=os.path.join(ROOT, 'gazetteer.csv'))
+    print(f"{len(geocoder)} địa chỉ, dựng trong {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+    rng = np.random.default_rng(0)
+    base = rng.integers(0, len(geocoder), args.queries)
+    lat = (geocoder.lat[base] + rng.normal(0, 0.02, args.queries)).tolist()
+    lng = (geocoder.lng[base] + rng.normal(0, 0.02, args.queries)).tolist()
+
+    t0 = time.perf_counter()
+    places = [geocoder.nearest(a, b) for a, b in zip(lat, lng)]
+    t_tree = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    linear = [linear_nearest(geocoder, a, b) for a, b in zip(lat, lng)]
+    t_linear = time.perf_counter() - t0
+
+    mismatched = sum(abs(place.distance_km - d) > 1e-6 for place, (_, d) in zip(places, linear))
+    print(f"KD-tree: {t_tree / args.queries * 1e6:.1f} us/truy vấn | quét tuyến tính: {t_linear / args.queries * 1e6:.1f} us/truy vấn"
+          f" | khác khoảng cách: {mismatched}")
+    distances = np.array([place.distance_km for place in places])
+    for threshold in (0.5, 1.0, 2.0, 5.0):
+        print(f"Ngưỡng {threshold:>4} km: {np.mean(distances <= threshold) * 100:5.1f}% truy vấn trả lời offline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Một điểm xuất phát, nhiều điểm đích: run_ucs_one_to_many so với gọi run_ucs_search cho từng điểm đích.
+Điểm đích là tọa độ trạm sạc ngẫu nhiên lệch thêm tối đa ~5 km. Hai cách phải cho cùng kết quả (kiểm tra bằng assert);
+cột "Tìm kiếm" là số trạm đích khác nhau thực sự phải tìm kiếm (các đích còn lại dùng lại chặng qua RouteCache).
+Chạy: python benchmarks/bench_one_to_many.py [--destinations 500] [--seed 0]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import file as routing  # noqa: E402
+from models import cars  # noqa: E402
+from bench_dominance import load_stations  # noqa: E402
+
+DEPOT = (21.0285, 105.854) # Hà Nội
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--destinations', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    df_charge = load_stations()
+    rng = np.random.default_rng(args.seed)
+    rows = rng.integers(0, len(df_charge), args.destinations)
+    jitter = rng.uniform(-0.05, 0.05, (args.destinations, 2))
+    destinations = [(float(df_charge['lat'].iloc[r] + j[0]), float(df_charge['lng'].iloc[r] + j[1])) for r, j in zip(rows, jitter)]
+
+    print(f"{args.destinations} điểm đích từ {DEPOT}")
+    print(f"{'Xe':<18} | {'Một-nhiều':>9} | {'Từng đích':>9} | {'Tăng tốc':>8} | {'Tìm kiếm':>8}")
+    print("-" * 64)
+    for car in cars:
+        routing.prepare_station_graphs(df_charge, [car])
+        t0 = time.perf_counter()
+        many_results = routing.run_ucs_one_to_many(car, *DEPOT, destinations, 80, False, df_charge, emit_stats=False)
+        many_time = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        single_results = [routing.run_ucs_search(car, *DEPOT, lat, lng, 80, False, df_charge, emit_stats=False) for lat, lng in destinations]
+        single_time = time.perf_counter() - t0
+        searched = sum(result['stats'].get('cache') == 'miss' for result in many_results)
+        for a, b in zip(many_results, single_results):
+            a.pop('stats')
+            b.pop('stats')
+            assert a == b
+        print(f"{car.name:<18} | {many_time:>8.2f}s | {single_time:>8.2f}s | {single_time / many_time:>7.1f}x | {searched:>8}")
+
+
+if __name__ == "__main__":
+    main()
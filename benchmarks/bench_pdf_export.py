@@ -0,0 +1,93 @@
+"""
+Xuất báo cáo PDF: PdfRenderer (pdf_renderer.py - metrics font nạp một lần, font con cache theo tập ký tự,
+nhúng một font) so với cách cũ (mỗi lần xuất một FPDF mới, add_font Arial.ttf cho kiểu thường và "đậm",
+fpdf cắt lại file font khi ghi). Báo cáo giả lập với nội dung khác nhau giữa các lần xuất.
+Chạy: python benchmarks/bench_pdf_export.py [--reports 1000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from fpdf import FPDF  # noqa: E402
+from pdf_renderer import FONT_PATH, PdfRenderer, RouteReport  # noqa: E402
+
+CITIES = ["Hà Nội", "Hải Phòng", "Vinh", "Huế", "Đà Nẵng", "Quy Nhơn", "Nha Trang", "Đà Lạt", "Cần Thơ", "TP Hồ Chí Minh"]
+
+
+def make_report(i: int) -> RouteReport:
+    start, end = CITIES[i % len(CITIES)], CITIES[(i * 7 + 3) % len(CITIES)]
+    summary = (f"Tổng quãng đường di chuyển: {300 + i % 1400:.2f} km\nTổng thời gian lái xe: {i % 24} giờ {i % 60} phút\n"
+               f"Tổng chi phí sạc: {i * 1000 % 900000:.0f} VND\nTổng phí BOT: {i * 500 % 300000:.0f} VND (Tránh BOT: Không)")
+    details = "\n".join(f"Chặng {k}: Trạm sạc {CITIES[(i + k) % len(CITIES)]} - sạc tới {60 + k * 5}%" for k in range(1 + i % 6))
+    stations = [{'id': k, 'name': f"Trạm {CITIES[(i + k) % len(CITIES)]}", 'address': f"Quốc lộ 1A, {CITIES[k % len(CITIES)]}",
+                 'lat': 10 + k, 'lng': 105 + k / 10} for k in range(i % 4)]
+    return RouteReport(model='VinFast VF8', pin=80, start_coords='21.0285, 105.854', end_coords='10.771, 106.701',
+                       summary=summary, details=details, stations=stations, start_address=start, end_address=end)
+
+
+def legacy_export(report: RouteReport, filepath: str) -> None:
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.add_font('ArialUnicode', '', FONT_PATH, uni=True)
+    pdf.add_font('ArialUnicode', 'B', FONT_PATH, uni=True)
+    pdf.set_font('ArialUnicode', '', 16)
+    pdf.cell(0, 12, txt="KẾT QUẢ LỘ TRÌNH XE ĐIỆN", ln=True, align='C')
+    pdf.ln(6)
+    pdf.set_font('ArialUnicode', '', 12)
+    for line in report.summary.split('\n'):
+        pdf.multi_cell(0, 8, txt=line, align='L')
+    pdf.ln(5)
+    pdf.set_font('ArialUnicode', 'B', 11)
+    pdf.multi_cell(0, 8, txt="CHI TIẾT LỘ TRÌNH:", align='L')
+    pdf.set_font('ArialUnicode', '', 10)
+    for line in report.details.split('\n'):
+        pdf.multi_cell(0, 5, txt=line.strip(), align='L')
+    if report.stations:
+        pdf.ln(5)
+        pdf.set_font('ArialUnicode', 'B', 11)
+        pdf.multi_cell(0, 8, txt="CÁC TRẠM SẠC TRÊN LỘ TRÌNH:", align='L')
+        pdf.set_font('ArialUnicode', '', 10)
+        for station in report.stations:
+            pdf.multi_cell(0, 5, txt=f"#{station['id']} {station['name']} - {station['address']} ({station['lat']:.5f}, {station['lng']:.5f})", align='L')
+    pdf.output(filepath)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--reports', type=int, default=1000)
+    args = parser.parse_args()
+    reports = [make_report(i) for i in range(args.reports)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_dir = os.path.join(tmp, 'legacy')
+        os.makedirs(legacy_dir)
+        t0 = time.perf_counter()
+        for i, report in enumerate(reports):
+            legacy_export(report, os.path.join(legacy_dir, f"{i}.pdf"))
+        t_legacy = time.perf_counter() - t0
+        legacy_size = sum(os.path.getsize(os.path.join(legacy_dir, name)) for name in os.listdir(legacy_dir))
+
+        t0 = time.perf_counter()
+        renderer = PdfRenderer(output_dir=os.path.join(tmp, 'renderer'), cache_dir=os.path.join(tmp, 'fonts'))
+        t_setup = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        paths = [renderer.export(report) for report in reports]
+        t_renderer = time.perf_counter() - t0
+        renderer_size = sum(os.path.getsize(path) for path in paths)
+
+    n = args.reports
+    print(f"{n} báo cáo")
+    print(f"FPDF mỗi lần:  {t_legacy:7.2f}s ({t_legacy / n * 1000:6.1f} ms/báo cáo) | {legacy_size / n / 1024:6.1f} KB/file")
+    print(f"PdfRenderer:   {t_renderer:7.2f}s ({t_renderer / n * 1000:6.1f} ms/báo cáo) | {renderer_size / n / 1024:6.1f} KB/file"
+          f" | nạp font {t_setup * 1000:.0f} ms | cache font con: {renderer.face.subset_hits} hit / {renderer.face.subset_misses} miss")
+    for path in (os.path.splitext(FONT_PATH)[0] + ext for ext in ('.pkl', '.cw127.pkl')): # add_font của fpdf ghi cạnh Arial.ttf
+        if os.path.exists(path):
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
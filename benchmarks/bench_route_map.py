@@ -0,0 +1,75 @@
+"""
+Vẽ bản đồ lộ trình: route_map.py (lớp tĩnh dựng một lần + lớp lộ trình) so với folium dựng cả bản đồ
+mỗi lần tìm (mọi trạm sạc trong MarkerCluster + lộ trình), với số trạm tăng dần (trạm giả lập quanh dữ liệu thật).
+Đo thời gian vẽ một lộ trình và kích thước file HTML mỗi lần tìm.
+Chạy: python benchmarks/bench_route_map.py [--sizes 1000 10000 50000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from data_loader import load_bot_stations, load_charging_stations  # noqa: E402
+from route_map import render_route_map  # noqa: E402
+from station_catalogue import get_station_catalogue  # noqa: E402
+
+ROUTE = [(21.0285, 105.854), (18.6796, 105.6813), (16.0544, 108.2022), (12.24, 109.19), (10.771, 106.701)]
+
+
+def synthetic_stations(df: pd.DataFrame, size: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    base = rng.integers(0, len(df), size)
+    return pd.DataFrame({'name': [f"Trạm {i}" for i in range(size)], 'address': df['address'].to_numpy()[base],
+                         'lat': df['lat'].to_numpy()[base] + rng.normal(0, 0.05, size),
+                         'lng': df['lng'].to_numpy()[base] + rng.normal(0, 0.05, size)})
+
+
+def folium_full_map(route_points, df_charge, path):
+    import folium
+    from folium.plugins import MarkerCluster
+    m = folium.Map(location=list(route_points[0]), zoom_start=6)
+    cluster = MarkerCluster().add_to(m)
+    for name, lat, lng in zip(df_charge['name'].tolist(), df_charge['lat'].tolist(), df_charge['lng'].tolist()):
+        folium.CircleMarker([lat, lng], radius=5, popup=f"Trạm Sạc: {name}").add_to(cluster)
+    folium.PolyLine(locations=route_points, color="blue", weight=5, opacity=0.7).add_to(m)
+    for lat, lng in route_points:
+        folium.Marker([lat, lng], icon=folium.Icon(color='orange', icon='bolt', prefix='fa')).add_to(m)
+    m.save(path)
+    return path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    args = parser.parse_args()
+
+    df_real = load_charging_stations(os.path.join(ROOT, 'charging_stations.csv'))
+    df_bot = load_bot_stations(os.path.join(ROOT, 'BOT.csv'))
+    print(f"{'Số trạm':>8} | {'folium':>8} | {'HTML folium':>11} | {'lớp tĩnh (1 lần)':>16} | {'lộ trình':>9} | {'HTML lộ trình':>13}")
+    print("-" * 82)
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            df_charge = synthetic_stations(df_real, size)
+            map_dir = os.path.join(tmp, str(size))
+            t0 = time.perf_counter()
+            folium_path = folium_full_map(ROUTE, df_charge, os.path.join(tmp, f"folium_{size}.html"))
+            t_folium = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            render_route_map(ROUTE, df_charge, [], None, df_bot=df_bot, map_dir=map_dir) # Lần đầu: dựng lớp tĩnh
+            t_first = time.perf_counter() - t0
+            catalogue = get_station_catalogue(df_charge) # GUI giữ sẵn catalogue
+            t0 = time.perf_counter()
+            path = render_route_map(ROUTE, df_charge, [], None, df_bot=df_bot, map_dir=map_dir, catalogue=catalogue)
+            t_route = time.perf_counter() - t0
+            print(f"{size:>8} | {t_folium:>7.2f}s | {os.path.getsize(folium_path) / 1024:>8.0f} KB | {t_first:>15.3f}s |"
+                  f" {t_route * 1000:>6.1f} ms | {os.path.getsize(path) / 1024:>10.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
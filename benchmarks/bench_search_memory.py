@@ -0,0 +1,60 @@
+"""
+Đo thời gian và bộ nhớ đỉnh (tracemalloc) của A* / UCS trên các lộ trình Bắc - Nam dài.
+
+Chạy: python benchmarks/bench_search_memory.py
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import data_loader  # noqa: E402
+from models import cars  # noqa: E402
+from file import run_astar_search, run_ucs_search  # noqa: E402
+
+ROUTES = [
+    ("Hà Nội -> TP.HCM", (21.0285, 105.854), (10.771, 106.701)),
+    ("Hải Phòng -> Cần Thơ", (20.8449, 106.6881), (10.0452, 105.7469)),
+    ("Lạng Sơn -> Cà Mau", (21.8537, 106.7615), (9.1769, 105.1524)),
+]
+CAR_NAMES = ["VinFast VF e34", "VinFast VF8", "Mercedes EQS 450+"]
+BATTERY_PERCENT = 80
+
+
+def load_stations() -> pd.DataFrame:
+    return data_loader.load_charging_stations(os.path.join(ROOT, 'charging_stations.csv'))
+
+
+def measure(fn, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main() -> None:
+    df_charge = load_stations()
+    car_by_name = {car.name: car for car in cars}
+    # Chạy khởi động một lần để đồ thị / chỉ mục đã nằm trong cache
+    run_astar_search(car_by_name[CAR_NAMES[0]], 21.0285, 105.854, 20.8449, 106.6881, 80, False, df_charge)
+
+    print(f"{'Lộ trình':<22} | {'Xe':<18} | {'Thuật toán':<5} | {'Thời gian':>9} | {'Bộ nhớ đỉnh':>11} | {'Quãng đường':>11}")
+    print("-" * 92)
+    for route_name, (lat_s, lng_s), (lat_e, lng_e) in ROUTES:
+        for car_name in CAR_NAMES:
+            car = car_by_name[car_name]
+            for algo, fn in (("A*", run_astar_search), ("UCS", run_ucs_search)):
+                result, elapsed, peak = measure(fn, car, lat_s, lng_s, lat_e, lng_e, BATTERY_PERCENT, False, df_charge)
+                dist = f"{result['total_dist']:.1f} km" if 'error' not in result else "lỗi"
+                print(f"{route_name:<22} | {car_name:<18} | {algo:<5} | {elapsed:>8.3f}s | {peak / 1024**2:>8.2f} MB | {dist:>11}")
+
+
+if __name__ == "__main__":
+    main()
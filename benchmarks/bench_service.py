@@ -0,0 +1,100 @@
+"""
+Dịch vụ lập lộ trình (service.py, dữ liệu + chỉ mục nạp một lần) so với chạy script mới cho mỗi lộ trình
+(tiến trình Python mới: import, nạp dữ liệu, tìm một lộ trình). Yêu cầu ngẫu nhiên giữa các trạm thật,
+gửi từ nhiều kết nối đồng thời; in độ trễ p50 / p90 / p99 theo endpoint từ GET /stats.
+Chạy: python benchmarks/bench_service.py [--requests 200] [--clients 4] [--cold 5] [--processes]
+"""
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from service import BackgroundServer, RoutingService  # noqa: E402
+
+COLD_SCRIPT = """
+import sys, json
+sys.path.insert(0, {root!r})
+from data_loader import load_charging_stations
+from file import run_astar_search
+from models import cars
+car = next(car for car in cars if car.name == {car!r})
+result = run_astar_search(car, {start[0]}, {start[1]}, {end[0]}, {end[1]}, 80, False, load_charging_stations(), emit_stats=False)
+print(json.dumps(result.get('total_dist')))
+"""
+
+
+def make_requests(service: RoutingService, count: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    coords = service.df_charge[['lat', 'lng']].to_numpy(dtype=np.float64)
+    pairs = rng.integers(0, len(coords), (count, 2))
+    return [{'car': 'VinFast VF8', 'start': coords[a].tolist(), 'end': coords[b].tolist(), 'battery_percent': 80}
+            for a, b in pairs.tolist()]
+
+
+def run_client(port: int, bodies):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=600)
+    try:
+        for body in bodies:
+            conn.request('POST', '/route', body=json.dumps(body))
+            conn.getresponse().read()
+            conn.request('GET', f"/nearest?lat={body['start'][0]}&lng={body['start'][1]}&k=5")
+            conn.getresponse().read()
+    finally:
+        conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--cold', type=int, default=5, help="Số lần chạy script mới (cách cũ)")
+    parser.add_argument('--processes', action='store_true')
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    service = RoutingService.load(workers=args.clients, processes=args.processes)
+    t_load = time.perf_counter() - t0
+    bodies = make_requests(service, args.requests)
+
+    t_cold = []
+    for body in bodies[:args.cold]:
+        script = COLD_SCRIPT.format(root=ROOT, car=body['car'], start=body['start'], end=body['end'])
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, '-c', script], check=True, capture_output=True)
+        t_cold.append(time.perf_counter() - t0)
+
+    server = BackgroundServer(service)
+    try:
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(args.clients) as pool:
+            list(pool.map(lambda i: run_client(server.port, bodies[i::args.clients]), range(args.clients)))
+        t_warm = time.perf_counter() - t0
+        conn = http.client.HTTPConnection('127.0.0.1', server.port)
+        conn.request('GET', '/stats')
+        stats = json.loads(conn.getresponse().read())
+        conn.close()
+    finally:
+        server.stop()
+        service.close()
+
+    print(f"Nạp dịch vụ: {t_load:.2f}s ({'tiến trình' if args.processes else 'luồng'}, {args.clients} worker)")
+    if t_cold:
+        print(f"Script mới mỗi lộ trình: {np.mean(t_cold) * 1000:.0f} ms/lộ trình (trung bình {len(t_cold)} lần)")
+    print(f"Dịch vụ: {args.requests} lộ trình + {args.requests} tra trạm gần nhất từ {args.clients} kết nối trong {t_warm:.2f}s"
+          f" ({args.requests / t_warm:.1f} lộ trình/giây)")
+    for endpoint, row in stats['endpoints'].items():
+        print(f"  {endpoint:<14} n={row['count']:<5} lỗi={row['errors']:<3} p50={row['p50_ms']:8.2f} ms"
+              f"  p90={row['p90_ms']:8.2f} ms  p99={row['p99_ms']:8.2f} ms")
+    print(f"  RouteCache: {stats['route_cache']}")
+
+
+if __name__ == "__main__":
+    main()
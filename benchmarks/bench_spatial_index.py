@@ -0,0 +1,101 @@
+"""
+Benchmark chỉ mục không gian (spatial_index.SpatialIndex) trên tập trạm sạc tổng hợp.
+
+So sánh với cách quét toàn bộ:
+- nearest: cách cũ của find_nearest_node (khoảng cách Euclid trên độ, idxmin trên DataFrame)
+- find_nearest_node: cả lời gọi file.find_nearest_node (tra cache StationArrays theo DataFrame + KD-tree),
+  không chỉ SpatialIndex.query_nearest - chi phí tra cache / băm dữ liệu trên mỗi lời gọi hiện ở cột này
+- radius: Haversine vector hóa trên toàn bộ điểm
+
+Chạy: python benchmarks/bench_spatial_index.py [--sizes 1000 100000 1000000]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from spatial_index import SpatialIndex, R_EARTH  # noqa: E402
+import file as routing  # noqa: E402
+import station_graph  # noqa: E402
+
+# Khung tọa độ xấp xỉ lãnh thổ Việt Nam
+LAT_RANGE = (8.5, 23.4)
+LNG_RANGE = (102.1, 109.5)
+
+
+def synthetic_stations(n: int, rng: np.random.Generator) -> pd.DataFrame:
+    return pd.DataFrame({
+        'name': [f"Trạm {i}" for i in range(n)],
+        'lat': rng.uniform(*LAT_RANGE, n),
+        'lng': rng.uniform(*LNG_RANGE, n),
+    })
+
+
+def brute_nearest(df: pd.DataFrame, lat: float, lng: float) -> str:
+    """Cách cũ của find_nearest_node (copy DataFrame + idxmin)."""
+    df = df.copy()
+    df['dist'] = ((df['lat'].astype(float) - lat)**2 + (df['lng'].astype(float) - lng)**2).apply(np.sqrt)
+    return df.loc[df['dist'].idxmin()]['name']
+
+
+def brute_radius(lat_rad: np.ndarray, lng_rad: np.ndarray, lat: float, lng: float, radius_km: float) -> np.ndarray:
+    lat1, lng1 = np.radians(lat), np.radians(lng)
+    a = np.sin((lat_rad - lat1) / 2)**2 + np.cos(lat1) * np.cos(lat_rad) * np.sin((lng_rad - lng1) / 2)**2
+    d = R_EARTH * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return np.flatnonzero(d <= radius_km)
+
+
+def time_per_call(fn, args_list) -> float:
+    start = time.perf_counter()
+    for args in args_list:
+        fn(*args)
+    return (time.perf_counter() - start) / len(args_list)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 100_000, 1_000_000])
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--radius-km', type=float, default=50.0)
+    args = parser.parse_args()
+
+    station_graph.CACHE_DIR = '' # Chỉ đo trong bộ nhớ
+    rng = np.random.default_rng(12)
+    print(f"{'N':>9} | {'build (s)':>9} | {'nearest idx':>11} | {'find_node':>11} | {'nearest cũ':>11} | {'radius idx':>11} | {'radius quét':>11} | {'TB điểm/r':>9}")
+    print("-" * 106)
+    for n in args.sizes:
+        df = synthetic_stations(n, rng)
+        lat, lng = df['lat'].to_numpy(), df['lng'].to_numpy()
+        queries = list(zip(rng.uniform(*LAT_RANGE, args.queries), rng.uniform(*LNG_RANGE, args.queries)))
+
+        start = time.perf_counter()
+        index = SpatialIndex(lat, lng)
+        build_s = time.perf_counter() - start
+
+        nearest_idx = time_per_call(lambda a, b: index.query_nearest(a, b, k=1), queries)
+        routing.find_nearest_node(*queries[0], df) # Lần đầu: dựng StationArrays + KD-tree cho df
+        find_node = time_per_call(lambda a, b: routing.find_nearest_node(a, b, df), queries)
+        assert routing.find_nearest_node(*queries[0], df) == df['name'].iloc[int(index.query_nearest(*queries[0], k=1)[1][0])]
+        # Cách cũ rất chậm với N lớn: chỉ đo trên ít truy vấn hơn
+        n_brute = max(3, min(len(queries), 200_000 // max(n // 100, 1)))
+        nearest_old = time_per_call(lambda a, b: brute_nearest(df, a, b), queries[:n_brute])
+
+        radius_idx = time_per_call(lambda a, b: index.query_radius(a, b, args.radius_km), queries)
+        lat_rad, lng_rad = np.radians(lat), np.radians(lng)
+        radius_scan = time_per_call(lambda a, b: brute_radius(lat_rad, lng_rad, a, b, args.radius_km), queries[:n_brute])
+
+        # Kiểm tra kết quả khớp với quét toàn bộ
+        for a, b in queries[:20]:
+            assert np.array_equal(index.query_radius(a, b, args.radius_km), brute_radius(lat_rad, lng_rad, a, b, args.radius_km))
+        avg_hits = np.mean([len(index.query_radius(a, b, args.radius_km)) for a, b in queries[:50]])
+
+        print(f"{n:>9} | {build_s:>9.3f} | {nearest_idx*1e6:>9.1f}µs | {find_node*1e6:>9.1f}µs | {nearest_old*1e3:>9.2f}ms | "
+              f"{radius_idx*1e6:>9.1f}µs | {radius_scan*1e3:>9.2f}ms | {avg_hits:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Thời gian tải dữ liệu khi khởi động (charging_stations.csv + BOT.csv), mỗi lần chạy trong một tiến trình mới:
+- csv: đọc CSV bằng pandas như trước (không cache)
+- lạnh: chưa có cache nhị phân (đọc CSV + ghi cache)
+- ấm: nạp từ cache nhị phân (mmap)
+Báo cáo thời gian tải dữ liệu (sau khi import xong) và tổng thời gian tiến trình, lấy trung vị.
+Chạy: python benchmarks/bench_startup.py [--runs 7]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import data_loader  # noqa: E402
+
+CHILD = """
+import json, sys, time
+t0 = time.perf_counter()
+import data_loader
+t1 = time.perf_counter()
+use_cache = sys.argv[1] != 'csv'
+df_charge = data_loader.load_charging_stations(use_cache=use_cache)
+df_bot = data_loader.load_bot_stations(use_cache=use_cache)
+print(json.dumps({'import': t1 - t0, 'load': time.perf_counter() - t1, 'rows': len(df_charge) + len(df_bot)}))
+"""
+
+
+def remove_cache_files() -> None:
+    for filename, kind in ((data_loader.STATIONS_FILE, 'stations'), (data_loader.BOT_FILE, 'bot')):
+        path = data_loader.cache_path_for(filename, kind)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def run_child(mode: str):
+    t0 = time.perf_counter()
+    out = subprocess.run([sys.executable, '-c', CHILD, mode], cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return json.loads(out), time.perf_counter() - t0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"{'Chế độ':<6} | {'Tải dữ liệu':>11} | {'Import':>8} | {'Tiến trình':>10}")
+    print("-" * 46)
+    for mode in ('csv', 'lạnh', 'ấm'):
+        samples = []
+        for _ in range(args.runs):
+            if mode == 'lạnh':
+                remove_cache_files()
+            samples.append(run_child(mode))
+        load = statistics.median(s['load'] for s, _ in samples) * 1000
+        imp = statistics.median(s['import'] for s, _ in samples) * 1000
+        wall = statistics.median(w for _, w in samples) * 1000
+        print(f"{mode:<6} | {load:>9.1f}ms | {imp:>6.1f}ms | {wall:>8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
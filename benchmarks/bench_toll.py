@@ -0,0 +1,61 @@
+"""
+Chỉ mục cạnh đi qua trạm thu phí (toll_edges.py): thời gian dựng cho từng quãng đường xe,
+số cạnh có BOT, và ảnh hưởng của avoid_toll lên lộ trình A* / UCS (quãng đường, số BOT trên lộ trình).
+Chạy: python benchmarks/bench_toll.py
+"""
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import file as routing  # noqa: E402
+import station_graph  # noqa: E402
+from models import cars  # noqa: E402
+from pdf_utils import check_bot_stations  # noqa: E402
+from toll_edges import build_toll_edges, default_bot_stations  # noqa: E402
+from bench_dominance import QUERIES, load_stations  # noqa: E402
+
+
+def count_bots(result, catalogue, start, end, df_bot) -> int:
+    """Số trạm BOT trong vòng BOT_PROXIMITY_THRESHOLD của lộ trình (giống main.py); -1 nếu không có lộ trình."""
+    if 'error' in result:
+        return -1
+    stops = [catalogue.coords(step['station_id']) for step in result['path'][1:-1] if 'station_id' in step]
+    return len(check_bot_stations([start] + stops + [end], df_bot))
+
+
+def main() -> None:
+    df_charge = load_stations()
+    df_bot = default_bot_stations()
+    stations = routing.get_station_arrays(df_charge)
+
+    print(f"{'Quãng đường':>11} | {'Số cạnh':>8} | {'Cạnh có BOT':>11} | {'Dựng':>7}")
+    print("-" * 48)
+    ranges = sorted({car.max_km_per_charge for car in cars})
+    for max_km in (ranges[0], ranges[len(ranges) // 2], ranges[-1]):
+        graph = station_graph.get_reachability_graph(stations, max_km, routing.ROAD_FACTOR, stations.version)
+        t0 = time.perf_counter()
+        toll = build_toll_edges(stations, graph, df_bot)
+        elapsed = time.perf_counter() - t0
+        print(f"{max_km:>9} km | {graph.num_edges:>8} | {toll.num_tolled:>11} | {elapsed:>6.2f}s")
+
+    print()
+    print(f"{'Xe':<18} | {'Thuật toán':<10} | {'QĐ (km)':>15} | {'Số BOT':>7} | {'Thời gian':>15}")
+    print("-" * 80)
+    for car_name, start, end, battery in QUERIES:
+        car = next(c for c in cars if c.name == car_name)
+        for label, run in (("A*", routing.run_astar_search), ("UCS", routing.run_ucs_search)):
+            row = []
+            for avoid in (False, True):
+                t0 = time.perf_counter()
+                result = run(car, *start, *end, battery, avoid, df_charge, emit_stats=False)
+                row.append((result, time.perf_counter() - t0))
+            (plain, t_plain), (avoiding, t_avoid) = row
+            dist = lambda r: f"{r['total_dist']:.1f}" if 'error' not in r else "lỗi"
+            print(f"{car.name:<18} | {label:<10} | {dist(plain):>7} / {dist(avoiding):<7} | "
+                  f"{count_bots(plain, stations.catalogue, start, end, df_bot):>3} / {count_bots(avoiding, stations.catalogue, start, end, df_bot):<3} | {t_plain:>6.2f}s / {t_avoid:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Đo contraction hierarchy (transit_table.py) so với A*:
+- thời gian dựng, số cạnh tắt và kích thước file cho từng quãng đường xe trong danh sách truy vấn
+- thời gian trả lời chặng giữa hai trạm: A* (10 trạm/bước), Dijkstra chính xác trên đồ thị trạm kề
+  (station_graph.shortest_path_tree, dừng khi chốt được đích) và CH; cùng quãng đường tìm được
+
+Kết quả trên dữ liệu hiện tại (755 trạm, 1 lõi): dựng 1.5-5.5s mỗi quãng đường, 2-1290 cạnh tắt, file 1.5-2.8MB;
+chặng CH 0.4-10ms, chỉ nhanh hơn Dijkstra chính xác 0.6-2.8x. Đồ thị trạm kề rất dày (bậc trung bình 238-462)
+và mọi cạnh gốc đều là đường ngắn nhất duy nhất (bất đẳng thức tam giác) nên không cạnh nào bỏ được: tìm kiếm
+đi lên vẫn chạm phần lớn đồ thị. Lợi ích chính là bộ nhớ O(số cạnh) thay cho ma trận n x n và bỏ giới hạn số trạm.
+CH trả về đường ngắn nhất trên toàn đồ thị trạm kề, nên quãng đường <= A*
+(A* chỉ xét 10 trạm gần đích nhất ở mỗi bước).
+Chạy: python benchmarks/bench_transit.py [--repeat 200]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import file as routing  # noqa: E402
+import station_graph  # noqa: E402
+import transit_table  # noqa: E402
+from models import cars  # noqa: E402
+from bench_dominance import QUERIES, load_stations  # noqa: E402
+
+
+def time_leg(df_charge, start_node, end_node, battery_max, battery, repeat, use_transit):
+    stats = {}
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        result = routing.astar_charging_stations(df_charge, start_node, end_node, battery_max, battery, stats=stats, use_transit=use_transit)
+    return result, stats.get('engine'), (time.perf_counter() - t0) / repeat
+
+
+def time_dijkstra(graph, start_node, end_node, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        dist, _ = station_graph.shortest_path_tree(graph, start_node, targets={end_node})
+    return float(dist[end_node]), (time.perf_counter() - t0) / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=200, help="Số lần lặp mỗi truy vấn")
+    args = parser.parse_args()
+
+    df_charge = load_stations()
+    car_by_name = {car.name: car for car in cars}
+    stations = routing.get_station_arrays(df_charge)
+    ranges = sorted({car_by_name[q[0]].max_km_per_charge for q in QUERIES})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # CH dựng vào thư mục tạm để không đụng tới .cache/ của người dùng
+        original_cache_dir = transit_table.station_graph.CACHE_DIR
+        transit_table.station_graph.CACHE_DIR = tmp
+        try:
+            print(f"{'Quãng đường':>11} | {'Dựng':>6} | {'Cạnh tắt':>8} | {'Cạnh lên':>8} | {'File':>7}")
+            for max_km in ranges:
+                t0 = time.perf_counter()
+                transit_table.precompute_transit_tables(stations, [max_km], routing.ROAD_FACTOR)
+                build = time.perf_counter() - t0
+                path = transit_table.transit_table_path(stations.version, max_km, routing.ROAD_FACTOR)
+                table = transit_table.load_transit_table(stations.version, max_km, routing.ROAD_FACTOR, len(stations))
+                print(f"{max_km:>8} km | {build:>5.1f}s | {table.num_shortcuts:>8} | {len(table.indices):>8} | "
+                      f"{os.path.getsize(path) / 1e6:>5.1f}MB")
+
+            print(f"\n{'Xe':<18} | {'A*':>9} | {'Dijkstra':>9} | {'CH':>9} | {'CH/Dijk.':>8} | {'QĐ A* (km)':>10} | {'QĐ CH (km)':>10}")
+            print("-" * 96)
+            for car_name, start, end, pct in QUERIES:
+                car = car_by_name[car_name]
+                start_node = routing.find_nearest_node(*start, df_charge)
+                end_node = routing.find_nearest_node(*end, df_charge)
+                battery = car.max_km_per_charge * pct / 100
+                (_, _, dist_astar), _, t_astar = time_leg(df_charge, start_node, end_node, car.max_km_per_charge, battery, max(1, args.repeat // 20), False)
+                (_, _, dist_table), engine, t_table = time_leg(df_charge, start_node, end_node, car.max_km_per_charge, battery, args.repeat, True)
+                assert engine == 'transit'
+                graph = station_graph.get_reachability_graph(stations, car.max_km_per_charge, routing.ROAD_FACTOR, stations.version)
+                dist_exact, t_exact = time_dijkstra(graph, stations.catalogue.resolve(start_node), stations.catalogue.resolve(end_node), max(1, args.repeat // 20))
+                assert abs(dist_exact - dist_table) < 1e-6
+                print(f"{car_name:<18} | {t_astar * 1000:>7.2f}ms | {t_exact * 1000:>7.2f}ms | {t_table * 1000:>7.2f}ms | "
+                      f"{t_exact / t_table:>7.1f}x | {dist_astar:>10.1f} | {dist_table:>10.1f}")
+        finally:
+            transit_table.station_graph.CACHE_DIR = original_cache_dir
+            transit_table.clear_transit_cache()
+
+
+if __name__ == "__main__":
+    main()
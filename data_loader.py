@@ -0,0 +1,223 @@
+"""
+Tải dữ liệu trạm sạc (charging_stations.csv) và trạm BOT (BOT.csv) qua cache nhị phân.
+
+Lần đầu: đọc CSV bằng pandas, chuẩn hóa, rồi ghi ra file nhị phân trong thư mục .cache/ cạnh file CSV.
+Các lần sau: nạp trực tiếp từ file nhị phân bằng mmap - cột số (lat, lng, ...) là view không sao chép
+(chỉ đọc) trên file, cột chuỗi giải mã một lần từ khối UTF-8 + offsets.
+Cache hết hạn khi file CSV thay đổi: so mtime + kích thước trước (rẻ); nếu khác thì so hash nội dung
+(SHA-1) - nội dung không đổi (vd. chỉ touch/copy file) thì dùng lại cache và cập nhật mtime.
+Mọi module (main, pdf_utils, toll_edges, utils, benchmark) dùng chung một bản DataFrame trong bộ nhớ
+cho mỗi file - coi DataFrame trả về là chỉ đọc.
+
+Định dạng file: MAGIC | độ dài header (uint32) | header JSON | các mảng (căn lề ALIGN byte).
+"""
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+FORMAT_VERSION = 1
+MAGIC = b'EVDS'
+ALIGN = 64 # Căn lề mảng trong file (byte) để view NumPy không cần sao chép
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIONS_FILE = os.path.join(ROOT, 'charging_stations.csv')
+BOT_FILE = os.path.join(ROOT, 'BOT.csv')
+
+# Cache trong bộ nhớ: (đường dẫn CSV tuyệt đối, loại dữ liệu) -> (mtime_ns, kích thước, DataFrame)
+_dataset_cache: Dict[Tuple[str, str], Tuple[int, int, pd.DataFrame]] = {}
+
+
+def parse_fee(fee) -> int:
+    """Phí BOT dạng chuỗi ('35.000 VNĐ') -> số nguyên VND (bỏ mọi ký tự không phải chữ số)."""
+    digits = re.sub(r'[^\d]', '', str(fee))
+    return int(digits) if digits else 0
+
+
+# --- ĐỌC VÀ CHUẨN HÓA CSV ---
+def read_stations_csv(filename: str) -> pd.DataFrame:
+    """Đọc charging_stations.csv: bỏ hàng thiếu tọa độ, lat/lng dạng float."""
+    df = pd.read_csv(filename, skipinitialspace=True)
+    df = df[df['lat'].notnull() & df['lng'].notnull()]
+    # Đảm bảo cột lat/lng là float
+    df['lat'] = df['lat'].astype(float)
+    df['lng'] = df['lng'].astype(float)
+    return df.reset_index(drop=True)
+
+
+def read_bot_csv(filename: str) -> pd.DataFrame:
+    """Đọc BOT.csv: cột name, address, coords, fee, lat, lng và fee_vnd (phí dạng số nguyên VND)."""
+    df = pd.read_csv(filename, skipinitialspace=True)
+    # Đổi tên cột cho dễ xử lý (Giả định cột thứ 3 là tọa độ, cột thứ 4 là phí)
+    df.columns = ['name', 'address', 'coords', 'fee']
+    # Tách cột 'coords' thành 'lat' và 'lng'
+    df[['lat', 'lng']] = df['coords'].str.split(',', expand=True).astype(float)
+    # Loại bỏ các hàng không có tọa độ
+    df = df[df['lat'].notnull() & df['lng'].notnull()]
+    df = df.reset_index(drop=True)
+    # Phân tích phí một lần khi tải, không lặp lại ở mỗi lần tìm đường
+    df['fee_vnd'] = np.array([parse_fee(fee) for fee in df['fee'].tolist()], dtype=np.int64)
+    return df
+
+
+READERS: Dict[str, Callable[[str], pd.DataFrame]] = {'stations': read_stations_csv, 'bot': read_bot_csv}
+
+
+# --- FILE NHỊ PHÂN ---
+def cache_path_for(filename: str, kind: str) -> str:
+    """File cache nhị phân của một CSV: <thư mục CSV>/.cache/<tên CSV>.<loại>.bin"""
+    folder, base = os.path.split(os.path.abspath(filename))
+    return os.path.join(folder, '.cache', f"{base}.{kind}.bin")
+
+
+def file_digest(filename: str) -> str:
+    h = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _encode_column(series: pd.Series) -> Tuple[Dict[str, Any], List[np.ndarray]]:
+    """Cột -> (mô tả trong header, các mảng cần ghi). Cột số ghi nguyên mảng; cột khác ghi UTF-8 + offsets + mặt nạ NaN."""
+    dtype = series.dtype
+    if isinstance(dtype, np.dtype) and dtype.kind in 'fiub':
+        return {'name': series.name, 'kind': 'numeric', 'dtype': dtype.str}, [series.to_numpy()]
+    values = series.tolist()
+    missing = np.array([value is None or (isinstance(value, float) and value != value) for value in values], dtype=np.uint8)
+    encoded = [b'' if miss else str(value).encode('utf-8') for value, miss in zip(values, missing)]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(chunk) for chunk in encoded], out=offsets[1:])
+    blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    return {'name': series.name, 'kind': 'text', 'dtype': str(dtype)}, [blob, offsets, missing]
+
+
+def write_dataset_cache(df: pd.DataFrame, path: str, source: Dict[str, Any]) -> None:
+    """Ghi DataFrame ra file nhị phân (ghi file tạm rồi đổi tên)."""
+    columns, arrays = [], []
+    for name in df.columns:
+        meta, parts = _encode_column(df[name])
+        meta['arrays'] = list(range(len(arrays), len(arrays) + len(parts)))
+        columns.append(meta)
+        arrays.extend(np.ascontiguousarray(part) for part in parts)
+
+    # Header chứa vị trí các mảng -> tính hai lần (độ dài header ảnh hưởng tới vị trí)
+    specs = [{'dtype': array.dtype.str, 'count': int(array.size)} for array in arrays]
+    header = {'format': FORMAT_VERSION, 'rows': len(df), 'source': source, 'columns': columns, 'arrays': specs}
+    for _ in range(2):
+        header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+        offset = len(MAGIC) + 4 + len(header_bytes)
+        for spec, array in zip(specs, arrays):
+            offset = -(-offset // ALIGN) * ALIGN
+            spec['offset'] = offset
+            offset += array.nbytes
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC + struct.pack('<I', len(header_bytes)) + header_bytes)
+        for spec, array in zip(specs, arrays):
+            f.write(b'\0' * (spec['offset'] - f.tell()))
+            f.write(array.tobytes())
+    os.replace(tmp_path, path)
+
+
+def _read_header(buffer) -> Dict[str, Any]:
+    if bytes(buffer[:len(MAGIC)]) != MAGIC:
+        raise ValueError("Không phải file cache dữ liệu")
+    (length,) = struct.unpack_from('<I', buffer, len(MAGIC))
+    header = json.loads(bytes(buffer[len(MAGIC) + 4:len(MAGIC) + 4 + length]).decode('utf-8'))
+    if header.get('format') != FORMAT_VERSION:
+        raise ValueError(f"Phiên bản file không khớp: {header.get('format')}")
+    return header
+
+
+def read_dataset_header(path: str) -> Dict[str, Any]:
+    """Chỉ đọc header (thông tin file nguồn) của file cache."""
+    with open(path, 'rb') as f:
+        start = f.read(len(MAGIC) + 4)
+        (length,) = struct.unpack_from('<I', start, len(MAGIC))
+        return _read_header(start + f.read(length))
+
+
+def load_dataset_cache(path: str) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """Nạp DataFrame từ file nhị phân; cột số là view chỉ đọc trên vùng mmap (không sao chép)."""
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    header = _read_header(buffer)
+    arrays = [np.frombuffer(buffer, dtype=np.dtype(spec['dtype']), count=spec['count'], offset=spec['offset'])
+              for spec in header['arrays']]
+    data = {}
+    for column in header['columns']:
+        parts = [arrays[i] for i in column['arrays']]
+        if column['kind'] == 'numeric':
+            data[column['name']] = pd.Series(parts[0], dtype=parts[0].dtype, copy=False)
+        else:
+            blob, offsets, missing = parts[0].tobytes(), parts[1].tolist(), parts[2]
+            values = [np.nan if miss else blob[lo:hi].decode('utf-8') for lo, hi, miss in zip(offsets, offsets[1:], missing.tolist())]
+            data[column['name']] = pd.Series(values, dtype=column['dtype'])
+    return pd.DataFrame(data, copy=False), header['source']
+
+
+# --- TẢI CÓ CACHE ---
+def load_dataset(filename: str, kind: str, use_cache: bool = True) -> pd.DataFrame:
+    """
+    Tải CSV loại kind ('stations' / 'bot') qua cache bộ nhớ -> cache nhị phân -> đọc CSV (rồi ghi cache).
+    Ném FileNotFoundError nếu không có file CSV.
+    """
+    filename = os.path.abspath(filename)
+    stat = os.stat(filename)
+    key = (filename, kind)
+    cached = _dataset_cache.get(key)
+    if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+
+    df = None
+    path = cache_path_for(filename, kind)
+    source = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha1': None}
+    if use_cache and os.path.exists(path):
+        try:
+            df, source_cached = load_dataset_cache(path)
+            if (source_cached['mtime_ns'], source_cached['size']) != (stat.st_mtime_ns, stat.st_size):
+                # mtime khác: chỉ dùng lại nếu nội dung không đổi
+                source['sha1'] = file_digest(filename)
+                if source['sha1'] != source_cached['sha1']:
+                    df = None
+                else:
+                    write_dataset_cache(df, path, source)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Lỗi khi đọc cache dữ liệu {path}: {e}")
+            df = None
+
+    if df is None:
+        df = READERS[kind](filename)
+        if use_cache:
+            source['sha1'] = source['sha1'] or file_digest(filename)
+            try:
+                write_dataset_cache(df, path, source)
+            except OSError as e:
+                print(f"Không ghi được cache dữ liệu {path}: {e}")
+
+    _dataset_cache[key] = (stat.st_mtime_ns, stat.st_size, df)
+    return df
+
+
+def load_charging_stations(filename: Optional[str] = None, use_cache: bool = True) -> pd.DataFrame:
+    """Dữ liệu trạm sạc (mặc định charging_stations.csv cạnh mã nguồn)."""
+    return load_dataset(filename or STATIONS_FILE, 'stations', use_cache)
+
+
+def load_bot_stations(filename: Optional[str] = None, use_cache: bool = True) -> pd.DataFrame:
+    """Dữ liệu trạm BOT (mặc định BOT.csv cạnh mã nguồn)."""
+    return load_dataset(filename or BOT_FILE, 'bot', use_cache)
+
+
+def clear_dataset_cache() -> None:
+    """Xóa cache trong bộ nhớ (không xóa file trên đĩa)."""
+    _dataset_cache.clear()
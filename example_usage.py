@@ -5,7 +5,7 @@ Example script demonstrating how to use the routing algorithms programmatically.
 This can be used for testing or integrating the algorithms into other applications.
 """
 
-import pandas as pd
+from data_loader import load_charging_stations
 from models import cars
 from file import run_astar_search, run_ucs_search
 
@@ -17,7 +17,7 @@ def example_basic_search():
     print("=" * 60)
     
     # Load charging stations data
-    df_charge = pd.read_csv('charging_stations.csv')
+    df_charge = load_charging_stations('charging_stations.csv')
     
     # Select a car (VinFast VF8)
     car = cars[1]  # VinFast VF8
@@ -61,7 +61,7 @@ def example_compare_algorithms():
     print("=" * 60)
     
     # Load charging stations data
-    df_charge = pd.read_csv('charging_stations.csv')
+    df_charge = load_charging_stations('charging_stations.csv')
     
     # Select a car
     car = cars[0]  # VinFast VF e34
@@ -116,7 +116,7 @@ def example_avoid_toll():
     print("=" * 60)
     
     # Load charging stations data
-    df_charge = pd.read_csv('charging_stations.csv')
+    df_charge = load_charging_stations('charging_stations.csv')
     
     # Select a car
     car = cars[2]  # VinFast VF9
@@ -156,7 +156,7 @@ def example_all_cars():
     print("=" * 60)
     
     # Load charging stations data
-    df_charge = pd.read_csv('charging_stations.csv')
+    df_charge = load_charging_stations('charging_stations.csv')
     
     # Define route
     start_lat, start_lng = 20.825, 105.351
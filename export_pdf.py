@@ -1,33 +1,278 @@
-from fpdf import FPDF
-import csv
+"""
+Xuất danh mục trạm sạc (charging_stations.csv) ra PDF dạng bảng nhiều cột, cho cả dữ liệu toàn quốc rất lớn:
+- đọc CSV theo từng khối CHUNK_ROWS dòng (pandas chunksize), không nạp cả file
+- mỗi trang có tiêu đề và hàng tên cột, chân trang đánh số; ô dài tự xuống dòng
+- ghi qua pdf_renderer.StreamingPDF: trang xong là ghi ra file và giải phóng, bộ nhớ không tăng theo số dòng
+- font Arial.ttf (Unicode, có dấu tiếng Việt) nạp qua FontFace dùng chung với báo cáo lộ trình
+- tách mỗi tỉnh / thành một file: theo cột province của CSV nếu có, không thì theo điểm gần nhất trong
+  gazetteer.csv (name, lat, lng - tâm tỉnh / thành, xem offline_geocoder.py)
+"""
+import os
+import re
+from contextlib import ExitStack
+from typing import Dict, Iterable, List, Optional, Tuple
 
-# Hàm xuất danh sách trạm sạc ra file PDF
-# Đọc dữ liệu từ charging_stations.csv và ghi ra file PDF
+import numpy as np
+import pandas as pd
 
-def export_charging_stations_to_pdf(csv_path, pdf_path):
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=12)
-    pdf.cell(200, 10, txt="Danh sách trạm sạc", ln=True, align='C')
-    pdf.ln(10)
+from offline_geocoder import GAZETTEER_FILE, load_gazetteer
+from pdf_renderer import FONT_FAMILY, FontFace, StreamingPDF, clean_filename
 
-    # Đọc dữ liệu từ CSV và ghi vào PDF
+CHUNK_ROWS = 20000 # Số dòng CSV đọc mỗi lượt
+UNKNOWN_PROVINCE = "Không rõ tỉnh"
+TITLE = "Danh sách trạm sạc"
+FONT_SIZE = 8
+LINE_HEIGHT = 4 # mm mỗi dòng chữ trong ô
+CELL_PADDING = 1 # mm
+WORD_CACHE_SIZE = 100000 # Số từ giữ trong cache độ rộng
+# (tiêu đề cột, cột CSV, độ rộng mm) - tổng 277 mm = A4 ngang trừ lề 10 mm mỗi bên
+COLUMNS = [("STT", None, 14), ("Tên trạm", 'name', 62), ("Địa chỉ", 'address', 95), ("Loại sạc", 'type', 46),
+           ("Vĩ độ", 'lat', 30), ("Kinh độ", 'lng', 30)]
+
+_face: Optional[FontFace] = None
+
+
+def _font_face() -> FontFace:
+    global _face
+    if _face is None:
+        _face = FontFace()
+    return _face
+
+
+def _format(value, column: Optional[str]) -> str:
+    if not isinstance(value, str):
+        if value is None or value != value: # NaN
+            return ''
+        value = str(value)
+    value = value.strip()
+    if column in ('lat', 'lng'):
+        try:
+            return f"{float(value):.6f}"
+        except ValueError:
+            return value
+    return value
+
+
+class CatalogueDocument:
+    """Một file PDF danh mục đang ghi: trang khổ A4 ngang, bảng COLUMNS, thêm từng hàng bằng add_row()."""
+
+    def __init__(self, path: str, subtitle: str = '', face: Optional[FontFace] = None):
+        self.path = path
+        self.subtitle = subtitle
+        self.rows = 0
+        self._file = open(path, 'wb')
+        self.pdf = pdf = _CataloguePDF(self, self._file, orientation='L')
+        pdf.set_margins(10, 10)
+        pdf.set_auto_page_break(False) # Tự ngắt trang theo chiều cao cả hàng (add_row)
+        (face or _font_face()).register(pdf)
+        pdf.set_font(FONT_FAMILY, '', FONT_SIZE)
+        self._cw = pdf.current_font['cw']
+        self._missing_width = pdf.current_font['desc'].get('MissingWidth') or 500
+        self._word_widths: Dict[str, float] = {}
+        self._space_width = self._word_width(' ')
+        self._used_chars = set()
+        self._bottom = pdf.h - 15 # Chừa chỗ cho chân trang
+        pdf.add_page()
+
+    def _word_width(self, word: str) -> float:
+        """Độ rộng (mm) của một từ như FPDF.get_string_width; tên / địa chỉ lặp lại nhiều nên có cache."""
+        width = self._word_widths.get(word)
+        if width is None:
+            cw, n = self._cw, len(self._cw)
+            width = sum(cw[c] if c < n else self._missing_width for c in map(ord, word)) * FONT_SIZE / 1000.0
+            if len(self._word_widths) >= WORD_CACHE_SIZE:
+                self._word_widths.clear()
+            self._word_widths[word] = width
+        return width
+
+    def _wrap(self, text: str, width: float) -> List[str]:
+        """Ngắt chữ theo từ cho vừa width mm (từ quá dài thì cắt theo ký tự)."""
+        words = text.split()
+        if not words:
+            return ['']
+        widths = [self._word_width(word) for word in words]
+        if sum(widths) + self._space_width * (len(words) - 1) <= width:
+            return [' '.join(words)]
+        lines, line, line_width = [], [], 0.0
+        for word, word_width in zip(words, widths):
+            if line and line_width + self._space_width + word_width <= width:
+                line.append(word)
+                line_width += self._space_width + word_width
+                continue
+            if line:
+                lines.append(' '.join(line))
+            if word_width <= width:
+                line, line_width = [word], word_width
+                continue
+            line, line_width = [], 0.0
+            part, part_width = '', 0.0
+            for ch in word:
+                ch_width = self._word_width(ch)
+                if part and part_width + ch_width > width:
+                    lines.append(part)
+                    part, part_width = '', 0.0
+                part += ch
+                part_width += ch_width
+            if part:
+                line, line_width = [part], part_width
+        if line:
+            lines.append(' '.join(line))
+        return lines
+
+    def _text(self, x: float, y: float, text: str) -> None:
+        """Như FPDF.text với font Unicode (cùng lệnh PDF), nhưng chỉ thêm ký tự mới vào subset của font."""
+        pdf = self.pdf
+        new = set(text) - self._used_chars
+        if new:
+            self._used_chars |= new
+            pdf.current_font['subset'].extend(map(ord, new))
+        escaped = text.encode('utf-16-be').decode('latin1').replace('\\', '\\\\').replace(')', '\\)').replace('(', '\\(').replace('\r', '\\r')
+        pdf._out('BT %.2f %.2f Td (%s) Tj ET' % (x * pdf.k, (pdf.h - y) * pdf.k, escaped))
+
+    def draw_header(self) -> None:
+        pdf = self.pdf
+        pdf.set_font(FONT_FAMILY, '', 12)
+        pdf.cell(0, 7, txt=f"{TITLE} - {self.subtitle}" if self.subtitle else TITLE, ln=True, align='C')
+        pdf.set_font(FONT_FAMILY, '', FONT_SIZE)
+        pdf.set_fill_color(220, 220, 220)
+        for heading, _, width in COLUMNS:
+            pdf.cell(width, LINE_HEIGHT + 2 * CELL_PADDING, txt=heading, border=1, align='C', fill=True)
+        pdf.ln()
+
+    def draw_footer(self) -> None:
+        pdf = self.pdf
+        pdf.set_font(FONT_FAMILY, '', FONT_SIZE)
+        self._text(pdf.w / 2 - 8, pdf.h - 7, f"Trang {pdf.page_no()}")
+
+    def add_row(self, values: Iterable[str]) -> None:
+        pdf = self.pdf
+        self.rows += 1
+        cells = [self._wrap(str(self.rows), COLUMNS[0][2] - 2 * CELL_PADDING)]
+        cells += [self._wrap(value, width - 2 * CELL_PADDING) for value, (_, _, width) in zip(values, COLUMNS[1:])]
+        height = max(len(lines) for lines in cells) * LINE_HEIGHT + 2 * CELL_PADDING
+        if pdf.y + height > self._bottom:
+            pdf.add_page()
+        x, y = pdf.l_margin, pdf.y
+        for lines, (_, _, width) in zip(cells, COLUMNS):
+            pdf.rect(x, y, width, height)
+            for i, line in enumerate(lines):
+                if line:
+                    self._text(x + CELL_PADDING, y + CELL_PADDING + (i + 0.8) * LINE_HEIGHT, line)
+            x += width
+        pdf.y = y + height
+
+    def close(self) -> None:
+        try:
+            self.pdf.close()
+        finally:
+            self._file.close()
+
+
+class _CataloguePDF(StreamingPDF):
+    """StreamingPDF vẽ tiêu đề / chân trang của CatalogueDocument trên mỗi trang."""
+
+    def __init__(self, document: CatalogueDocument, stream, orientation: str = 'L'):
+        super().__init__(stream, orientation)
+        self.document = document
+
+    def header(self):
+        self.document.draw_header()
+
+    def footer(self):
+        self.document.draw_footer()
+
+
+def read_station_chunks(csv_path: str, chunk_rows: int = CHUNK_ROWS) -> Iterable[pd.DataFrame]:
+    """Đọc CSV theo từng khối chunk_rows dòng (mọi cột dạng chuỗi, tên cột đã bỏ khoảng trắng)."""
+    with pd.read_csv(csv_path, chunksize=chunk_rows, dtype=str, skipinitialspace=True, keep_default_na=False) as reader:
+        for chunk in reader:
+            chunk.columns = [str(column).strip() for column in chunk.columns]
+            yield chunk
+
+
+def _rows(chunk: pd.DataFrame) -> Iterable[List[str]]:
+    columns = [chunk[column].tolist() if column in chunk.columns else [''] * len(chunk) for _, column, _ in COLUMNS[1:]]
+    for values in zip(*columns):
+        yield [_format(value, column) for value, (_, column, _) in zip(values, COLUMNS[1:])]
+
+
+def _unit_xyz(lat: np.ndarray, lng: np.ndarray) -> np.ndarray:
+    lat, lng = np.radians(lat), np.radians(lng)
+    return np.column_stack((np.cos(lat) * np.cos(lng), np.cos(lat) * np.sin(lng), np.sin(lat)))
+
+
+class ProvinceLocator:
+    """Gán tỉnh / thành cho từng trạm theo tâm gần nhất (gazetteer: name, lat, lng), vector hóa theo khối."""
+
+    def __init__(self, gazetteer: pd.DataFrame):
+        self.names = [str(name).strip() for name in gazetteer['name'].tolist()]
+        self.xyz = _unit_xyz(gazetteer['lat'].to_numpy(dtype=np.float64), gazetteer['lng'].to_numpy(dtype=np.float64))
+
+    def locate(self, lat: np.ndarray, lng: np.ndarray) -> List[str]:
+        """Tên tâm gần nhất của mỗi điểm (tích vô hướng lớn nhất trên mặt cầu); tọa độ thiếu -> UNKNOWN_PROVINCE."""
+        valid = ~(np.isnan(lat) | np.isnan(lng))
+        nearest = np.zeros(len(lat), dtype=np.int64)
+        if valid.any():
+            nearest[valid] = np.argmax(_unit_xyz(lat[valid], lng[valid]) @ self.xyz.T, axis=1)
+        return [self.names[i] if ok else UNKNOWN_PROVINCE for i, ok in zip(nearest.tolist(), valid.tolist())]
+
+
+def _provinces(chunk: pd.DataFrame, locator: Optional[ProvinceLocator]) -> List[str]:
+    if 'province' in chunk.columns:
+        return [value.strip() or UNKNOWN_PROVINCE for value in chunk['province'].tolist()]
+    if locator is None:
+        return [UNKNOWN_PROVINCE] * len(chunk)
+    lat = pd.to_numeric(chunk['lat'], errors='coerce').to_numpy(dtype=np.float64)
+    lng = pd.to_numeric(chunk['lng'], errors='coerce').to_numpy(dtype=np.float64)
+    return locator.locate(lat, lng)
+
+
+def export_charging_stations_to_pdf(csv_path: str, pdf_path: str, chunk_rows: int = CHUNK_ROWS) -> int:
+    """Xuất toàn bộ danh mục ra một file PDF, trả về số trạm đã ghi (-1 nếu lỗi)."""
+    if not os.path.exists(csv_path):
+        print(f"Lỗi: Không tìm thấy file dữ liệu: {csv_path}")
+        return -1
     try:
-        with open(csv_path, newline='', encoding='utf-8') as csvfile:
-            reader = csv.reader(csvfile)
-            for i, row in enumerate(reader):
-                # Format dòng dữ liệu
-                line = ' | '.join(row)
-                pdf.cell(0, 10, txt=line, ln=True)
-        
-        pdf.output(pdf_path)
+        document = CatalogueDocument(pdf_path)
+        try:
+            for chunk in read_station_chunks(csv_path, chunk_rows):
+                for values in _rows(chunk):
+                    document.add_row(values)
+        finally:
+            document.close()
         print(f"Danh sách trạm sạc đã được xuất ra: {pdf_path}")
-    except FileNotFoundError:
-        print(f"Lỗi: Không tìm thấy file dữ liệu: {csv_path}")
+        return document.rows
     except Exception as e:
         print(f"Lỗi khi xuất PDF: {e}")
+        return -1
+
+
+def export_charging_stations_by_province(csv_path: str, output_dir: str, chunk_rows: int = CHUNK_ROWS,
+                                         gazetteer_file: Optional[str] = GAZETTEER_FILE) -> Dict[str, Tuple[str, int]]:
+    """
+    Xuất mỗi tỉnh / thành ra một file <output_dir>/<tỉnh>.pdf, trả về {tỉnh: (đường dẫn, số trạm)}.
+    Tỉnh lấy từ cột province nếu CSV có; không thì theo gazetteer_file (không có -> mọi trạm vào UNKNOWN_PROVINCE).
+    Các file được ghi song song trong một lượt đọc CSV (mỗi file chỉ giữ trang đang vẽ trong bộ nhớ).
+    """
+    gazetteer = load_gazetteer(gazetteer_file) if gazetteer_file else None
+    locator = ProvinceLocator(gazetteer) if gazetteer is not None and not gazetteer.empty else None
+    os.makedirs(output_dir, exist_ok=True)
+    documents: Dict[str, CatalogueDocument] = {}
+    with ExitStack() as stack:
+        for chunk in read_station_chunks(csv_path, chunk_rows):
+            for province, values in zip(_provinces(chunk, locator), _rows(chunk)):
+                document = documents.get(province)
+                if document is None:
+                    filename = re.sub(r'\s+', '_', clean_filename(province)) + '.pdf'
+                    document = documents[province] = CatalogueDocument(os.path.join(output_dir, filename), province)
+                    stack.callback(document.close)
+                document.add_row(values)
+    for province, document in documents.items():
+        print(f"{province}: {document.rows} trạm -> {document.path}")
+    return {province: (document.path, document.rows) for province, document in documents.items()}
+
 
 # Ví dụ sử dụng
 if __name__ == "__main__":
     # Lưu ý: Cần có file 'charging_stations.csv' trong cùng thư mục để chạy
-    export_charging_stations_to_pdf("charging_stations.csv", "charging_stations.pdf")
\ No newline at end of file
+    export_charging_stations_to_pdf("charging_stations.csv", "charging_stations.pdf")
@@ -1,15 +1,34 @@
-from typing import Tuple, List, Optional, Dict, Any
+from typing import Tuple, List, Optional, Dict, Any, Callable
 import pandas as pd
 import numpy as np
 import heapq
 import time
+from array import array
 from math import radians, sin, cos, sqrt, atan2
+from station_graph import get_reachability_graph, station_data_version, shortest_path_tree
+from spatial_index import SpatialIndex
+from landmarks import get_landmark_table
+from transit_table import load_transit_table
+from search_stats import emit_search_stats
+from route_cache import RouteCache, route_cache_key
+from station_catalogue import StationCatalogue, FrameCache, get_station_catalogue
+from toll_edges import get_toll_edges, default_bot_version
+from search_control import SearchControl
 
 # --- CẤU HÌNH ---
 TIMEOUT_SECONDS = 600 # Giới hạn thời gian tìm kiếm
+SEARCH_CANCELLED_MESSAGE = "Đã hủy tìm kiếm." # Lỗi trả về khi tìm kiếm bị hủy qua SearchControl
 AVG_SPEED_KMH = 60 # Tốc độ di chuyển trung bình (dùng để tính thời gian lái xe)
 R_EARTH = 6371.0 # Bán kính Trái Đất (km)
 ROAD_FACTOR = 1.25 # HỆ SỐ ƯỚC TÍNH ĐƯỜNG BỘ: 1.25 x Đường chim bay = Quãng đường thực tế
+DOMINANCE_PRUNING = True # Loại nhãn bị trội (pin <= và quãng đường >= một nhãn đã duyệt tại cùng trạm)
+SOC_BUCKET_KM = None # Lượng tử hóa mức pin (km, làm tròn xuống). None = không lượng tử hóa
+USE_LANDMARKS = False # A*: dùng thêm heuristic ALT (trạm mốc + bất đẳng thức tam giác)
+USE_TRANSIT_TABLE = False # A*: trả lời bằng contraction hierarchy (transit_table.py) - đường ngắn nhất toàn đồ thị, khác kết quả A*; chỉ bật khi cần
+TOLL_PENALTY_KM_PER_VND = 0.01 # Tránh BOT không được: mỗi 1.000 VND phí BOT tính như đi vòng 10 km (lộ trình dự phòng)
+NO_TOLL_FREE_ROUTE_WARNING = "Không có lộ trình tránh hoàn toàn trạm thu phí BOT; lộ trình dưới đây đi qua ít phí BOT nhất có thể."
+ANYTIME_WEIGHTS = (3.0, 2.0, 1.5, 1.25, 1.0) # Trọng số A* anytime (giảm dần, kết thúc bằng 1.0 = A* thường)
+INF = float('inf')
 
 # ======================= #
 # 1. HÀM TÍNH TOÁN KHOẢNG CÁCH VÀ TÌM TRẠM GẦN NHẤT
@@ -45,129 +64,625 @@ def haversine(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
     return R_EARTH * c
 
 def find_nearest_node(lat: float, lng: float, df_charge: pd.DataFrame) -> str:
-    """Tìm trạm sạc gần nhất (dùng khoảng cách Euclidean để tăng tốc độ)"""
-    df = df_charge.copy()
-    df = df[df['lat'].notnull() & df['lng'].notnull()]
-    df['dist'] = ((df['lat'].astype(float) - lat)**2 + (df['lng'].astype(float) - lng)**2).apply(np.sqrt)
-    
-    if df.empty:
+    """Tìm trạm sạc gần nhất (khoảng cách vòng lớn, tra cứu qua chỉ mục không gian KD-tree)"""
+    if df_charge.empty or 'name' not in df_charge.columns:
         return 'unknown'
-        
-    nearest = df.loc[df['dist'].idxmin()]
-    return nearest['name'] if 'name' in nearest else 'unknown'
+    stations = get_station_arrays(df_charge)
+    station_id = find_nearest_station(lat, lng, df_charge, stations)
+    if station_id is None:
+        return 'unknown'
+    return stations.names[station_id]
+
+def find_nearest_station(lat: float, lng: float, df_charge: pd.DataFrame, stations: Optional['StationArrays'] = None) -> Optional[int]:
+    """
+    Như find_nearest_node nhưng trả về id trạm (station_catalogue.py); None nếu không có trạm.
+    stations: StationArrays của df_charge nếu hàm gọi đã có sẵn (tránh tra cache lần nữa).
+    """
+    if df_charge.empty or 'name' not in df_charge.columns:
+        return None
+    if stations is None:
+        stations = get_station_arrays(df_charge)
+    _, positions = stations.spatial_index.query_nearest(lat, lng, k=1)
+    if len(positions) == 0:
+        return None
+    return int(positions[0])
 
 # ======================= #
-# 2. THUẬT TOÁN UCS TÌM ĐƯỜNG (CÓ TỐI ƯU TỐC ĐỘ)
+# 1b. MẢNG TỌA ĐỘ TRẠM SẠC (VECTOR HÓA)
 # ======================= #
-def ucs_charging_stations(df_charge: pd.DataFrame, start: str, end: str, battery_max: int, battery_start: int, avoid_toll: bool = False) -> Tuple[Optional[List[int]], Optional[List[Tuple[str, int, int, float, float]]], Optional[float]]:
+MAX_CANDIDATES_PER_STEP = 10 # Số trạm gần đích nhất được xét ở mỗi bước mở rộng
+
+class StationArrays:
     """
-    Thuật toán Uniform Cost Search (UCS) tìm đường đi qua các trạm sạc.
-    Đã tối ưu: Chỉ xem xét 10 trạm sạc gần đích nhất trong mỗi bước.
+    Tọa độ các trạm sạc dưới dạng mảng NumPy liên tục (dựng một lần cho mỗi lần tìm kiếm).
+    Vị trí (position) trong mảng tương ứng với thứ tự hàng của df_charge và trùng với id trạm trong catalogue.
+    """
+    __slots__ = ('index', 'names', 'lat', 'lng', 'lat_rad', 'lng_rad', 'cos_lat', 'version', 'catalogue', '_spatial_index')
+
+    @classmethod
+    def from_arrays(cls, df_charge: pd.DataFrame, version: str, lat: np.ndarray, lng: np.ndarray,
+                    lat_rad: np.ndarray, lng_rad: np.ndarray, cos_lat: np.ndarray) -> 'StationArrays':
+        """Dựng từ các mảng đã tính sẵn (vd. view trên shared memory của batch.py), không sao chép."""
+        stations = cls.__new__(cls)
+        stations.index = df_charge.index.to_numpy()
+        stations.names = df_charge['name'].to_numpy()
+        stations.lat, stations.lng = lat, lng
+        stations.lat_rad, stations.lng_rad, stations.cos_lat = lat_rad, lng_rad, cos_lat
+        stations.version = version
+        stations.catalogue = get_station_catalogue(df_charge, version)
+        stations._spatial_index = None
+        return stations
+
+    def __init__(self, df_charge: pd.DataFrame, version: Optional[str] = None):
+        lat = df_charge['lat'].to_numpy(dtype=np.float64)
+        lng = df_charge['lng'].to_numpy(dtype=np.float64)
+        if np.any(np.abs(lat) > 90) or np.any(np.abs(lng) > 180):
+            raise ValueError("Tọa độ trạm sạc không hợp lệ (vĩ độ ngoài -90..90 hoặc kinh độ ngoài -180..180).")
+        self.index = df_charge.index.to_numpy()
+        self.names = df_charge['name'].to_numpy()
+        self.lat = np.ascontiguousarray(lat)
+        self.lng = np.ascontiguousarray(lng)
+        self.lat_rad = np.radians(self.lat)
+        self.lng_rad = np.radians(self.lng)
+        self.cos_lat = np.cos(self.lat_rad)
+        self.version = version if version is not None else station_data_version(df_charge)
+        self.catalogue: StationCatalogue = get_station_catalogue(df_charge, self.version)
+        self._spatial_index = None
+
+    @property
+    def spatial_index(self) -> SpatialIndex:
+        """Chỉ mục KD-tree trên tọa độ trạm (dựng khi dùng lần đầu)."""
+        if self._spatial_index is None:
+            self._spatial_index = SpatialIndex(self.lat, self.lng)
+        return self._spatial_index
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    def distances_from(self, pos: int) -> np.ndarray:
+        """Khoảng cách Haversine (km) từ trạm ở vị trí pos tới tất cả các trạm."""
+        return haversine_vec(self.lat_rad[pos], self.lng_rad[pos], self.cos_lat[pos], self.lat_rad, self.lng_rad, self.cos_lat)
+
+_station_arrays_cache: Dict[str, StationArrays] = {}
+_STATION_ARRAYS_CACHE_SIZE = 8
+_station_arrays_frames = FrameCache(_STATION_ARRAYS_CACHE_SIZE)
+
+def get_station_arrays(df_charge: pd.DataFrame) -> StationArrays:
+    """
+    Lấy StationArrays (kèm chỉ mục không gian) cho df_charge.
+    Tra theo DataFrame (FrameCache, O(1)): hash nội dung chỉ tính lần đầu gặp mỗi DataFrame, rồi tra
+    theo catalogue_data_version (tên, tọa độ, địa chỉ, nhãn index) để dùng lại StationArrays cùng nội dung.
+    """
+    return _station_arrays_frames.get(df_charge, lambda: _station_arrays_for_content(df_charge))
+
+def _station_arrays_for_content(df_charge: pd.DataFrame) -> StationArrays:
+    catalogue = get_station_catalogue(df_charge)
+    stations = _station_arrays_cache.get(catalogue.content_version)
+    if stations is None:
+        stations = register_station_arrays(StationArrays(df_charge, catalogue.version))
+    return stations
+
+def register_station_arrays(stations: StationArrays) -> StationArrays:
+    """Đưa StationArrays dựng sẵn (vd. StationArrays.from_arrays) vào cache của get_station_arrays."""
+    key = stations.catalogue.content_version
+    if key not in _station_arrays_cache and len(_station_arrays_cache) >= _STATION_ARRAYS_CACHE_SIZE:
+        _station_arrays_cache.pop(next(iter(_station_arrays_cache)))
+    _station_arrays_cache[key] = stations
+    return stations
+
+def haversine_vec(lat1_rad: float, lng1_rad: float, cos_lat1: float, lat2_rad: np.ndarray, lng2_rad: np.ndarray, cos_lat2: np.ndarray) -> np.ndarray:
+    """
+    Phiên bản vector hóa của haversine() (đầu vào đã đổi sang radian, cos(vĩ độ) tính sẵn).
+    Giữ nguyên thứ tự phép tính; sai khác so với hàm vô hướng chỉ ở mức 1 ULP (arctan2/pow của NumPy).
+    """
+    dlat = lat2_rad - lat1_rad
+    dlng = lng2_rad - lng1_rad
+    a = np.sin(dlat/2)**2 + cos_lat1 * cos_lat2 * np.sin(dlng/2)**2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
+    return R_EARTH * c
+
+def _select_nearest_to_goal(cand: np.ndarray, dist_to_end: np.ndarray, k: int = MAX_CANDIDATES_PER_STEP) -> np.ndarray:
+    """
+    Chọn k ứng viên có dist_to_end nhỏ nhất (thay cho heapq.nsmallest), dùng argpartition.
+    Thứ tự trả về tăng dần theo (dist_to_end, vị trí) giống như so sánh tuple của nsmallest.
+    """
+    d = dist_to_end[cand]
+    if len(cand) > k:
+        kth = d[np.argpartition(d, k - 1)[:k]].max()
+        keep = d <= kth # Giữ cả các ứng viên bằng giá trị thứ k để xử lý hòa
+        cand, d = cand[keep], d[keep]
+    order = np.lexsort((cand, d))[:k]
+    return cand[order]
+
+def prepare_station_graphs(df_charge: pd.DataFrame, cars: List[Any]) -> Dict[float, Any]:
+    """
+    Dựng trước (hoặc nạp từ cache) đồ thị trạm kề cho mỗi quãng đường max_km_per_charge khác nhau
+    trong danh sách xe. Trả về dict: quãng đường -> đồ thị.
+    """
+    stations = get_station_arrays(df_charge)
+    graphs = {}
+    for max_km in sorted({car.max_km_per_charge for car in cars}):
+        graphs[max_km] = get_reachability_graph(stations, max_km, ROAD_FACTOR, stations.version)
+    return graphs
+
+# ======================= #
+# 1c. NHÃN TÌM KIẾM (PARENT-POINTER) VÀ VÒNG LẶP TÌM KIẾM DÙNG CHUNG
+# ======================= #
+
+class SearchLabels:
+    """
+    Kho nhãn trạng thái tìm kiếm lưu theo mảng (array-backed). Mỗi nhãn là một số nguyên id:
+    trạm (vị trí), pin khi tới trạm, quãng đường g, id nhãn cha và lượng sạc tại trạm cha.
+    Đường đi và nhật ký sạc chỉ được dựng lại (truy ngược nhãn cha) khi đã tới đích.
+    """
+    __slots__ = ('node', 'battery', 'g', 'parent', 'charge_amount')
+
+    def __init__(self):
+        self.node = array('l')
+        self.battery = array('d')
+        self.g = array('d')
+        self.parent = array('l')
+        self.charge_amount = array('d')
+
+    def __len__(self) -> int:
+        return len(self.node)
+
+    def add(self, node: int, battery: float, g: float, parent: int, charge_amount: float) -> int:
+        self.node.append(node)
+        self.battery.append(battery)
+        self.g.append(g)
+        self.parent.append(parent)
+        self.charge_amount.append(charge_amount)
+        return len(self.node) - 1
+
+    def chain(self, label: int) -> List[int]:
+        """Danh sách id nhãn từ gốc tới label."""
+        labels = []
+        while label >= 0:
+            labels.append(label)
+            label = self.parent[label]
+        labels.reverse()
+        return labels
+
+def _charge_for_leg(policy: str, battery: float, dist_km: float, battery_max: int) -> Tuple[float, float]:
+    """
+    Chính sách sạc trước khi đi một chặng dài dist_km. Trả về (mức pin sau sạc, lượng sạc).
+    - 'astar': sạc vừa đủ để đi đến trạm kế tiếp (cộng thêm 1km dự phòng)
+    - 'ucs': sạc tới tối thiểu 90% pin (hoặc vừa đủ chặng nếu chặng dài hơn)
     """
+    if battery - dist_km >= 0:
+        return battery, 0
+    if policy == 'ucs':
+        charge_to = max(int(battery_max * 0.9), int(dist_km + 1))
+    else:
+        charge_to = int(dist_km + 1)
+    charge_to = min(charge_to, battery_max)
+    return charge_to, charge_to - battery
+
+def _charging_search(df_charge: pd.DataFrame, start: str, end: str, battery_max: int, battery_start: float, avoid_toll: bool, policy: str,
+                     dominance: Optional[bool] = None, soc_bucket_km: Optional[float] = None, stats: Optional[Dict[str, Any]] = None,
+                     use_landmarks: Optional[bool] = None, weight: float = 1.0, cost_bound: float = INF,
+                     deadline: Optional[float] = None, control: Optional[SearchControl] = None) -> Tuple[Optional[List[int]], Optional[List[Tuple[str, float, float, float, float]]], Optional[float]]:
+    """
+    Vòng lặp tìm kiếm dùng chung cho A* (policy='astar', f = g + h) và UCS (policy='ucs', f = g).
+    Heap chỉ chứa (f, g, trạm, pin, id nhãn); đường đi được dựng lại từ nhãn khi tới đích.
+
+    dominance: tại mỗi trạm, nhãn có pin >= và quãng đường <= trội hơn; nhãn bị trội bị loại
+        (False = hành vi cũ: chỉ loại trạng thái trùng (trạm, pin) chính xác).
+    soc_bucket_km: làm tròn xuống mức pin theo bước (km) để giới hạn số trạng thái.
+    stats: dict (tùy chọn) nhận số liệu: popped, expanded, pushed, pruned, max_heap, peak_labels, engine.
+    use_landmarks: (chỉ A*) dùng thêm heuristic ALT từ bảng trạm mốc (landmarks.py).
+    weight: A* có trọng số, f = g + weight * h (weight > 1: tìm nhanh, quãng đường <= weight * tối ưu).
+    cost_bound: bỏ các nhãn có g + h >= cost_bound (đã có lời giải tốt hơn - dùng cho tìm kiếm anytime).
+    deadline: mốc time.time() phải dừng (ngoài TIMEOUT_SECONDS); khi hết giờ stats['timed_out'] = True.
+    stats['lower_bound']: cận dưới quãng đường tối ưu khi dừng (min g + h trên heap, cost_bound, lời giải tìm được).
+    control: SearchControl (search_control.py) - hủy hợp tác (stats['cancelled'] = True) và báo tiến độ.
+    """
+    if dominance is None:
+        dominance = DOMINANCE_PRUNING
+    if use_landmarks is None:
+        use_landmarks = USE_LANDMARKS
+    if soc_bucket_km is None:
+        soc_bucket_km = SOC_BUCKET_KM
+    counters = {'popped': 0, 'expanded': 0, 'pushed': 0, 'pruned': 0, 'max_heap': 1, 'peak_labels': 0}
+    if stats is not None:
+        stats.update(counters, engine='search')
     start_time = time.time()
-    idx_start = df_charge[df_charge['name'] == start].index[0] if not df_charge[df_charge['name'] == start].empty else None
-    idx_end = df_charge[df_charge['name'] == end].index[0] if not df_charge[df_charge['name'] == end].empty else None
-    if idx_start is None or idx_end is None:
+    if df_charge.empty or 'name' not in df_charge.columns:
         return None, None, None
 
-    end_lat, end_lng = float(df_charge.loc[idx_end, 'lat']), float(df_charge.loc[idx_end, 'lng'])
+    # Mảng tọa độ dựng một lần; khoảng cách tới đích tính sẵn cho mọi trạm
+    stations = get_station_arrays(df_charge)
+    pos_start, pos_end = stations.catalogue.resolve(start), stations.catalogue.resolve(end)
+    if pos_start is None or pos_end is None:
+        return None, None, None
+    dist_to_end_all = stations.distances_from(pos_end) * ROAD_FACTOR
+    # Đồ thị trạm kề (trong tầm battery_max) dựng sẵn và cache theo dữ liệu + quãng đường
+    graph = get_reachability_graph(stations, battery_max, ROAD_FACTOR, stations.version)
+    # Heuristic tính sẵn thành vector theo đích (tra cứu O(1) mỗi lần đẩy nhãn)
+    if policy == 'astar':
+        h_all = dist_to_end_all # Haversine * ROAD_FACTOR (h_score)
+        if use_landmarks:
+            # ALT: cận dưới theo bất đẳng thức tam giác qua các trạm mốc, lấy max với Haversine
+            table = get_landmark_table(graph, stations.version)
+            h_all = np.maximum(h_all, table.lower_bounds(pos_end))
+        h_score = h_all.tolist()
+    else:
+        h_score = [0] * len(stations) # UCS: f_score = total_dist
+
+    if soc_bucket_km:
+        battery_start = _quantize_soc(battery_start, soc_bucket_km)
 
-    # Heap: (total_dist, current_idx, battery, path, charge_log) - f_score = total_dist
-    initial_log = [(df_charge.loc[idx_start, 'name'], battery_start, 0, float(df_charge.loc[idx_start, 'lat']), float(df_charge.loc[idx_start, 'lng']))]
-    heap = [(0, idx_start, battery_start, [idx_start], initial_log)]
+    labels = SearchLabels()
+    root = labels.add(pos_start, battery_start, 0, -1, 0)
+    # Heap: (f_score, total_dist, trạm, pin, id nhãn)
+    heap = [(0 + weight * h_score[pos_start], 0, pos_start, battery_start, root)]
+    # visited: (trạm, pin) -> total_dist (g_score) - chỉ dùng khi tắt dominance
     visited = dict()
-    toll_edges = set()
+    # settled: trạm -> tập Pareto [(pin, g)] các nhãn đã duyệt (dùng khi bật dominance)
+    settled: Dict[int, List[Tuple[float, float]]] = {}
+    # Tránh trạm thu phí: bitset cạnh có BOT tính sẵn theo thứ tự cạnh của đồ thị (toll_edges.py)
+    tolled = get_toll_edges(stations, graph).tolled if avoid_toll else None
+
+    def finish(result, timed_out=False, cancelled=False):
+        counters['peak_labels'] = len(labels) # Nhãn không bị giải phóng trong lúc tìm -> số cuối = đỉnh
+        if stats is not None:
+            open_bound = min((g + h_score[p] for _, g, p, _, _ in heap), default=INF)
+            stats.update(counters, timed_out=timed_out,
+                         lower_bound=min(open_bound, cost_bound, result[2] if result[2] is not None else INF))
+            if cancelled:
+                stats['cancelled'] = True
+        return result
 
     while heap:
-        if time.time() - start_time > TIMEOUT_SECONDS:
-            return None, None, None # Timeout
-        
-        total_dist, current, battery, path, charge_log = heapq.heappop(heap)
-        
-        if (current, battery) in visited and visited[(current, battery)] <= total_dist:
-            continue
-        visited[(current, battery)] = total_dist
-        
-        if current == idx_end:
-            return path, charge_log, total_dist
+        now = time.time()
+        if now - start_time > TIMEOUT_SECONDS or (deadline is not None and now > deadline):
+            return finish((None, None, None), timed_out=True) # Timeout
 
-        lat1, lng1 = float(df_charge.loc[current, 'lat']), float(df_charge.loc[current, 'lng'])
-        candidates = []
-        
-        for next_idx in df_charge.index:
-            if next_idx == current:
+        f_score, total_dist, pos, battery, label = heapq.heappop(heap)
+        counters['popped'] += 1
+        if control is not None and control.checkpoint('search', counters['expanded'], counters['popped'], f_score, len(heap)):
+            heapq.heappush(heap, (f_score, total_dist, pos, battery, label)) # Giữ nhãn cho cận dưới khi dừng
+            return finish((None, None, None), cancelled=True)
+
+        if dominance:
+            front = settled.setdefault(pos, [])
+            if _is_dominated(front, battery, total_dist):
+                counters['pruned'] += 1
                 continue
-            
-            # Kiểm tra trạm thu phí (giả định toll_edges rỗng)
-            if avoid_toll:
-                from_name = df_charge.loc[current, 'name']
-                to_name = df_charge.loc[next_idx, 'name']
-                if (from_name, to_name) in toll_edges or (to_name, from_name) in toll_edges:
-                    continue
-            
-            lat2, lng2 = float(df_charge.loc[next_idx, 'lat']), float(df_charge.loc[next_idx, 'lng'])
-            dist_km_straight = haversine(lat1, lng1, lat2, lng2)
-            dist_km_road = dist_km_straight * ROAD_FACTOR
-            
-            if dist_km_road > battery_max:
+            # Bỏ các nhãn cũ bị nhãn mới trội, rồi thêm nhãn mới vào tập Pareto
+            front[:] = [(b, g) for b, g in front if not (b <= battery and g >= total_dist)]
+            front.append((battery, total_dist))
+        else:
+            if (pos, battery) in visited and visited[(pos, battery)] <= total_dist:
                 continue
-            
-            # Tính khoảng cách đến đích (dùng để tối ưu TỐC ĐỘ, không phải UCS)
-            dist_to_end = haversine(lat2, lng2, end_lat, end_lng) * ROAD_FACTOR
-            candidates.append((dist_to_end, next_idx, dist_km_road))
+            visited[(pos, battery)] = total_dist
+
+        if pos == pos_end:
+            return finish(_rebuild_path(stations, labels, label))
+        counters['expanded'] += 1
+
+        lat1, lng1 = float(stations.lat[pos]), float(stations.lng[pos])
+        # Các trạm trong tầm pin: đọc thẳng từ đồ thị, chi phí tỉ lệ với bậc của trạm
+        neighbors, _ = graph.neighbors(pos)
+
+        # Bỏ các cạnh đi qua trạm thu phí
+        if tolled is not None:
+            neighbors = neighbors[~tolled[graph.indptr[pos]:graph.indptr[pos + 1]]]
 
         # TỐI ƯU TỐC ĐỘ: Chỉ xem xét 10 trạm sạc gần đích nhất từ vị trí hiện tại
-        for _, next_idx, dist_km in heapq.nsmallest(10, candidates):
-            battery_after_travel = battery - dist_km
-            
-            charge_to = battery
-            charge_amount = 0
-            
-            if battery_after_travel < 0:
-                # Cần sạc
-                max_charge = int(battery_max * 0.9)
-                charge_to = max(max_charge, int(dist_km + 1))
-                charge_to = min(charge_to, battery_max)
-                charge_amount = charge_to - battery
-                
+        # (dùng khoảng cách đến đích để sắp xếp - tham lam, tối ưu tốc độ)
+        for next_pos in _select_nearest_to_goal(neighbors, dist_to_end_all).tolist():
+            # Tính lại chính xác bằng hàm vô hướng cho ≤10 trạm được chọn (kết quả trùng bit với bản gốc)
+            dist_km = haversine(lat1, lng1, float(stations.lat[next_pos]), float(stations.lng[next_pos])) * ROAD_FACTOR
+            charge_to, charge_amount = _charge_for_leg(policy, battery, dist_km, battery_max)
             new_battery = charge_to - dist_km
-            
+
             if new_battery < 0:
-                continue 
-            
-            new_charge_log = charge_log + [(df_charge.loc[current, 'name'], new_battery, charge_amount, lat1, lng1)]
+                continue
+            if soc_bucket_km:
+                new_battery = _quantize_soc(new_battery, soc_bucket_km)
+
             new_total_dist = total_dist + dist_km
-            
-            # UCS: f_score = total_dist
-            heapq.heappush(heap, (new_total_dist, next_idx, new_battery, path + [next_idx], new_charge_log))
-            
-    return None, None, None
+            if dominance and next_pos in settled and _is_dominated(settled[next_pos], new_battery, new_total_dist):
+                counters['pruned'] += 1
+                continue
+            h = h_score[next_pos]
+            if h == INF or new_total_dist + h >= cost_bound:
+                counters['pruned'] += 1 # ALT: trạm không cùng thành phần liên thông với đích / không tốt hơn lời giải đã có
+                continue
+            new_label = labels.add(next_pos, new_battery, new_total_dist, label, charge_amount)
+            heapq.heappush(heap, (new_total_dist + weight * h, new_total_dist, next_pos, new_battery, new_label))
+            counters['pushed'] += 1
+        if len(heap) > counters['max_heap']:
+            counters['max_heap'] = len(heap)
 
-# Hàm entry point cho UCS (Giữ nguyên logic hậu xử lý)
-def run_ucs_search(car: Any, lat_start: float, lng_start: float, lat_end: float, lng_end: float, battery_percent: int, qua_tram_thu_phi: bool, df_charge: pd.DataFrame) -> Dict[str, Any]:
-    """ Hàm entry point chính cho thuật toán UCS (Dùng cho GUI). """
-    battery_max = car.max_km_per_charge
-    start_node = find_nearest_node(lat_start, lng_start, df_charge)
-    end_node = find_nearest_node(lat_end, lng_end, df_charge)
-    if end_node == 'unknown' or start_node == 'unknown':
-        return {"error": "Không tìm thấy trạm sạc gần điểm bắt đầu hoặc kết thúc."}
-        
-    info_start_node = df_charge[df_charge['name'] == start_node].iloc[0]
-    info_end_node = df_charge[df_charge['name'] == end_node].iloc[0]
-    lat_first, lng_first = float(info_start_node['lat']), float(info_start_node['lng'])
-    lat_last, lng_last = float(info_end_node['lat']), float(info_end_node['lng'])
-    dist_to_first_road = haversine(lat_start, lng_start, lat_first, lng_first) * ROAD_FACTOR
-    battery_start_actual = int(battery_max * battery_percent / 100)
-    battery_at_first_station = battery_start_actual - dist_to_first_road
-    if battery_at_first_station < 0:
-        return {"error": f"Không đủ pin ({battery_start_actual:.0f} km) để đi tới trạm sạc đầu tiên ({dist_to_first_road:.0f} km)."}
-        
-    path, charge_log, total_dist_stations = ucs_charging_stations(df_charge, start_node, end_node, battery_max, battery_at_first_station, avoid_toll=qua_tram_thu_phi)
-    
-    if path is None:
-        return {"error": "Không tìm được đường đi hợp lệ (Timeout hoặc không có đường giữa các trạm)."}
-        
-    dist_to_last_road = haversine(lat_last, lng_last, lat_end, lng_end) * ROAD_FACTOR
+    return finish((None, None, None))
+
+def _is_dominated(front: List[Tuple[float, float]], battery: float, g: float) -> bool:
+    """Nhãn (battery, g) bị trội nếu tập Pareto có nhãn với pin >= battery và quãng đường <= g."""
+    for b, g_settled in front:
+        if b >= battery and g_settled <= g:
+            return True
+    return False
+
+def _quantize_soc(battery: float, bucket_km: float) -> float:
+    """Làm tròn xuống mức pin theo bước bucket_km (an toàn: không bao giờ tăng pin)."""
+    return (battery // bucket_km) * bucket_km
+
+def soc_bucket_to_km(battery_max: float, soc_bucket_km: Optional[float] = None, soc_bucket_percent: Optional[float] = None) -> Optional[float]:
+    """Đổi bước lượng tử hóa pin (km hoặc % dung lượng) sang km."""
+    if soc_bucket_percent:
+        return battery_max * soc_bucket_percent / 100
+    return soc_bucket_km
+
+def _rebuild_path(stations: StationArrays, labels: SearchLabels, goal_label: int) -> Tuple[List[int], List[Tuple[str, float, float, float, float]], float]:
+    """
+    Truy ngược nhãn cha để dựng (path, charge_log, total_dist).
+    Mỗi mục charge_log: (tên trạm xuất phát của chặng, pin khi tới trạm kế, lượng sạc, lat, lng trạm xuất phát).
+    """
+    chain = labels.chain(goal_label)
+    root = chain[0]
+    root_pos = labels.node[root]
+    path = [stations.index[labels.node[label]].item() for label in chain]
+    charge_log = [(stations.names[root_pos], labels.battery[root], 0, float(stations.lat[root_pos]), float(stations.lng[root_pos]))]
+    for label in chain[1:]:
+        from_pos = labels.node[labels.parent[label]]
+        charge_log.append((stations.names[from_pos], labels.battery[label], labels.charge_amount[label], float(stations.lat[from_pos]), float(stations.lng[from_pos])))
+    return path, charge_log, labels.g[goal_label]
+
+def _labels_along_path(stations: StationArrays, positions: List[int], battery_start: float, battery_max: int, policy: str,
+                       soc_bucket_km: Optional[float] = None) -> Tuple[Optional[SearchLabels], int]:
+    """
+    Mô phỏng chính sách sạc dọc theo một dãy trạm cho trước, ghi thành chuỗi nhãn (để dùng chung _rebuild_path).
+    Quãng đường từng chặng tính bằng haversine() vô hướng giống vòng lặp tìm kiếm.
+    Trả về (None, -1) nếu có chặng dài hơn battery_max.
+    """
+    if soc_bucket_km:
+        battery_start = _quantize_soc(battery_start, soc_bucket_km)
+    labels = SearchLabels()
+    label = labels.add(positions[0], battery_start, 0, -1, 0)
+    battery, total_dist = battery_start, 0
+    for from_pos, to_pos in zip(positions, positions[1:]):
+        dist_km = haversine(float(stations.lat[from_pos]), float(stations.lng[from_pos]), float(stations.lat[to_pos]), float(stations.lng[to_pos])) * ROAD_FACTOR
+        charge_to, charge_amount = _charge_for_leg(policy, battery, dist_km, battery_max)
+        battery = charge_to - dist_km
+        if battery < 0:
+            return None, -1
+        if soc_bucket_km:
+            battery = _quantize_soc(battery, soc_bucket_km)
+        total_dist += dist_km
+        label = labels.add(to_pos, battery, total_dist, label, charge_amount)
+    return labels, label
+
+def _transit_table_search(df_charge: pd.DataFrame, start: str, end: str, battery_max: int, battery_start: float,
+                          soc_bucket_km: Optional[float] = None, stats: Optional[Dict[str, Any]] = None):
+    """
+    Trả lời chặng giữa hai trạm bằng contraction hierarchy tính trước (đường ngắn nhất trên toàn đồ thị trạm kề).
+    Trả về None nếu chưa có bảng hoặc bảng cũ (stale) -> hàm gọi quay về A*.
+    """
+    if df_charge.empty or 'name' not in df_charge.columns:
+        return None
+    stations = get_station_arrays(df_charge)
+    table = load_transit_table(stations.version, battery_max, ROAD_FACTOR, len(stations))
+    if table is None:
+        return None
+    if soc_bucket_km is None:
+        soc_bucket_km = SOC_BUCKET_KM
+
+    pos_start, pos_end = stations.catalogue.resolve(start), stations.catalogue.resolve(end)
+    if stats is not None:
+        stats.update({'popped': 0, 'expanded': 0, 'pushed': 0, 'pruned': 0, 'max_heap': 0, 'peak_labels': 0, 'engine': 'transit'})
+    if pos_start is None or pos_end is None:
+        return None, None, None
+
+    positions = table.path(pos_start, pos_end)
+    if positions is None:
+        return None, None, None
+    labels, goal_label = _labels_along_path(stations, positions, battery_start, battery_max, 'astar', soc_bucket_km)
+    if labels is None:
+        return None # Bảng không khớp tầm pin -> để A* xử lý
+    if stats is not None:
+        stats['peak_labels'] = len(labels)
+    return _rebuild_path(stations, labels, goal_label)
+
+# ======================= #
+# 1d. TÌM KIẾM HAI CHIỀU (BIDIRECTIONAL)
+# ======================= #
+
+def bidirectional_charging_stations(df_charge: pd.DataFrame, start: str, end: str, battery_max: int, battery_start: float, avoid_toll: bool = False,
+                                    policy: str = 'astar', soc_bucket_km: Optional[float] = None, stats: Optional[Dict[str, Any]] = None,
+                                    control: Optional[SearchControl] = None) -> Tuple[Optional[List[int]], Optional[List[Tuple[str, float, float, float, float]]], Optional[float]]:
+    """
+    Tìm kiếm hai chiều theo quãng đường (Dijkstra hai chiều) trên toàn bộ đồ thị trạm kề:
+    chiều xuôi từ trạm đầu, chiều ngược từ trạm đích, cùng nhãn quãng đường g.
+    Không cần nhãn mức pin: mọi cạnh của đồ thị dài <= battery_max và mọi trạm (kể cả trạm đầu) đều sạc được,
+    nên mọi đường trên đồ thị đều đi được với bất kỳ mức pin nào - mức pin chỉ ảnh hưởng nhật ký sạc.
+    Điểm gặp: cạnh u -> v với nhãn xuôi tại u và nhãn ngược tại v.
+    Dừng khi đỉnh heap xuôi + đỉnh heap ngược >= quãng đường tốt nhất đã gặp (mu).
+
+    Nhật ký sạc được dựng bằng cách mô phỏng chính sách sạc (policy 'astar' / 'ucs') dọc đường tìm được.
+    avoid_toll: bỏ các cạnh đi qua trạm thu phí (toll_edges.py).
+    stats: popped, expanded (tổng), expanded_forward, expanded_backward, pushed, max_heap, peak_labels, engine.
+    control: SearchControl (search_control.py) - hủy hợp tác và báo tiến độ (best_f = tổng đỉnh hai heap).
+    """
+    counters = {'popped': 0, 'expanded': 0, 'expanded_forward': 0, 'expanded_backward': 0, 'pushed': 0, 'pruned': 0, 'max_heap': 2, 'peak_labels': 0}
+    if stats is not None:
+        stats.update(counters, engine='bidirectional')
+    if soc_bucket_km is None:
+        soc_bucket_km = SOC_BUCKET_KM
+    if df_charge.empty or 'name' not in df_charge.columns:
+        return None, None, None
+    stations = get_station_arrays(df_charge)
+    pos_start, pos_end = stations.catalogue.resolve(start), stations.catalogue.resolve(end)
+    if pos_start is None or pos_end is None:
+        return None, None, None
+    graph = get_reachability_graph(stations, battery_max, ROAD_FACTOR, stations.version)
+    tolled = get_toll_edges(stations, graph).tolled if avoid_toll else None
+
+    def finish(result, cancelled=False):
+        if cancelled and stats is not None:
+            stats['cancelled'] = True
+        counters['expanded'] = counters['expanded_forward'] + counters['expanded_backward']
+        counters['peak_labels'] = int(np.isfinite(g_fwd).sum() + np.isfinite(g_bwd).sum())
+        if stats is not None:
+            stats.update(counters)
+        return result
+
+    n = len(stations)
+    g_fwd = np.full(n, np.inf)
+    g_bwd = np.full(n, np.inf)
+    parent_fwd = np.full(n, -1, dtype=np.int64) # Trạm trước đó trên đường từ trạm đầu
+    parent_bwd = np.full(n, -1, dtype=np.int64) # Trạm kế tiếp trên đường tới trạm đích
+    closed_fwd = np.zeros(n, dtype=bool)
+    closed_bwd = np.zeros(n, dtype=bool)
+    g_fwd[pos_start] = 0.0
+    g_bwd[pos_end] = 0.0
+    heap_fwd = [(0.0, pos_start)]
+    heap_bwd = [(0.0, pos_end)]
+    best, meet = (0.0, (pos_start, pos_start)) if pos_start == pos_end else (INF, None)
+    start_time = time.time()
+
+    while heap_fwd and heap_bwd and heap_fwd[0][0] + heap_bwd[0][0] < best:
+        if time.time() - start_time > TIMEOUT_SECONDS:
+            return finish((None, None, None)) # Timeout
+        if control is not None and control.checkpoint('bidirectional', counters['expanded_forward'] + counters['expanded_backward'], counters['popped'],
+                                                      heap_fwd[0][0] + heap_bwd[0][0], len(heap_fwd) + len(heap_bwd)):
+            return finish((None, None, None), cancelled=True)
+        forward = heap_fwd[0][0] <= heap_bwd[0][0]
+        g, pos = heapq.heappop(heap_fwd if forward else heap_bwd)
+        counters['popped'] += 1
+        closed = closed_fwd if forward else closed_bwd
+        if closed[pos]:
+            continue
+        closed[pos] = True
+        counters['expanded_forward' if forward else 'expanded_backward'] += 1
+
+        neighbors, legs = graph.neighbors(pos)
+        if tolled is not None:
+            free = ~tolled[graph.indptr[pos]:graph.indptr[pos + 1]]
+            neighbors, legs = neighbors[free], legs[free]
+        new_g = g + legs
+        own_g, own_parent = (g_fwd, parent_fwd) if forward else (g_bwd, parent_bwd)
+        # Gặp chiều còn lại qua cạnh pos - neighbor
+        meeting = new_g + (g_bwd if forward else g_fwd)[neighbors]
+        better = new_g < own_g[neighbors]
+
+        if len(meeting):
+            i = int(np.argmin(meeting))
+            if meeting[i] < best:
+                best = float(meeting[i])
+                meet = (pos, int(neighbors[i])) if forward else (int(neighbors[i]), pos)
+
+        improved = neighbors[better]
+        own_g[improved] = new_g[better]
+        own_parent[improved] = pos
+        heap = heap_fwd if forward else heap_bwd
+        for next_pos, next_g in zip(improved.tolist(), new_g[better].tolist()):
+            heapq.heappush(heap, (next_g, next_pos))
+        counters['pushed'] += len(improved)
+        if len(heap_fwd) + len(heap_bwd) > counters['max_heap']:
+            counters['max_heap'] = len(heap_fwd) + len(heap_bwd)
+
+    if meet is None:
+        return finish((None, None, None))
+
+    # Ghép hai nửa đường: trạm đầu ... u (theo parent xuôi), v ... trạm đích (theo parent ngược)
+    u, v = meet
+    positions = []
+    node = u
+    while node >= 0:
+        positions.append(node)
+        node = parent_fwd[node]
+    positions.reverse()
+    node = v if v != u else parent_bwd[u]
+    while node >= 0:
+        positions.append(int(node))
+        node = parent_bwd[node]
+
+    labels, goal_label = _labels_along_path(stations, [int(p) for p in positions], battery_start, battery_max, policy, soc_bucket_km)
+    if labels is None:
+        return finish((None, None, None))
+    return finish(_rebuild_path(stations, labels, goal_label))
+
+def _cached_station_search(cache: Optional[RouteCache], df_charge: pd.DataFrame, start_id: int, end_id: int, battery_max: int,
+                           battery_at_first_station: float, avoid_toll: bool, algorithm: Tuple, search: Callable, stats: Dict[str, Any],
+                           policy: str, soc_bucket_km: Optional[float] = None, use_transit: bool = False):
+    """
+    Chạy search(pin tại trạm đầu, stats) cho chặng giữa các trạm, qua cache nếu có.
+    Tìm kiếm luôn chạy với mức pin thật. Mọi cạnh của đồ thị trạm kề đều đi được sau khi sạc, nên dãy trạm và
+    quãng đường tìm được không phụ thuộc mức pin; cache chỉ lưu phần đó (khóa theo bước cache.soc_bucket_km).
+    Lượng sạc và pin khi tới mỗi trạm phụ thuộc mức pin, nên khi dùng lại (hit / coalesced) nhật ký sạc được
+    mô phỏng lại dọc dãy trạm với mức pin thật của yêu cầu (policy, soc_bucket_km như lúc tìm kiếm).
+    Khi dùng lại, bộ đếm tìm kiếm trong stats bằng 0 (engine = 'cache', cached_engine = engine của lần tìm gốc).
+    Kết quả bị timeout hoặc bị hủy không được lưu.
+    """
+    if cache is None:
+        return search(battery_at_first_station, stats)
+    stations = get_station_arrays(df_charge)
+    key_battery = _quantize_soc(battery_at_first_station, cache.soc_bucket_km) if cache.soc_bucket_km else battery_at_first_station
+    index_versions = []
+    if avoid_toll:
+        index_versions.append(('bot', default_bot_version()))
+    if use_transit and not avoid_toll and load_transit_table(stations.version, battery_max, ROAD_FACTOR, len(stations)) is not None:
+        index_versions.append(('transit', True)) # Đã dựng contraction hierarchy -> kết quả khác A*
+    key = route_cache_key(battery_max, start_id, end_id, key_battery, avoid_toll, algorithm, stations.version, tuple(index_versions))
+    own = {}
+
+    def compute():
+        search_stats = {}
+        path, charge_log, total_dist = search(battery_at_first_station, search_stats)
+        own['result'] = (path, charge_log, total_dist)
+        positions = [stations.catalogue.id_of_label(label) for label in path] if path is not None else None
+        return positions, total_dist, search_stats
+
+    (positions, total_dist, search_stats), status = cache.get_or_compute(key, compute, store_if=lambda value: not (value[2].get('timed_out') or value[2].get('cancelled')))
+    if status == 'miss':
+        stats.update(search_stats, cache=status)
+        return own['result']
+    stats.update({counter: 0 for counter in ('popped', 'expanded', 'pushed', 'pruned', 'max_heap', 'peak_labels')},
+                 engine='cache', cached_engine=search_stats.get('engine'), cache=status)
+    if search_stats.get('cancelled'): # Chờ (coalesced) một lần tìm kiếm bị hủy
+        stats['cancelled'] = True
+    if search_stats.get('toll_fallback'): # Lộ trình dự phòng đi qua BOT
+        stats['toll_fallback'] = True
+    if positions is None:
+        return None, None, None
+    labels, goal_label = _labels_along_path(stations, positions, battery_at_first_station, battery_max, policy, soc_bucket_km)
+    if labels is None:
+        return None, None, None
+    stats['peak_labels'] = len(labels)
+    return _rebuild_path(stations, labels, goal_label)
+
+def _finish_search_result(result: Dict[str, Any], stats: Dict[str, Any], emit_stats: bool, algorithm: str, car: Any) -> Dict[str, Any]:
+    """Gắn khối stats vào kết quả run_*_search và ghi một dòng JSON nếu bật EV_SEARCH_STATS_LOG."""
+    result['stats'] = stats
+    if emit_stats:
+        emit_search_stats(stats, algorithm=algorithm, car=car.name, error=result.get('error'))
+    return result
+
+# ======================= #
+# 2. THUẬT TOÁN UCS TÌM ĐƯỜNG (CÓ TỐI ƯU TỐC ĐỘ)
+# ======================= #
+def ucs_charging_stations(df_charge: pd.DataFrame, start: str, end: str, battery_max: int, battery_start: int, avoid_toll: bool = False,
+                         dominance: Optional[bool] = None, soc_bucket_km: Optional[float] = None, stats: Optional[Dict[str, Any]] = None,
+                         control: Optional[SearchControl] = None) -> Tuple[Optional[List[int]], Optional[List[Tuple[str, int, int, float, float]]], Optional[float]]:
+    """
+    Thuật toán Uniform Cost Search (UCS) tìm đường đi qua các trạm sạc.
+    Đã tối ưu: Chỉ xem xét 10 trạm sạc gần đích nhất trong mỗi bước.
+    Khi cần sạc: sạc tới tối thiểu 90% pin.
+    """
+    return _charging_search(df_charge, start, end, battery_max, battery_start, avoid_toll, policy='ucs',
+                            dominance=dominance, soc_bucket_km=soc_bucket_km, stats=stats, control=control)
+
+def _charge_log_route_result(catalogue: StationCatalogue, path: List[Any], charge_log: List[Tuple[str, float, float, float, float]], total_dist_stations: float,
+                      start_node: str, end_node: str, battery_max: int, battery_start_actual: int, battery_at_first_station: float,
+                      dist_to_first_road: float, dist_to_last_road: float, qua_tram_thu_phi: bool) -> Dict[str, Any]:
+    """
+    Dựng chi tiết lộ trình, thời gian lái/sạc và phí sạc từ một charge_log theo biểu phí của UCS.
+    Chỉ tính toán trên nhật ký được truyền vào (nhật ký của UCS, 10 trạm/bước - xem _ucs_route).
+    Thông tin trạm tra theo id trong catalogue (path[i] là nhãn index của trạm xuất phát chặng ghi ở charge_log[i + 1]).
+    """
     total_dist_full = total_dist_stations + dist_to_first_road + dist_to_last_road
     total_time_sac = 0
     total_fee = 0
@@ -188,9 +703,9 @@ def run_ucs_search(car: Any, lat_start: float, lng_start: float, lat_end: float,
     # B. CHẶNG 2: GIỮA CÁC TRẠM
     for idx_log, (node, new_battery, charge_amount, lat, lng) in enumerate(charge_log):
         if idx_log == 0: continue
-        info_row = df_charge[df_charge['name'] == node]
-        if info_row.empty: continue
-        info = info_row.iloc[0]
+        station_id = catalogue.id_of_label(path[idx_log-1])
+        if station_id is None: continue
+        info = catalogue.row(station_id)
         prev_log = charge_log[idx_log-1]
         
         # Tính lại quãng đường và pin trước khi sạc
@@ -223,7 +738,8 @@ def run_ucs_search(car: Any, lat_start: float, lng_start: float, lat_end: float,
             'address': info['address'],
             'charge_status': charge_info if charge_amount > 0 else f"Pin còn lại {new_battery:.0f} km ({percent}%) khi tới.",
             'time_lai': (dist_lai / AVG_SPEED_KMH) * 60,
-            'dist_lai': dist_lai
+            'dist_lai': dist_lai,
+            'station_id': station_id
         })
 
     # C. CHẶNG 3: TRẠM CUỐI -> ĐIỂM END
@@ -244,119 +760,347 @@ def run_ucs_search(car: Any, lat_start: float, lng_start: float, lat_end: float,
         "qua_tram_thu_phi": qua_tram_thu_phi
     }
 
+# Hàm entry point cho UCS (Giữ nguyên logic hậu xử lý)
+def run_ucs_search(car: Any, lat_start: float, lng_start: float, lat_end: float, lng_end: float, battery_percent: int, qua_tram_thu_phi: bool, df_charge: pd.DataFrame,
+                   dominance: Optional[bool] = None, soc_bucket_km: Optional[float] = None, soc_bucket_percent: Optional[float] = None,
+                   bidirectional: bool = False, emit_stats: bool = True, cache: Optional[RouteCache] = None,
+                   control: Optional[SearchControl] = None) -> Dict[str, Any]:
+    """
+    Hàm entry point chính cho thuật toán UCS (Dùng cho GUI).
+    bidirectional=True: tìm kiếm hai chiều (chính sách sạc UCS).
+    cache: RouteCache (route_cache.py) cho chặng giữa các trạm; stats['cache'] = 'hit' / 'miss' / 'coalesced'.
+    result['stats']: bộ đếm tìm kiếm và thời gian từng pha (search_stats.py); emit_stats=False để không ghi log JSON
+    (GUI tự ghi sau khi điền thời gian kiểm tra BOT và vẽ bản đồ).
+    """
+    stats = {}
+    phase_start = time.perf_counter()
+    stations = get_station_arrays(df_charge) if not df_charge.empty and 'name' in df_charge.columns else None
+    start_id = find_nearest_station(lat_start, lng_start, df_charge, stations)
+    end_id = find_nearest_station(lat_end, lng_end, df_charge, stations)
+    if end_id is None or start_id is None:
+        stats['snap_time'] = time.perf_counter() - phase_start
+        return _finish_search_result({"error": "Không tìm thấy trạm sạc gần điểm bắt đầu hoặc kết thúc."}, stats, emit_stats, 'ucs', car)
+    stats['snap_time'] = time.perf_counter() - phase_start
+    result = _ucs_route(car, stations.catalogue, start_id, end_id, lat_start, lng_start, lat_end, lng_end, battery_percent, qua_tram_thu_phi,
+                        df_charge, stats, dominance=dominance, bucket_km=soc_bucket_to_km(car.max_km_per_charge, soc_bucket_km, soc_bucket_percent),
+                        bidirectional=bidirectional, cache=cache, control=control)
+    return _finish_search_result(result, stats, emit_stats, 'ucs', car)
+
+def _ucs_route(car: Any, catalogue: StationCatalogue, start_id: int, end_id: int, lat_start: float, lng_start: float, lat_end: float, lng_end: float,
+               battery_percent: int, qua_tram_thu_phi: bool, df_charge: pd.DataFrame, stats: Dict[str, Any], dominance: Optional[bool] = None,
+               bucket_km: Optional[float] = None, bidirectional: bool = False, cache: Optional[RouteCache] = None,
+               control: Optional[SearchControl] = None) -> Dict[str, Any]:
+    """
+    Phần sau bước snap của run_ucs_search: tìm chặng giữa trạm start_id và end_id rồi dựng kết quả (hoặc {"error": ...}).
+    Dùng chung cho run_ucs_search và run_ucs_one_to_many để hai hàm cho cùng kết quả.
+    """
+    battery_max = car.max_km_per_charge
+    start_node, end_node = catalogue.name(start_id), catalogue.name(end_id)
+    lat_first, lng_first = catalogue.coords(start_id)
+    lat_last, lng_last = catalogue.coords(end_id)
+    dist_to_first_road = haversine(lat_start, lng_start, lat_first, lng_first) * ROAD_FACTOR
+    battery_start_actual = int(battery_max * battery_percent / 100)
+    battery_at_first_station = battery_start_actual - dist_to_first_road
+    if battery_at_first_station < 0:
+        return {"error": f"Không đủ pin ({battery_start_actual:.0f} km) để đi tới trạm sạc đầu tiên ({dist_to_first_road:.0f} km)."}
+        
+    phase_start = time.perf_counter()
+
+    def search(battery, search_stats):
+        if bidirectional:
+            result = bidirectional_charging_stations(df_charge, start_id, end_id, battery_max, battery, avoid_toll=qua_tram_thu_phi,
+                                                     policy='ucs', soc_bucket_km=bucket_km, stats=search_stats, control=control)
+        else:
+            result = ucs_charging_stations(df_charge, start_id, end_id, battery_max, battery, avoid_toll=qua_tram_thu_phi,
+                                           dominance=dominance, soc_bucket_km=bucket_km, stats=search_stats, control=control)
+        if qua_tram_thu_phi:
+            result = _toll_fallback_search(result, search_stats, df_charge, start_id, end_id, battery_max, battery, 'ucs', bucket_km)
+        return result
+
+    path, charge_log, total_dist_stations = _cached_station_search(cache, df_charge, start_id, end_id, battery_max, battery_at_first_station, qua_tram_thu_phi,
+                                                                   ('ucs', bidirectional, dominance, bucket_km), search, stats, 'ucs', bucket_km)
+    stats['search_time'] = time.perf_counter() - phase_start
+    phase_start = time.perf_counter()
+    
+    if path is None and stats.get('cancelled'):
+        return {"error": SEARCH_CANCELLED_MESSAGE}
+    if path is None:
+        return {"error": "Không tìm được đường đi hợp lệ (Timeout hoặc không có đường giữa các trạm)."}
+        
+    dist_to_last_road = haversine(lat_last, lng_last, lat_end, lng_end) * ROAD_FACTOR
+    result = _charge_log_route_result(catalogue, path, charge_log, total_dist_stations, start_node, end_node, battery_max, battery_start_actual,
+                               battery_at_first_station, dist_to_first_road, dist_to_last_road, qua_tram_thu_phi)
+    if stats.get('toll_fallback'):
+        result['canh_bao_bot'] = NO_TOLL_FREE_ROUTE_WARNING
+    stats['postprocess_time'] = time.perf_counter() - phase_start
+    return result
+
 # ======================= #
-# 3. THUẬT TOÁN A* TÌM ĐƯỜNG (CÓ TỐI ƯU TỐC ĐỘ)
+# 2b. CÂY DIJKSTRA TỪ MỘT TRẠM (lộ trình dự phòng BOT) VÀ UCS MỘT-NHIỀU (một điểm xuất phát, nhiều điểm đích)
 # ======================= #
 
-def astar_charging_stations(df_charge: pd.DataFrame, start: str, end: str, battery_max: int, battery_start: int, avoid_toll: bool = False) -> Tuple[Optional[List[int]], Optional[List[Tuple[str, int, int, float, float]]], Optional[float]]:
+class ChargingTree:
     """
-    Thuật toán A* tìm đường đi qua các trạm sạc.
-    Đã tối ưu: Chỉ xem xét 10 trạm sạc gần đích nhất trong mỗi bước.
+    Cây đường đi ngắn nhất (parent-pointer theo vị trí trạm) từ một trạm xuất phát.
+    Mọi cạnh của đồ thị trạm kề (<= battery_max) đều đi được sau khi sạc, nên quãng đường nhỏ nhất
+    tới mỗi trạm không phụ thuộc mức pin; pin và lượng sạc được mô phỏng lại dọc đường khi truy ngược.
     """
-    start_time = time.time()
-    
-    idx_start = df_charge[df_charge['name'] == start].index[0] if not df_charge[df_charge['name'] == start].empty else None
-    idx_end = df_charge[df_charge['name'] == end].index[0] if not df_charge[df_charge['name'] == end].empty else None
+    __slots__ = ('stations', 'parent', 'dist', 'battery_start', 'battery_max', 'policy', 'soc_bucket_km')
 
-    if idx_start is None or idx_end is None:
-        return None, None, None
+    def __init__(self, stations: StationArrays, parent: np.ndarray, dist: np.ndarray, battery_start: float, battery_max: int,
+                 policy: str = 'ucs', soc_bucket_km: Optional[float] = None):
+        self.stations = stations
+        self.parent = parent
+        self.dist = dist
+        self.battery_start = battery_start
+        self.battery_max = battery_max
+        self.policy = policy
+        self.soc_bucket_km = soc_bucket_km
 
-    end_lat, end_lng = float(df_charge.loc[idx_end, 'lat']), float(df_charge.loc[idx_end, 'lng'])
-    
-    def heuristic(idx: int) -> float:
-        """Ước tính khoảng cách Haversine * ROAD_FACTOR (h_score)"""
-        lat1, lng1 = float(df_charge.loc[idx, 'lat']), float(df_charge.loc[idx, 'lng'])
-        return haversine(lat1, lng1, end_lat, end_lng) * ROAD_FACTOR
+    def route(self, end: str) -> Tuple[Optional[List[int]], Optional[List[Tuple[str, float, float, float, float]]], Optional[float]]:
+        """(path, charge_log, total_dist) cùng dạng với ucs_charging_stations; (None, None, None) nếu không tới được."""
+        pos_end = self.stations.catalogue.resolve(end)
+        if pos_end is None or self.dist[pos_end] == INF:
+            return None, None, None
+        positions = [pos_end]
+        while self.parent[positions[-1]] >= 0:
+            positions.append(int(self.parent[positions[-1]]))
+        positions.reverse()
+        labels, goal_label = _labels_along_path(self.stations, positions, self.battery_start, self.battery_max, self.policy, self.soc_bucket_km)
+        if labels is None:
+            return None, None, None
+        return _rebuild_path(self.stations, labels, goal_label)
 
-    # Heap: (f_score, total_dist, current_idx, battery, path, charge_log)
-    f_start = 0 + heuristic(idx_start)
-    
-    initial_log = [(df_charge.loc[idx_start, 'name'], battery_start, 0, float(df_charge.loc[idx_start, 'lat']), float(df_charge.loc[idx_start, 'lng']))]
-    heap = [(f_start, 0, idx_start, battery_start, [idx_start], initial_log)]
-    
-    # visited: (idx, battery) -> total_dist (g_score)
-    visited = dict() 
-    toll_edges = set() 
+def dijkstra_charging_tree(df_charge: pd.DataFrame, start: str, battery_max: int, battery_start: float, targets: Optional[List[str]] = None,
+                      soc_bucket_km: Optional[float] = None, stats: Optional[Dict[str, Any]] = None, avoid_toll: bool = False,
+                      toll_penalty: bool = False, policy: str = 'ucs') -> Optional[ChargingTree]:
+    """
+    Tìm kiếm không có đích (Dijkstra trên toàn bộ đồ thị trạm kề, không giới hạn 10 trạm/bước) từ trạm start,
+    giữ lại cây nhãn để trả lời nhiều trạm đích bằng cách truy ngược. Đường tới mỗi trạm là đường ngắn nhất
+    (<= quãng đường của ucs_charging_stations); lượng sạc được mô phỏng dọc đường theo chính sách UCS (sạc tới 90%).
+    targets: dừng sớm khi mọi trạm trong danh sách đã được chốt (None = duyệt hết).
+    avoid_toll: bỏ các cạnh đi qua trạm thu phí (toll_edges.py).
+    toll_penalty: không bỏ cạnh mà cộng phí BOT của cạnh * TOLL_PENALTY_KM_PER_VND vào chi phí (lộ trình dự phòng
+        khi avoid_toll không tìm được đường); tree.dist khi đó là quãng đường + phạt, quãng đường thật tính lại khi truy ngược.
+    policy: chính sách sạc khi mô phỏng dọc đường ('ucs' hoặc 'astar').
+    Trả về None nếu không tìm thấy trạm xuất phát.
+    """
+    if soc_bucket_km is None:
+        soc_bucket_km = SOC_BUCKET_KM
+    if stats is not None:
+        stats.update(engine='tree')
+    if df_charge.empty or 'name' not in df_charge.columns:
+        return None
+    stations = get_station_arrays(df_charge)
+    pos_start = stations.catalogue.resolve(start)
+    if pos_start is None:
+        return None
+    graph = get_reachability_graph(stations, battery_max, ROAD_FACTOR, stations.version)
+    target_pos = None
+    if targets is not None:
+        target_pos = [pos for pos in map(stations.catalogue.resolve, targets) if pos is not None]
+    counters = {}
+    blocked = get_toll_edges(stations, graph).tolled if avoid_toll and not toll_penalty else None
+    penalty = get_toll_edges(stations, graph).fee * TOLL_PENALTY_KM_PER_VND if toll_penalty else None
+    dist, parent = shortest_path_tree(graph, pos_start, targets=target_pos, stats=counters, blocked=blocked, penalty=penalty)
+    if stats is not None:
+        stats.update(counters, reached=int(np.count_nonzero(dist < INF)))
+    return ChargingTree(stations, parent, dist, battery_start, battery_max, policy, soc_bucket_km)
 
-    while heap:
-        if time.time() - start_time > TIMEOUT_SECONDS:
-            return None, None, None # Timeout
+def _toll_fallback_search(result: Tuple, search_stats: Dict[str, Any], df_charge: pd.DataFrame, start_id: int, end_id: int, battery_max: int,
+                          battery_start: float, policy: str, soc_bucket_km: Optional[float] = None) -> Tuple:
+    """
+    avoid_toll: nếu tìm kiếm bỏ cạnh có BOT không ra đường (không phải do hủy / hết giờ), tìm lại trên toàn đồ thị
+    với phí BOT làm chi phí phạt (dijkstra_charging_tree(toll_penalty=True)) -> lộ trình qua ít phí BOT nhất.
+    Khi dùng lộ trình dự phòng: search_stats['toll_fallback'] = True, fallback_expanded = số trạm đã duyệt thêm.
+    """
+    if result[0] is not None or search_stats.get('cancelled') or search_stats.get('timed_out'):
+        return result
+    fallback_stats = {}
+    tree = dijkstra_charging_tree(df_charge, start_id, battery_max, battery_start, targets=[end_id], soc_bucket_km=soc_bucket_km,
+                                  stats=fallback_stats, toll_penalty=True, policy=policy)
+    result = tree.route(end_id) if tree is not None else (None, None, None)
+    if result[0] is not None:
+        search_stats.update(toll_fallback=True, fallback_expanded=fallback_stats.get('expanded', 0))
+    return result
 
-        f_score, total_dist, current, battery, path, charge_log = heapq.heappop(heap)
-        
-        if (current, battery) in visited and visited[(current, battery)] <= total_dist:
-            continue
-        visited[(current, battery)] = total_dist
+def run_ucs_one_to_many(car: Any, lat_start: float, lng_start: float, destinations: List[Tuple[float, float]], battery_percent: int,
+                        qua_tram_thu_phi: bool, df_charge: pd.DataFrame, soc_bucket_km: Optional[float] = None,
+                        soc_bucket_percent: Optional[float] = None, emit_stats: bool = True,
+                        cache: Optional[RouteCache] = None) -> List[Dict[str, Any]]:
+    """
+    Một điểm xuất phát, nhiều điểm đích (vd. kho -> 500 khách hàng). Kết quả của mỗi đích giống hệt
+    run_ucs_search(car, lat_start, lng_start, lat_end, lng_end, ...) (cùng cách snap, cùng UCS 10 trạm gần đích/bước,
+    cùng hậu xử lý); danh sách theo thứ tự destinations.
+    UCS chọn trạm theo đích nên không dùng chung được một cây tìm kiếm; phần dùng chung là: snap điểm xuất phát
+    và bảng trạm một lần, và mỗi trạm đích chỉ tìm kiếm một lần - các điểm đích snap về cùng trạm dùng lại chặng
+    giữa các trạm qua RouteCache (cache truyền vào, hoặc một cache riêng cho lần gọi này; stats['engine'] = 'cache').
+    result['stats']: snap_time của điểm xuất phát + số liệu tìm kiếm / hậu xử lý của từng đích.
+    """
+    shared_stats = {}
+    phase_start = time.perf_counter()
+    stations = get_station_arrays(df_charge) if not df_charge.empty and 'name' in df_charge.columns else None
+    start_id = find_nearest_station(lat_start, lng_start, df_charge, stations)
+    shared_stats['snap_time'] = time.perf_counter() - phase_start
+    if cache is None:
+        cache = RouteCache(soc_bucket_km=None) # Chỉ dùng lại đúng mức pin -> kết quả trùng run_ucs_search
+    bucket_km = soc_bucket_to_km(car.max_km_per_charge, soc_bucket_km, soc_bucket_percent)
 
-        if current == idx_end:
-            return path, charge_log, total_dist 
+    results = []
+    for lat_end, lng_end in destinations:
+        stats = dict(shared_stats)
+        phase_start = time.perf_counter()
+        end_id = find_nearest_station(lat_end, lng_end, df_charge, stations)
+        stats['snap_time'] += time.perf_counter() - phase_start
+        if start_id is None or end_id is None:
+            result = {"error": "Không tìm thấy trạm sạc gần điểm bắt đầu hoặc kết thúc."}
+        else:
+            result = _ucs_route(car, stations.catalogue, start_id, end_id, lat_start, lng_start, lat_end, lng_end, battery_percent,
+                                qua_tram_thu_phi, df_charge, stats, bucket_km=bucket_km, cache=cache)
+        result['stats'] = stats
+        results.append(result)
+    if emit_stats:
+        emit_search_stats(shared_stats, algorithm='ucs_one_to_many', car=car.name, destinations=len(destinations),
+                          searched=sum(result['stats'].get('cache') == 'miss' for result in results),
+                          errors=sum('error' in result for result in results))
+    return results
 
-        lat1, lng1 = float(df_charge.loc[current, 'lat']), float(df_charge.loc[current, 'lng'])
-        
-        candidates = []
-        for next_idx in df_charge.index:
-            if next_idx == current:
-                continue
-            
-            if avoid_toll:
-                from_name = df_charge.loc[current, 'name']
-                to_name = df_charge.loc[next_idx, 'name']
-                if (from_name, to_name) in toll_edges or (to_name, from_name) in toll_edges:
-                    continue
-            
-            lat2, lng2 = float(df_charge.loc[next_idx, 'lat']), float(df_charge.loc[next_idx, 'lng'])
-            dist_km_straight = haversine(lat1, lng1, lat2, lng2)
-            dist_km_road = dist_km_straight * ROAD_FACTOR
-            
-            if dist_km_road > battery_max:
-                continue 
-            
-            # Dùng khoảng cách đến đích để sắp xếp (tham lam, tối ưu tốc độ)
-            dist_to_end = haversine(lat2, lng2, end_lat, end_lng) * ROAD_FACTOR
-            candidates.append((dist_to_end, next_idx, dist_km_road))
-        
-        # TỐI ƯU TỐC ĐỘ: Chỉ xem xét 10 trạm sạc gần đích nhất từ vị trí hiện tại
-        for _, next_idx, dist_km in heapq.nsmallest(10, candidates):
-            battery_after_travel = battery - dist_km
-            
-            if battery_after_travel < 0:
-                # Sạc vừa đủ để đi đến trạm kế tiếp (cộng thêm 1km dự phòng)
-                charge_to = int(dist_km + 1)
-                charge_to = min(charge_to, battery_max)
-                charge_amount = charge_to - battery
-            else:
-                charge_to = battery
-                charge_amount = 0
-            new_battery = charge_to - dist_km
-            
-            if new_battery < 0:
-                continue 
-            
-            new_charge_log = charge_log + [(df_charge.loc[current, 'name'], new_battery, charge_amount, lat1, lng1)]
-            new_total_dist = total_dist + dist_km 
-            new_f_score = new_total_dist + heuristic(next_idx)
-            
-            # Thêm vào heap (A*)
-            heapq.heappush(heap, (new_f_score, new_total_dist, next_idx, new_battery, path + [next_idx], new_charge_log))
-            
-    return None, None, None
+# ======================= #
+# 3. THUẬT TOÁN A* TÌM ĐƯỜNG (CÓ TỐI ƯU TỐC ĐỘ)
+# ======================= #
+
+def _check_transit_options(**options: Any) -> None:
+    """Bảng chuyển tiếp chỉ trả lời đường ngắn nhất: từ chối các tùy chọn tìm kiếm mà bảng sẽ bỏ qua."""
+    given = [name for name, value in options.items() if value is not None]
+    if given:
+        raise ValueError(f"use_transit=True không dùng chung với: {', '.join(given)}")
+
+def astar_charging_stations(df_charge: pd.DataFrame, start: str, end: str, battery_max: int, battery_start: int, avoid_toll: bool = False,
+                           dominance: Optional[bool] = None, soc_bucket_km: Optional[float] = None, stats: Optional[Dict[str, Any]] = None,
+                           use_landmarks: Optional[bool] = None, use_transit: Optional[bool] = None,
+                           control: Optional[SearchControl] = None) -> Tuple[Optional[List[int]], Optional[List[Tuple[str, int, int, float, float]]], Optional[float]]:
+    """
+    Thuật toán A* tìm đường đi qua các trạm sạc (h = Haversine * ROAD_FACTOR tới trạm đích,
+    hoặc max với cận dưới ALT khi use_landmarks=True).
+    Đã tối ưu: Chỉ xem xét 10 trạm sạc gần đích nhất trong mỗi bước.
+    Khi cần sạc: sạc vừa đủ để đi đến trạm kế tiếp.
+
+    use_transit=True (mặc định USE_TRANSIT_TABLE = False): nếu đã dựng contraction hierarchy cho quãng đường này
+    (python transit_table.py), chặng giữa hai trạm được trả lời từ hierarchy - đường ngắn nhất trên toàn đồ thị
+    (không giới hạn 10 trạm/bước), nên lộ trình có thể khác A*; stats['engine'] = 'transit'.
+    Thiếu bảng, bảng cũ hoặc cần tránh trạm thu phí -> chạy A*. Không dùng chung với dominance / use_landmarks
+    (bảng không áp dụng các tùy chọn này) -> ValueError.
+    """
+    if use_transit is None:
+        use_transit = USE_TRANSIT_TABLE
+    if use_transit:
+        _check_transit_options(dominance=dominance, use_landmarks=use_landmarks or None)
+    if use_transit and not avoid_toll:
+        result = _transit_table_search(df_charge, start, end, battery_max, battery_start, soc_bucket_km, stats)
+        if result is not None:
+            return result
+    return _charging_search(df_charge, start, end, battery_max, battery_start, avoid_toll, policy='astar',
+                            dominance=dominance, soc_bucket_km=soc_bucket_km, stats=stats, use_landmarks=use_landmarks, control=control)
+
+def anytime_astar_charging_stations(df_charge: pd.DataFrame, start: str, end: str, battery_max: int, battery_start: float, avoid_toll: bool = False,
+                                    deadline_ms: Optional[float] = None, on_incumbent: Optional[Callable[[Dict[str, Any]], None]] = None,
+                                    weights: Optional[Tuple[float, ...]] = None, dominance: Optional[bool] = None, soc_bucket_km: Optional[float] = None,
+                                    use_landmarks: Optional[bool] = None, stats: Optional[Dict[str, Any]] = None,
+                                    control: Optional[SearchControl] = None) -> Tuple[Optional[List[int]], Optional[List[Tuple[str, float, float, float, float]]], Optional[float]]:
+    """
+    A* anytime: chạy A* có trọng số với trọng số giảm dần (ANYTIME_WEIGHTS). Lượt đầu (trọng số lớn) nhanh chóng
+    cho một lộ trình hợp lệ; các lượt sau chỉ giữ nhãn có g + h < quãng đường tốt nhất hiện có.
+
+    Mỗi khi có lời giải tốt hơn (hoặc cận tối ưu được siết lại), on_incumbent nhận dict:
+        path, charge_log, total_dist, weight, bound (quãng đường / cận dưới tối ưu, 1.0 = tối ưu), elapsed_ms.
+    deadline_ms: hết giờ -> trả về lời giải tốt nhất đã có (None nếu chưa có).
+    stats: cộng dồn bộ đếm các lượt, thêm incumbents, bound, weight, timed_out (và cancelled nếu bị hủy).
+    control: SearchControl - bị hủy thì dừng như hết giờ (trả về lời giải tốt nhất đã có).
+    """
+    if weights is None:
+        weights = ANYTIME_WEIGHTS
+    start_time = time.time()
+    deadline = start_time + deadline_ms / 1000 if deadline_ms is not None else None
+    best = (None, None, None)
+    best_dist = INF
+    lower_bound = 0.0
+    bound = INF
+    totals = {'popped': 0, 'expanded': 0, 'pushed': 0, 'pruned': 0, 'max_heap': 0, 'peak_labels': 0}
+    summary = {'incumbents': 0, 'bound': INF, 'weight': None, 'timed_out': False}
+
+    for weight in weights:
+        run_stats = {}
+        result = _charging_search(df_charge, start, end, battery_max, battery_start, avoid_toll, policy='astar', dominance=dominance,
+                                  soc_bucket_km=soc_bucket_km, stats=run_stats, use_landmarks=use_landmarks,
+                                  weight=weight, cost_bound=best_dist, deadline=deadline, control=control)
+        for key in ('popped', 'expanded', 'pushed', 'pruned'):
+            totals[key] += run_stats.get(key, 0)
+        for key in ('max_heap', 'peak_labels'):
+            totals[key] = max(totals[key], run_stats.get(key, 0))
+
+        improved = result[0] is not None and result[2] < best_dist
+        if improved:
+            best, best_dist = result, result[2]
+            summary['incumbents'] += 1
+            summary['weight'] = weight
+        if 'lower_bound' in run_stats:
+            # Cận dưới của lượt này: min(g + h trên heap, quãng đường tốt nhất) - không bao giờ giảm giữa các lượt
+            lower_bound = max(lower_bound, min(run_stats['lower_bound'], best_dist))
+        new_bound = (best_dist / lower_bound if lower_bound > 0 else (1.0 if best_dist == 0 else INF)) if best_dist < INF else INF
+        if on_incumbent is not None and best[0] is not None and (improved or new_bound < bound):
+            on_incumbent({'path': best[0], 'charge_log': best[1], 'total_dist': best_dist, 'weight': weight,
+                          'bound': new_bound, 'elapsed_ms': (time.time() - start_time) * 1000})
+        bound = new_bound
+        if run_stats.get('timed_out'):
+            summary['timed_out'] = True
+            break
+        if run_stats.get('cancelled'):
+            summary['cancelled'] = True
+            break
+        if bound <= 1.0 + 1e-9 or best[0] is None:
+            break # Đã tối ưu, hoặc không có đường (A* có trọng số vẫn đầy đủ: duyệt hết mà không tới đích)
+
+    summary['bound'] = bound
+    if stats is not None:
+        stats.update(totals, **summary, engine='anytime')
+    return best
 
 # Hàm entry point cho A* (Giữ nguyên logic hậu xử lý)
-def run_astar_search(car: Any, lat_start: float, lng_start: float, lat_end: float, lng_end: float, battery_percent: int, qua_tram_thu_phi: bool, df_charge: pd.DataFrame) -> Dict[str, Any]:
-    """ Hàm entry point chính cho thuật toán A* (Dùng cho GUI). """
-    
-    battery_max = car.max_km_per_charge
-    start_node = find_nearest_node(lat_start, lng_start, df_charge)
-    end_node = find_nearest_node(lat_end, lng_end, df_charge)
+def run_astar_search(car: Any, lat_start: float, lng_start: float, lat_end: float, lng_end: float, battery_percent: int, qua_tram_thu_phi: bool, df_charge: pd.DataFrame,
+                     dominance: Optional[bool] = None, soc_bucket_km: Optional[float] = None, soc_bucket_percent: Optional[float] = None,
+                     use_landmarks: Optional[bool] = None, use_transit: Optional[bool] = None, bidirectional: bool = False,
+                     emit_stats: bool = True, deadline_ms: Optional[float] = None, on_incumbent: Optional[Callable[[Dict[str, Any]], None]] = None,
+                     cache: Optional[RouteCache] = None, control: Optional[SearchControl] = None) -> Dict[str, Any]:
+    """
+    Hàm entry point chính cho thuật toán A* (Dùng cho GUI).
+    bidirectional=True: tìm kiếm hai chiều (chính sách sạc A*).
+    deadline_ms / on_incumbent: chế độ anytime (anytime_astar_charging_stations) - trả về lộ trình tốt nhất tìm được
+        trong thời hạn; stats['bound'] là hệ số tối ưu đảm bảo (1.0 = tối ưu).
+    result['stats']: bộ đếm tìm kiếm và thời gian từng pha (search_stats.py); emit_stats=False để không ghi log JSON.
+    cache: RouteCache (route_cache.py) cho chặng giữa các trạm (không dùng ở chế độ anytime).
+    control: SearchControl (search_control.py) để hủy / theo dõi tiến độ từ luồng khác; bị hủy -> kết quả lỗi,
+        stats['cancelled'] = True.
+    use_transit: xem astar_charging_stations (không dùng chung với bidirectional / anytime -> ValueError).
+    """
+    if use_transit:
+        _check_transit_options(bidirectional=bidirectional or None, deadline_ms=deadline_ms, on_incumbent=on_incumbent)
 
-    if end_node == 'unknown' or start_node == 'unknown':
-        return {"error": "Không tìm thấy trạm sạc gần điểm bắt đầu hoặc kết thúc."}
+    stats = {}
+    phase_start = time.perf_counter()
+    battery_max = car.max_km_per_charge
+    stations = get_station_arrays(df_charge) if not df_charge.empty and 'name' in df_charge.columns else None
+    start_id = find_nearest_station(lat_start, lng_start, df_charge, stations)
+    end_id = find_nearest_station(lat_end, lng_end, df_charge, stations)
 
-    info_start_node = df_charge[df_charge['name'] == start_node].iloc[0]
-    info_end_node = df_charge[df_charge['name'] == end_node].iloc[0]
+    if end_id is None or start_id is None:
+        stats['snap_time'] = time.perf_counter() - phase_start
+        return _finish_search_result({"error": "Không tìm thấy trạm sạc gần điểm bắt đầu hoặc kết thúc."}, stats, emit_stats, 'astar', car)
 
-    lat_first, lng_first = float(info_start_node['lat']), float(info_start_node['lng'])
-    lat_last, lng_last = float(info_end_node['lat']), float(info_end_node['lng'])
+    catalogue = stations.catalogue
+    start_node, end_node = catalogue.name(start_id), catalogue.name(end_id)
+    lat_first, lng_first = catalogue.coords(start_id)
+    lat_last, lng_last = catalogue.coords(end_id)
+    stats['snap_time'] = time.perf_counter() - phase_start
 
     # Chặng 1: Start -> Trạm đầu tiên
     dist_to_first_road = haversine(lat_start, lng_start, lat_first, lng_first) * ROAD_FACTOR
@@ -364,13 +1108,43 @@ def run_astar_search(car: Any, lat_start: float, lng_start: float, lat_end: floa
     battery_at_first_station = battery_start_actual - dist_to_first_road
 
     if battery_at_first_station < 0:
-        return {"error": f"Không đủ pin ({battery_start_actual:.0f} km) để đi tới trạm sạc đầu tiên ({dist_to_first_road:.0f} km)."}
+        return _finish_search_result({"error": f"Không đủ pin ({battery_start_actual:.0f} km) để đi tới trạm sạc đầu tiên ({dist_to_first_road:.0f} km)."}, stats, emit_stats, 'astar', car)
 
     # Chặng 2: Giữa các trạm (A*)
-    path, charge_log, total_dist_stations = astar_charging_stations(df_charge, start_node, end_node, battery_max, battery_at_first_station, avoid_toll=qua_tram_thu_phi)
+    phase_start = time.perf_counter()
+    bucket_km = soc_bucket_to_km(battery_max, soc_bucket_km, soc_bucket_percent)
+    if deadline_ms is not None or on_incumbent is not None:
+        # Anytime phụ thuộc thời hạn -> không đi qua cache
+        path, charge_log, total_dist_stations = anytime_astar_charging_stations(df_charge, start_id, end_id, battery_max, battery_at_first_station, avoid_toll=qua_tram_thu_phi,
+                                                                                deadline_ms=deadline_ms, on_incumbent=on_incumbent, dominance=dominance,
+                                                                                soc_bucket_km=bucket_km, use_landmarks=use_landmarks, stats=stats, control=control)
+        if qua_tram_thu_phi:
+            path, charge_log, total_dist_stations = _toll_fallback_search((path, charge_log, total_dist_stations), stats, df_charge, start_id, end_id,
+                                                                          battery_max, battery_at_first_station, 'astar', bucket_km)
+    else:
+        def search(battery, search_stats):
+            if bidirectional:
+                result = bidirectional_charging_stations(df_charge, start_id, end_id, battery_max, battery, avoid_toll=qua_tram_thu_phi,
+                                                         policy='astar', soc_bucket_km=bucket_km, stats=search_stats, control=control)
+            else:
+                result = astar_charging_stations(df_charge, start_id, end_id, battery_max, battery, avoid_toll=qua_tram_thu_phi,
+                                                 dominance=dominance, soc_bucket_km=bucket_km, use_landmarks=use_landmarks, use_transit=use_transit,
+                                                 stats=search_stats, control=control)
+            if qua_tram_thu_phi:
+                result = _toll_fallback_search(result, search_stats, df_charge, start_id, end_id, battery_max, battery, 'astar', bucket_km)
+            return result
+
+        transit = use_transit if use_transit is not None else USE_TRANSIT_TABLE
+        path, charge_log, total_dist_stations = _cached_station_search(cache, df_charge, start_id, end_id, battery_max, battery_at_first_station, qua_tram_thu_phi,
+                                                                       ('astar', bidirectional, dominance, bucket_km, use_landmarks, bool(transit) and not bidirectional),
+                                                                       search, stats, 'astar', bucket_km, use_transit=bool(transit) and not bidirectional)
+    stats['search_time'] = time.perf_counter() - phase_start
+    phase_start = time.perf_counter()
 
+    if path is None and stats.get('cancelled'):
+        return _finish_search_result({"error": SEARCH_CANCELLED_MESSAGE}, stats, emit_stats, 'astar', car)
     if path is None:
-        return {"error": "Không tìm được đường đi hợp lệ (Timeout hoặc không có đường giữa các trạm)."}
+        return _finish_search_result({"error": "Không tìm được đường đi hợp lệ (Timeout hoặc không có đường giữa các trạm)."}, stats, emit_stats, 'astar', car)
 
     # Chặng 3: Trạm cuối -> End
     dist_to_last_road = haversine(lat_last, lng_last, lat_end, lng_end) * ROAD_FACTOR
@@ -400,9 +1174,9 @@ def run_astar_search(car: Any, lat_start: float, lng_start: float, lat_end: floa
     for idx_log, (node, new_battery, charge_amount, lat, lng) in enumerate(charge_log):
         if idx_log == 0: continue 
 
-        info_row = df_charge[df_charge['name'] == node]
-        if info_row.empty: continue
-        info = info_row.iloc[0]
+        station_id = catalogue.id_of_label(path[idx_log-1])
+        if station_id is None: continue
+        info = catalogue.row(station_id)
         
         prev_log = charge_log[idx_log-1]
         
@@ -452,7 +1226,8 @@ def run_astar_search(car: Any, lat_start: float, lng_start: float, lat_end: floa
             'address': info['address'],
             'charge_status': charge_info if charge_amount > 0 else f"Pin còn lại {new_battery:.0f} km ({percent}%) khi tới.",
             'time_lai': (dist_lai / AVG_SPEED_KMH) * 60,
-            'dist_lai': dist_lai
+            'dist_lai': dist_lai,
+            'station_id': station_id
         })
 
     # C. CHẶNG 3: TRẠM CUỐI -> ĐIỂM END
@@ -464,11 +1239,15 @@ def run_astar_search(car: Any, lat_start: float, lng_start: float, lat_end: floa
         'dist_lai': dist_to_last_road
     })
 
-    return {
+    result = {
         "path": detailed_path,
         "total_dist": total_dist_full,
         "total_time_lai": total_time_lai,
         "total_time_sac": total_time_sac,
         "total_fee": total_fee,
         "qua_tram_thu_phi": qua_tram_thu_phi
-    }
\ No newline at end of file
+    }
+    if stats.get('toll_fallback'):
+        result['canh_bao_bot'] = NO_TOLL_FREE_ROUTE_WARNING
+    stats['postprocess_time'] = time.perf_counter() - phase_start
+    return _finish_search_result(result, stats, emit_stats, 'astar', car)
@@ -0,0 +1,239 @@
+"""
+Lớp dịch vụ geocoding (địa chỉ <-> tọa độ) cho GUI.
+
+- GeocodeCache: cache SQLite (.cache/geocode.sqlite) cho cả tra xuôi (địa chỉ -> tọa độ) và tra ngược
+  (tọa độ -> địa chỉ), có TTL; khóa là địa chỉ đã chuẩn hóa (normalize_address) hoặc tọa độ làm tròn
+  (coord_key). Kết quả "không tìm thấy" cũng được lưu (TTL ngắn hơn); lỗi mạng / timeout thì không.
+- TokenBucket: giới hạn tần suất gọi geocoder - mặc định theo chính sách Nominatim (tối đa 1 yêu cầu / giây).
+- GeocodingService: tra cache -> chờ token -> gọi geocoder; geocode_async / reverse_async chạy trên luồng
+  riêng và trả về Future (kết quả có sẵn trong cache thì Future đã xong ngay).
+  Tra ngược hỏi trước OfflineGeocoder (offline_geocoder.py) nếu có: nơi đã biết gần nhất cách không quá
+  OFFLINE_MAX_DISTANCE_KM thì trả lời ngay, không gọi mạng; geocoder lỗi (mất mạng) thì dùng nơi gần nhất đó.
+geocoder là đối tượng kiểu geopy: geocode(query, timeout=...) -> có .latitude / .longitude,
+reverse((lat, lng), exactly_one=True, timeout=...) -> có .address (kiểm thử dùng geocoder giả).
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional, Tuple
+
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'geocode.sqlite')
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600 # Kết quả tìm thấy: 30 ngày
+NEGATIVE_TTL_SECONDS = 24 * 3600 # Kết quả "không tìm thấy": 1 ngày
+COORD_PRECISION = 5 # Số chữ số thập phân của tọa độ trong khóa tra ngược (~1 m)
+NOMINATIM_RATE = 1.0 # Chính sách Nominatim: tối đa 1 yêu cầu / giây
+DEFAULT_TIMEOUT = 5 # Giây chờ mỗi yêu cầu geocoder
+USER_AGENT = "ev_route_app"
+OFFLINE_MAX_DISTANCE_KM = 1.0 # Nơi đã biết gần hơn khoảng này -> trả lời offline, không gọi geocoder
+
+_MISSING = object()
+
+
+def normalize_address(address: str) -> str:
+    """Chuẩn hóa địa chỉ làm khóa cache: Unicode NFC, chữ thường, gộp khoảng trắng, bỏ dấu phẩy thừa."""
+    text = unicodedata.normalize('NFC', address).lower()
+    text = re.sub(r'\s*,\s*', ', ', text)
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip(' ,')
+
+
+def coord_key(lat: float, lng: float, precision: int = COORD_PRECISION) -> str:
+    """Khóa tra ngược: tọa độ làm tròn precision chữ số."""
+    return f"{round(lat, precision):.{precision}f},{round(lng, precision):.{precision}f}"
+
+
+class GeocodeCache:
+    """
+    Cache SQLite có TTL, bảng geocode(kind, key, value JSON, expires). kind: 'forward' / 'reverse'.
+    value None = đã tra nhưng không tìm thấy. Dùng chung được giữa các luồng (một kết nối + khóa).
+    path=':memory:' cho cache chỉ trong bộ nhớ.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, ttl: float = DEFAULT_TTL_SECONDS, negative_ttl: float = NEGATIVE_TTL_SECONDS,
+                 clock: Callable[[], float] = time.time):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS geocode (kind TEXT NOT NULL, key TEXT NOT NULL, value TEXT, "
+                               "expires REAL NOT NULL, PRIMARY KEY (kind, key))")
+
+    def get(self, kind: str, key: str) -> Any:
+        """Giá trị còn hạn của (kind, key); _MISSING nếu chưa có hoặc đã hết hạn (hàng hết hạn bị xóa)."""
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires FROM geocode WHERE kind = ? AND key = ?", (kind, key)).fetchone()
+            if row is None:
+                return _MISSING
+            if row[1] <= self.clock():
+                with self._conn:
+                    self._conn.execute("DELETE FROM geocode WHERE kind = ? AND key = ?", (kind, key))
+                return _MISSING
+        return json.loads(row[0])
+
+    def put(self, kind: str, key: str, value: Any) -> None:
+        expires = self.clock() + (self.ttl if value is not None else self.negative_ttl)
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO geocode (kind, key, value, expires) VALUES (?, ?, ?, ?)",
+                               (kind, key, json.dumps(value, ensure_ascii=False), expires))
+
+    def purge_expired(self) -> int:
+        """Xóa mọi hàng đã hết hạn, trả về số hàng đã xóa."""
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM geocode WHERE expires <= ?", (self.clock(),)).rowcount
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM geocode").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class TokenBucket:
+    """Giới hạn tần suất: rate token / giây, tối đa capacity token dồn lại. acquire() chờ tới khi có token."""
+
+    def __init__(self, rate: float = NOMINATIM_RATE, capacity: float = 1.0,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def acquire(self) -> float:
+        """Lấy một token (chờ nếu cần), trả về số giây đã chờ."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            self.sleep(delay)
+            waited += delay
+
+
+class GeocodingService:
+    """
+    Tra địa chỉ / tọa độ qua cache -> giới hạn tần suất -> geocoder.
+    geocoder mặc định: Nominatim của geopy (import khi gọi geocoder lần đầu).
+    Lỗi của geocoder (timeout, mạng) được ném lại và không lưu vào cache.
+    offline: OfflineGeocoder cho tra ngược (gán sau được, vd. khi dữ liệu trạm nạp xong).
+    """
+
+    def __init__(self, geocoder: Any = None, cache: Optional[GeocodeCache] = None, rate_limiter: Optional[TokenBucket] = None,
+                 timeout: float = DEFAULT_TIMEOUT, offline: Any = None, offline_max_km: float = OFFLINE_MAX_DISTANCE_KM):
+        self._geocoder = geocoder
+        self.cache = cache if cache is not None else GeocodeCache()
+        self.rate_limiter = rate_limiter if rate_limiter is not None else TokenBucket()
+        self.timeout = timeout
+        self.offline = offline
+        self.offline_max_km = offline_max_km
+        self.requests = 0 # Số lần gọi geocoder thật (cache miss)
+        self.offline_hits = 0 # Số lần tra ngược trả lời bằng OfflineGeocoder
+        # Một luồng: các yêu cầu tới geocoder đi tuần tự, đúng giới hạn tần suất
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='geocoding')
+
+    @property
+    def geocoder(self) -> Any:
+        if self._geocoder is None:
+            from geopy.geocoders import Nominatim
+            self._geocoder = Nominatim(user_agent=USER_AGENT)
+        return self._geocoder
+
+    def _lookup(self, kind: str, key: str, fetch: Callable[[], Any]) -> Any:
+        value = self.cache.get(kind, key)
+        if value is _MISSING:
+            self.rate_limiter.acquire()
+            self.requests += 1
+            value = fetch()
+            self.cache.put(kind, key, value)
+        return value
+
+    def geocode(self, address: str) -> Optional[Tuple[float, float]]:
+        """Địa chỉ -> (lat, lng); None nếu không tìm thấy."""
+        def fetch():
+            location = self.geocoder.geocode(address, timeout=self.timeout)
+            return [location.latitude, location.longitude] if location else None
+        value = self._lookup('forward', normalize_address(address), fetch)
+        return tuple(value) if value is not None else None
+
+    def _offline_nearby(self, lat: float, lng: float) -> Tuple[Any, Optional[str]]:
+        """(nơi đã biết gần nhất hoặc None, địa chỉ nếu đủ gần để trả lời offline)."""
+        place = self.offline.nearest(lat, lng) if self.offline is not None else None
+        if place is not None and place.distance_km <= self.offline_max_km:
+            self.offline_hits += 1
+            return place, place.address
+        return place, None
+
+    def reverse(self, lat: float, lng: float) -> Optional[str]:
+        """(lat, lng) -> địa chỉ; None nếu không tìm thấy."""
+        place, address = self._offline_nearby(lat, lng)
+        if address is not None:
+            return address
+
+        def fetch():
+            location = self.geocoder.reverse((lat, lng), exactly_one=True, timeout=self.timeout)
+            return location.address if location and location.address else None
+        try:
+            return self._lookup('reverse', coord_key(lat, lng), fetch)
+        except Exception:
+            if place is None:
+                raise
+            return place.describe() # Geocoder không trả lời được: dùng nơi đã biết gần nhất
+
+    @staticmethod
+    def _done(value: Any) -> 'Future':
+        future = Future()
+        future.set_result(value)
+        return future
+
+    def _submit(self, kind: str, key: str, lookup: Callable[[], Any], convert: Callable[[Any], Any]) -> 'Future':
+        value = self.cache.get(kind, key)
+        if value is not _MISSING: # Có sẵn trong cache: không cần chuyển luồng
+            return self._done(convert(value))
+        return self._executor.submit(lookup)
+
+    def geocode_async(self, address: str) -> 'Future':
+        """Như geocode() nhưng chạy trên luồng geocoding, trả về Future."""
+        return self._submit('forward', normalize_address(address), lambda: self.geocode(address),
+                            lambda value: tuple(value) if value is not None else None)
+
+    def reverse_async(self, lat: float, lng: float) -> 'Future':
+        """Như reverse() nhưng chạy trên luồng geocoding, trả về Future."""
+        _, address = self._offline_nearby(lat, lng)
+        if address is not None:
+            return self._done(address)
+        return self._submit('reverse', coord_key(lat, lng), lambda: self.reverse(lat, lng), lambda value: value)
+
+    def close(self) -> None:
+        """Dừng luồng geocoding (bỏ các yêu cầu chưa chạy) và đóng cache."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.cache.close()
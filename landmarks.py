@@ -0,0 +1,118 @@
+"""
+Heuristic ALT (A*, Landmarks, Triangle inequality) cho tìm kiếm A* giữa các trạm sạc.
+
+Chọn offline một số trạm mốc (landmark) trên đồ thị trạm kề của mỗi quãng đường xe,
+tính sẵn khoảng cách ngắn nhất từ mỗi mốc tới mọi trạm. Theo bất đẳng thức tam giác
+(đồ thị vô hướng): d(v, t) >= |d(L, t) - d(L, v)| với mọi mốc L.
+Cận dưới này chặt hơn Haversine x ROAD_FACTOR khi lộ trình phải đi vòng.
+"""
+import os
+from typing import Dict, Tuple, Optional
+
+import numpy as np
+
+import station_graph
+from station_graph import ReachabilityGraph, graph_dijkstra
+
+ALT_LANDMARKS = 8 # Số trạm mốc mặc định
+
+# Cache trong bộ nhớ: (version, max_km, road_factor, số mốc) -> LandmarkTable
+_landmark_cache: Dict[Tuple[str, float, float, int], 'LandmarkTable'] = {}
+
+
+class LandmarkTable:
+    """Bảng khoảng cách mốc: dist[i, v] = khoảng cách ngắn nhất từ mốc landmarks[i] tới trạm v."""
+    __slots__ = ('landmarks', 'dist')
+
+    def __init__(self, landmarks: np.ndarray, dist: np.ndarray):
+        self.landmarks = landmarks
+        self.dist = dist
+
+    def lower_bounds(self, target: int) -> np.ndarray:
+        """
+        Cận dưới d(v, target) cho mọi trạm v. np.inf nghĩa là v chắc chắn không tới được target
+        (một mốc tới được target nhưng không tới được v -> khác thành phần liên thông).
+        """
+        to_target = self.dist[:, target][:, None]
+        with np.errstate(invalid='ignore'):
+            diff = np.abs(to_target - self.dist)
+        diff[np.isnan(diff)] = 0.0 # Cả hai đều không tới được mốc: không có thông tin
+        if len(self.landmarks) == 0:
+            return np.zeros(self.dist.shape[1])
+        return diff.max(axis=0)
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, landmarks=self.landmarks, dist=self.dist)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'LandmarkTable':
+        with np.load(path) as data:
+            return cls(data['landmarks'], data['dist'])
+
+
+def build_landmark_table(graph: ReachabilityGraph, count: int = ALT_LANDMARKS) -> LandmarkTable:
+    """
+    Chọn mốc theo kiểu "điểm xa nhất": mốc đầu là trạm xa trạm 0 nhất, mỗi mốc tiếp theo là trạm
+    có khoảng cách (trên đồ thị) tới tập mốc đã chọn lớn nhất. Trạm không tới được từ mốc nào
+    được ưu tiên để mỗi thành phần liên thông đều có mốc.
+    """
+    n = graph.num_nodes
+    count = min(count, n)
+    if count == 0:
+        return LandmarkTable(np.zeros(0, dtype=np.int64), np.zeros((0, n)))
+
+    landmarks = []
+    rows = []
+    seed_dist = graph_dijkstra(graph, 0)
+    next_landmark = int(np.argmax(np.where(np.isinf(seed_dist), -1.0, seed_dist)))
+    nearest_to_set = np.full(n, np.inf)
+    for _ in range(count):
+        landmarks.append(next_landmark)
+        row = graph_dijkstra(graph, next_landmark)
+        rows.append(row)
+        nearest_to_set = np.minimum(nearest_to_set, row)
+        # Trạm chưa có mốc nào tới được (inf) sẽ được chọn trước
+        score = np.where(np.isinf(nearest_to_set), np.finfo(np.float64).max, nearest_to_set)
+        score[landmarks] = -1.0
+        next_landmark = int(np.argmax(score))
+    return LandmarkTable(np.array(landmarks, dtype=np.int64), np.vstack(rows))
+
+
+def landmark_cache_path(version: str, max_km: float, road_factor: float, count: int, cache_dir: Optional[str] = None) -> str:
+    cache_dir = station_graph.CACHE_DIR if cache_dir is None else cache_dir
+    return os.path.join(cache_dir, f"alt_{version[:16]}_{max_km:g}km_rf{road_factor:g}_L{count}.npz")
+
+
+def get_landmark_table(graph: ReachabilityGraph, version: str, count: int = ALT_LANDMARKS,
+                       cache_dir: Optional[str] = None) -> LandmarkTable:
+    """Lấy bảng mốc cho đồ thị: bộ nhớ -> đĩa -> dựng mới (và ghi ra đĩa). cache_dir=None: station_graph.CACHE_DIR."""
+    if cache_dir is None:
+        cache_dir = station_graph.CACHE_DIR
+    key = (version, float(graph.max_km), float(graph.road_factor), count)
+    table = _landmark_cache.get(key)
+    if table is not None:
+        return table
+
+    path = landmark_cache_path(version, graph.max_km, graph.road_factor, count, cache_dir) if cache_dir else None
+    if path and os.path.exists(path):
+        try:
+            table = LandmarkTable.load(path)
+            if table.dist.shape[1] != graph.num_nodes:
+                table = None
+        except Exception as e:
+            print(f"Lỗi khi đọc cache mốc ALT {path}: {e}")
+            table = None
+
+    if table is None:
+        table = build_landmark_table(graph, count)
+        if path:
+            try:
+                table.save(path)
+            except OSError as e:
+                print(f"Không ghi được cache mốc ALT {path}: {e}")
+
+    _landmark_cache[key] = table
+    return table
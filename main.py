@@ -1,131 +1,83 @@
 import tkinter as tk
 from tkinter import messagebox, scrolledtext, Toplevel, ttk # Thêm ttk để styling
-import pandas as pd
-from typing import Optional, List, Tuple, Dict, Any
-import numpy as np
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut
-import heapq
+from typing import Optional, List, Tuple, Dict, Any, TYPE_CHECKING
+import queue
+import threading
 import time
-from math import radians, sin, cos, sqrt, atan2
-import re 
-import folium 
 import webbrowser 
 import os 
 from models import ElectricCar,cars
+from search_stats import emit_search_stats, format_search_stats
+from route_cache import RouteCache
+from search_control import SearchControl
 
-try:
-    from file import astar_charging_stations, run_astar_search, run_ucs_search, TIMEOUT_SECONDS, AVG_SPEED_KMH, R_EARTH, ROAD_FACTOR, haversine, find_nearest_node
-except ImportError:
-    messagebox.showerror("Lỗi", "Thiếu file.py hoặc không import được các hàm cần thiết từ file.py.")
-    # Fallback cho các biến
-    TIMEOUT_SECONDS = 240 
-    AVG_SPEED_KMH = 100 
-    R_EARTH = 6371.0
-    ROAD_FACTOR = 1.25
-    
-    def run_astar_search(*args): return {"error": "Không thể chạy A* (thiếu file.py)"}
-    def run_ucs_search(*args): return {"error": "Không thể chạy UCS (thiếu file.py)"}
-    def haversine(lat1, lng1, lat2, lng2): return 0
-    def find_nearest_node(lat, lng, df_charge): return 'unknown'
-
+if TYPE_CHECKING:
+    import pandas as pd
 
-# Import các hàm BOT/PDF (Giả định từ pdf_utils.py)
-try:
-    from pdf_utils import export_route_to_pdf, check_bot_stations, load_bot_stations
-except ImportError:
-    # Fallback nếu không import được
-    def export_route_to_pdf(model, pin, start_coords, end_coords, summary, details):
-        messagebox.showerror("Lỗi", "Thiếu file pdf_utils.py hoặc hàm export_route_to_pdf.")
-    def check_bot_stations(route_points, df_bot): return []
-    def load_bot_stations(filename='bot_stations.csv'): return pd.DataFrame()
+# Các module nặng được import khi cần lần đầu để cửa sổ hiện ngay:
+# - file.py (pandas, numpy), pdf_utils.py (hàm BOT) và dữ liệu trạm: trên luồng nền lúc khởi động (_load_app_data)
+# - route_map.py: khi vẽ bản đồ; fpdf (pdf_utils.export_route_to_pdf): khi xuất PDF; geocoding.py / geopy: khi tra địa chỉ lần đầu
+DATA_POLL_MS = 50 # Chu kỳ kiểm tra luồng nạp dữ liệu (ms)
+SEARCH_POLL_MS = 50 # Chu kỳ kiểm tra luồng tìm kiếm (tiến độ / kết quả, ms)
+GEOCODE_POLL_MS = 50 # Chu kỳ kiểm tra kết quả tra địa chỉ / tọa độ (ms)
 
+# Hàm tìm kiếm / BOT, gán khi luồng nền import xong file.py và pdf_utils.py (_import_backend)
+run_astar_search = run_ucs_search = prepare_station_graphs = None
+check_bot_stations = load_bot_stations = None
 
-# ======================= #
-# HÀM TẠO BẢN ĐỒ VỚI FOLIUM
-# ======================= #
 
-def create_route_map(route_points: List[Tuple[float, float]], df_charge: pd.DataFrame, bot_stations: List[Dict]) -> str:
+def _import_backend() -> List[str]:
     """
-    Tạo bản đồ tương tác (HTML) sử dụng Folium hiển thị lộ trình, trạm sạc và trạm BOT.
-    (Giữ nguyên như code gốc để tránh thay đổi logic Folium)
+    Import file.py và các hàm BOT của pdf_utils.py, dùng bản dự phòng nếu thiếu file.
+    Trả về danh sách thông báo lỗi (hiển thị sau trên luồng GUI).
     """
-    if not route_points:
-        return ""
+    global run_astar_search, run_ucs_search, prepare_station_graphs, check_bot_stations, load_bot_stations
+    errors = []
+    try:
+        from file import run_astar_search, run_ucs_search, prepare_station_graphs
+    except ImportError:
+        errors.append("Thiếu file.py hoặc không import được các hàm cần thiết từ file.py.")
+        def run_astar_search(*args, **kwargs): return {"error": "Không thể chạy A* (thiếu file.py)"}
+        def run_ucs_search(*args, **kwargs): return {"error": "Không thể chạy UCS (thiếu file.py)"}
+        def prepare_station_graphs(df_charge, cars): return {}
+
+    # Import các hàm BOT (Giả định từ pdf_utils.py)
+    try:
+        from pdf_utils import check_bot_stations, load_bot_stations
+    except ImportError:
+        # Fallback nếu không import được
+        import pandas as pd
+        def check_bot_stations(route_points, df_bot, station_ids=None): return []
+        def load_bot_stations(filename='bot_stations.csv'): return pd.DataFrame()
+    return errors
 
-    # Tạo bản đồ, tập trung vào điểm bắt đầu
-    start_lat, start_lng = route_points[0]
-    m = folium.Map(location=[start_lat, start_lng], zoom_start=6)
 
-    # 1. Vẽ Lộ trình
-    folium.PolyLine(locations=route_points, color="blue", weight=5, opacity=0.7).add_to(m)
+# ======================= #
+# HÀM TẠO BẢN ĐỒ
+# ======================= #
 
-    # 2. Đánh dấu các điểm trên lộ trình
-    for i, (lat, lng) in enumerate(route_points):
-        popup_text = f"Lat: {lat:.4f}, Lng: {lng:.4f}"
-        
-        icon = 'info'
-        color = 'gray'
-        
-        if i == 0:
-            color = 'green'
-            icon = 'play'
-            popup_text = "Điểm BẮT ĐẦU"
-        elif i == len(route_points) - 1:
-            color = 'red'
-            icon = 'flag'
-            popup_text = "Điểm KẾT THÚC"
-        else:
-            # Đây là một trạm sạc
-            # Cần kiểm tra kỹ vì tọa độ trạm sạc có thể bị làm tròn khi lưu
-            info_row = df_charge[
-                (abs(df_charge['lat'].astype(float) - lat) < 1e-4) & 
-                (abs(df_charge['lng'].astype(float) - lng) < 1e-4)
-            ]
-            if not info_row.empty:
-                station_name = info_row.iloc[0]['name']
-                popup_text = f"Trạm Sạc: {station_name}"
-                color = 'orange'
-                icon = 'bolt'
-
-        folium.Marker(
-            [lat, lng],
-            popup=popup_text,
-            icon=folium.Icon(color=color, icon=icon, prefix='fa')
-        ).add_to(m)
-        
-    # 3. Đánh dấu các trạm BOT đi qua (nếu có)
-    for bot in bot_stations:
-        bot_lat = float(bot['lat'])
-        bot_lng = float(bot['lng'])
-        bot_name = bot['name']
-        
-        folium.CircleMarker(
-            location=[bot_lat, bot_lng],
-            radius=10,
-            color='#FF00FF', # Màu hồng
-            fill=True,
-            fill_color='#FF00FF',
-            fill_opacity=0.6,
-            popup=f"Trạm BOT: {bot_name} - Phí: {bot['fee']}"
-        ).add_to(m)
-
-
-    # Lưu bản đồ vào file HTML tạm
-    map_file_path = os.path.join(os.getcwd(), "route_map_temp.html")
-    m.save(map_file_path)
-    return map_file_path
+def create_route_map(route_points: List[Tuple[float, float]], df_charge: 'pd.DataFrame', bot_stations: List[Dict],
+                     station_ids: Optional[List[Optional[int]]] = None, df_bot: Optional['pd.DataFrame'] = None,
+                     catalogue=None) -> str:
+    """
+    Tạo bản đồ tương tác (HTML, Leaflet) hiển thị lộ trình, trạm sạc và trạm BOT (route_map.py).
+    Lớp mọi trạm sạc / BOT được dựng một lần và dùng lại; mỗi lần tìm chỉ ghi lớp lộ trình ra một file riêng.
+    station_ids: id trạm (station_catalogue.py) tương ứng từng điểm của route_points (None = không phải trạm);
+    không có thì tra trạm theo tọa độ qua chỉ mục của catalogue.
+    """
+    from route_map import render_route_map # Import khi vẽ bản đồ lần đầu
+    return render_route_map(route_points, df_charge, bot_stations, station_ids, df_bot=df_bot, catalogue=catalogue)
 
 # --- HÀM TRỢ GIÚP ---
-def load_charging_stations(filename='charging_stations.csv'):
-    """Tải dữ liệu trạm sạc"""
+def load_charging_stations(filename='charging_stations.csv', warn=None):
+    """
+    Tải dữ liệu trạm sạc (qua cache nhị phân của data_loader.py).
+    warn(tiêu đề, nội dung): hàm báo cảnh báo (mặc định messagebox; luồng nền truyền hàm ghi lại để hiển thị sau).
+    """
+    import data_loader
+    import pandas as pd
     try:
-        df = pd.read_csv(filename, skipinitialspace=True)
-        df = df[df['lat'].notnull() & df['lng'].notnull()]
-        # Đảm bảo cột lat/lng là float
-        df['lat'] = df['lat'].astype(float)
-        df['lng'] = df['lng'].astype(float)
-        return df.reset_index(drop=True)
+        return data_loader.load_charging_stations(filename)
     except FileNotFoundError:
         # Tạo file mẫu nếu không tồn tại
         sample_data = {
@@ -135,7 +87,7 @@ def load_charging_stations(filename='charging_stations.csv'):
             'lng': [105.854, 105.77, 106.701]
         }
         df = pd.DataFrame(sample_data)
-        messagebox.showwarning("Cảnh báo", f"Không tìm thấy file dữ liệu: {filename}. Đã sử dụng dữ liệu mẫu.")
+        (warn or messagebox.showwarning)("Cảnh báo", f"Không tìm thấy file dữ liệu: {filename}. Đã sử dụng dữ liệu mẫu.")
         return df.reset_index(drop=True)
 
 
@@ -161,21 +113,27 @@ class ElectricCarRoutingApp:
         master.title("Hệ thống Lập kế hoạch lộ trình Xe điện")
         master.state('zoomed')  # Mở rộng tối đa nhưng vẫn có nút đóng/min/max
         
-        self.df_charge = load_charging_stations()
-        self.df_bot = load_bot_stations() # Tải dữ liệu BOT
-        
-        if self.df_charge.empty and not self.df_charge.columns.empty:
-            messagebox.showerror("Lỗi Dữ liệu", "Dữ liệu trạm sạc không hợp lệ.")
-            master.quit()
-            return
+        # Dữ liệu trạm sạc / BOT, catalogue, đồ thị trạm kề và cache lộ trình được nạp trên luồng nền
+        # (_load_app_data); nút tìm kiếm chỉ bật khi đã nạp xong (_poll_app_data)
+        self.df_charge = None
+        self.df_bot = None
+        self.catalogue = None
+        self.route_cache = None
+        self.offline_geocoder = None
+        self.data_ready = False
+        self._data_queue = queue.Queue()
+        # Tìm kiếm chạy trên luồng riêng (_run_search_worker), hủy / báo tiến độ qua SearchControl
+        self._search_control = None
+        self._search_queue = queue.Queue()
+        master.protocol("WM_DELETE_WINDOW", self._on_close)
             
         self.car_names = [car.name for car in cars]
         self.selected_car = tk.StringVar(master)
         self.selected_car.set(self.car_names[0]) 
         self.map_file_path = None 
 
-        # Thuật toán lựa chọn: A* hoặc UCS
-        self.algorithms = ["A*", "UCS"]
+        # Thuật toán lựa chọn: A*, UCS hoặc tìm kiếm hai chiều
+        self.algorithms = ["A*", "UCS", "Bidirectional"]
         self.selected_algorithm = tk.StringVar(master)
         self.selected_algorithm.set(self.algorithms[0])
 
@@ -183,8 +141,8 @@ class ElectricCarRoutingApp:
         self.is_dark_mode = True
         self.current_theme = DARK_THEME
         
-        # Geocoder cho reverse geocoding
-        self.geolocator = Nominatim(user_agent="ev_route_app")
+        # Dịch vụ geocoding (cache SQLite + giới hạn tần suất, tạo khi tra địa chỉ lần đầu, xem thuộc tính geocoding)
+        self._geocoding = None
         # --- TẠO CÁC KHUNG CHÍNH ---
         self.config_frame = tk.LabelFrame(master, text="CẤU HÌNH LỘ TRÌNH", padx=10, pady=10)
         self.config_frame.pack(side=tk.LEFT, fill="y", padx=10, pady=10)
@@ -222,6 +180,79 @@ class ElectricCarRoutingApp:
         # Áp dụng theme ban đầu
         self.apply_theme(DARK_THEME)
 
+        # Nạp dữ liệu trên luồng nền; cửa sổ hiện ngay, luồng GUI kiểm tra kết quả theo chu kỳ
+        threading.Thread(target=self._load_app_data, daemon=True).start()
+        master.after(DATA_POLL_MS, self._poll_app_data)
+
+    def _load_app_data(self):
+        """Luồng nền: import file.py / pdf_utils.py, tải dữ liệu trạm sạc và BOT, dựng trước đồ thị trạm kề."""
+        try:
+            warnings = [] # Cảnh báo cần hiển thị (messagebox chỉ gọi trên luồng GUI)
+            errors = _import_backend()
+            df_charge = load_charging_stations(warn=lambda title, message: warnings.append((title, message)))
+            df_bot = load_bot_stations() # Tải dữ liệu BOT
+            from station_catalogue import get_station_catalogue
+            from station_graph import CACHE_DIR
+
+            catalogue = None
+            offline_geocoder = None
+            if not (df_charge.empty and not df_charge.columns.empty):
+                catalogue = get_station_catalogue(df_charge) # Tra cứu trạm theo id / tên / tọa độ, dùng chung mọi bước
+                # Dựng trước đồ thị trạm kề cho từng quãng đường xe (nạp từ .cache/ nếu đã có)
+                try:
+                    prepare_station_graphs(df_charge, cars)
+                except Exception as e:
+                    print(f"Không dựng trước được đồ thị trạm sạc: {e}")
+                # Tra ngược địa chỉ không cần mạng từ địa chỉ trạm sạc / BOT (và gazetteer.csv nếu có)
+                try:
+                    from offline_geocoder import build_offline_geocoder
+                    offline_geocoder = build_offline_geocoder(df_charge, df_bot)
+                except Exception as e:
+                    print(f"Không dựng được bộ tra địa chỉ offline: {e}")
+
+            # Cache chặng giữa các trạm (LRU, lưu ra .cache/ khi đóng ứng dụng)
+            route_cache = RouteCache(path=os.path.join(CACHE_DIR, 'route_cache.pkl'))
+            self._data_queue.put((df_charge, df_bot, catalogue, route_cache, offline_geocoder, errors, warnings))
+        except Exception as e:
+            self._data_queue.put(e)
+
+    def _poll_app_data(self):
+        """Luồng GUI: nhận dữ liệu từ luồng nền, báo lỗi / cảnh báo rồi bật nút tìm kiếm."""
+        try:
+            loaded = self._data_queue.get_nowait()
+        except queue.Empty:
+            self.master.after(DATA_POLL_MS, self._poll_app_data)
+            return
+        if isinstance(loaded, Exception):
+            messagebox.showerror("Lỗi Khởi tạo", f"Không tải được dữ liệu: {loaded}.")
+            return
+
+        self.df_charge, self.df_bot, self.catalogue, self.route_cache, self.offline_geocoder, errors, warnings = loaded
+        if self._geocoding is not None:
+            self._geocoding.offline = self.offline_geocoder
+        for message in errors:
+            messagebox.showerror("Lỗi", message)
+        for title, message in warnings:
+            messagebox.showwarning(title, message)
+        if self.catalogue is None:
+            messagebox.showerror("Lỗi Dữ liệu", "Dữ liệu trạm sạc không hợp lệ.")
+            self.master.quit()
+            return
+        self.data_ready = True
+        self._update_search_button_text()
+        self.btn_search.config(state=tk.NORMAL)
+
+    @property
+    def geocoding(self):
+        """
+        Dịch vụ geocoding (geocoding.py): Nominatim qua cache SQLite trong .cache/, tối đa 1 yêu cầu / giây;
+        tra ngược dùng bộ tra offline (offline_geocoder.py) khi gần một địa chỉ đã biết hoặc khi mất mạng
+        """
+        if self._geocoding is None:
+            from geocoding import GeocodingService
+            self._geocoding = GeocodingService(offline=self.offline_geocoder)
+        return self._geocoding
+
     def apply_theme(self, theme):
         """Áp dụng theme (Light/Dark) cho toàn bộ GUI"""
         self.master.config(bg=theme["bg"])
@@ -333,52 +364,69 @@ class ElectricCarRoutingApp:
         self.entry_end_address.bind('<FocusOut>', lambda e: self._update_end_coords_from_address())
 
     def _update_start_address_from_coords(self):
-        value = self.entry_start.get().strip()
-        try:
-            lat, lng = [float(x.strip()) for x in value.split(',')]
-            address = self.reverse_geocode(lat, lng)
-            self.entry_start_address.delete(0, tk.END)
-            self.entry_start_address.insert(0, address)
-        except Exception:
-            pass
+        self._update_address_from_coords(self.entry_start, self.entry_start_address)
 
     def _update_start_coords_from_address(self):
-        address = self.entry_start_address.get().strip()
-        if address:
-            try:
-                location = self.geolocator.geocode(address, timeout=5)
-                if location:
-                    coords = f"{location.latitude},{location.longitude}"
-                    self.entry_start.delete(0, tk.END)
-                    self.entry_start.insert(0, coords)
-                else:
-                    messagebox.showerror("Không tìm thấy địa chỉ", f"Không thể tìm thấy tọa độ cho địa chỉ: {address}")
-            except Exception:
-                messagebox.showerror("Lỗi tra cứu địa chỉ", f"Đã xảy ra lỗi khi tra cứu địa chỉ: {address}")
+        self._update_coords_from_address(self.entry_start_address, self.entry_start)
 
     def _update_end_address_from_coords(self):
-        value = self.entry_end.get().strip()
+        self._update_address_from_coords(self.entry_end, self.entry_end_address)
+
+    def _update_end_coords_from_address(self):
+        self._update_coords_from_address(self.entry_end_address, self.entry_end)
+
+    def _update_address_from_coords(self, entry_coords, entry_address):
+        """Tra địa chỉ của tọa độ trong entry_coords trên luồng geocoding, điền vào entry_address khi xong"""
+        value = entry_coords.get().strip()
         try:
             lat, lng = [float(x.strip()) for x in value.split(',')]
-            address = self.reverse_geocode(lat, lng)
-            self.entry_end_address.delete(0, tk.END)
-            self.entry_end_address.insert(0, address)
-        except Exception:
-            pass
+        except ValueError:
+            return
 
-    def _update_end_coords_from_address(self):
-        address = self.entry_end_address.get().strip()
-        if address:
+        def done(future):
+            if entry_coords.get().strip() != value:
+                return # Tọa độ đã đổi trong lúc chờ: bỏ kết quả cũ
+            entry_address.delete(0, tk.END)
+            entry_address.insert(0, self._address_text(future))
+        self._wait_geocode(self.geocoding.reverse_async(lat, lng), done)
+
+    def _update_coords_from_address(self, entry_address, entry_coords):
+        """Tra tọa độ của địa chỉ trong entry_address trên luồng geocoding, điền vào entry_coords khi xong"""
+        address = entry_address.get().strip()
+        if not address:
+            return
+
+        def done(future):
+            if entry_address.get().strip() != address:
+                return # Địa chỉ đã đổi trong lúc chờ: bỏ kết quả cũ
             try:
-                location = self.geolocator.geocode(address, timeout=5)
-                if location:
-                    coords = f"{location.latitude},{location.longitude}"
-                    self.entry_end.delete(0, tk.END)
-                    self.entry_end.insert(0, coords)
-                else:
-                    messagebox.showerror("Không tìm thấy địa chỉ", f"Không thể tìm thấy tọa độ cho địa chỉ: {address}")
+                location = future.result()
             except Exception:
                 messagebox.showerror("Lỗi tra cứu địa chỉ", f"Đã xảy ra lỗi khi tra cứu địa chỉ: {address}")
+                return
+            if location:
+                entry_coords.delete(0, tk.END)
+                entry_coords.insert(0, f"{location[0]},{location[1]}")
+            else:
+                messagebox.showerror("Không tìm thấy địa chỉ", f"Không thể tìm thấy tọa độ cho địa chỉ: {address}")
+        self._wait_geocode(self.geocoding.geocode_async(address), done)
+
+    def _wait_geocode(self, future, on_done):
+        """Luồng GUI: kiểm tra Future của dịch vụ geocoding theo chu kỳ, gọi on_done(future) khi xong"""
+        if future.done():
+            on_done(future)
+        else:
+            self.master.after(GEOCODE_POLL_MS, self._wait_geocode, future, on_done)
+
+    @staticmethod
+    def _address_text(future) -> str:
+        """Kết quả tra ngược -> chuỗi hiển thị (kể cả khi không tìm thấy / lỗi)"""
+        try:
+            address = future.result()
+        except Exception as e:
+            from geopy.exc import GeocoderTimedOut
+            return "Lỗi timeout khi lấy địa chỉ." if isinstance(e, GeocoderTimedOut) else "Không xác định được địa chỉ."
+        return address or "Không tìm thấy địa chỉ phù hợp."
 
     def switch_coords(self):
         start_val = self.entry_start.get()
@@ -394,30 +442,15 @@ class ElectricCarRoutingApp:
         self.entry_end_address.delete(0, tk.END)
         self.entry_end_address.insert(0, start_addr)
 
-    # Thêm cache cho geocoding
-    geocode_cache = {}
-
-    def reverse_geocode(self, lat, lng):
-        key = f"{lat:.6f},{lng:.6f}"
-        if key in self.geocode_cache:
-            return self.geocode_cache[key]
-        try:
-            location = self.geolocator.reverse((lat, lng), exactly_one=True, timeout=5)
-            if location and location.address:
-                self.geocode_cache[key] = location.address
-                return location.address
-            else:
-                self.geocode_cache[key] = "Không tìm thấy địa chỉ phù hợp."
-                return "Không tìm thấy địa chỉ phù hợp."
-        except GeocoderTimedOut:
-            return "Lỗi timeout khi lấy địa chỉ."
-        except Exception:
-            return "Không xác định được địa chỉ."
-
     # Đã loại bỏ hàm update_start_address và update_end_address vì không còn dùng nữa
     def _setup_buttons(self):
-        self.btn_search = tk.Button(self.config_frame, text="TÌM LỘ TRÌNH TỐI ƯU", command=self.run_search, bg="#4CAF50", fg="white", font=("Arial", 11, "bold"))
-        self.btn_search.pack(fill='x', pady=15)
+        self.btn_search = tk.Button(self.config_frame, text="ĐANG TẢI DỮ LIỆU...", command=self.run_search, bg="#4CAF50", fg="white", font=("Arial", 11, "bold"), state=tk.DISABLED)
+        self.btn_search.pack(fill='x', pady=(15, 5))
+        # Nút hủy và dòng tiến độ của lần tìm kiếm đang chạy
+        self.btn_cancel_search = tk.Button(self.config_frame, text="HỦY TÌM KIẾM", command=self.cancel_search, bg="#f44336", fg="white", font=("Arial", 10, "bold"), state=tk.DISABLED)
+        self.btn_cancel_search.pack(fill='x')
+        self.lbl_search_progress = tk.Label(self.config_frame, text="", anchor='w', font=("Arial", 9, "italic"), fg="#888")
+        self.lbl_search_progress.pack(fill='x', pady=(0, 10))
         # Theo dõi thay đổi thuật toán để cập nhật nút
         self.selected_algorithm.trace_add('write', self._update_search_button_text)
 
@@ -430,11 +463,16 @@ class ElectricCarRoutingApp:
         self.btn_show_map.pack(fill='x', pady=5)
 
     def _update_search_button_text(self, *args):
+        if not self.data_ready:
+            self.btn_search.config(text="ĐANG TẢI DỮ LIỆU...")
+            return
         algo = self.selected_algorithm.get()
         if algo == "A*":
             self.btn_search.config(text="TÌM LỘ TRÌNH TỐI ƯU (A*)")
         elif algo == "UCS":
             self.btn_search.config(text="TÌM LỘ TRÌNH TỐI ƯU (UCS)")
+        elif algo == "Bidirectional":
+            self.btn_search.config(text="TÌM LỘ TRÌNH TỐI ƯU (HAI CHIỀU)")
         else:
             self.btn_search.config(text="TÌM LỘ TRÌNH TỐI ƯU")
 
@@ -456,12 +494,32 @@ class ElectricCarRoutingApp:
         # THÊM: Thời gian xử lý thuật toán
         self.lbl_processing_time = tk.Label(self.summary_frame, text="Thời gian xử lý thuật toán: N/A", anchor='w', font=("Arial", 10, "italic"), fg="#888")
         self.lbl_processing_time.pack(fill='x', pady=(5, 0))
+        # Khung số liệu tìm kiếm (thu gọn mặc định)
+        self.btn_toggle_stats = tk.Button(self.summary_frame, text="▸ Số liệu tìm kiếm", command=self._toggle_search_stats, relief='flat', anchor='w', font=("Arial", 9), fg="#888")
+        self.btn_toggle_stats.pack(fill='x')
+        self.stats_frame = tk.Frame(self.summary_frame)
+        self.lbl_search_stats = tk.Label(self.stats_frame, text=format_search_stats({}), anchor='w', justify='left', font=("Consolas", 9), fg="#888")
+        self.lbl_search_stats.pack(fill='x')
+        self.stats_visible = False
 
         # Khung Chi tiết
         tk.Label(self.result_frame, text="CHI TIẾT LỘ TRÌNH (Trạm sạc & Hoạt động)", font=("Arial", 10, "bold")).pack(anchor='w', pady=(5, 0))
         self.txt_path = scrolledtext.ScrolledText(self.result_frame, width=50, height=20, font=("Consolas", 9), state='disabled')
         self.txt_path.pack(fill='both', expand=True)
 
+    def _toggle_search_stats(self):
+        """Mở / thu gọn khung số liệu tìm kiếm"""
+        self.stats_visible = not self.stats_visible
+        if self.stats_visible:
+            self.stats_frame.pack(fill='x', after=self.btn_toggle_stats)
+            self.btn_toggle_stats.config(text="▾ Số liệu tìm kiếm")
+        else:
+            self.stats_frame.pack_forget()
+            self.btn_toggle_stats.config(text="▸ Số liệu tìm kiếm")
+
+    def _show_search_stats(self, stats: Dict[str, Any]):
+        self.lbl_search_stats.config(text=format_search_stats(stats))
+
     def _get_selected_car(self) -> Optional[ElectricCar]:
         """Tìm đối tượng xe được chọn"""
         name = self.selected_car.get()
@@ -485,11 +543,14 @@ class ElectricCarRoutingApp:
         self.lbl_fee.config(text="Tổng chi phí sạc: N/A")
         self.lbl_bot_fee.config(text="Tổng phí qua các trạm BOT: N/A")
         self.lbl_processing_time.config(text="Thời gian xử lý thuật toán: N/A")
+        self.lbl_search_stats.config(text=format_search_stats({}))
         self.btn_show_map.config(state=tk.DISABLED) 
         self.map_file_path = None
 
     def run_search(self):
-        """Thực hiện tìm kiếm và hiển thị kết quả"""
+        """Kiểm tra input rồi chạy tìm kiếm trên luồng riêng; GUI vẫn phản hồi, có thể hủy giữa chừng"""
+        if not self.data_ready or self._search_control is not None:
+            return
         self._clear_summary() 
         self.btn_show_map.config(state=tk.DISABLED)
         self.map_file_path = None
@@ -512,41 +573,107 @@ class ElectricCarRoutingApp:
             messagebox.showerror("Lỗi Input", f"Dữ liệu nhập không hợp lệ: {e}")
             return
 
-        # 2. Chạy thuật toán theo lựa chọn
-        self.btn_search.config(text="ĐANG TÌM KIẾM...", state=tk.DISABLED, bg="orange")
-        self.master.update()
-        
-        start_time_algo = time.time()
-        
         algorithm = self.selected_algorithm.get()
-        if algorithm == "A*":
-            result = run_astar_search(car, start_coords[0], start_coords[1], end_coords[0], end_coords[1], pin_percent, qua_tram_thu_phi, self.df_charge)
-        elif algorithm == "UCS":
-            # Đã import run_ucs_search từ file.py (fallback nếu lỗi import)
-            result = run_ucs_search(car, start_coords[0], start_coords[1], end_coords[0], end_coords[1], pin_percent, qua_tram_thu_phi, self.df_charge)
-        else:
+        if algorithm not in self.algorithms:
             messagebox.showerror("Lỗi", "Thuật toán không hợp lệ!")
-            self._update_search_button_text()
-            self.btn_search.config(state=tk.NORMAL, bg="#4CAF50")
             return
-        
-        processing_time = time.time() - start_time_algo
-        
-        self.lbl_processing_time.config(text=f"Thời gian xử lý thuật toán: {processing_time:.3f} giây")
+
+        # 2. Chạy thuật toán theo lựa chọn trên luồng riêng
+        self.btn_search.config(text="ĐANG TÌM KIẾM...", state=tk.DISABLED, bg="orange")
+        self.btn_cancel_search.config(state=tk.NORMAL)
+        self.lbl_search_progress.config(text="Đang tìm kiếm...")
+        # on_progress chạy trên luồng tìm kiếm: chỉ đưa vào hàng đợi (gắn control như kết quả), luồng GUI đọc trong _poll_search
+        control = SearchControl(on_progress=lambda progress: self._search_queue.put(('progress', control, progress)))
+        self._search_control = control
+        search = (car, pin_percent, qua_tram_thu_phi, start_coords, end_coords, algorithm)
+        threading.Thread(target=self._run_search_worker, args=(control, search), daemon=True).start()
+        self.master.after(SEARCH_POLL_MS, self._poll_search, control, search)
+
+    def _run_search_worker(self, control: SearchControl, search: Tuple):
+        """Luồng tìm kiếm: chạy thuật toán đã chọn, gửi kết quả (hoặc lỗi) về luồng GUI qua hàng đợi"""
+        car, pin_percent, qua_tram_thu_phi, start_coords, end_coords, algorithm = search
+        start_time_algo = time.time()
+        try:
+            if algorithm == "A*":
+                result = run_astar_search(car, start_coords[0], start_coords[1], end_coords[0], end_coords[1], pin_percent, qua_tram_thu_phi, self.df_charge, emit_stats=False, cache=self.route_cache, control=control)
+            elif algorithm == "UCS":
+                # Đã import run_ucs_search từ file.py (fallback nếu lỗi import)
+                result = run_ucs_search(car, start_coords[0], start_coords[1], end_coords[0], end_coords[1], pin_percent, qua_tram_thu_phi, self.df_charge, emit_stats=False, cache=self.route_cache, control=control)
+            else:
+                # Tìm kiếm hai chiều, chính sách sạc và hậu xử lý giống A*
+                result = run_astar_search(car, start_coords[0], start_coords[1], end_coords[0], end_coords[1], pin_percent, qua_tram_thu_phi, self.df_charge, bidirectional=True, emit_stats=False, cache=self.route_cache, control=control)
+        except Exception as e:
+            self._search_queue.put(('error', control, e))
+            return
+        self._search_queue.put(('done', control, (result, time.time() - start_time_algo)))
+
+    def _poll_search(self, control: SearchControl, search: Tuple):
+        """Luồng GUI: cập nhật dòng tiến độ, hiển thị kết quả khi luồng tìm kiếm xong"""
+        finished = None
+        while finished is None:
+            try:
+                message = self._search_queue.get_nowait()
+            except queue.Empty:
+                break
+            if message[1] is not control: # Bỏ qua tiến độ / kết quả của lần tìm kiếm cũ
+                continue
+            if message[0] == 'progress':
+                progress = message[2]
+                self.lbl_search_progress.config(text=f"Đã mở rộng {progress['expanded']:,} nhãn | f tốt nhất: {progress['best_f']:.1f} km | {progress['elapsed_ms'] / 1000:.1f} giây")
+            else:
+                finished = message
+        if finished is None:
+            self.master.after(SEARCH_POLL_MS, self._poll_search, control, search)
+            return
+
+        self._search_control = None
+        self.btn_cancel_search.config(state=tk.DISABLED)
+        self.lbl_search_progress.config(text="")
         self._update_search_button_text()
         self.btn_search.config(state=tk.NORMAL, bg="#4CAF50")
+        if finished[0] == 'error':
+            messagebox.showerror("Lỗi Tìm kiếm", f"Đã xảy ra lỗi khi tìm kiếm: {finished[2]}")
+            return
+        result, processing_time = finished[2]
+        self._show_search_result(result, processing_time, *search)
+
+    def cancel_search(self):
+        """Hủy lần tìm kiếm đang chạy (tìm kiếm dừng ở bước kế tiếp, kết quả báo 'Đã hủy')"""
+        if self._search_control is not None:
+            self._search_control.cancel()
+            self.btn_cancel_search.config(state=tk.DISABLED)
+            self.lbl_search_progress.config(text="Đang hủy...")
+
+    def _show_search_result(self, result: Dict[str, Any], processing_time: float, car: ElectricCar, pin_percent: int,
+                            qua_tram_thu_phi: bool, start_coords: List[float], end_coords: List[float], algorithm: str):
+        """Hiển thị kết quả tìm kiếm: tóm tắt, chi tiết, phí BOT, bản đồ và dữ liệu cho PDF"""
+        self.lbl_processing_time.config(text=f"Thời gian xử lý thuật toán: {processing_time:.3f} giây")
+        search_stats = result.get('stats', {})
+        if 'cache' in search_stats:
+            search_stats.update({f"cache_{name}": value for name, value in self.route_cache.stats().items()})
 
         # 3. Hiển thị kết quả
         self.txt_path.config(state='normal')
         self.txt_path.delete('1.0', tk.END)
 
         if "error" in result:
-            messagebox.showerror("Lỗi Tìm kiếm", result['error'])
-            self.txt_path.insert(tk.END, f"LỖI: {result['error']}\nVui lòng kiểm tra lại tọa độ hoặc pin.")
+            emit_search_stats(search_stats, algorithm=algorithm, car=car.name, error=result['error'])
+            if search_stats.get('cancelled'):
+                self.txt_path.insert(tk.END, f"{result['error']}\nBấm tìm kiếm để chạy lại.")
+            else:
+                messagebox.showerror("Lỗi Tìm kiếm", result['error'])
+                self.txt_path.insert(tk.END, f"LỖI: {result['error']}\nVui lòng kiểm tra lại tọa độ hoặc pin.")
+            self.txt_path.config(state='disabled')
             self._clear_summary()
+            self._show_search_stats(search_stats)
             self.last_search_result = None
             return
 
+        # Không có lộ trình tránh hoàn toàn BOT: lộ trình dự phòng đi qua BOT -> tính phí như khi không tránh
+        toll_warning = result.get('canh_bao_bot')
+        if toll_warning:
+            qua_tram_thu_phi = False
+
         # Lấy tên trạm bắt đầu/kết thúc từ lộ trình
         # Sử dụng log đầu tiên và log cuối cùng (trước log điểm kết thúc)
         start_station = result['path'][0].get('address', '').replace('Di chuyển tới ', '')
@@ -554,30 +681,31 @@ class ElectricCarRoutingApp:
 
 
         # --- Tính toán phí BOT (ĐÃ HOÀN THIỆN) và Lấy Tọa độ Lộ trình ---
+        bot_check_start = time.time()
         route_points = []
+        route_station_ids = [] # id trạm (station_catalogue.py) của từng điểm, None với điểm bắt đầu/kết thúc
         # 1. Điểm bắt đầu thực tế
         route_points.append(tuple(start_coords)) 
-        # 2. Các trạm sạc/điểm trung gian
+        route_station_ids.append(None)
+        # 2. Các trạm sạc/điểm trung gian: tọa độ chính xác tra theo id trạm trong catalogue
         for step in result['path'][1:-1]:
-            node_name = step['node'].replace(' (TRẠM CUỐI)', '')
-            # Tìm lại tọa độ chính xác của trạm sạc từ df_charge
-            info_row = self.df_charge[self.df_charge['name'] == node_name]
-            if not info_row.empty:
-                lat = float(info_row.iloc[0]['lat'])
-                lng = float(info_row.iloc[0]['lng'])
-                route_points.append((lat, lng))
+            station_id = step.get('station_id')
+            if station_id is not None:
+                route_points.append(self.catalogue.coords(station_id))
+                route_station_ids.append(station_id)
         # 3. Điểm kết thúc thực tế
         route_points.append(tuple(end_coords))
+        route_station_ids.append(None)
 
-        bot_stations = check_bot_stations(route_points, self.df_bot)
+        bot_stations = check_bot_stations(route_points, self.df_bot, route_station_ids)
+        search_stats['bot_check_time'] = time.time() - bot_check_start
 
         # Tính tổng phí BOT
         total_bot_fee = 0
         bot_info_text = ""
         for bot in bot_stations:
-            fee_raw = re.sub(r'[^\d]', '', bot['fee'])
-            fee_int = int(fee_raw) if fee_raw else 0
-            
+            fee_int = bot['fee_vnd'] # Phí đã được phân tích thành số nguyên khi tải BOT.csv
+
             if not qua_tram_thu_phi:
                 total_bot_fee += fee_int
                 bot_info_text += f"- {bot['name']} ({bot['address']}): {bot['fee']}\n"
@@ -598,6 +726,8 @@ class ElectricCarRoutingApp:
 
         # --- Hiển thị Chi tiết ---
         full_path_text = f"TÓM TẮT:\n"
+        if toll_warning:
+            full_path_text += f"CẢNH BÁO: {toll_warning}\n"
         full_path_text += f"Xe: {car.name} | Pin ban đầu: {pin_percent}%\n"
         full_path_text += f"Thuật toán: {algorithm} | Thời gian xử lý: {processing_time:.3f} giây\n"
         full_path_text += f"Xuất phát: {self.entry_start_address.get()} (Gần trạm {start_station})\n"
@@ -637,12 +767,18 @@ class ElectricCarRoutingApp:
 
         # --- TẠO BẢN ĐỒ VÀ KÍCH HOẠT NÚT XEM BẢN ĐỒ ---
         try:
-            map_path = create_route_map(route_points, self.df_charge, bot_stations)
+            map_start = time.time()
+            map_path = create_route_map(route_points, self.df_charge, bot_stations, route_station_ids, df_bot=self.df_bot, catalogue=self.catalogue)
+            search_stats['map_time'] = time.time() - map_start
             if map_path:
                 self.map_file_path = map_path
                 self.btn_show_map.config(state=tk.NORMAL)
         except Exception as e:
-            messagebox.showwarning("Cảnh báo Bản đồ", f"Không thể tạo bản đồ (thiếu thư viện folium?): {e}")
+            messagebox.showwarning("Cảnh báo Bản đồ", f"Không thể tạo bản đồ: {e}")
+
+        # Số liệu tìm kiếm: hiển thị trong khung thu gọn và ghi log JSON (nếu bật EV_SEARCH_STATS_LOG)
+        emit_search_stats(search_stats, algorithm=algorithm, car=car.name)
+        self._show_search_stats(search_stats)
 
         # Lưu lại dữ liệu kết quả để xuất PDF
         summary_text = f"Tổng quãng đường di chuyển: {result['total_dist']:.2f} km\n"
@@ -656,8 +792,11 @@ class ElectricCarRoutingApp:
             'pin': pin_percent,
             'start_coords': self.entry_start.get(),
             'end_coords': self.entry_end.get(),
+            'start_address': self.entry_start_address.get(),
+            'end_address': self.entry_end_address.get(),
             'summary': summary_text,
-            'details': full_path_text
+            'details': full_path_text,
+            'stations': [self.catalogue.row(station_id) for station_id in route_station_ids if station_id is not None]
         }
 
     def export_pdf(self):
@@ -666,21 +805,40 @@ class ElectricCarRoutingApp:
             messagebox.showwarning("Cảnh báo", "Vui lòng chạy tìm kiếm lộ trình trước khi xuất PDF.")
             return
 
+        try:
+            from pdf_utils import export_route_to_pdf # Import fpdf khi xuất PDF lần đầu
+        except ImportError:
+            messagebox.showerror("Lỗi", "Thiếu file pdf_utils.py hoặc hàm export_route_to_pdf.")
+            return
+
         try:
             res = self.last_search_result
-            export_route_to_pdf(
+            filepath = export_route_to_pdf(
                 model=res['model'],
                 pin=res['pin'],
                 start_coords=res['start_coords'],
                 end_coords=res['end_coords'],
                 summary=res['summary'],
-                details=res['details']
+                details=res['details'],
+                stations=res['stations'],
+                start_address=res['start_address'],
+                end_address=res['end_address']
             )
-            messagebox.showinfo("Thành công", f"Đã xuất lộ trình ra file PDF!")
+            messagebox.showinfo("Thành công", f"Đã xuất lộ trình ra file PDF:\n{os.path.basename(filepath)}")
         
         except Exception as e:
             messagebox.showerror("Lỗi Xuất PDF", f"Đã xảy ra lỗi khi xuất file: {e}")
 
+    def _on_close(self):
+        """Hủy tìm kiếm đang chạy, lưu cache lộ trình ra đĩa, đóng dịch vụ geocoding rồi đóng cửa sổ"""
+        if self._search_control is not None:
+            self._search_control.cancel()
+        if self._geocoding is not None:
+            self._geocoding.close()
+        if self.route_cache is not None:
+            self.route_cache.save()
+        self.master.destroy()
+
     def show_map(self):
         """Mở bản đồ HTML trong trình duyệt mặc định"""
         if self.map_file_path and os.path.exists(self.map_file_path):
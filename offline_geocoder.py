@@ -0,0 +1,99 @@
+"""
+Tra ngược tọa độ -> địa chỉ không cần mạng, từ kho địa chỉ có sẵn trong dự án:
+- cột address của charging_stations.csv (thiếu địa chỉ thì dùng tên trạm)
+- cột địa chỉ của BOT.csv
+- (tùy chọn) gazetteer CSV tỉnh / huyện: cột name, lat, lng (file gazetteer.csv cạnh mã nguồn nếu có)
+Mọi điểm nằm trong một SpatialIndex (KD-tree trên mặt cầu), nên nearest() chỉ tốn vài chục micro giây.
+GeocodingService (geocoding.py) dùng kết quả này khi điểm đã biết gần nhất cách không quá
+geocoding.OFFLINE_MAX_DISTANCE_KM, chỉ hỏi geocoder trực tuyến khi xa hơn (hoặc dùng làm dự phòng khi mất mạng).
+"""
+import os
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from spatial_index import SpatialIndex
+
+GAZETTEER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gazetteer.csv')
+
+
+class OfflinePlace(NamedTuple):
+    address: str
+    distance_km: float
+    source: str # 'station' / 'bot' / 'gazetteer'
+
+    def describe(self) -> str:
+        """Chuỗi hiển thị khi điểm ở xa nơi đã biết (vd. khi mất mạng)."""
+        return f"Gần {self.address} (~{self.distance_km:.1f} km)"
+
+
+def _text_column(df: pd.DataFrame, column: str, fallback: Optional[str] = None) -> List[str]:
+    """Giá trị chuỗi của cột (đã strip); ô trống lấy từ cột fallback."""
+    values = df[column].tolist() if column in df.columns else [None] * len(df)
+    backup = df[fallback].tolist() if fallback and fallback in df.columns else [None] * len(df)
+    texts = []
+    for value, other in zip(values, backup):
+        text = str(value).strip() if isinstance(value, str) else ''
+        texts.append(text or (str(other).strip() if isinstance(other, str) else ''))
+    return texts
+
+
+def load_gazetteer(filename: str = GAZETTEER_FILE) -> Optional[pd.DataFrame]:
+    """Đọc gazetteer CSV (name, lat, lng); None nếu không có file."""
+    if not os.path.exists(filename):
+        return None
+    df = pd.read_csv(filename, skipinitialspace=True)
+    return df[df['lat'].notnull() & df['lng'].notnull()].reset_index(drop=True)
+
+
+class OfflineGeocoder:
+    """Danh sách nơi đã biết (địa chỉ, tọa độ, nguồn) + KD-tree; nearest(lat, lng) -> OfflinePlace."""
+
+    def __init__(self, lat: np.ndarray, lng: np.ndarray, addresses: List[str], sources: List[str]):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lng = np.asarray(lng, dtype=np.float64)
+        self.addresses = addresses
+        self.sources = sources
+        self.index = SpatialIndex(self.lat, self.lng)
+
+    def __len__(self) -> int:
+        return len(self.addresses)
+
+    @classmethod
+    def from_frames(cls, df_charge: Optional[pd.DataFrame] = None, df_bot: Optional[pd.DataFrame] = None,
+                    gazetteer: Optional[pd.DataFrame] = None) -> 'OfflineGeocoder':
+        """Dựng từ dữ liệu trạm sạc, BOT (cột đã chuẩn hóa của data_loader.py) và gazetteer; bỏ điểm không có địa chỉ."""
+        lat, lng, addresses, sources = [], [], [], []
+        for df, column, fallback, source in ((df_charge, 'address', 'name', 'station'), (df_bot, 'address', 'name', 'bot'),
+                                             (gazetteer, 'name', None, 'gazetteer')):
+            if df is None or df.empty:
+                continue
+            texts = _text_column(df, column, fallback)
+            keep = [i for i, text in enumerate(texts) if text]
+            lat.append(df['lat'].to_numpy(dtype=np.float64)[keep])
+            lng.append(df['lng'].to_numpy(dtype=np.float64)[keep])
+            addresses.extend(texts[i] for i in keep)
+            sources.extend([source] * len(keep))
+        if not addresses:
+            return cls(np.zeros(0), np.zeros(0), [], [])
+        return cls(np.concatenate(lat), np.concatenate(lng), addresses, sources)
+
+    def nearest(self, lat: float, lng: float) -> Optional[OfflinePlace]:
+        """Nơi đã biết gần nhất (khoảng cách vòng lớn); None nếu danh sách rỗng."""
+        distances, positions = self.index.query_nearest(lat, lng, k=1)
+        if len(positions) == 0:
+            return None
+        position = int(positions[0])
+        return OfflinePlace(self.addresses[position], float(distances[0]), self.sources[position])
+
+
+def build_offline_geocoder(df_charge: Optional[pd.DataFrame] = None, df_bot: Optional[pd.DataFrame] = None,
+                           gazetteer_file: Optional[str] = GAZETTEER_FILE) -> OfflineGeocoder:
+    """Dựng OfflineGeocoder; mặc định nạp charging_stations.csv / BOT.csv qua data_loader.py và gazetteer.csv nếu có."""
+    if df_charge is None or df_bot is None:
+        import data_loader
+        df_charge = df_charge if df_charge is not None else data_loader.load_charging_stations()
+        df_bot = df_bot if df_bot is not None else data_loader.load_bot_stations()
+    gazetteer = load_gazetteer(gazetteer_file) if gazetteer_file else None
+    return OfflineGeocoder.from_frames(df_charge, df_bot, gazetteer)
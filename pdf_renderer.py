@@ -0,0 +1,463 @@
+"""
+Bộ dựng PDF dùng lâu dài cho báo cáo lộ trình (fpdf 1.7.2).
+
+Với FPDF thường, mỗi lần xuất phải nạp metrics của Arial.ttf (add_font) rồi, khi ghi file, đọc lại toàn bộ
+file font để cắt bộ ký tự (makeSubset), tính bảng độ rộng /W và CIDToGIDMap - phần lớn thời gian xuất.
+PdfRenderer làm các việc đó một lần:
+- FontFace: metrics phân tích một lần, lưu đĩa trong .cache/fonts/ (khóa theo đường dẫn, kích thước, mtime)
+- mỗi tập ký tự đã dùng (luôn gồm BASE_CHARSET) -> luồng font con (nén), /W và CIDToGIDMap (nén), giữ trong cache LRU
+- chỉ nhúng một font (bản cũ đăng ký cùng file hai lần cho kiểu "đậm" giả, nên nhúng hai lần)
+Báo cáo là RouteReport có cấu trúc: tên file lấy trực tiếp từ địa chỉ đầu / cuối, không tách chuỗi summary.
+Một PdfRenderer dùng được từ nhiều luồng (cache có khóa, mỗi lần xuất một FPDF riêng).
+"""
+import hashlib
+import os
+import pickle
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from fpdf import FPDF
+from fpdf.ttfonts import TTFontFile
+
+import station_graph
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+FONT_PATH = os.path.join(ROOT, "Arial.ttf")
+ROUTES_DIR = os.path.join(ROOT, 'routes')
+FONT_CACHE_DIR = os.path.join(station_graph.CACHE_DIR, 'fonts')
+FONT_FORMAT_VERSION = 1
+SUBSET_CACHE_SIZE = 64 # Số tập ký tự giữ trong cache mỗi font
+FONT_FAMILY = 'ArialUnicode'
+# Bộ ký tự luôn nhúng: ASCII in được + chữ tiếng Việt. Báo cáo chỉ dùng các ký tự này thì mọi lần xuất chung
+# một tập ký tự -> trúng cache font con; file lớn hơn vài KB so với cắt đúng ký tự đã dùng.
+VIETNAMESE_LETTERS = ("aàảãáạăằẳẵắặâầẩẫấậbcdđeèẻẽéẹêềểễếệfghiìỉĩíịjklmnoòỏõóọôồổỗốộơờởỡớợpqrstuùủũúụưừửữứự"
+                      "vwxyỳỷỹýỵz")
+BASE_CHARSET = frozenset(range(32, 127)) | frozenset(map(ord, VIETNAMESE_LETTERS + VIETNAMESE_LETTERS.upper()))
+BASE_SUBSET = range(0, 32) # Như add_font của fpdf: luôn có mã 0..31 (0..56 nếu dùng alias_nb_pages)
+
+# ToUnicode CMap cố định của fpdf 1.7.2 (Identity-H)
+TO_UNICODE = ("/CIDInit /ProcSet findresource begin\n12 dict begin\nbegincmap\n/CIDSystemInfo\n"
+              "<</Registry (Adobe)\n/Ordering (UCS)\n/Supplement 0\n>> def\n/CMapName /Adobe-Identity-UCS def\n"
+              "/CMapType 2 def\n1 begincodespacerange\n<0000> <FFFF>\nendcodespacerange\n1 beginbfrange\n"
+              "<0000> <FFFF> <0000>\nendbfrange\nendcmap\nCMapName currentdict /CMap defineresource pop\nend\nend")
+
+
+class RouteReport(NamedTuple):
+    """Dữ liệu một báo cáo lộ trình (main.py tạo sau mỗi lần tìm)."""
+    model: str
+    pin: int
+    start_coords: str
+    end_coords: str
+    summary: str
+    details: str
+    stations: Optional[List[Dict[str, Any]]] = None # StationCatalogue.row của các trạm trên lộ trình
+    start_address: Optional[str] = None # Địa chỉ điểm đầu / cuối (tên file); thiếu thì dùng tọa độ
+    end_address: Optional[str] = None
+
+
+def clean_filename(s: str) -> str:
+    """Làm sạch tên file để tránh lỗi hệ điều hành"""
+    for ch in ':/\\*?"<>|[]':
+        s = s.replace(ch, '-')
+    return s
+
+
+def report_filename(report: RouteReport, now: Optional[datetime] = None) -> str:
+    """<ngày>-<giờ>-<xe>-<pin>-<điểm đầu>-<điểm cuối>.pdf"""
+    now = now or datetime.now()
+    start = re.sub(r'\(Gần trạm .*\)', '', report.start_address or '').strip() or report.start_coords or 'unknown'
+    end = re.sub(r'\(Gần trạm .*\)', '', report.end_address or '').strip() or report.end_coords or 'unknown'
+    filename = (f"{now.strftime('%d-%m-%Y')}-{now.strftime('%H-%M-%S')}-{clean_filename(report.model)}-{report.pin}"
+                f"-{clean_filename(start)}-{clean_filename(end)}.pdf")
+    return filename.replace(' ', '').replace(',', '-')
+
+
+class _WidthsWriter:
+    """Đối tượng thay cho FPDF khi gọi FPDF._putTTfontwidths để lấy chuỗi /W (hàm chỉ dùng self._out)."""
+    def __init__(self):
+        self.lines: List[str] = []
+
+    def _out(self, line: str) -> None:
+        self.lines.append(line)
+
+
+class FontFace:
+    """Font TrueType đã phân tích: metrics dạng font_dict của fpdf + cache các phần nhúng theo tập ký tự."""
+
+    def __init__(self, font_path: str = FONT_PATH, cache_dir: Optional[str] = FONT_CACHE_DIR,
+                 subset_cache_size: int = SUBSET_CACHE_SIZE):
+        self.font_path = os.path.abspath(font_path)
+        self.cache_dir = cache_dir
+        self.subset_cache_size = subset_cache_size
+        self.metrics = self._load_metrics()
+        self._subsets: 'OrderedDict[Tuple[int, ...], Tuple[bytes, int, str, bytes]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.subset_hits = 0
+        self.subset_misses = 0
+
+    def metrics_cache_path(self) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        stat = os.stat(self.font_path)
+        key = hashlib.sha1(f"{self.font_path}|{stat.st_size}|{stat.st_mtime_ns}".encode('utf-8')).hexdigest()[:16]
+        base = os.path.splitext(os.path.basename(self.font_path))[0]
+        return os.path.join(self.cache_dir, f"{base}_v{FONT_FORMAT_VERSION}_{key}.pkl")
+
+    def _load_metrics(self) -> Dict[str, Any]:
+        """Metrics từ cache đĩa, hoặc phân tích file font (như add_font của fpdf) rồi ghi cache."""
+        path = self.metrics_cache_path()
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    return pickle.load(f)
+            except Exception as e:
+                print(f"Lỗi khi đọc cache font {path}: {e}")
+
+        ttf = TTFontFile()
+        ttf.getMetrics(self.font_path)
+        metrics = {
+            'name': re.sub('[ ()]', '', ttf.fullName),
+            'type': 'TTF',
+            'desc': {
+                'Ascent': int(round(ttf.ascent, 0)),
+                'Descent': int(round(ttf.descent, 0)),
+                'CapHeight': int(round(ttf.capHeight, 0)),
+                'Flags': ttf.flags,
+                'FontBBox': "[%s %s %s %s]" % tuple(int(round(v, 0)) for v in ttf.bbox[:4]),
+                'ItalicAngle': int(ttf.italicAngle),
+                'StemV': int(round(ttf.stemV, 0)),
+                'MissingWidth': int(round(ttf.defaultWidth, 0)),
+            },
+            'up': round(ttf.underlinePosition),
+            'ut': round(ttf.underlineThickness),
+            'ttffile': self.font_path,
+            'originalsize': os.stat(self.font_path).st_size,
+            'cw': ttf.charWidths,
+        }
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    pickle.dump(metrics, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"Không ghi được cache font {path}: {e}")
+        return metrics
+
+    def register(self, pdf: FPDF, family: str = FONT_FAMILY, style: str = '') -> None:
+        """Đăng ký font vào một FPDF (như add_font(..., uni=True) nhưng không đọc lại file)."""
+        fontkey = family.lower() + style.upper()
+        if fontkey in pdf.fonts:
+            return
+        metrics = self.metrics
+        pdf.fonts[fontkey] = {
+            'i': len(pdf.fonts) + 1, 'type': 'TTF', 'name': metrics['name'], 'desc': metrics['desc'],
+            'up': metrics['up'], 'ut': metrics['ut'], 'cw': metrics['cw'], 'ttffile': metrics['ttffile'],
+            'fontkey': fontkey, 'subset': list(range(0, 57) if hasattr(pdf, 'str_alias_nb_pages') else BASE_SUBSET),
+            'unifilename': None, 'face': self,
+        }
+
+    def subset_parts(self, used: Iterable[int]) -> Tuple[bytes, int, str, bytes]:
+        """
+        Tập ký tự đã dùng -> (luồng font con đã nén, kích thước chưa nén, dòng /W, CIDToGIDMap đã nén).
+        Kết quả giống nhánh TTF của FPDF._putfonts; tính một lần cho mỗi tập ký tự.
+        """
+        key = tuple(sorted(set(used)))
+        with self._lock:
+            parts = self._subsets.get(key)
+            if parts is not None:
+                self._subsets.move_to_end(key)
+                self.subset_hits += 1
+                return parts
+
+        ttf = TTFontFile()
+        stream = ttf.makeSubset(self.font_path, list(key))
+        writer = _WidthsWriter()
+        FPDF._putTTfontwidths(writer, {'unifilename': None, 'cw': self.metrics['cw'], 'subset': set(key)}, ttf.maxUni)
+        cidtogidmap = bytearray(256 * 256 * 2)
+        for code, glyph in ttf.codeToGlyph.items():
+            cidtogidmap[code * 2] = glyph >> 8
+            cidtogidmap[code * 2 + 1] = glyph & 0xFF
+        parts = (zlib.compress(stream), len(stream), ''.join(writer.lines), zlib.compress(bytes(cidtogidmap)))
+
+        with self._lock:
+            self.subset_misses += 1
+            self._subsets[key] = parts
+            while len(self._subsets) > self.subset_cache_size:
+                self._subsets.popitem(last=False)
+        return parts
+
+
+class _ReportPDF(FPDF):
+    """FPDF ghi font TTF từ cache của FontFace thay vì cắt lại file font ở mỗi lần xuất."""
+
+    def _putfonts(self):
+        if not self.fonts or any(font.get('face') is None for font in self.fonts.values()):
+            return super()._putfonts()
+        for font in self.fonts.values():
+            fontstream, ttfontsize, widths, cidtogidmap = font['face'].subset_parts(BASE_CHARSET.union(font['subset'][1:]))
+            fontname = 'MPDFAA' + '+' + font['name']
+            font['n'] = self.n + 1
+            # Type0 Font
+            self._newobj()
+            self._out('<</Type /Font')
+            self._out('/Subtype /Type0')
+            self._out('/BaseFont /' + fontname + '')
+            self._out('/Encoding /Identity-H')
+            self._out('/DescendantFonts [' + str(self.n + 1) + ' 0 R]')
+            self._out('/ToUnicode ' + str(self.n + 2) + ' 0 R')
+            self._out('>>')
+            self._out('endobj')
+            # CIDFontType2
+            self._newobj()
+            self._out('<</Type /Font')
+            self._out('/Subtype /CIDFontType2')
+            self._out('/BaseFont /' + fontname + '')
+            self._out('/CIDSystemInfo ' + str(self.n + 2) + ' 0 R')
+            self._out('/FontDescriptor ' + str(self.n + 3) + ' 0 R')
+            if font['desc'].get('MissingWidth'):
+                self._out('/DW %d' % font['desc']['MissingWidth'])
+            self._out(widths)
+            self._out('/CIDToGIDMap ' + str(self.n + 4) + ' 0 R')
+            self._out('>>')
+            self._out('endobj')
+            # ToUnicode
+            self._newobj()
+            self._out('<</Length ' + str(len(TO_UNICODE)) + '>>')
+            self._putstream(TO_UNICODE)
+            self._out('endobj')
+            # CIDSystemInfo
+            self._newobj()
+            self._out('<</Registry (Adobe)')
+            self._out('/Ordering (UCS)')
+            self._out('/Supplement 0')
+            self._out('>>')
+            self._out('endobj')
+            # Font descriptor
+            self._newobj()
+            self._out('<</Type /FontDescriptor')
+            self._out('/FontName /' + fontname)
+            for kd in ('Ascent', 'Descent', 'CapHeight', 'Flags', 'FontBBox', 'ItalicAngle', 'StemV', 'MissingWidth'):
+                v = font['desc'][kd]
+                if kd == 'Flags':
+                    v = (v | 4) & ~32 # Bỏ cờ SYMBOLIC
+                self._out(' /%s %s' % (kd, v))
+            self._out('/FontFile2 ' + str(self.n + 2) + ' 0 R')
+            self._out('>>')
+            self._out('endobj')
+            # CIDToGIDMap
+            self._newobj()
+            self._out('<</Length ' + str(len(cidtogidmap)) + '')
+            self._out('/Filter /FlateDecode')
+            self._out('>>')
+            self._putstream(cidtogidmap)
+            self._out('endobj')
+            # Font file
+            self._newobj()
+            self._out('<</Length ' + str(len(fontstream)))
+            self._out('/Filter /FlateDecode')
+            self._out('/Length1 ' + str(ttfontsize))
+            self._out('>>')
+            self._putstream(fontstream)
+            self._out('endobj')
+
+
+
+class StreamingPDF(_ReportPDF):
+    """
+    FPDF ghi thẳng ra stream (file nhị phân): mỗi trang xong là nén và ghi ngay đối tượng trang + nội dung, rồi bỏ
+    nội dung trang khỏi bộ nhớ; close() ghi font, từ điển tài nguyên, mục lục trang, xref. Bộ nhớ không tăng theo số
+    trang (chỉ còn số hiệu đối tượng trang và tập ký tự đã dùng). Không hỗ trợ link, đổi hướng trang và alias_nb_pages
+    (cần nội dung mọi trang tới cuối); dùng close() thay cho output().
+    """
+
+    def __init__(self, stream: BinaryIO, orientation: str = 'P', unit: str = 'mm', format: str = 'A4'):
+        super().__init__(orientation, unit, format)
+        self._stream = stream
+        self._pos = 0 # Số byte đã ghi ra stream
+        self._page_objs: List[int] = []
+
+    def _write_buffer(self) -> None:
+        data = self.buffer.encode('latin1') # fpdf 1.7.2 giữ dữ liệu nhị phân dạng chuỗi latin1
+        self._stream.write(data)
+        self._pos += len(data)
+        self.buffer = ''
+
+    def _newobj(self):
+        self.n += 1
+        self.offsets[self.n] = self._pos + len(self.buffer)
+        self._out(str(self.n) + ' 0 obj')
+
+    def _endpage(self):
+        super()._endpage()
+        if self._pos == 0 and not self.buffer:
+            self._putheader()
+        content = self.pages[self.page]
+        if self.compress:
+            content = zlib.compress(content.encode('latin1'))
+        self._newobj()
+        self._page_objs.append(self.n)
+        self._out('<</Type /Page')
+        self._out('/Parent 1 0 R')
+        self._out('/Resources 2 0 R')
+        if self.pdf_version > '1.3':
+            self._out('/Group <</Type /Group /S /Transparency /CS /DeviceRGB>>')
+        self._out('/Contents ' + str(self.n + 1) + ' 0 R>>')
+        self._out('endobj')
+        self._newobj()
+        self._out('<<' + ('/Filter /FlateDecode ' if self.compress else '') + '/Length ' + str(len(content)) + '>>')
+        self._putstream(content)
+        self._out('endobj')
+        self.pages[self.page] = ''
+        # fpdf thêm mã ký tự vào subset mỗi lần vẽ chữ (có trùng lặp): gọn lại để không tăng theo số trang
+        for font in self.fonts.values():
+            if 'subset' in font:
+                font['subset'] = list(dict.fromkeys(font['subset']))
+        self._write_buffer()
+
+    def _putresources(self):
+        self._putfonts()
+        self._putimages()
+        self.offsets[2] = self._pos + len(self.buffer)
+        self._out('2 0 obj')
+        self._out('<<')
+        self._putresourcedict()
+        self._out('>>')
+        self._out('endobj')
+
+    def _enddoc(self):
+        w_pt, h_pt = (self.fw_pt, self.fh_pt) if self.def_orientation == 'P' else (self.fh_pt, self.fw_pt)
+        # Mục lục trang (đối tượng 1, đã dành sẵn)
+        self.offsets[1] = self._pos + len(self.buffer)
+        self._out('1 0 obj')
+        self._out('<</Type /Pages')
+        self._out('/Kids [' + ''.join(f"{n} 0 R " for n in self._page_objs) + ']')
+        self._out('/Count ' + str(len(self._page_objs)))
+        self._out('/MediaBox [0 0 %.2f %.2f]' % (w_pt, h_pt))
+        self._out('>>')
+        self._out('endobj')
+        self._putresources()
+        # Info
+        self._newobj()
+        self._out('<<')
+        self._putinfo()
+        self._out('>>')
+        self._out('endobj')
+        # Catalog
+        self._newobj()
+        self._out('<<')
+        self._putcatalog()
+        self._out('>>')
+        self._out('endobj')
+        # Cross-ref
+        o = self._pos + len(self.buffer)
+        self._out('xref')
+        self._out('0 ' + str(self.n + 1))
+        self._out('0000000000 65535 f ')
+        for i in range(1, self.n + 1):
+            self._out('%010d 00000 n ' % self.offsets[i])
+        # Trailer
+        self._out('trailer')
+        self._out('<<')
+        self._puttrailer()
+        self._out('>>')
+        self._out('startxref')
+        self._out(str(o))
+        self._out('%%EOF')
+        self._write_buffer()
+        self.state = 3
+
+class PdfRenderer:
+    """
+    Xuất RouteReport ra PDF, dùng lại FontFace giữa các lần xuất.
+    font_path không tồn tại / lỗi: dùng font lõi Arial của fpdf (không có dấu tiếng Việt) như bản cũ.
+    """
+
+    def __init__(self, font_path: str = FONT_PATH, output_dir: str = ROUTES_DIR, cache_dir: Optional[str] = FONT_CACHE_DIR):
+        self.output_dir = output_dir
+        try:
+            self.face: Optional[FontFace] = FontFace(font_path, cache_dir)
+        except Exception as e:
+            print(f"Lỗi khi thêm font: {e}")
+            self.face = None
+        self._path_lock = threading.Lock()
+
+    def _new_pdf(self) -> Tuple[FPDF, str]:
+        pdf = _ReportPDF()
+        pdf.add_page()
+        if self.face is None:
+            return pdf, 'Arial' # Fallback
+        self.face.register(pdf)
+        return pdf, FONT_FAMILY
+
+    def build(self, report: RouteReport) -> FPDF:
+        """Dựng tài liệu (chưa ghi file)."""
+        pdf, font_name = self._new_pdf()
+        # Tiêu đề mục dùng cùng font (bản cũ cũng chỉ có một file font cho kiểu "đậm")
+        pdf.set_font(font_name, '', 16)
+        pdf.cell(0, 12, txt="KẾT QUẢ LỘ TRÌNH XE ĐIỆN", ln=True, align='C')
+        pdf.ln(6)
+
+        pdf.set_font(font_name, '', 12)
+        # Ghi tóm tắt
+        for line in report.summary.split('\n'):
+            if line.strip():
+                pdf.multi_cell(0, 8, txt=line, align='L')
+        pdf.ln(5)
+
+        # Ghi chi tiết
+        pdf.set_font(font_name, '', 11)
+        pdf.multi_cell(0, 8, txt="CHI TIẾT LỘ TRÌNH:", align='L')
+        pdf.set_font(font_name, '', 10)
+        for line in report.details.split('\n'):
+            if line.strip():
+                pdf.multi_cell(0, 5, txt=line.strip(), align='L')
+
+        # Danh sách trạm sạc trên lộ trình (theo id trạm)
+        if report.stations:
+            pdf.ln(5)
+            pdf.set_font(font_name, '', 11)
+            pdf.multi_cell(0, 8, txt="CÁC TRẠM SẠC TRÊN LỘ TRÌNH:", align='L')
+            pdf.set_font(font_name, '', 10)
+            for station in report.stations:
+                pdf.multi_cell(0, 5, txt=f"#{station['id']} {station['name']} - {station['address']} ({station['lat']:.5f}, {station['lng']:.5f})", align='L')
+        return pdf
+
+    def _reserve_path(self, filename: str) -> str:
+        """Đường dẫn chưa dùng trong output_dir (thêm -2, -3... nếu trùng tên trong cùng giây)."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        stem, ext = os.path.splitext(filename)
+        with self._path_lock:
+            for n in range(1, 10000):
+                path = os.path.join(self.output_dir, filename if n == 1 else f"{stem}-{n}{ext}")
+                try:
+                    os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                    return path
+                except FileExistsError:
+                    continue
+        raise RuntimeError(f"Không tạo được tên file cho {filename}")
+
+    def export(self, report: RouteReport, filepath: Optional[str] = None) -> str:
+        """Ghi báo cáo ra filepath (mặc định output_dir/<report_filename>), trả về đường dẫn."""
+        pdf = self.build(report)
+        filepath = filepath or self._reserve_path(report_filename(report))
+        pdf.output(filepath, 'F')
+        return filepath
+
+
+_default_renderer: Optional[PdfRenderer] = None
+_default_lock = threading.Lock()
+
+
+def get_default_renderer() -> PdfRenderer:
+    """PdfRenderer dùng chung (Arial.ttf cạnh mã nguồn, xuất vào routes/), tạo khi xuất lần đầu."""
+    global _default_renderer
+    with _default_lock:
+        if _default_renderer is None:
+            _default_renderer = PdfRenderer()
+        return _default_renderer
@@ -1,14 +1,14 @@
-from fpdf import FPDF
-from datetime import datetime
-import os
+import numpy as np
 import pandas as pd
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Optional
 from math import radians, sin, cos, sqrt, atan2
-import re
+import data_loader
+from data_loader import parse_fee
 
 # CẤU HÌNH CHO BOT
 R_EARTH = 6371.0 # Bán kính Trái Đất (km)
 BOT_PROXIMITY_THRESHOLD = 5.0 # km - Nếu lộ trình đi qua trong vòng 5km của BOT, tính là đã đi qua
+SEGMENT_CHUNK = 4096 # Số đoạn đường xử lý mỗi lượt trong check_bot_stations (ma trận đoạn x BOT)
 
 # --- HÀM TÍNH TOÁN KHOẢNG CÁCH ---
 def haversine(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
@@ -20,128 +20,113 @@ def haversine(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
     c = 2 * atan2(sqrt(a), sqrt(1-a))
     return R_EARTH * c
 
+def _unit_vector(lat, lng) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Tọa độ (độ) -> ba thành phần (x, y, z) của vector đơn vị 3D."""
+    lat, lng = np.radians(lat), np.radians(lng)
+    cos_lat = np.cos(lat)
+    return cos_lat * np.cos(lng), cos_lat * np.sin(lng), np.sin(lat)
+
+def point_segment_distance_km(lat_a, lng_a, lat_b, lng_b, lat_p, lng_p) -> np.ndarray:
+    """
+    Khoảng cách (km) từ điểm P tới cung đường tròn lớn AB, vector hóa theo broadcasting của NumPy
+    (vd. A, B dạng (m, 1) và P dạng (1, k) -> ma trận (m, k)).
+    Nếu hình chiếu của P nằm trong cung AB: khoảng cách cross-track; ngược lại: khoảng cách tới đầu mút gần nhất.
+    """
+    ax, ay, az = _unit_vector(lat_a, lng_a)
+    bx, by, bz = _unit_vector(lat_b, lng_b)
+    px, py, pz = _unit_vector(lat_p, lng_p)
+    # Pháp tuyến N = A x B (chỉ phụ thuộc đoạn), cos góc AB và các tích vô hướng với P
+    nx, ny, nz = ay * bz - az * by, az * bx - ax * bz, ax * by - ay * bx
+    ab = ax * bx + ay * by + az * bz
+    norm = np.sqrt(nx * nx + ny * ny + nz * nz)
+    pa = px * ax + py * ay + pz * az
+    pb = px * bx + py * by + pz * bz
+    pn = px * nx + py * ny + pz * nz
+    cross_track = np.abs(np.arcsin(np.clip(np.divide(pn, norm, out=np.zeros(np.broadcast(pn, norm).shape), where=norm > 0), -1.0, 1.0)))
+    # Hình chiếu nằm giữa A và B khi (A x P).N >= 0 và (P x B).N >= 0 (khai triển Lagrange với vector đơn vị)
+    inside = (norm > 0) & (pb - ab * pa >= 0) & (pa - ab * pb >= 0)
+    chord = np.sqrt(np.maximum(2.0 - 2.0 * np.maximum(pa, pb), 0.0))
+    endpoint = 2 * np.arcsin(np.minimum(chord / 2, 1.0))
+    return R_EARTH * np.where(inside, cross_track, endpoint)
+
 # --- HÀM XỬ LÝ BOT ---
 def load_bot_stations(filename='BOT.csv') -> pd.DataFrame:
-    """Tải và chuẩn hóa dữ liệu BOT station từ BOT.csv"""
+    """
+    Tải và chuẩn hóa dữ liệu BOT station từ BOT.csv (kèm cột 'fee_vnd': phí dạng số nguyên VND).
+    Đọc qua cache nhị phân của data_loader.py; DataFrame dùng chung giữa các module, coi là chỉ đọc.
+    """
     try:
-        # Đọc dữ liệu từ file BOT.csv
-        df = pd.read_csv(filename, skipinitialspace=True)
-        # Đổi tên cột cho dễ xử lý (Giả định cột thứ 3 là tọa độ, cột thứ 4 là phí)
-        df.columns = ['name', 'address', 'coords', 'fee']
-        # Tách cột 'coords' thành 'lat' và 'lng'
-        df[['lat', 'lng']] = df['coords'].str.split(',', expand=True).astype(float)
-        # Loại bỏ các hàng không có tọa độ
-        df = df[df['lat'].notnull() & df['lng'].notnull()]
-        return df.reset_index(drop=True)
+        return data_loader.load_bot_stations(filename)
     except FileNotFoundError:
         print(f"Lỗi: Không tìm thấy file dữ liệu BOT: {filename}")
         return pd.DataFrame()
 
-def check_bot_stations(route_points: List[Tuple[float, float]], df_bot: pd.DataFrame) -> List[Dict[str, Any]]:
+def check_bot_stations(route_points: List[Tuple[float, float]], df_bot: pd.DataFrame,
+                       station_ids: Optional[List[Optional[int]]] = None) -> List[Dict[str, Any]]:
     """
     Kiểm tra các trạm BOT có thể đi qua trên lộ trình.
     route_points: Danh sách các tọa độ [(lat_start, lng_start), (lat_tram1, lng_tram1), ..., (lat_end, lng_end)]
+    station_ids: (tùy chọn) id trạm sạc của từng điểm (None với điểm bắt đầu/kết thúc); mỗi BOT tìm thấy
+        được gắn 'segment_station_ids' = (id điểm đầu, id điểm cuối) của đoạn đường đi qua BOT.
+    Một BOT được tính là đi qua nếu cách một đoạn đường (cung đường tròn lớn giữa hai điểm liên tiếp)
+    dưới BOT_PROXIMITY_THRESHOLD, kể cả khi nằm giữa một chặng dài. Tính vector hóa (đoạn x BOT) theo từng
+    khối SEGMENT_CHUNK đoạn. Kết quả theo thứ tự đoạn đường đầu tiên đi qua, rồi theo thứ tự hàng trong df_bot.
     """
-    if df_bot.empty:
+    if df_bot.empty or len(route_points) < 2:
         return []
-        
-    passed_bot_stations = {} # Dùng dict để tránh trùng lặp
-    
-    # Duyệt qua từng đoạn đường (A -> B)
-    for i in range(len(route_points) - 1):
-        lat_a, lng_a = route_points[i]
-        lat_b, lng_b = route_points[i+1]
-        
-        for index, bot in df_bot.iterrows():
-            bot_name = bot['name']
-            bot_lat = bot['lat']
-            bot_lng = bot['lng']
-            
-            # Kiểm tra xem BOT có nằm gần điểm đầu hoặc điểm cuối của đoạn đường hay không
-            dist_a_to_bot = haversine(lat_a, lng_a, bot_lat, bot_lng)
-            dist_b_to_bot = haversine(lat_b, lng_b, bot_lat, bot_lng)
-
-            if dist_a_to_bot < BOT_PROXIMITY_THRESHOLD or dist_b_to_bot < BOT_PROXIMITY_THRESHOLD:
-                if bot_name not in passed_bot_stations:
-                    passed_bot_stations[bot_name] = {
-                        'name': bot_name,
-                        'address': bot['address'],
-                        'fee': bot['fee'],
-                        'lat': bot_lat,
-                        'lng': bot_lng
-                    }
-                    
-    return list(passed_bot_stations.values())
-
-# --- HÀM XUẤT PDF ---
-def clean_filename(s):
-    """Làm sạch tên file để tránh lỗi hệ điều hành"""
-    for ch in ':/\\*?"<>|[]':
-        s = s.replace(ch, '-')
-    return s
-
-def export_route_to_pdf(model, pin, start_coords, end_coords, summary, details):
-    """Xuất thông tin lộ trình ra file PDF"""
-    now = datetime.now()
-    date_str = now.strftime('%d-%m-%Y')
-    time_str = now.strftime('%H-%M-%S') 
-    
-    start_station = start_coords
-    end_station = end_coords
-    
-    # Cố gắng lấy tên trạm từ summary để đặt tên file
-    for line in summary.split('\n'):
-        if 'Xuất phát:' in line:
-            start_station = line.split(':',1)[-1].strip()
-            start_station = re.sub(r'\(Gần trạm .*\)', '', start_station).strip()
-        if 'Kết thúc:' in line:
-            end_station = line.split(':',1)[-1].strip()
-            end_station = re.sub(r'\(Gần trạm .*\)', '', end_station).strip()
-
-    if not start_station: start_station = 'unknown'
-    if not end_station: end_station = 'unknown'
 
-    # Format tên file
-    filename = f"{date_str}-{time_str}-{clean_filename(model)}-{pin}-{clean_filename(start_station)}-{clean_filename(end_station)}.pdf"
-    filename = filename.replace(' ', '').replace(',', '-')
-    folder = os.path.join(os.path.dirname(__file__), 'routes')
-    os.makedirs(folder, exist_ok=True)
-    filepath = os.path.join(folder, filename)
-
-    pdf = FPDF()
-    pdf.add_page()
-    # Sử dụng font hỗ trợ Unicode (Tiếng Việt)
-    try:
-        font_path = os.path.join(os.path.dirname(__file__), "Arial.ttf")
-        # Thêm font thường
-        pdf.add_font('ArialUnicode', '', font_path, uni=True)
-        # Thêm font đậm (bold) nếu cần
-        pdf.add_font('ArialUnicode', 'B', font_path, uni=True)
-        font_name = 'ArialUnicode'
-    except Exception as e:
-        print(f"Lỗi khi thêm font: {e}")
-        font_name = 'Arial' # Fallback
+    points = np.asarray(route_points, dtype=np.float64).reshape(-1, 2)
+    bot_lat = df_bot['lat'].to_numpy(dtype=np.float64)
+    bot_lng = df_bot['lng'].to_numpy(dtype=np.float64)
+    first_segment = np.full(len(df_bot), -1, dtype=np.int64) # Đoạn đầu tiên đi qua mỗi BOT (-1 = không qua)
 
-    pdf.set_font(font_name, '', 16)
-    pdf.cell(0, 12, txt="KẾT QUẢ LỘ TRÌNH XE ĐIỆN", ln=True, align='C')
-    pdf.ln(6)
+    # Duyệt theo khối đoạn đường (A -> B), mỗi khối so với mọi BOT cùng lúc
+    for lo in range(0, len(points) - 1, SEGMENT_CHUNK):
+        hi = min(lo + SEGMENT_CHUNK, len(points) - 1)
+        dist = point_segment_distance_km(points[lo:hi, 0, None], points[lo:hi, 1, None], points[lo + 1:hi + 1, 0, None],
+                                         points[lo + 1:hi + 1, 1, None], bot_lat[None, :], bot_lng[None, :])
+        near = dist < BOT_PROXIMITY_THRESHOLD
+        found = (first_segment < 0) & near.any(axis=0)
+        first_segment[found] = lo + near[:, found].argmax(axis=0)
+        if (first_segment >= 0).all():
+            break
 
-    pdf.set_font(font_name, '', 12)
-    # Ghi tóm tắt
-    for line in summary.split('\n'):
-        if line.strip():
-            pdf.multi_cell(0, 8, txt=line, align='L')
-    pdf.ln(5)
+    hits = np.flatnonzero(first_segment >= 0)
+    hits = hits[np.argsort(first_segment[hits], kind='stable')]
+    fees = df_bot['fee_vnd'].tolist() if 'fee_vnd' in df_bot.columns else [parse_fee(fee) for fee in df_bot['fee'].tolist()]
 
-    # Ghi chi tiết
-    pdf.set_font(font_name, 'B', 11)
-    pdf.multi_cell(0, 8, txt="CHI TIẾT LỘ TRÌNH:", align='L')
-    pdf.set_font(font_name, '', 10)
+    passed_bot_stations = {} # Dùng dict để tránh trùng lặp
+    for row in hits.tolist():
+        bot_name = df_bot['name'].iat[row]
+        if bot_name in passed_bot_stations:
+            continue
+        passed_bot_stations[bot_name] = {
+            'name': bot_name,
+            'address': df_bot['address'].iat[row],
+            'fee': df_bot['fee'].iat[row],
+            'fee_vnd': int(fees[row]),
+            'lat': float(bot_lat[row]),
+            'lng': float(bot_lng[row])
+        }
+        if station_ids is not None:
+            segment = int(first_segment[row])
+            passed_bot_stations[bot_name]['segment_station_ids'] = (station_ids[segment], station_ids[segment + 1])
 
-    # Xử lý chi tiết để ngắt dòng
-    for line in details.split('\n'):
-        if line.strip():
-            pdf.multi_cell(0, 5, txt=line.strip(), align='L')
+    return list(passed_bot_stations.values())
 
-    pdf.output(filepath)
-    print(f"Lộ trình đã được xuất ra: {filepath}")
\ No newline at end of file
+# --- HÀM XUẤT PDF ---
+def export_route_to_pdf(model, pin, start_coords, end_coords, summary, details, stations=None,
+                        start_address=None, end_address=None):
+    """
+    Xuất thông tin lộ trình ra file PDF trong routes/, trả về đường dẫn file.
+    stations: (tùy chọn) danh sách trạm sạc trên lộ trình (StationCatalogue.row: id, name, address, lat, lng),
+    được ghi thành mục riêng ở cuối file.
+    start_address / end_address: địa chỉ điểm đầu / cuối để đặt tên file (thiếu thì dùng tọa độ).
+    Dùng PdfRenderer chung của pdf_renderer.py (font nạp một lần cho mọi lần xuất).
+    """
+    from pdf_renderer import RouteReport, get_default_renderer # Import fpdf khi xuất PDF (không làm chậm lúc khởi động GUI)
+    report = RouteReport(model=model, pin=pin, start_coords=start_coords, end_coords=end_coords, summary=summary,
+                         details=details, stations=stations, start_address=start_address, end_address=end_address)
+    filepath = get_default_renderer().export(report)
+    print(f"Lộ trình đã được xuất ra: {filepath}")
+    return filepath
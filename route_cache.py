@@ -0,0 +1,161 @@
+"""
+Cache kết quả tìm kiếm chặng giữa các trạm (station-to-station) đặt trước run_astar_search / run_ucs_search.
+
+Khóa: (quãng đường xe, trạm bắt đầu, trạm kết thúc, mức pin tại trạm đầu (theo bước soc_bucket_km),
+tránh trạm thu phí, thuật toán + tùy chọn, phiên bản dữ liệu trạm sạc, phiên bản các chỉ mục phụ
+(dữ liệu BOT khi tránh trạm thu phí, có bảng chuyển tiếp hay không)).
+Giá trị do file.py quyết định: dãy trạm + quãng đường (không phụ thuộc mức pin); nhật ký sạc được
+mô phỏng lại theo mức pin thật của từng yêu cầu.
+- Giới hạn kích thước, loại bỏ theo LRU (OrderedDict)
+- Các yêu cầu giống nhau chạy đồng thời dùng chung một lần tính (request coalescing)
+- Bộ đếm hits / misses / coalesced
+- Lưu / nạp từ đĩa bằng pickle (tùy chọn, ghi file tạm rồi đổi tên)
+"""
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+FORMAT_VERSION = 2 # Tăng khi đổi dạng khóa / giá trị -> file pickle cũ bị bỏ qua
+DEFAULT_MAXSIZE = 512
+DEFAULT_SOC_BUCKET_KM = 1.0 # Mức pin tại trạm đầu được làm tròn xuống theo bước này (km)
+
+
+class _InFlight:
+    """Một lần tính đang chạy; các luồng khác cùng khóa chờ trên event."""
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+
+class RouteCache:
+    """
+    Cache LRU an toàn luồng. get_or_compute(key, compute) trả về (giá trị, trạng thái) với trạng thái
+    'hit' (có sẵn), 'miss' (vừa tính) hoặc 'coalesced' (chờ lần tính của luồng khác).
+    path: file pickle để nạp khi khởi tạo và ghi khi gọi save() (None = chỉ trong bộ nhớ).
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE, path: Optional[str] = None, soc_bucket_km: Optional[float] = DEFAULT_SOC_BUCKET_KM):
+        self.maxsize = maxsize
+        self.path = path
+        self.soc_bucket_km = soc_bucket_km
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self._in_flight: Dict[Hashable, _InFlight] = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any],
+                       store_if: Optional[Callable[[Any], bool]] = None) -> Tuple[Any, str]:
+        """
+        Trả về giá trị của key, tính bằng compute() nếu chưa có. store_if(giá trị) = False: không lưu
+        (vd. tìm kiếm bị timeout), các luồng đang chờ vẫn nhận giá trị đó.
+        Lỗi trong compute() được ném lại cho cả các luồng đang chờ.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key], 'hit'
+            flight = self._in_flight.get(key)
+            owner = flight is None
+            if owner:
+                flight = self._in_flight[key] = _InFlight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, 'coalesced'
+
+        try:
+            flight.value = compute()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+                if flight.error is None and (store_if is None or store_if(flight.value)):
+                    self._store(key, flight.value)
+            flight.event.set()
+        return flight.value, 'miss'
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'coalesced': self.coalesced,
+                    'size': len(self._entries), 'maxsize': self.maxsize}
+
+    def clear(self) -> None:
+        """Xóa toàn bộ mục và đặt lại bộ đếm (không xóa file trên đĩa)."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.coalesced = 0
+
+    def save(self, path: Optional[str] = None) -> bool:
+        """Ghi cache ra file pickle (mục cũ nhất trước). Trả về False nếu không có đường dẫn hoặc lỗi ghi."""
+        path = path or self.path
+        if not path:
+            return False
+        with self._lock:
+            payload = {'format': FORMAT_VERSION, 'entries': list(self._entries.items())}
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Không ghi được cache lộ trình {path}: {e}")
+            return False
+        return True
+
+    def load(self, path: Optional[str] = None) -> int:
+        """Nạp các mục từ file pickle (giữ thứ tự LRU, cắt theo maxsize). Trả về số mục đã nạp."""
+        path = path or self.path
+        try:
+            with open(path, 'rb') as f:
+                payload = pickle.load(f)
+            if payload.get('format') != FORMAT_VERSION:
+                return 0
+            entries = payload['entries']
+        except Exception as e:
+            print(f"Lỗi khi đọc cache lộ trình {path}: {e}")
+            return 0
+        with self._lock:
+            for key, value in entries:
+                self._store(key, value)
+        return min(len(entries), self.maxsize)
+
+
+def route_cache_key(battery_max: float, start_node: str, end_node: str, battery_at_first_station: float, avoid_toll: bool,
+                    algorithm: Hashable, data_version: str, index_versions: Tuple = ()) -> Tuple:
+    """
+    Khóa cache; battery_at_first_station phải được làm tròn theo bước soc_bucket_km của cache trước khi gọi.
+    index_versions: phiên bản các dữ liệu / chỉ mục khác mà kết quả phụ thuộc (vd. ('bot', hash BOT.csv)).
+    """
+    return (float(battery_max), start_node, end_node, float(battery_at_first_station), bool(avoid_toll), algorithm, data_version,
+            tuple(index_versions))
@@ -0,0 +1,201 @@
+"""
+Bản đồ lộ trình (HTML + Leaflet) gồm hai lớp:
+- Lớp tĩnh: mọi trạm sạc và trạm BOT dạng GeoJSON trong một file JS (stations_<phiên bản>.js), dựng một lần
+  cho mỗi phiên bản dữ liệu và dùng lại cho mọi lần tìm; trình duyệt gom cụm marker (Leaflet.markercluster).
+- Lớp lộ trình: chỉ polyline, điểm đầu / cuối, trạm sạc dừng và BOT đi qua của lần tìm này, nhúng vào
+  khung HTML cố định (MAP_TEMPLATE) và tham chiếu file lớp tĩnh theo đường dẫn tương đối.
+Vì vậy thời gian vẽ và kích thước file HTML không phụ thuộc số trạm.
+Mỗi lần vẽ ghi ra một file route_map_*.html riêng (tempfile) trong MAP_DIR, nên các lần tìm đồng thời không
+ghi đè lên nhau; chỉ giữ MAX_ROUTE_FILES file mới nhất.
+"""
+import glob
+import json
+import os
+import tempfile
+import threading
+from string import Template
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+import station_graph
+from station_catalogue import StationCatalogue, get_station_catalogue
+from toll_edges import bot_data_version
+
+MAP_DIR = os.path.join(station_graph.CACHE_DIR, 'map')
+MAX_ROUTE_FILES = 20 # Số file bản đồ lộ trình giữ lại trong MAP_DIR
+STATIC_FORMAT_VERSION = 1
+
+LEAFLET_JS = "https://cdn.jsdelivr.net/npm/leaflet@1.9.3/dist/leaflet.js"
+LEAFLET_CSS = "https://cdn.jsdelivr.net/npm/leaflet@1.9.3/dist/leaflet.css"
+CLUSTER_JS = "https://cdnjs.cloudflare.com/ajax/libs/leaflet.markercluster/1.1.0/leaflet.markercluster.js"
+CLUSTER_CSS = ["https://cdnjs.cloudflare.com/ajax/libs/leaflet.markercluster/1.1.0/MarkerCluster.css",
+               "https://cdnjs.cloudflare.com/ajax/libs/leaflet.markercluster/1.1.0/MarkerCluster.Default.css"]
+AWESOME_JS = "https://cdnjs.cloudflare.com/ajax/libs/Leaflet.awesome-markers/2.0.2/leaflet.awesome-markers.js"
+AWESOME_CSS = ["https://cdn.jsdelivr.net/npm/@fortawesome/fontawesome-free@6.2.0/css/all.min.css",
+               "https://cdnjs.cloudflare.com/ajax/libs/Leaflet.awesome-markers/2.0.2/leaflet.awesome-markers.css"]
+
+MAP_TEMPLATE = Template("""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+<title>Lộ trình xe điện</title>
+$css
+<style>html, body, #map { width: 100%; height: 100%; margin: 0; padding: 0; }</style>
+<script src="$leaflet_js"></script>
+<script src="$cluster_js"></script>
+<script src="$awesome_js"></script>
+<script src="$static_layer"></script>
+</head>
+<body>
+<div id="map"></div>
+<script>
+var route = $route;
+var map = L.map('map').setView(route.points[0], 6);
+L.tileLayer('https://tile.openstreetmap.org/{z}/{x}/{y}.png', {
+    maxZoom: 19, attribution: '&copy; OpenStreetMap contributors'
+}).addTo(map);
+
+// Lớp tĩnh: mọi trạm sạc / BOT, gom cụm
+var overlays = {};
+if (window.EV_STATIC_LAYER) {
+    var groups = {station: L.markerClusterGroup({chunkedLoading: true}), bot: L.markerClusterGroup({chunkedLoading: true})};
+    L.geoJSON(window.EV_STATIC_LAYER, {
+        pointToLayer: function (feature, latlng) {
+            var bot = feature.properties.kind === 'bot';
+            return L.circleMarker(latlng, {radius: 5, color: bot ? '#FF00FF' : '#2196F3', weight: 1, fillOpacity: 0.6});
+        },
+        onEachFeature: function (feature, layer) {
+            var p = feature.properties;
+            layer.bindPopup((p.kind === 'bot' ? 'Trạm BOT: ' : 'Trạm Sạc: ') + p.name + (p.detail ? ' - ' + p.detail : ''));
+            groups[p.kind].addLayer(layer);
+        }
+    });
+    overlays['Tất cả trạm sạc'] = groups.station;
+    overlays['Tất cả trạm BOT'] = groups.bot;
+}
+L.control.layers(null, overlays).addTo(map);
+
+// Lớp lộ trình
+L.polyline(route.points, {color: 'blue', weight: 5, opacity: 0.7}).addTo(map);
+route.markers.forEach(function (m) {
+    L.marker(m.latlng, {icon: L.AwesomeMarkers.icon({icon: m.icon, markerColor: m.color, prefix: 'fa'})})
+        .bindPopup(m.popup).addTo(map);
+});
+route.bots.forEach(function (b) {
+    L.circleMarker(b.latlng, {radius: 10, color: '#FF00FF', fill: true, fillColor: '#FF00FF', fillOpacity: 0.6})
+        .bindPopup(b.popup).addTo(map);
+});
+</script>
+</body>
+</html>
+""")
+
+_static_lock = threading.Lock()
+
+
+def _text(value: Any) -> str:
+    return value.strip() if isinstance(value, str) else ''
+
+
+def static_layer_features(catalogue: StationCatalogue, df_bot: Optional[pd.DataFrame]) -> Dict[str, Any]:
+    """GeoJSON FeatureCollection của mọi trạm sạc (id = id trong catalogue) và trạm BOT."""
+    features = []
+    for station_id, (name, address, lat, lng) in enumerate(zip(catalogue.names, catalogue.addresses,
+                                                                catalogue.lat.tolist(), catalogue.lng.tolist())):
+        if lat == lat and lng == lng:
+            features.append({'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [lng, lat]},
+                             'properties': {'kind': 'station', 'id': station_id, 'name': name, 'detail': _text(address)}})
+    if df_bot is not None and not df_bot.empty:
+        for name, fee, lat, lng in zip(df_bot['name'].tolist(), df_bot['fee'].tolist(),
+                                       df_bot['lat'].tolist(), df_bot['lng'].tolist()):
+            features.append({'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [lng, lat]},
+                             'properties': {'kind': 'bot', 'name': name, 'detail': f"Phí: {_text(fee)}"}})
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def static_layer_path(catalogue: StationCatalogue, df_bot: Optional[pd.DataFrame], map_dir: Optional[str] = None) -> str:
+    """File lớp tĩnh, tên theo phiên bản danh mục (kể cả địa chỉ trong popup) và dữ liệu BOT."""
+    bot_version = bot_data_version(df_bot) if df_bot is not None else 'none'
+    return os.path.join(map_dir or MAP_DIR, f"stations_v{STATIC_FORMAT_VERSION}_{catalogue.content_version[:16]}_bot{bot_version[:12]}.js")
+
+
+def ensure_static_layer(catalogue: StationCatalogue, df_bot: Optional[pd.DataFrame], map_dir: Optional[str] = None) -> str:
+    """Ghi file lớp tĩnh nếu chưa có (ghi file tạm rồi đổi tên), trả về đường dẫn."""
+    path = static_layer_path(catalogue, df_bot, map_dir)
+    if os.path.exists(path):
+        return path
+    with _static_lock:
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            payload = json.dumps(static_layer_features(catalogue, df_bot), ensure_ascii=False, separators=(',', ':'))
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(f"window.EV_STATIC_LAYER = {payload};\n")
+            os.replace(tmp_path, path)
+    return path
+
+
+def route_overlay(route_points: List[Tuple[float, float]], catalogue: StationCatalogue, bot_stations: List[Dict],
+                  station_ids: Optional[List[Optional[int]]] = None) -> Dict[str, Any]:
+    """
+    Dữ liệu lớp lộ trình: polyline, marker (điểm đầu xanh, điểm cuối đỏ, trạm sạc cam) và BOT đi qua.
+    station_ids: id trạm tương ứng từng điểm (None = không phải trạm); không có thì tra theo tọa độ qua catalogue.
+    """
+    markers = []
+    for i, (lat, lng) in enumerate(route_points):
+        marker = {'latlng': [lat, lng], 'popup': f"Lat: {lat:.4f}, Lng: {lng:.4f}", 'icon': 'info', 'color': 'gray'}
+        if i == 0:
+            marker.update(popup="Điểm BẮT ĐẦU", icon='play', color='green')
+        elif i == len(route_points) - 1:
+            marker.update(popup="Điểm KẾT THÚC", icon='flag', color='red')
+        else:
+            station_id = station_ids[i] if station_ids is not None else catalogue.id_at(lat, lng)
+            if station_id is not None:
+                marker.update(popup=f"Trạm Sạc: {catalogue.name(station_id)}", icon='bolt', color='orange')
+        markers.append(marker)
+    bots = [{'latlng': [float(bot['lat']), float(bot['lng'])], 'popup': f"Trạm BOT: {bot['name']} - Phí: {bot['fee']}"}
+            for bot in bot_stations]
+    return {'points': [list(point) for point in route_points], 'markers': markers, 'bots': bots}
+
+
+def prune_route_maps(map_dir: Optional[str] = None, keep: int = MAX_ROUTE_FILES) -> None:
+    """Xóa các file route_map_*.html cũ, chỉ giữ keep file mới nhất."""
+    paths = glob.glob(os.path.join(map_dir or MAP_DIR, 'route_map_*.html'))
+    if len(paths) <= keep:
+        return
+    paths.sort(key=lambda path: os.stat(path).st_mtime_ns if os.path.exists(path) else 0)
+    for path in paths[:len(paths) - keep]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def render_route_map(route_points: List[Tuple[float, float]], df_charge: pd.DataFrame, bot_stations: List[Dict],
+                     station_ids: Optional[List[Optional[int]]] = None, df_bot: Optional[pd.DataFrame] = None,
+                     map_dir: Optional[str] = None, catalogue: Optional[StationCatalogue] = None) -> str:
+    """
+    Ghi bản đồ lộ trình ra một file HTML mới trong map_dir (mặc định MAP_DIR), trả về đường dẫn ("" nếu không có điểm).
+    df_bot: mọi trạm BOT cho lớp tĩnh (None = lớp tĩnh chỉ có trạm sạc).
+    catalogue: catalogue của df_charge nếu đã có (khỏi hash lại dữ liệu trạm).
+    """
+    if not route_points:
+        return ""
+    map_dir = map_dir or MAP_DIR
+    if catalogue is None:
+        catalogue = get_station_catalogue(df_charge)
+    static_path = ensure_static_layer(catalogue, df_bot, map_dir)
+    overlay = route_overlay(route_points, catalogue, bot_stations, station_ids)
+    html = MAP_TEMPLATE.substitute(
+        css="\n".join(f'<link rel="stylesheet" href="{href}">' for href in [LEAFLET_CSS, *CLUSTER_CSS, *AWESOME_CSS]),
+        leaflet_js=LEAFLET_JS, cluster_js=CLUSTER_JS, awesome_js=AWESOME_JS,
+        static_layer=os.path.basename(static_path), # Cùng thư mục với file HTML
+        route=json.dumps(overlay, ensure_ascii=False).replace('</', '<\\/'))
+
+    fd, path = tempfile.mkstemp(prefix='route_map_', suffix='.html', dir=map_dir)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(html)
+    prune_route_maps(map_dir)
+    return path
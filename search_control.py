@@ -0,0 +1,46 @@
+"""
+Điều khiển hợp tác cho một lần tìm kiếm chạy trên luồng khác (vd. luồng tìm kiếm của GUI).
+
+- cancel(): vòng lặp tìm kiếm kiểm tra cờ hủy ở mỗi bước, dừng sớm và đặt stats['cancelled'] = True
+- on_progress(dict): báo tiến độ tối đa một lần mỗi progress_interval giây với các khóa
+  engine, expanded, popped, best_f (f nhỏ nhất đang xét - cận dưới quãng đường, km), heap, elapsed_ms
+on_progress chạy trên luồng tìm kiếm: phía GUI chỉ nên đưa dữ liệu vào hàng đợi rồi đọc lại bằng master.after.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+DEFAULT_PROGRESS_INTERVAL = 0.1 # Giây giữa hai lần báo tiến độ
+
+
+class SearchControl:
+    """Cờ hủy (an toàn luồng) + callback tiến độ có giới hạn tần suất, truyền vào hàm tìm kiếm qua tham số control."""
+    __slots__ = ('on_progress', 'progress_interval', '_cancel', '_start', '_next_report')
+
+    def __init__(self, on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 progress_interval: float = DEFAULT_PROGRESS_INTERVAL):
+        self.on_progress = on_progress
+        self.progress_interval = progress_interval
+        self._cancel = threading.Event()
+        self._start = time.perf_counter()
+        self._next_report = self._start
+
+    def cancel(self) -> None:
+        """Yêu cầu dừng (gọi được từ bất kỳ luồng nào); tìm kiếm dừng ở bước kế tiếp."""
+        self._cancel.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def checkpoint(self, engine: str, expanded: int, popped: int, best_f: float, heap_size: int) -> bool:
+        """Gọi ở mỗi bước của vòng lặp tìm kiếm: trả về True nếu đã bị hủy; báo tiến độ khi tới hạn."""
+        if self._cancel.is_set():
+            return True
+        if self.on_progress is not None:
+            now = time.perf_counter()
+            if now >= self._next_report:
+                self._next_report = now + self.progress_interval
+                self.on_progress({'engine': engine, 'expanded': expanded, 'popped': popped, 'best_f': best_f,
+                                  'heap': heap_size, 'elapsed_ms': (now - self._start) * 1000})
+        return False
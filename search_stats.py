@@ -0,0 +1,58 @@
+"""
+Số liệu đo đạc của mỗi lần tìm đường (khối 'stats' trong kết quả run_*_search).
+
+- Bộ đếm của vòng lặp tìm kiếm: popped, expanded, pushed, pruned, max_heap, peak_labels
+- Thời gian từng pha (giây): snap_time, search_time, postprocess_time, bot_check_time, map_time
+  (bot_check_time / map_time do GUI điền sau khi kiểm tra BOT và vẽ bản đồ)
+
+Khi biến môi trường EV_SEARCH_STATS_LOG chứa đường dẫn file, mỗi lần tìm đường ghi thêm
+một dòng JSON vào file đó để theo dõi hồi quy hiệu năng.
+"""
+import json
+import os
+import threading
+import time
+from typing import Any, Dict
+
+STATS_LOG_ENV = 'EV_SEARCH_STATS_LOG'
+PHASES = ('snap', 'search', 'postprocess', 'bot_check', 'map')
+
+_log_lock = threading.Lock()
+
+
+def emit_search_stats(stats: Dict[str, Any], **fields: Any) -> bool:
+    """
+    Ghi một dòng JSON (fields + stats) vào file trong EV_SEARCH_STATS_LOG.
+    Trả về False nếu biến môi trường chưa đặt hoặc không ghi được file.
+    """
+    path = os.environ.get(STATS_LOG_ENV)
+    if not path:
+        return False
+    record = {'timestamp': time.time(), **fields, **stats}
+    line = json.dumps(record, ensure_ascii=False, default=str)
+    try:
+        with _log_lock, open(path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+    except OSError as e:
+        print(f"Không ghi được số liệu tìm kiếm vào {path}: {e}")
+        return False
+    return True
+
+
+def format_search_stats(stats: Dict[str, Any]) -> str:
+    """Chuỗi nhiều dòng để hiển thị khối stats trên GUI."""
+    if not stats:
+        return "Chưa có số liệu."
+    lines = [
+        f"Bộ tìm kiếm: {stats.get('engine', 'N/A')}",
+        f"Lấy ra: {stats.get('popped', 0)} | Mở rộng: {stats.get('expanded', 0)} | Đẩy vào: {stats.get('pushed', 0)} | Loại bỏ: {stats.get('pruned', 0)}",
+        f"Heap tối đa: {stats.get('max_heap', 0)} | Số nhãn (đỉnh): {stats.get('peak_labels', 0)}",
+    ]
+    if 'expanded_forward' in stats:
+        lines.append(f"Mở rộng xuôi / ngược: {stats['expanded_forward']} / {stats['expanded_backward']}")
+    if 'cache' in stats:
+        counters = f" (hits {stats['cache_hits']} / misses {stats['cache_misses']})" if 'cache_hits' in stats else ""
+        lines.append(f"Cache lộ trình: {stats['cache']}{counters}")
+    timings = " | ".join(f"{name} {stats[f'{name}_time'] * 1000:.1f}" for name in PHASES if f"{name}_time" in stats)
+    lines.append(f"Thời gian (ms): {timings}")
+    return "\n".join(lines)
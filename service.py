@@ -0,0 +1,395 @@
+"""
+Dịch vụ lập lộ trình chạy nền (HTTP/JSON trên asyncio, chỉ dùng thư viện chuẩn) - nạp dữ liệu một lần:
+trạm sạc và BOT (data_loader.py), catalogue + KD-tree (get_station_arrays), đồ thị trạm kề cho mọi xe
+(.cache/), cache chặng giữa các trạm (RouteCache). Mọi yêu cầu sau đó dùng lại các chỉ mục đã nạp sẵn.
+
+Endpoint (JSON vào / ra):
+- POST /route          {"car": "VinFast VF8", "start": [lat, lng], "end": [lat, lng], "battery_percent": 80,
+                        "avoid_toll": false, "algorithm": "astar" | "ucs" | "bidirectional"}
+                       -> kết quả run_*_search + "bot_stations", "total_bot_fee"
+- POST /route/batch    {"requests": [<như /route>, ...]} -> {"results": [...]} (theo thứ tự đầu vào)
+- GET  /nearest?lat=..&lng=..&k=5 -> {"stations": [{id, name, address, lat, lng, distance_km}, ...]}
+- POST /bot-check      {"points": [[lat, lng], ...]} -> {"bot_stations": [...], "total_bot_fee": ...}
+- GET  /stats          -> số yêu cầu, lỗi và độ trễ p50 / p90 / p99 (ms) của từng endpoint, số liệu RouteCache
+- GET  /health
+Tìm lộ trình (tốn CPU) chạy trong pool: mặc định luồng (dùng chung RouteCache), processes=True dùng
+batch.PlannerPool (tiến trình con gắn bảng trạm qua shared memory một lần khi khởi động). Chế độ tiến trình
+KHÔNG dùng RouteCache: cache nằm ở tiến trình chính, mỗi yêu cầu được tiến trình con tìm lại từ đầu
+(kết quả giống chế độ luồng; /health và /stats báo "route_cache": false / "enabled": false).
+Mặc định chỉ nghe trên 127.0.0.1.
+Chạy: python service.py [--port 8765] [--workers 4] [--processes]
+"""
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+import data_loader
+import file as routing
+import station_graph
+from batch import PlannerPool, RouteRequest, run_route_request
+from models import cars
+from pdf_utils import check_bot_stations
+from route_cache import RouteCache
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+LATENCY_WINDOW = 10000 # Số mẫu độ trễ gần nhất giữ cho mỗi endpoint
+PERCENTILES = (50, 90, 99)
+MAX_BODY_BYTES = 8 * 1024 * 1024
+MAX_BATCH_SIZE = 1000
+MAX_NEAREST_K = 50
+ALGORITHMS = ('astar', 'ucs', 'bidirectional')
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class ServiceError(Exception):
+    """Lỗi trả về cho client với mã HTTP status (400: dữ liệu vào không hợp lệ...)."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+class LatencyRecorder:
+    """Độ trễ theo endpoint: LATENCY_WINDOW mẫu gần nhất (deque) + tổng số yêu cầu / lỗi."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self._samples: Dict[str, deque] = {}
+        self._counts: Dict[str, List[int]] = {} # endpoint -> [số yêu cầu, số lỗi]
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, seconds: float, ok: bool = True) -> None:
+        with self._lock:
+            samples = self._samples.get(endpoint)
+            if samples is None:
+                samples = self._samples[endpoint] = deque(maxlen=self.window)
+                self._counts[endpoint] = [0, 0]
+            samples.append(seconds)
+            self._counts[endpoint][0] += 1
+            self._counts[endpoint][1] += not ok
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """{endpoint: {count, errors, p50_ms, p90_ms, p99_ms, max_ms}} (phân vị trên cửa sổ mẫu gần nhất)."""
+        with self._lock:
+            items = [(endpoint, np.fromiter(samples, dtype=np.float64), *self._counts[endpoint])
+                     for endpoint, samples in self._samples.items()]
+        report = {}
+        for endpoint, samples, count, errors in items:
+            values = np.percentile(samples, PERCENTILES) * 1000
+            report[endpoint] = {'count': count, 'errors': errors,
+                                **{f"p{p}_ms": round(float(v), 3) for p, v in zip(PERCENTILES, values)},
+                                'max_ms': round(float(samples.max()) * 1000, 3)}
+        return report
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Không chuyển được sang JSON: {type(value).__name__}")
+
+
+def _number(body: Dict[str, Any], key: str, default: Any = None) -> float:
+    value = body.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value != value:
+        raise ServiceError(f"'{key}' phải là số")
+    return float(value)
+
+
+def _flag(body: Dict[str, Any], key: str, default: bool = False) -> bool:
+    value = body.get(key, default)
+    if not isinstance(value, bool): # bool("false") là True: chỉ nhận true / false của JSON
+        raise ServiceError(f"'{key}' phải là true hoặc false")
+    return value
+
+
+def _point(value: Any, key: str) -> Tuple[float, float]:
+    if not isinstance(value, (list, tuple)) or len(value) != 2:
+        raise ServiceError(f"'{key}' phải là [lat, lng]")
+    lat, lng = (_number({key: v}, key) for v in value)
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ServiceError(f"'{key}' nằm ngoài phạm vi tọa độ")
+    return lat, lng
+
+
+class RoutingService:
+    """
+    Trạng thái dùng chung của dịch vụ (dữ liệu, chỉ mục, cache, pool) và các handler endpoint.
+    Dựng từ DataFrame có sẵn (kiểm thử) hoặc RoutingService.load() (đọc charging_stations.csv / BOT.csv).
+    workers: số luồng / tiến trình tìm lộ trình (mặc định os.cpu_count()).
+    """
+
+    def __init__(self, df_charge: pd.DataFrame, df_bot: pd.DataFrame, workers: Optional[int] = None, processes: bool = False,
+                 route_cache: Optional[RouteCache] = None, prepare_graphs: bool = True):
+        self.df_charge = df_charge
+        self.df_bot = df_bot
+        self.cars = {car.name: car for car in cars}
+        self.stations = routing.get_station_arrays(df_charge) # KD-tree + catalogue, dựng một lần
+        self.catalogue = self.stations.catalogue
+        self.route_cache = route_cache if route_cache is not None else RouteCache()
+        self.latency = LatencyRecorder()
+        self.started = time.time()
+        self.connections = set() # StreamWriter của các kết nối đang mở
+        self.workers = workers or os.cpu_count() or 1
+        self.pool: Optional[PlannerPool] = None
+        if processes:
+            self.pool = PlannerPool(df_charge, self.workers, cars=cars if prepare_graphs else None)
+        elif prepare_graphs:
+            routing.prepare_station_graphs(df_charge, cars)
+        # Luồng tìm lộ trình (chế độ luồng) và kiểm tra BOT
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='route')
+        self.routes: Dict[Tuple[str, str], Callable[..., Awaitable[Dict[str, Any]]]] = {
+            ('GET', '/health'): self.health,
+            ('GET', '/stats'): self.stats,
+            ('GET', '/nearest'): self.nearest,
+            ('POST', '/route'): self.route,
+            ('POST', '/route/batch'): self.route_batch,
+            ('POST', '/bot-check'): self.bot_check,
+        }
+
+    @classmethod
+    def load(cls, charge_file: Optional[str] = None, bot_file: Optional[str] = None, **kwargs: Any) -> 'RoutingService':
+        """Nạp dữ liệu trạm sạc / BOT và cache lộ trình trên đĩa (như GUI), trả về dịch vụ sẵn sàng."""
+        df_charge = data_loader.load_charging_stations(charge_file)
+        df_bot = data_loader.load_bot_stations(bot_file)
+        kwargs.setdefault('route_cache', RouteCache(path=os.path.join(station_graph.CACHE_DIR, 'route_cache.pkl')))
+        return cls(df_charge, df_bot, **kwargs)
+
+    # --- Chuyển đổi dữ liệu vào / ra ---
+    def _route_request(self, body: Any) -> RouteRequest:
+        if not isinstance(body, dict):
+            raise ServiceError("Yêu cầu phải là JSON object")
+        car = self.cars.get(body.get('car'))
+        if car is None:
+            raise ServiceError(f"Không có xe '{body.get('car')}'")
+        lat_start, lng_start = _point(body.get('start'), 'start')
+        lat_end, lng_end = _point(body.get('end'), 'end')
+        battery_percent = _number(body, 'battery_percent', 100) # Giữ số thực: int() sẽ biến 0.5 thành 0 % pin
+        if not 0 < battery_percent <= 100:
+            raise ServiceError("'battery_percent' phải trong (0, 100]")
+        algorithm = body.get('algorithm', 'astar')
+        if algorithm not in ALGORITHMS:
+            raise ServiceError(f"Thuật toán không hợp lệ: {algorithm}")
+        return RouteRequest(car, lat_start, lng_start, lat_end, lng_end, battery_percent,
+                            _flag(body, 'avoid_toll'), algorithm)
+
+    def _route_points(self, result: Dict[str, Any], request: RouteRequest) -> Tuple[List[Tuple[float, float]], List[Optional[int]]]:
+        """Điểm đầu, các trạm trên lộ trình (tọa độ theo id trong catalogue), điểm cuối - như GUI."""
+        points, station_ids = [(request.lat_start, request.lng_start)], [None]
+        for step in result['path'][1:-1]:
+            station_id = step.get('station_id')
+            if station_id is not None:
+                points.append(self.catalogue.coords(station_id))
+                station_ids.append(station_id)
+        points.append((request.lat_end, request.lng_end))
+        station_ids.append(None)
+        return points, station_ids
+
+    def _bots(self, points: List[Tuple[float, float]], station_ids: Optional[List[Optional[int]]] = None) -> Dict[str, Any]:
+        bots = check_bot_stations(points, self.df_bot, station_ids) if self.df_bot is not None else []
+        return {'bot_stations': bots, 'total_bot_fee': sum(bot['fee_vnd'] for bot in bots)}
+
+    def _plan_sync(self, request: RouteRequest) -> Dict[str, Any]:
+        """
+        Luồng route: tìm lộ trình (hoặc nhận kết quả từ tiến trình con - không qua RouteCache) rồi kiểm tra BOT.
+        Lỗi khi tìm lộ trình (cả chế độ luồng lẫn tiến trình) trả về {"error": ...} thay vì 500.
+        """
+        try:
+            if self.pool is not None:
+                _, result = self.pool.submit(0, request).result()
+            else:
+                result = run_route_request(self.df_charge, request, cache=self.route_cache, emit_stats=False)
+        except Exception as e:
+            result = {"error": f"Lỗi khi tìm lộ trình: {e}"}
+        if 'error' not in result:
+            result.update(self._bots(*self._route_points(result, request)))
+        return result
+
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, partial(func, *args))
+
+    # --- Endpoint ---
+    async def health(self, query: Dict[str, List[str]], body: Any) -> Dict[str, Any]:
+        return {'status': 'ok', 'stations': len(self.df_charge), 'bot_stations': 0 if self.df_bot is None else len(self.df_bot),
+                'workers': self.workers, 'mode': 'process' if self.pool is not None else 'thread',
+                'route_cache': self.pool is None, 'uptime_s': round(time.time() - self.started, 1)}
+
+    async def stats(self, query: Dict[str, List[str]], body: Any) -> Dict[str, Any]:
+        return {'endpoints': self.latency.snapshot(), 'route_cache': {**self.route_cache.stats(), 'size': len(self.route_cache),
+                                                                         'enabled': self.pool is None}}
+
+    async def nearest(self, query: Dict[str, List[str]], body: Any) -> Dict[str, Any]:
+        try:
+            lat, lng = float(query['lat'][0]), float(query['lng'][0])
+            k = int(query.get('k', ['1'])[0])
+        except (KeyError, ValueError):
+            raise ServiceError("Cần tham số lat, lng (số) và k (số nguyên, tùy chọn)")
+        lat, lng = _point([lat, lng], 'lat, lng') # Loại NaN / vô cực / ngoài phạm vi tọa độ như body JSON
+        if not 1 <= k <= MAX_NEAREST_K:
+            raise ServiceError(f"'k' phải trong [1, {MAX_NEAREST_K}]")
+        distances, positions = self.stations.spatial_index.query_nearest(lat, lng, k=k)
+        return {'stations': [{**self.catalogue.row(position), 'distance_km': round(distance, 3)}
+                             for distance, position in zip(np.asarray(distances).tolist(), np.asarray(positions).tolist())]}
+
+    async def route(self, query: Dict[str, List[str]], body: Any) -> Dict[str, Any]:
+        return await self._run(self._plan_sync, self._route_request(body))
+
+    async def route_batch(self, query: Dict[str, List[str]], body: Any) -> Dict[str, Any]:
+        items = body.get('requests') if isinstance(body, dict) else None
+        if not isinstance(items, list) or not items:
+            raise ServiceError("'requests' phải là danh sách yêu cầu /route")
+        if len(items) > MAX_BATCH_SIZE:
+            raise ServiceError(f"Tối đa {MAX_BATCH_SIZE} yêu cầu mỗi lô", 413)
+        requests = [self._route_request(item) for item in items]
+        return {'results': list(await asyncio.gather(*(self._run(self._plan_sync, request) for request in requests)))}
+
+    async def bot_check(self, query: Dict[str, List[str]], body: Any) -> Dict[str, Any]:
+        points = body.get('points') if isinstance(body, dict) else None
+        if not isinstance(points, list) or len(points) < 2:
+            raise ServiceError("'points' phải là danh sách ít nhất 2 điểm [lat, lng]")
+        return await self._run(self._bots, [_point(point, 'points') for point in points])
+
+    # --- HTTP ---
+    async def dispatch(self, method: str, target: str, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        """Gọi handler của (method, path), trả về (status, JSON) và ghi độ trễ theo endpoint."""
+        url = urlsplit(target)
+        handler = self.routes.get((method, url.path))
+        if handler is None:
+            allowed = [m for m, path in self.routes if path == url.path]
+            return (405, {'error': f"Chỉ hỗ trợ {', '.join(allowed)}"}) if allowed else (404, {'error': f"Không có endpoint {url.path}"})
+        endpoint = f"{method} {url.path}"
+        start = time.perf_counter()
+        try:
+            payload = json.loads(body) if body else None
+            status, response = 200, await handler(parse_qs(url.query), payload)
+        except json.JSONDecodeError as e:
+            status, response = 400, {'error': f"JSON không hợp lệ: {e}"}
+        except ServiceError as e:
+            status, response = e.status, {'error': str(e)}
+        except Exception as e:
+            status, response = 500, {'error': f"Lỗi máy chủ: {e}"}
+        self.latency.record(endpoint, time.perf_counter() - start, ok=status == 200 and 'error' not in response)
+        return status, response
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """HTTP/1.1 tối giản: Content-Length, keep-alive; mỗi kết nối xử lý tuần tự các yêu cầu."""
+        self.connections.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                parts = request_line.decode('latin1').split()
+                keep_alive = len(parts) == 3 and parts[2] == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                try:
+                    length = int(headers.get('content-length', 0))
+                except ValueError:
+                    length = -1
+                if len(parts) != 3 or not parts[2].startswith('HTTP/') or length < 0:
+                    status, response, keep_alive = 400, {'error': "Yêu cầu HTTP không hợp lệ"}, False
+                elif length > MAX_BODY_BYTES:
+                    status, response, keep_alive = 413, {'error': f"Body quá {MAX_BODY_BYTES} byte"}, False
+                else:
+                    body = await reader.readexactly(length) if length else b''
+                    status, response = await self.dispatch(parts[0].upper(), parts[1], body)
+                data = json.dumps(response, ensure_ascii=False, default=_json_default).encode('utf-8')
+                writer.write(f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\nContent-Type: application/json; charset=utf-8\r\n"
+                             f"Content-Length: {len(data)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin1') + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.connections.discard(writer)
+            writer.close()
+
+    async def start(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    def close(self) -> None:
+        """Dừng pool, lưu cache lộ trình ra đĩa (nếu có đường dẫn)."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.pool is not None:
+            self.pool.close()
+        self.route_cache.save()
+
+
+class BackgroundServer:
+    """Chạy RoutingService trên một event loop ở luồng riêng (kiểm thử / nhúng vào script); port=0 -> cổng trống bất kỳ."""
+
+    def __init__(self, service: RoutingService, host: str = DEFAULT_HOST, port: int = 0):
+        self.service = service
+        self.host = host
+        self._loop = asyncio.new_event_loop()
+        self._server = self._loop.run_until_complete(service.start(host, port))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._thread = threading.Thread(target=self._loop.run_forever, name='routing-service', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        async def shutdown():
+            self._server.close()
+            await self._server.wait_closed()
+            # Kết nối keep-alive còn mở: đóng để task xử lý của chúng kết thúc
+            for writer in list(self.service.connections):
+                writer.close()
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            await asyncio.gather(*tasks, return_exceptions=True)
+        asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+async def _serve_forever(service: RoutingService, host: str, port: int) -> None:
+    server = await service.start(host, port)
+    print(f"Dịch vụ lập lộ trình đang chạy tại http://{host}:{port} ({len(service.df_charge)} trạm sạc)")
+    async with server:
+        await server.serve_forever()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Dịch vụ lập lộ trình xe điện (HTTP/JSON)")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=None, help="Số luồng / tiến trình tìm lộ trình (mặc định: số CPU)")
+    parser.add_argument('--processes', action='store_true', help="Tìm lộ trình trong pool tiến trình thay vì luồng")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    service = RoutingService.load(workers=args.workers, processes=args.processes)
+    print(f"Đã nạp dữ liệu và chỉ mục trong {time.perf_counter() - t0:.2f} giây")
+    try:
+        asyncio.run(_serve_forever(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
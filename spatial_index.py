@@ -0,0 +1,180 @@
+"""
+Chỉ mục không gian (KD-tree) cho tọa độ trạm sạc.
+
+Các điểm (vĩ độ, kinh độ) được chiếu lên mặt cầu đơn vị (x, y, z). Khoảng cách dây cung
+giữa hai điểm đơn điệu theo khoảng cách vòng lớn, nên KD-tree 3 chiều trả lời chính xác:
+- query_nearest: k trạm gần nhất (theo khoảng cách vòng lớn)
+- query_radius: các trạm trong bán kính r km (theo khoảng cách vòng lớn)
+với độ phức tạp trung bình O(log N) (cộng số điểm trả về).
+"""
+import heapq
+from math import radians, sin, cos
+from typing import List, Tuple
+
+import numpy as np
+
+R_EARTH = 6371.0 # Bán kính Trái Đất (km)
+LEAF_SIZE = 32 # Số điểm tối đa trong một lá
+
+
+def _to_unit_xyz(lat: np.ndarray, lng: np.ndarray) -> np.ndarray:
+    lat_rad = np.radians(lat)
+    lng_rad = np.radians(lng)
+    cos_lat = np.cos(lat_rad)
+    return np.column_stack((cos_lat * np.cos(lng_rad), cos_lat * np.sin(lng_rad), np.sin(lat_rad)))
+
+
+def _point_xyz(lat: float, lng: float) -> Tuple[float, float, float]:
+    lat_rad, lng_rad = radians(lat), radians(lng)
+    return cos(lat_rad) * cos(lng_rad), cos(lat_rad) * sin(lng_rad), sin(lat_rad)
+
+
+def km_to_chord(radius_km: float) -> float:
+    """Đổi khoảng cách vòng lớn (km) sang độ dài dây cung trên mặt cầu đơn vị."""
+    theta = radius_km / R_EARTH
+    if theta >= np.pi:
+        return 2.0
+    return 2.0 * sin(theta / 2)
+
+
+def chord_to_km(chord: np.ndarray) -> np.ndarray:
+    """Đổi độ dài dây cung (mặt cầu đơn vị) sang khoảng cách vòng lớn (km)."""
+    return 2.0 * R_EARTH * np.arcsin(np.clip(chord / 2.0, 0.0, 1.0))
+
+
+class SpatialIndex:
+    """
+    KD-tree trên tọa độ 3 chiều của các trạm. Các điểm có tọa độ NaN bị bỏ qua.
+    Kết quả trả về là vị trí (position) của trạm trong mảng lat/lng ban đầu.
+    """
+
+    def __init__(self, lat: np.ndarray, lng: np.ndarray, leaf_size: int = LEAF_SIZE):
+        lat = np.asarray(lat, dtype=np.float64)
+        lng = np.asarray(lng, dtype=np.float64)
+        valid = np.flatnonzero(~(np.isnan(lat) | np.isnan(lng)))
+        self.size = len(lat)
+        self.leaf_size = leaf_size
+
+        xyz = _to_unit_xyz(lat[valid], lng[valid])
+        perm = np.arange(len(valid))
+
+        # Các nút được lưu dạng danh sách phẳng: [start, end) trên perm, hộp bao, con trái/phải
+        starts, ends, lefts, rights, lows, highs = [], [], [], [], [], []
+
+        def new_node(start: int, end: int) -> int:
+            pts = xyz[perm[start:end]]
+            starts.append(start)
+            ends.append(end)
+            lefts.append(-1)
+            rights.append(-1)
+            lows.append(pts.min(axis=0).tolist() if end > start else [0.0, 0.0, 0.0])
+            highs.append(pts.max(axis=0).tolist() if end > start else [0.0, 0.0, 0.0])
+            return len(starts) - 1
+
+        stack = [new_node(0, len(valid))]
+        while stack:
+            node = stack.pop()
+            start, end = starts[node], ends[node]
+            if end - start <= leaf_size:
+                continue
+            # Chia theo chiều có hộp bao rộng nhất, tại trung vị
+            dim = int(np.argmax(np.subtract(highs[node], lows[node])))
+            mid = (start + end) // 2
+            sub = perm[start:end]
+            order = np.argpartition(xyz[sub, dim], mid - start)
+            perm[start:end] = sub[order]
+            lefts[node] = new_node(start, mid)
+            rights[node] = new_node(mid, end)
+            stack.append(lefts[node])
+            stack.append(rights[node])
+
+        # Sắp xếp lại tọa độ theo perm để mỗi lá là một đoạn liên tục
+        self._xyz = np.ascontiguousarray(xyz[perm])
+        self._positions = valid[perm]
+        self._starts, self._ends = starts, ends
+        self._lefts, self._rights = lefts, rights
+        self._lows, self._highs = lows, highs
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def _box_min_dist2(self, node: int, q: Tuple[float, float, float]) -> float:
+        lo, hi = self._lows[node], self._highs[node]
+        d2 = 0.0
+        for i in range(3):
+            if q[i] < lo[i]:
+                d2 += (lo[i] - q[i]) ** 2
+            elif q[i] > hi[i]:
+                d2 += (q[i] - hi[i]) ** 2
+        return d2
+
+    def _box_max_dist2(self, node: int, q: Tuple[float, float, float]) -> float:
+        lo, hi = self._lows[node], self._highs[node]
+        return sum(max(q[i] - lo[i], hi[i] - q[i]) ** 2 for i in range(3))
+
+    def query_nearest(self, lat: float, lng: float, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Tìm k trạm gần nhất. Trả về (khoảng cách km, vị trí trạm), sắp tăng dần theo khoảng cách.
+        """
+        if len(self) == 0 or k <= 0:
+            return np.zeros(0), np.zeros(0, dtype=np.int64)
+        q = _point_xyz(lat, lng)
+        qv = np.array(q)
+        best: List[Tuple[float, int]] = [] # max-heap (-d2, vị trí trong cây)
+        frontier = [(0.0, 0)] # min-heap theo khoảng cách tới hộp bao
+        while frontier:
+            box_d2, node = heapq.heappop(frontier)
+            if len(best) == k and box_d2 > -best[0][0]:
+                break
+            left = self._lefts[node]
+            if left < 0:
+                start, end = self._starts[node], self._ends[node]
+                d2 = ((self._xyz[start:end] - qv) ** 2).sum(axis=1)
+                if end - start > k:
+                    cand = np.argpartition(d2, k - 1)[:k]
+                else:
+                    cand = np.arange(end - start)
+                for i, dist2 in zip(cand.tolist(), d2[cand].tolist()):
+                    if len(best) < k:
+                        heapq.heappush(best, (-dist2, start + i))
+                    elif dist2 < -best[0][0]:
+                        heapq.heapreplace(best, (-dist2, start + i))
+                continue
+            for child in (left, self._rights[node]):
+                child_d2 = self._box_min_dist2(child, q)
+                if len(best) < k or child_d2 <= -best[0][0]:
+                    heapq.heappush(frontier, (child_d2, child))
+        best.sort(key=lambda item: (-item[0], self._positions[item[1]]))
+        chords = np.sqrt(np.array([-d2 for d2, _ in best]))
+        positions = self._positions[[i for _, i in best]]
+        return chord_to_km(chords), positions
+
+    def query_radius(self, lat: float, lng: float, radius_km: float) -> np.ndarray:
+        """
+        Tìm tất cả trạm có khoảng cách vòng lớn <= radius_km. Trả về vị trí trạm (sắp tăng dần).
+        """
+        if len(self) == 0 or radius_km < 0:
+            return np.zeros(0, dtype=np.int64)
+        q = _point_xyz(lat, lng)
+        qv = np.array(q)
+        r2 = km_to_chord(radius_km) ** 2
+        parts = []
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            if self._box_min_dist2(node, q) > r2:
+                continue
+            start, end = self._starts[node], self._ends[node]
+            if self._box_max_dist2(node, q) <= r2:
+                parts.append(self._positions[start:end]) # Cả hộp nằm trong bán kính
+                continue
+            left = self._lefts[node]
+            if left < 0:
+                d2 = ((self._xyz[start:end] - qv) ** 2).sum(axis=1)
+                parts.append(self._positions[start:end][d2 <= r2])
+                continue
+            stack.append(left)
+            stack.append(self._rights[node])
+        if not parts:
+            return np.zeros(0, dtype=np.int64)
+        return np.sort(np.concatenate(parts))
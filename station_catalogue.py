@@ -0,0 +1,168 @@
+"""
+Danh mục trạm sạc (station catalogue) dùng chung cho tìm kiếm, hậu xử lý, bản đồ, kiểm tra BOT và PDF.
+
+Mỗi trạm có một id ổn định = vị trí hàng trong df_charge (0..n-1, cố định với cùng phiên bản dữ liệu).
+Trạm trùng tên có id khác nhau; tra theo tên trả về hàng đầu tiên (giống df[df['name'] == tên].iloc[0]).
+Chỉ mục:
+- tên -> danh sách id
+- nhãn index của df_charge -> id
+- tọa độ (làm tròn theo ô COORD_TOLERANCE) -> danh sách id
+Mọi tra cứu đều O(1), không quét lại DataFrame.
+"""
+import hashlib
+import weakref
+from collections import OrderedDict
+from math import floor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from station_graph import station_data_version
+
+COORD_TOLERANCE = 1e-4 # Sai số tọa độ (độ) khi tra trạm theo tọa độ (giống bản đồ cũ)
+_CATALOGUE_CACHE_SIZE = 8
+
+_catalogue_cache: Dict[str, 'StationCatalogue'] = {}
+
+
+class FrameCache:
+    """
+    Cache theo từng DataFrame đã nạp: khóa id(df), kèm weakref (id bị dùng lại sau khi df bị thu hồi không trùng)
+    và một phép kiểm tra rẻ (số hàng, đối tượng index, tên cột). Tra cứu O(1), không băm nội dung DataFrame.
+    Sửa giá trị tại chỗ trên một DataFrame đã dùng không được phát hiện: hãy sửa trên bản copy (hoặc gọi clear()).
+    """
+
+    def __init__(self, maxsize: int = 8):
+        self.maxsize = maxsize
+        self._entries: 'OrderedDict[int, Tuple[Any, Tuple, Any]]' = OrderedDict()
+
+    @staticmethod
+    def _guard(df: pd.DataFrame) -> Tuple:
+        return len(df), id(df.index), tuple(df.columns)
+
+    def get(self, df: pd.DataFrame, build: Callable[[], Any]) -> Any:
+        """Giá trị đã dựng cho df, hoặc build() (một lần cho mỗi DataFrame)."""
+        key = id(df)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0]() is df and entry[1] == self._guard(df):
+            return entry[2]
+        value = build()
+        self._entries[key] = (weakref.ref(df), self._guard(df), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+_catalogue_frames = FrameCache(_CATALOGUE_CACHE_SIZE)
+
+
+class StationCatalogue:
+    """Các cột name / address / lat / lng theo id, kèm chỉ mục theo tên, nhãn index và tọa độ."""
+
+    def __init__(self, df_charge: pd.DataFrame, version: Optional[str] = None, content_version: Optional[str] = None):
+        self.version = version if version is not None else station_data_version(df_charge)
+        self.content_version = content_version if content_version is not None else catalogue_data_version(df_charge, self.version)
+        self.names: List[str] = df_charge['name'].tolist()
+        self.addresses: List[Any] = df_charge['address'].tolist() if 'address' in df_charge.columns else [''] * len(df_charge)
+        self.lat = df_charge['lat'].to_numpy(dtype=np.float64)
+        self.lng = df_charge['lng'].to_numpy(dtype=np.float64)
+        self.labels = df_charge.index.tolist()
+
+        self._ids_by_name: Dict[str, List[int]] = {}
+        for station_id, name in enumerate(self.names):
+            self._ids_by_name.setdefault(name, []).append(station_id)
+        self._id_by_label = {label: station_id for station_id, label in reversed(list(enumerate(self.labels)))}
+        self._ids_by_cell: Dict[Tuple[int, int], List[int]] = {}
+        for station_id, (lat, lng) in enumerate(zip(self.lat.tolist(), self.lng.tolist())):
+            if lat == lat and lng == lng: # Bỏ qua tọa độ NaN
+                self._ids_by_cell.setdefault(self._cell(lat, lng), []).append(station_id)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @staticmethod
+    def _cell(lat: float, lng: float) -> Tuple[int, int]:
+        return floor(lat / COORD_TOLERANCE), floor(lng / COORD_TOLERANCE)
+
+    def id_of(self, name: str) -> Optional[int]:
+        """Id của hàng đầu tiên có tên này (None nếu không có)."""
+        ids = self._ids_by_name.get(name)
+        return ids[0] if ids else None
+
+    def ids_of(self, name: str) -> List[int]:
+        """Tất cả id có tên này (trạm trùng tên), theo thứ tự hàng."""
+        return list(self._ids_by_name.get(name, ()))
+
+    def id_of_label(self, label: Any) -> Optional[int]:
+        """Id của hàng có nhãn index này trong df_charge."""
+        return self._id_by_label.get(label)
+
+    def id_at(self, lat: float, lng: float, tolerance: float = COORD_TOLERANCE) -> Optional[int]:
+        """Id nhỏ nhất có |Δlat| < tolerance và |Δlng| < tolerance (tolerance <= COORD_TOLERANCE)."""
+        row, col = self._cell(lat, lng)
+        found = [station_id for dr in (-1, 0, 1) for dc in (-1, 0, 1) for station_id in self._ids_by_cell.get((row + dr, col + dc), ())
+                 if abs(self.lat[station_id] - lat) < tolerance and abs(self.lng[station_id] - lng) < tolerance]
+        return min(found) if found else None
+
+    def resolve(self, ref: Any) -> Optional[int]:
+        """Chuẩn hóa tham chiếu trạm (id số nguyên hoặc tên) thành id; None nếu không hợp lệ."""
+        if isinstance(ref, str):
+            return self.id_of(ref)
+        if isinstance(ref, (int, np.integer)) and not isinstance(ref, bool) and 0 <= ref < len(self.names):
+            return int(ref)
+        return None
+
+    def name(self, station_id: int) -> str:
+        return self.names[station_id]
+
+    def address(self, station_id: int) -> Any:
+        return self.addresses[station_id]
+
+    def coords(self, station_id: int) -> Tuple[float, float]:
+        return float(self.lat[station_id]), float(self.lng[station_id])
+
+    def row(self, station_id: int) -> Dict[str, Any]:
+        """Thông tin trạm dạng dict (id, name, address, lat, lng)."""
+        lat, lng = self.coords(station_id)
+        return {'id': station_id, 'name': self.names[station_id], 'address': self.addresses[station_id], 'lat': lat, 'lng': lng}
+
+
+def catalogue_data_version(df_charge: pd.DataFrame, version: Optional[str] = None) -> str:
+    """
+    Hash toàn bộ dữ liệu của danh mục: station_data_version (tên + tọa độ) cộng địa chỉ và nhãn index.
+    station_data_version chỉ đủ cho đồ thị / chỉ mục tìm kiếm; danh mục, cache StationArrays và lớp tĩnh
+    bản đồ còn hiển thị địa chỉ và tra theo nhãn, nên phải khóa theo hash này.
+    """
+    h = hashlib.sha1((version if version is not None else station_data_version(df_charge)).encode())
+    addresses = df_charge['address'].tolist() if 'address' in df_charge.columns else []
+    h.update('\x1f'.join(map(str, addresses)).encode('utf-8'))
+    h.update(b'\x1e')
+    h.update('\x1f'.join(map(repr, df_charge.index.tolist())).encode('utf-8'))
+    return h.hexdigest()
+
+
+def get_station_catalogue(df_charge: pd.DataFrame, version: Optional[str] = None) -> StationCatalogue:
+    """
+    Lấy StationCatalogue cho df_charge (version = station_data_version tính sẵn nếu có).
+    Hai tầng cache: theo DataFrame (FrameCache, O(1) - các hash chỉ tính một lần cho mỗi DataFrame được nạp),
+    rồi theo catalogue_data_version (DataFrame khác nhưng cùng nội dung dùng chung một danh mục).
+    """
+    return _catalogue_frames.get(df_charge, lambda: _catalogue_for_content(df_charge, version))
+
+
+def _catalogue_for_content(df_charge: pd.DataFrame, version: Optional[str]) -> StationCatalogue:
+    if version is None:
+        version = station_data_version(df_charge)
+    content_version = catalogue_data_version(df_charge, version)
+    catalogue = _catalogue_cache.get(content_version)
+    if catalogue is None:
+        catalogue = StationCatalogue(df_charge, version, content_version)
+        if len(_catalogue_cache) >= _CATALOGUE_CACHE_SIZE:
+            _catalogue_cache.pop(next(iter(_catalogue_cache)))
+        _catalogue_cache[content_version] = catalogue
+    return catalogue
@@ -0,0 +1,217 @@
+"""
+Đồ thị khả năng tiếp cận giữa các trạm sạc (reachability graph).
+
+Với mỗi quãng đường tối đa của xe (max_km_per_charge), hai trạm được nối với nhau
+nếu quãng đường đường bộ ước tính (Haversine x ROAD_FACTOR) không vượt quá giới hạn đó.
+Đồ thị được lưu dạng CSR (indptr / indices / dist) và được cache:
+- trong bộ nhớ, theo (phiên bản dữ liệu, quãng đường, ROAD_FACTOR)
+- trên đĩa (.cache/), tên file chứa hash nội dung dữ liệu trạm sạc
+"""
+import hashlib
+import heapq
+import os
+from typing import Dict, Tuple, Optional
+
+import numpy as np
+import pandas as pd
+
+R_EARTH = 6371.0 # Bán kính Trái Đất (km)
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+
+# Cache trong bộ nhớ: (version, max_km, road_factor) -> ReachabilityGraph
+_graph_cache: Dict[Tuple[str, float, float], 'ReachabilityGraph'] = {}
+
+
+def station_data_version(df_charge: pd.DataFrame) -> str:
+    """
+    Hash nội dung dữ liệu trạm sạc (tên + tọa độ, theo đúng thứ tự hàng).
+    Dùng làm khóa cache: dữ liệu thay đổi -> hash thay đổi -> đồ thị được dựng lại.
+    """
+    h = hashlib.sha1()
+    h.update(str(len(df_charge)).encode())
+    h.update(np.ascontiguousarray(df_charge['lat'].to_numpy(dtype=np.float64)).tobytes())
+    h.update(np.ascontiguousarray(df_charge['lng'].to_numpy(dtype=np.float64)).tobytes())
+    h.update('\x1f'.join(map(str, df_charge['name'].tolist())).encode('utf-8'))
+    return h.hexdigest()
+
+
+class ReachabilityGraph:
+    """
+    Đồ thị thưa dạng CSR: các trạm kề của trạm ở vị trí i là indices[indptr[i]:indptr[i+1]],
+    quãng đường đường bộ tương ứng nằm trong dist (km). Danh sách kề được sắp tăng theo vị trí.
+    """
+    __slots__ = ('indptr', 'indices', 'dist', 'max_km', 'road_factor')
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, dist: np.ndarray, max_km: float, road_factor: float):
+        self.indptr = indptr
+        self.indices = indices
+        self.dist = dist
+        self.max_km = max_km
+        self.road_factor = road_factor
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.indptr) - 1
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.indices)
+
+    def neighbors(self, pos: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Trả về (vị trí các trạm kề, quãng đường đường bộ tới từng trạm)."""
+        lo, hi = self.indptr[pos], self.indptr[pos + 1]
+        return self.indices[lo:hi], self.dist[lo:hi]
+
+    def degree(self, pos: int) -> int:
+        return int(self.indptr[pos + 1] - self.indptr[pos])
+
+    def save(self, path: str) -> None:
+        """Ghi đồ thị ra file .npz (ghi vào file tạm rồi đổi tên để tránh file hỏng)."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, indptr=self.indptr, indices=self.indices, dist=self.dist,
+                 meta=np.array([self.max_km, self.road_factor], dtype=np.float64))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'ReachabilityGraph':
+        with np.load(path) as data:
+            max_km, road_factor = data['meta'].tolist()
+            return cls(data['indptr'], data['indices'], data['dist'], max_km, road_factor)
+
+
+def build_reachability_graph(stations, max_km: float, road_factor: float) -> ReachabilityGraph:
+    """
+    Dựng đồ thị từ mảng tọa độ trạm sạc (file.StationArrays).
+    Ứng viên của mỗi trạm lấy từ truy vấn bán kính trên chỉ mục không gian (KD-tree),
+    sau đó lọc chính xác bằng Haversine vector hóa trên tập ứng viên.
+    """
+    n = len(stations)
+    index = stations.spatial_index
+    # Bán kính vòng lớn tương ứng (cộng biên nhỏ để không bỏ sót trạm nằm sát ngưỡng)
+    radius_km = max_km / road_factor + 1e-6
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    indices_parts = []
+    dist_parts = []
+    for i in range(n):
+        cand = index.query_radius(stations.lat[i], stations.lng[i], radius_km)
+        cand = cand[cand != i]
+        dist_road = haversine_vec_subset(stations, i, cand) * road_factor
+        keep = dist_road <= max_km
+        nbrs = cand[keep]
+        indices_parts.append(nbrs.astype(np.int32))
+        dist_parts.append(dist_road[keep])
+        indptr[i + 1] = indptr[i] + len(nbrs)
+    indices = np.concatenate(indices_parts) if indices_parts else np.zeros(0, dtype=np.int32)
+    dist = np.concatenate(dist_parts) if dist_parts else np.zeros(0, dtype=np.float64)
+    return ReachabilityGraph(indptr, indices, dist, max_km, road_factor)
+
+
+def haversine_vec_subset(stations, pos: int, cand: np.ndarray) -> np.ndarray:
+    """Khoảng cách Haversine (km) từ trạm pos tới các trạm trong cand."""
+    dlat = stations.lat_rad[cand] - stations.lat_rad[pos]
+    dlng = stations.lng_rad[cand] - stations.lng_rad[pos]
+    a = np.sin(dlat/2)**2 + stations.cos_lat[pos] * stations.cos_lat[cand] * np.sin(dlng/2)**2
+    return R_EARTH * (2 * np.arctan2(np.sqrt(a), np.sqrt(1-a)))
+
+
+def graph_cache_path(version: str, max_km: float, road_factor: float, cache_dir: Optional[str] = None) -> str:
+    cache_dir = CACHE_DIR if cache_dir is None else cache_dir
+    return os.path.join(cache_dir, f"reach_{version[:16]}_{max_km:g}km_rf{road_factor:g}.npz")
+
+
+def get_reachability_graph(stations, max_km: float, road_factor: float, version: str,
+                           cache_dir: Optional[str] = None) -> ReachabilityGraph:
+    """
+    Lấy đồ thị cho (dữ liệu, quãng đường): bộ nhớ -> đĩa -> dựng mới (và ghi ra đĩa).
+    cache_dir=None: CACHE_DIR (đọc lúc gọi); cache_dir='': chỉ cache trong bộ nhớ.
+    """
+    if cache_dir is None:
+        cache_dir = CACHE_DIR
+    key = (version, float(max_km), float(road_factor))
+    graph = _graph_cache.get(key)
+    if graph is not None:
+        return graph
+
+    path = graph_cache_path(version, max_km, road_factor, cache_dir) if cache_dir else None
+    if path and os.path.exists(path):
+        try:
+            graph = ReachabilityGraph.load(path)
+            if graph.num_nodes != len(stations):
+                graph = None # File cache không khớp dữ liệu -> dựng lại
+        except Exception as e:
+            print(f"Lỗi khi đọc cache đồ thị {path}: {e}")
+            graph = None
+
+    if graph is None:
+        graph = build_reachability_graph(stations, max_km, road_factor)
+        if path:
+            try:
+                graph.save(path)
+            except OSError as e:
+                print(f"Không ghi được cache đồ thị {path}: {e}")
+
+    _graph_cache[key] = graph
+    return graph
+
+
+def clear_graph_cache() -> None:
+    """Xóa cache đồ thị trong bộ nhớ (không xóa file trên đĩa)."""
+    _graph_cache.clear()
+
+
+def graph_dijkstra(graph: ReachabilityGraph, source: int) -> np.ndarray:
+    """
+    Dijkstra một nguồn trên đồ thị trạm kề (trọng số = quãng đường đường bộ).
+    Trả về mảng khoảng cách ngắn nhất (km) tới mọi trạm; np.inf nếu không tới được.
+    """
+    return shortest_path_tree(graph, source)[0]
+
+
+def shortest_path_tree(graph: ReachabilityGraph, source: int, targets=None, stats: Optional[Dict[str, int]] = None,
+                       blocked: Optional[np.ndarray] = None, penalty: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Cây đường đi ngắn nhất từ source: (khoảng cách km, vị trí trạm cha; -1 cho gốc / trạm không tới được).
+    targets: dừng sớm khi mọi trạm trong tập này đã được chốt (None = duyệt hết).
+    blocked: (tùy chọn) mảng bool theo thứ tự cạnh CSR - các cạnh bị bỏ qua (vd. cạnh qua trạm thu phí).
+    penalty: (tùy chọn) chi phí cộng thêm (km) theo thứ tự cạnh CSR; khi đó "khoảng cách" trả về là quãng đường + phạt.
+    stats: (tùy chọn) nhận số liệu popped, expanded, pushed, max_heap.
+    """
+    dist = np.full(graph.num_nodes, np.inf)
+    parent = np.full(graph.num_nodes, -1, dtype=np.int64)
+    done = np.zeros(graph.num_nodes, dtype=bool)
+    remaining = set(targets) if targets is not None else None
+    counters = {'popped': 0, 'expanded': 0, 'pushed': 0, 'max_heap': 1}
+    dist[source] = 0.0
+    heap = [(0.0, source)]
+    while heap:
+        d, u = heapq.heappop(heap)
+        counters['popped'] += 1
+        if done[u]:
+            continue
+        done[u] = True
+        if remaining is not None:
+            remaining.discard(u)
+            if not remaining:
+                break
+        counters['expanded'] += 1
+        nbrs, weights = graph.neighbors(u)
+        if penalty is not None:
+            weights = weights + penalty[graph.indptr[u]:graph.indptr[u + 1]]
+        if blocked is not None:
+            free = ~blocked[graph.indptr[u]:graph.indptr[u + 1]]
+            nbrs, weights = nbrs[free], weights[free]
+        cand = d + weights
+        improved = cand < dist[nbrs]
+        if not improved.any():
+            continue
+        nbrs, cand = nbrs[improved], cand[improved]
+        dist[nbrs] = cand
+        parent[nbrs] = u
+        for v, dv in zip(nbrs.tolist(), cand.tolist()):
+            heapq.heappush(heap, (dv, v))
+        counters['pushed'] += len(nbrs)
+        counters['max_heap'] = max(counters['max_heap'], len(heap))
+    if stats is not None:
+        stats.update(counters)
+    return dist, parent
@@ -1,7 +1,75 @@
 import unittest
 from models import ElectricCar, cars
-from file import haversine, find_nearest_node
+from file import haversine, find_nearest_node, StationArrays, _select_nearest_to_goal, SearchLabels, astar_charging_stations, ucs_charging_stations, _is_dominated, _quantize_soc, bidirectional_charging_stations, run_astar_search, run_ucs_search, anytime_astar_charging_stations, dijkstra_charging_tree, run_ucs_one_to_many, get_station_arrays, NO_TOLL_FREE_ROUTE_WARNING, find_nearest_station
 import pandas as pd
+import numpy as np
+import heapq
+import time
+import os
+import tempfile
+from unittest import mock
+from spatial_index import SpatialIndex
+from station_graph import build_reachability_graph, get_reachability_graph, station_data_version, clear_graph_cache, graph_dijkstra, shortest_path_tree
+from landmarks import build_landmark_table, get_landmark_table, _landmark_cache
+import station_graph
+import transit_table
+import json
+from search_stats import emit_search_stats, format_search_stats, STATS_LOG_ENV
+from batch import RouteRequest, SharedStationTable, plan_routes_batch
+import batch as batch_module
+from concurrent.futures import ProcessPoolExecutor
+from route_cache import RouteCache, route_cache_key
+from station_catalogue import StationCatalogue, get_station_catalogue
+from pdf_utils import check_bot_stations, load_bot_stations, point_segment_distance_km, parse_fee
+import toll_edges
+from toll_edges import build_toll_edges, get_toll_edges
+import threading
+import queue
+import shutil
+import subprocess
+import sys
+import importlib.util
+import data_loader
+from search_control import SearchControl
+from geocoding import GeocodeCache, GeocodingService, TokenBucket, normalize_address, coord_key
+from offline_geocoder import OfflineGeocoder, build_offline_geocoder
+import route_map
+import pdf_renderer
+import export_pdf
+import service
+import asyncio
+import http.client
+import socket
+import re
+import zlib
+from fpdf.ttfonts import TTFontFile
+
+
+# Chuỗi trạm thử Bắc - Nam S0..S4 (cách nhau ~55-70 km), dùng chung cho các bài test tìm kiếm
+CHAIN_COORDS = [(21.0, 105.8), (20.5, 105.85), (20.0, 105.8), (19.5, 105.75), (19.0, 105.8)]
+SIDE_COORDS = [(20.7, 106.2), (20.2, 105.4), (19.7, 106.1)] # Trạm lệch ngang khỏi chuỗi
+HCM_COORDS = (10.771, 106.701) # TP.HCM: không tới được từ chuỗi với tầm pin 100 km
+
+
+def make_stations(extra=(), names=None, addresses=None, index=None) -> pd.DataFrame:
+    """DataFrame trạm thử: chuỗi S0..S4 cộng các trạm extra [(lat, lng)]; tên mặc định S<i>, địa chỉ A<i>."""
+    coords = CHAIN_COORDS + list(extra)
+    return pd.DataFrame({
+        'name': names or [f'S{i}' for i in range(len(coords))],
+        'address': addresses or [f'A{i}' for i in range(len(coords))],
+        'lat': [lat for lat, _ in coords],
+        'lng': [lng for _, lng in coords]
+    }, index=index)
+
+
+def use_temp_cache_dir(test: unittest.TestCase) -> str:
+    """Ghi cache trên đĩa (đồ thị trạm kề, mốc ALT, bảng chuyển tiếp, cạnh BOT) vào thư mục tạm thay vì .cache/ của repo."""
+    tmp = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, tmp, True)
+    patch = mock.patch.object(station_graph, 'CACHE_DIR', tmp)
+    patch.start()
+    test.addCleanup(patch.stop)
+    return tmp
 
 
 class TestElectricCar(unittest.TestCase):
@@ -100,5 +168,1275 @@ class TestFindNearestNode(unittest.TestCase):
         self.assertEqual(nearest, 'unknown')
 
 
+class TestStationArrays(unittest.TestCase):
+    def setUp(self):
+        self.df_charge = pd.DataFrame({
+            'name': ['Station A', 'Station B', 'Station C', 'Station D'],
+            'address': ['Address A', 'Address B', 'Address C', 'Address D'],
+            'lat': [21.0, 20.5, 20.0, 10.771],
+            'lng': [105.0, 105.5, 106.0, 106.701]
+        })
+
+    def test_distances_match_scalar_haversine(self):
+        """Khoảng cách vector hóa phải khớp với hàm haversine vô hướng"""
+        stations = StationArrays(self.df_charge)
+        dists = stations.distances_from(0)
+        for j, row in self.df_charge.iterrows():
+            self.assertAlmostEqual(dists[j], haversine(21.0, 105.0, row['lat'], row['lng']), places=9)
+
+    def test_invalid_coordinates_raise(self):
+        df = self.df_charge.copy()
+        df.loc[0, 'lat'] = 95.0
+        with self.assertRaises(ValueError):
+            StationArrays(df)
+
+    def test_select_nearest_matches_nsmallest(self):
+        """argpartition phải chọn giống heapq.nsmallest, kể cả khi có giá trị bằng nhau"""
+        dist_to_end = np.array([5.0, 1.0, 3.0, 1.0, 2.0, 3.0, 0.5, 3.0])
+        cand = np.array([0, 1, 2, 3, 4, 5, 7])
+        expected = [i for _, i in heapq.nsmallest(4, [(dist_to_end[i], i) for i in cand])]
+        self.assertEqual(_select_nearest_to_goal(cand, dist_to_end, k=4).tolist(), expected)
+
+
+class TestReachabilityGraph(unittest.TestCase):
+    def setUp(self):
+        self.df_charge = pd.DataFrame({
+            'name': ['Station A', 'Station B', 'Station C', 'Station D'],
+            'address': ['Address A', 'Address B', 'Address C', 'Address D'],
+            'lat': [21.0, 20.5, 20.0, 10.771],
+            'lng': [105.0, 105.5, 106.0, 106.701]
+        })
+        self.stations = StationArrays(self.df_charge)
+
+    def test_edges_within_range(self):
+        """Cạnh chỉ nối các trạm có quãng đường đường bộ <= max_km"""
+        graph = build_reachability_graph(self.stations, 200, 1.25)
+        for i in range(len(self.df_charge)):
+            nbrs, dists = graph.neighbors(i)
+            self.assertNotIn(i, nbrs.tolist())
+            for j, d in zip(nbrs.tolist(), dists.tolist()):
+                self.assertLessEqual(d, 200)
+                self.assertAlmostEqual(d, haversine(self.df_charge.lat[i], self.df_charge.lng[i], self.df_charge.lat[j], self.df_charge.lng[j]) * 1.25, places=6)
+        # Trạm D (TP.HCM) quá xa các trạm miền Bắc
+        self.assertEqual(graph.degree(3), 0)
+
+    def test_disk_cache_roundtrip(self):
+        clear_graph_cache()
+        version = station_data_version(self.df_charge)
+        with tempfile.TemporaryDirectory() as tmp:
+            g1 = get_reachability_graph(self.stations, 200, 1.25, version, cache_dir=tmp)
+            self.assertEqual(len(os.listdir(tmp)), 1)
+            clear_graph_cache()
+            g2 = get_reachability_graph(self.stations, 200, 1.25, version, cache_dir=tmp)
+            self.assertEqual(g1.indices.tolist(), g2.indices.tolist())
+            self.assertEqual(g1.indptr.tolist(), g2.indptr.tolist())
+        clear_graph_cache()
+
+    def test_version_changes_with_data(self):
+        df = self.df_charge.copy()
+        df.loc[1, 'lat'] = 20.6
+        self.assertNotEqual(station_data_version(df), station_data_version(self.df_charge))
+
+
+class TestSpatialIndex(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.lat = rng.uniform(8.5, 23.4, 2000)
+        self.lng = rng.uniform(102.1, 109.5, 2000)
+        self.index = SpatialIndex(self.lat, self.lng, leaf_size=16)
+
+    def _brute_distances(self, lat, lng):
+        return np.array([haversine(lat, lng, a, b) for a, b in zip(self.lat, self.lng)])
+
+    def test_nearest_matches_brute_force(self):
+        for lat, lng in [(21.0285, 105.854), (10.771, 106.701), (16.0544, 108.2022)]:
+            dists, positions = self.index.query_nearest(lat, lng, k=5)
+            brute = self._brute_distances(lat, lng)
+            self.assertEqual(positions.tolist(), np.argsort(brute, kind='stable')[:5].tolist())
+            np.testing.assert_allclose(dists, np.sort(brute)[:5], rtol=1e-9)
+
+    def test_radius_matches_brute_force(self):
+        brute = self._brute_distances(16.0, 106.0)
+        result = self.index.query_radius(16.0, 106.0, 120.0)
+        self.assertEqual(result.tolist(), np.flatnonzero(brute <= 120.0).tolist())
+
+    def test_nan_points_are_skipped(self):
+        index = SpatialIndex(np.array([21.0, np.nan, 20.0]), np.array([105.0, 105.5, 106.0]))
+        _, positions = index.query_nearest(20.9, 105.4, k=3)
+        self.assertEqual(sorted(positions.tolist()), [0, 2])
+
+
+class TestChargingSearch(unittest.TestCase):
+    def setUp(self):
+        use_temp_cache_dir(self)
+        # Các trạm xếp gần thẳng hàng theo hướng Bắc - Nam, cách nhau ~55-70 km
+        self.df_charge = make_stations()
+
+    def test_labels_backtrack(self):
+        labels = SearchLabels()
+        root = labels.add(0, 100.0, 0.0, -1, 0.0)
+        a = labels.add(3, 50.0, 50.0, root, 0.0)
+        b = labels.add(1, 10.0, 90.0, root, 0.0)
+        c = labels.add(2, 20.0, 120.0, a, 30.0)
+        self.assertEqual(labels.chain(c), [root, a, c])
+        self.assertEqual(labels.chain(b), [root, b])
+        self.assertEqual(len(labels), 4)
+
+    def test_astar_path_and_charge_log(self):
+        path, charge_log, total_dist = astar_charging_stations(self.df_charge, 'S0', 'S4', 100, 30)
+        self.assertEqual(path[0], 0)
+        self.assertEqual(path[-1], 4)
+        self.assertEqual(len(charge_log), len(path))
+        # Mỗi chặng đều nằm trong tầm pin và tổng quãng đường khớp với nhật ký
+        legs = [haversine(self.df_charge.lat[a], self.df_charge.lng[a], self.df_charge.lat[b], self.df_charge.lng[b]) * 1.25 for a, b in zip(path, path[1:])]
+        self.assertTrue(all(leg <= 100 for leg in legs))
+        self.assertAlmostEqual(total_dist, sum(legs), places=6)
+        self.assertTrue(all(entry[1] >= 0 for entry in charge_log))
+
+    def test_ucs_matches_astar_distance(self):
+        _, _, dist_astar = astar_charging_stations(self.df_charge, 'S0', 'S4', 100, 30)
+        _, _, dist_ucs = ucs_charging_stations(self.df_charge, 'S0', 'S4', 100, 30)
+        self.assertAlmostEqual(dist_astar, dist_ucs, places=6)
+
+    def test_dominance_keeps_distance_and_prunes(self):
+        stats_legacy, stats_dom = {}, {}
+        _, _, dist_legacy = ucs_charging_stations(self.df_charge, 'S0', 'S4', 100, 30, dominance=False, stats=stats_legacy)
+        _, _, dist_dom = ucs_charging_stations(self.df_charge, 'S0', 'S4', 100, 30, dominance=True, stats=stats_dom)
+        self.assertAlmostEqual(dist_legacy, dist_dom, places=6)
+        self.assertLessEqual(stats_dom['expanded'], stats_legacy['expanded'])
+
+    def test_soc_bucket_quantizes_battery(self):
+        _, charge_log, _ = astar_charging_stations(self.df_charge, 'S0', 'S4', 100, 30.7, soc_bucket_km=5)
+        for entry in charge_log:
+            self.assertAlmostEqual(entry[1] % 5, 0.0)
+
+    def test_dominance_rule(self):
+        front = [(50.0, 100.0)]
+        self.assertTrue(_is_dominated(front, 40.0, 120.0))
+        self.assertTrue(_is_dominated(front, 50.0, 100.0))
+        self.assertFalse(_is_dominated(front, 60.0, 120.0)) # Nhiều pin hơn
+        self.assertFalse(_is_dominated(front, 40.0, 90.0)) # Ngắn hơn
+        self.assertEqual(_quantize_soc(37.9, 5), 35)
+
+    def test_unknown_station(self):
+        self.assertEqual(astar_charging_stations(self.df_charge, 'S0', 'Không có', 100, 30), (None, None, None))
+
+
+class TestLandmarks(unittest.TestCase):
+    def setUp(self):
+        use_temp_cache_dir(self)
+        # S0..S4 nối thành chuỗi Bắc - Nam, S5 (TP.HCM) nằm ở thành phần liên thông riêng
+        self.df_charge = make_stations([HCM_COORDS])
+        self.stations = StationArrays(self.df_charge)
+        self.graph = build_reachability_graph(self.stations, 100, 1.25)
+
+    def test_dijkstra_matches_chain(self):
+        dist = graph_dijkstra(self.graph, 0)
+        self.assertEqual(dist[0], 0.0)
+        self.assertTrue(np.isinf(dist[5]))
+        # Đi theo chuỗi: mỗi trạm xa hơn trạm trước
+        self.assertTrue(np.all(np.diff(dist[:5]) > 0))
+
+    def test_lower_bounds_are_admissible(self):
+        table = build_landmark_table(self.graph, count=3)
+        self.assertEqual(len(set(table.landmarks.tolist())), 3)
+        for target in range(5):
+            exact = graph_dijkstra(self.graph, target)
+            bounds = table.lower_bounds(target)
+            self.assertTrue(np.all(bounds[:5] <= exact[:5] + 1e-9))
+            self.assertTrue(np.isinf(bounds[5])) # Khác thành phần liên thông
+
+    def test_disk_cache_roundtrip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            t1 = get_landmark_table(self.graph, 'test-version', count=2, cache_dir=tmp)
+            self.assertEqual(len(os.listdir(tmp)), 1)
+            _landmark_cache.clear()
+            t2 = get_landmark_table(self.graph, 'test-version', count=2, cache_dir=tmp)
+            self.assertEqual(t1.landmarks.tolist(), t2.landmarks.tolist())
+            np.testing.assert_array_equal(t1.dist, t2.dist)
+            _landmark_cache.clear()
+
+    def test_alt_search_matches_haversine(self):
+        stats_h, stats_alt = {}, {}
+        _, _, dist_h = astar_charging_stations(self.df_charge, 'S0', 'S4', 100, 30, stats=stats_h)
+        _, _, dist_alt = astar_charging_stations(self.df_charge, 'S0', 'S4', 100, 30, use_landmarks=True, stats=stats_alt)
+        self.assertAlmostEqual(dist_h, dist_alt, places=6)
+        self.assertLessEqual(stats_alt['expanded'], stats_h['expanded'])
+
+
+class TestTransitTable(unittest.TestCase):
+    def setUp(self):
+        use_temp_cache_dir(self)
+        self.df_charge = make_stations([HCM_COORDS])
+        self.stations = StationArrays(self.df_charge)
+        self.graph = build_reachability_graph(self.stations, 100, 1.25)
+        transit_table.clear_transit_cache()
+
+    def tearDown(self):
+        transit_table.clear_transit_cache()
+
+    def test_paths_are_shortest(self):
+        table = transit_table.build_transit_table(self.graph)
+        exact = graph_dijkstra(self.graph, 0)
+        for target in range(5):
+            path = table.path(0, target)
+            self.assertEqual(path[0], 0)
+            self.assertEqual(path[-1], target)
+            length = sum(haversine(self.df_charge.lat[a], self.df_charge.lng[a], self.df_charge.lat[b], self.df_charge.lng[b]) * 1.25
+                         for a, b in zip(path, path[1:]))
+            self.assertAlmostEqual(length, exact[target], places=6)
+        self.assertIsNone(table.path(0, 5)) # Khác thành phần liên thông
+
+    def test_hierarchy_matches_dijkstra_on_all_pairs(self):
+        df_charge = make_stations(SIDE_COORDS + [HCM_COORDS])
+        stations = StationArrays(df_charge)
+        graph = build_reachability_graph(stations, 100, 1.25)
+        table = transit_table.build_transit_table(graph)
+        self.assertEqual(table.num_nodes, len(stations))
+        for source in range(len(stations)):
+            exact = graph_dijkstra(graph, source)
+            for target in range(len(stations)):
+                path = table.path(source, target)
+                if exact[target] == float('inf'):
+                    self.assertIsNone(path)
+                    continue
+                length = sum(haversine(stations.lat[a], stations.lng[a], stations.lat[b], stations.lng[b]) * 1.25
+                             for a, b in zip(path, path[1:]))
+                self.assertEqual((path[0], path[-1]), (source, target))
+                self.assertAlmostEqual(length, exact[target], places=6)
+
+    def test_astar_uses_table_and_falls_back(self):
+        stats = {}
+        _, _, dist_search = astar_charging_stations(self.df_charge, 'S0', 'S4', 100, 30, stats=stats)
+        self.assertEqual(stats['engine'], 'search') # Chưa dựng bảng -> A*
+
+        transit_table.precompute_transit_tables(self.stations, [100], 1.25)
+        astar_charging_stations(self.df_charge, 'S0', 'S4', 100, 30, stats=stats)
+        self.assertEqual(stats['engine'], 'search') # Có bảng nhưng chưa bật -> vẫn là A*
+        path, charge_log, dist_table = astar_charging_stations(self.df_charge, 'S0', 'S4', 100, 30, use_transit=True, stats=stats)
+        self.assertEqual(stats['engine'], 'transit')
+        self.assertLessEqual(dist_table, dist_search + 1e-9)
+        self.assertEqual((path[0], path[-1]), (0, 4))
+        self.assertEqual(len(charge_log), len(path))
+        self.assertTrue(all(entry[1] >= 0 for entry in charge_log))
+
+        astar_charging_stations(self.df_charge, 'S0', 'S4', 100, 30, avoid_toll=True, use_transit=True, stats=stats)
+        self.assertEqual(stats['engine'], 'search')
+
+    def test_conflicting_options(self):
+        with self.assertRaises(ValueError):
+            astar_charging_stations(self.df_charge, 'S0', 'S4', 100, 30, use_transit=True, use_landmarks=True)
+        with self.assertRaises(ValueError):
+            run_astar_search(ElectricCar("Test", 100, 40, 100, 150, 2023), 21.0, 105.8, 19.0, 105.8, 50, False, self.df_charge,
+                             use_transit=True, bidirectional=True, emit_stats=False)
+
+    def test_stale_table_is_ignored(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = transit_table.transit_table_path(self.stations.version, 100, 1.25, tmp)
+            small = build_reachability_graph(StationArrays(make_stations()), 100, 1.25)
+            transit_table.save_transit_table(transit_table.build_transit_table(small), path)
+            self.assertIsNone(transit_table.load_transit_table(self.stations.version, 100, 1.25, len(self.stations), tmp))
+            self.assertIsNone(transit_table.load_transit_table(self.stations.version, 200, 1.25, len(self.stations), tmp))
+
+
+class TestBidirectionalSearch(unittest.TestCase):
+    def setUp(self):
+        use_temp_cache_dir(self)
+        # Chuỗi Bắc - Nam kèm vài trạm lệch ngang, S8 (TP.HCM) không tới được
+        self.df_charge = make_stations(SIDE_COORDS + [HCM_COORDS])
+        self.stations = StationArrays(self.df_charge)
+
+    def test_matches_dijkstra(self):
+        graph = build_reachability_graph(self.stations, 100, 1.25)
+        exact = graph_dijkstra(graph, 0)
+        for end in ['S3', 'S4', 'S6', 'S7']:
+            stats = {}
+            path, charge_log, dist = bidirectional_charging_stations(self.df_charge, 'S0', end, 100, 30, stats=stats)
+            target = int(end[1:])
+            self.assertAlmostEqual(dist, exact[target], places=6)
+            self.assertEqual((path[0], path[-1]), (0, target))
+            self.assertEqual(len(charge_log), len(path))
+            self.assertTrue(all(entry[1] >= 0 for entry in charge_log))
+            self.assertEqual(stats['expanded'], stats['expanded_forward'] + stats['expanded_backward'])
+
+    def test_same_station_and_unreachable(self):
+        path, _, dist = bidirectional_charging_stations(self.df_charge, 'S2', 'S2', 100, 30)
+        self.assertEqual((path, dist), ([2], 0))
+        self.assertEqual(bidirectional_charging_stations(self.df_charge, 'S0', 'S8', 100, 30), (None, None, None))
+        self.assertEqual(bidirectional_charging_stations(self.df_charge, 'S0', 'Không có', 100, 30), (None, None, None))
+
+    def test_entry_points_report_stats(self):
+        car = ElectricCar("Test", 100, 40, 100, 150, 2023)
+        for run in (run_astar_search, run_ucs_search):
+            result = run(car, 21.0, 105.8, 19.0, 105.8, 50, False, self.df_charge, bidirectional=True)
+            self.assertNotIn('error', result)
+            self.assertEqual(result['stats']['engine'], 'bidirectional')
+            self.assertGreater(result['stats']['expanded'], 0)
+            self.assertGreaterEqual(result['stats']['search_time'], 0)
+
+
+class TestSearchStats(unittest.TestCase):
+    def setUp(self):
+        use_temp_cache_dir(self)
+        self.df_charge = make_stations()
+        self.car = ElectricCar("Test", 100, 40, 100, 150, 2023)
+
+    def test_result_has_counters_and_phase_timings(self):
+        for run in (run_astar_search, run_ucs_search):
+            result = run(self.car, 21.0, 105.8, 19.0, 105.8, 50, False, self.df_charge, emit_stats=False)
+            stats = result['stats']
+            for key in ('popped', 'pushed', 'pruned', 'expanded', 'max_heap', 'peak_labels', 'snap_time', 'search_time', 'postprocess_time'):
+                self.assertIn(key, stats)
+            self.assertGreaterEqual(stats['max_heap'], 1)
+            self.assertGreaterEqual(stats['peak_labels'], stats['expanded'])
+
+    def test_error_result_has_stats(self):
+        result = run_astar_search(self.car, 21.0, 105.8, 19.0, 105.8, 50, False, self.df_charge.iloc[0:0], emit_stats=False)
+        self.assertIn('error', result)
+        self.assertIn('snap_time', result['stats'])
+
+    def test_emits_json_lines_when_env_set(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            log_path = os.path.join(tmp, 'stats.jsonl')
+            with mock.patch.dict(os.environ, {STATS_LOG_ENV: log_path}):
+                run_astar_search(self.car, 21.0, 105.8, 19.0, 105.8, 50, False, self.df_charge)
+                run_ucs_search(self.car, 21.0, 105.8, 19.0, 105.8, 50, False, self.df_charge)
+            with open(log_path, encoding='utf-8') as f:
+                records = [json.loads(line) for line in f]
+            self.assertEqual([r['algorithm'] for r in records], ['astar', 'ucs'])
+            self.assertEqual(records[0]['car'], 'Test')
+            self.assertIn('search_time', records[0])
+        with mock.patch.dict(os.environ, {}, clear=True):
+            self.assertFalse(emit_search_stats({'popped': 1}))
+
+    def test_format(self):
+        text = format_search_stats({'popped': 3, 'pushed': 5, 'search_time': 0.002, 'map_time': 0.01})
+        self.assertIn('search 2.0', text)
+        self.assertIn('map 10.0', text)
+        self.assertEqual(format_search_stats({}), "Chưa có số liệu.")
+
+
+class TestAnytimeSearch(unittest.TestCase):
+    def setUp(self):
+        use_temp_cache_dir(self)
+        self.df_charge = make_stations(SIDE_COORDS)
+
+    def test_converges_to_astar_with_decreasing_bound(self):
+        incumbents = []
+        stats = {}
+        _, _, dist = anytime_astar_charging_stations(self.df_charge, 'S0', 'S4', 100, 30, on_incumbent=incumbents.append, stats=stats)
+        _, _, dist_astar = astar_charging_stations(self.df_charge, 'S0', 'S4', 100, 30, use_transit=False)
+        self.assertAlmostEqual(dist, dist_astar, places=6)
+        self.assertGreaterEqual(len(incumbents), 1)
+        dists = [inc['total_dist'] for inc in incumbents]
+        bounds = [inc['bound'] for inc in incumbents]
+        self.assertEqual(dists, sorted(dists, reverse=True))
+        self.assertEqual(bounds, sorted(bounds, reverse=True))
+        self.assertAlmostEqual(bounds[-1], 1.0)
+        self.assertEqual(stats['engine'], 'anytime')
+        self.assertFalse(stats['timed_out'])
+
+    def test_expired_deadline_returns_nothing(self):
+        stats = {}
+        self.assertEqual(anytime_astar_charging_stations(self.df_charge, 'S0', 'S4', 100, 30, deadline_ms=-1, stats=stats), (None, None, None))
+        self.assertTrue(stats['timed_out'])
+
+    def test_run_astar_search_deadline(self):
+        car = ElectricCar("Test", 100, 40, 100, 150, 2023)
+        result = run_astar_search(car, 21.0, 105.8, 19.0, 105.8, 50, False, self.df_charge, deadline_ms=5000, emit_stats=False)
+        self.assertNotIn('error', result)
+        self.assertAlmostEqual(result['stats']['bound'], 1.0)
+
+
+def _worker_arrays_are_shared():
+    """Chạy trong tiến trình con của pool: StationArrays của tiến trình con có dùng thẳng vùng nhớ chung không."""
+    stations = get_station_arrays(batch_module._worker_df)
+    shared = batch_module._worker_table.arrays
+    return all(np.shares_memory(getattr(stations, name), shared) for name in ('lat', 'lng', 'lat_rad', 'lng_rad', 'cos_lat'))
+
+
+class TestBatchPlanning(unittest.TestCase):
+    def setUp(self):
+        use_temp_cache_dir(self)
+        self.df_charge = make_stations(names=['S0', 'S1', 'S2', 'Trạm Đà Nẵng', 'S4'], addresses=['A0', 'A1', '', 'Đường 2/9', 'A4'])
+        self.car = ElectricCar("Test", 100, 40, 100, 150, 2023)
+
+    def test_shared_table_roundtrip(self):
+        table = SharedStationTable.create(self.df_charge)
+        try:
+            other = SharedStationTable.attach(table.spec)
+            try:
+                df = other.to_dataframe()
+            finally:
+                other.close()
+        finally:
+            table.close()
+        pd.testing.assert_frame_equal(df[['name', 'address', 'lat', 'lng']], self.df_charge)
+        self.assertEqual(station_data_version(df), station_data_version(self.df_charge))
+
+    def test_workers_map_shared_arrays(self):
+        table = SharedStationTable.create(self.df_charge)
+        try:
+            with ProcessPoolExecutor(1, initializer=batch_module._init_worker, initargs=(table.spec,)) as pool:
+                self.assertTrue(pool.submit(_worker_arrays_are_shared).result())
+        finally:
+            table.close()
+
+    def test_matches_sequential_in_both_orders(self):
+        requests = [
+            RouteRequest(self.car, 21.0, 105.8, 19.0, 105.8, 50),
+            (self.car, 19.0, 105.8, 21.0, 105.8, 80, False, 'ucs'),
+            RouteRequest(self.car, 21.0, 105.8, 19.0, 105.8, 50, algorithm='khác'),
+        ]
+        def strip(result):
+            result.pop('stats', None)
+            return result
+        expected = [strip(result) for _, result in plan_routes_batch(requests, self.df_charge, workers=0)]
+        self.assertIn('error', expected[2])
+        ordered = list(plan_routes_batch(requests, self.df_charge, workers=2))
+        self.assertEqual([index for index, _ in ordered], [0, 1, 2])
+        self.assertEqual([strip(result) for _, result in ordered], expected)
+        unordered = dict(plan_routes_batch(requests, self.df_charge, workers=2, ordered=False))
+        self.assertEqual([strip(unordered[i]) for i in range(3)], expected)
+
+
+class TestOneToMany(unittest.TestCase):
+    def setUp(self):
+        use_temp_cache_dir(self)
+        self.df_charge = make_stations(SIDE_COORDS + [HCM_COORDS])
+        self.car = ElectricCar("Test", 100, 40, 100, 150, 2023)
+
+    def test_tree_matches_dijkstra(self):
+        graph = build_reachability_graph(StationArrays(self.df_charge), 100, 1.25)
+        dist, parent = shortest_path_tree(graph, 0)
+        np.testing.assert_allclose(dist, graph_dijkstra(graph, 0))
+        self.assertEqual(parent[0], -1)
+        self.assertEqual(parent[8], -1)
+        stats = {}
+        tree = dijkstra_charging_tree(self.df_charge, 'S0', 100, 30, stats=stats)
+        for pos in range(1, 8):
+            path, charge_log, total = tree.route(f'S{pos}')
+            self.assertAlmostEqual(total, dist[pos], places=6)
+            self.assertEqual((path[0], path[-1]), (0, pos))
+            self.assertTrue(all(entry[1] >= 0 for entry in charge_log))
+        self.assertEqual(tree.route('S8'), (None, None, None))
+        self.assertEqual(stats['reached'], 8)
+
+    def test_results_match_ucs_search(self):
+        # Điểm đích thứ 2 và 3 snap về cùng trạm S6 -> chặng giữa các trạm chỉ tìm một lần
+        destinations = [(19.0, 105.8), (20.2, 105.4), (20.21, 105.41), (20.5, 105.85), (10.771, 106.701)]
+        results = run_ucs_one_to_many(self.car, 21.0, 105.8, destinations, 50, False, self.df_charge, emit_stats=False)
+        self.assertEqual(len(results), len(destinations))
+        for (lat, lng), result in zip(destinations, results):
+            ucs = run_ucs_search(self.car, 21.0, 105.8, lat, lng, 50, False, self.df_charge, emit_stats=False)
+            result.pop('stats')
+            ucs.pop('stats')
+            self.assertEqual(result, ucs)
+        self.assertIn('error', results[4])
+
+    def test_candidate_limit_matches_ucs_search(self):
+        # Đồ thị dày (mỗi trạm > 10 trạm kề): giới hạn 10 trạm gần đích/bước làm UCS dài hơn đường ngắn nhất ở vài đích
+        rng = np.random.default_rng(20)
+        coords = [(21.0 - 0.2 * i + float(dy), 105.8 + float(dx)) for i in range(12) for dy, dx in rng.uniform(-0.3, 0.3, (3, 2))]
+        df_charge = make_stations(coords)
+        destinations = [(lat + 0.01, lng - 0.01) for lat, lng in coords[5::4]]
+        results = run_ucs_one_to_many(self.car, 21.0, 105.8, destinations, 80, False, df_charge, emit_stats=False)
+        stations = StationArrays(df_charge)
+        tree = dijkstra_charging_tree(df_charge, 'S0', 100, 80)
+        longer = 0
+        for (lat, lng), result in zip(destinations, results):
+            ucs = run_ucs_search(self.car, 21.0, 105.8, lat, lng, 80, False, df_charge, emit_stats=False)
+            self.assertNotIn('error', ucs)
+            end_id = find_nearest_station(lat, lng, df_charge, stations)
+            longer += tree.dist[end_id] < ucs_charging_stations(df_charge, 0, end_id, 100, 80)[2] - 1e-6
+            self.assertEqual(result['stats']['engine'], 'search')
+            result.pop('stats')
+            ucs.pop('stats')
+            self.assertEqual(result, ucs)
+        self.assertGreater(longer, 0)
+
+    def test_repeated_end_station_is_searched_once(self):
+        results = run_ucs_one_to_many(self.car, 21.0, 105.8, [(20.2, 105.4), (20.21, 105.41)], 50, False, self.df_charge, emit_stats=False)
+        self.assertEqual([result['stats']['cache'] for result in results], ['miss', 'hit'])
+        self.assertEqual(results[1]['stats']['engine'], 'cache')
+
+
+class TestRouteCache(unittest.TestCase):
+    def setUp(self):
+        use_temp_cache_dir(self)
+        self.df_charge = make_stations()
+        self.car = ElectricCar("Test", 100, 40, 100, 150, 2023)
+
+    def test_lru_eviction_and_counters(self):
+        cache = RouteCache(maxsize=2)
+        self.assertEqual(cache.get_or_compute('a', lambda: 1), (1, 'miss'))
+        cache.get_or_compute('b', lambda: 2)
+        self.assertEqual(cache.get_or_compute('a', lambda: 0), (1, 'hit')) # 'a' mới dùng -> 'b' bị loại
+        cache.get_or_compute('c', lambda: 3)
+        self.assertNotIn('b', cache)
+        self.assertIn('a', cache)
+        cache.get_or_compute('x', lambda: None, store_if=lambda value: value is not None)
+        self.assertNotIn('x', cache)
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 4, 'coalesced': 0, 'size': 2, 'maxsize': 2})
+
+    def test_concurrent_requests_are_coalesced(self):
+        cache = RouteCache()
+        release = threading.Event()
+        calls = []
+        def compute():
+            calls.append(1)
+            release.wait(5)
+            return 'route'
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute('k', compute))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        while cache.stats()['coalesced'] < 3:
+            time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(status for _, status in results), ['coalesced'] * 3 + ['miss'])
+        self.assertTrue(all(value == 'route' for value, _ in results))
+
+    def test_errors_propagate_and_are_not_cached(self):
+        cache = RouteCache()
+        with self.assertRaises(ValueError):
+            cache.get_or_compute('k', lambda: (_ for _ in ()).throw(ValueError('lỗi')))
+        self.assertEqual(cache.get_or_compute('k', lambda: 5), (5, 'miss'))
+
+    def test_persistence(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'routes.pkl')
+            cache = RouteCache(path=path)
+            cache.get_or_compute(('a', 1), lambda: [1, 2])
+            self.assertTrue(cache.save())
+            reloaded = RouteCache(maxsize=4, path=path)
+            self.assertEqual(reloaded.get_or_compute(('a', 1), lambda: None), ([1, 2], 'hit'))
+
+    def test_search_entry_points_use_cache(self):
+        cache = RouteCache(soc_bucket_km=5)
+        for run in (run_astar_search, run_ucs_search):
+            first = run(self.car, 21.002, 105.8, 19.0, 105.8, 50, False, self.df_charge, emit_stats=False, cache=cache)
+            # Điểm xuất phát lệch nhẹ: cùng trạm đầu, cùng bước pin -> dùng lại chặng giữa các trạm
+            second = run(self.car, 21.001, 105.8, 19.0, 105.8, 50, False, self.df_charge, emit_stats=False, cache=cache)
+            self.assertEqual((first['stats']['cache'], second['stats']['cache']), ('miss', 'hit'))
+            self.assertEqual(first['path'][1:], second['path'][1:])
+        self.assertEqual(cache.stats()['size'], 2)
+
+    def test_hit_uses_real_soc_and_reports_no_search_work(self):
+        for run in (run_astar_search, run_ucs_search):
+            cache = RouteCache(soc_bucket_km=5)
+            run(self.car, 21.002, 105.8, 19.0, 105.8, 51, False, self.df_charge, emit_stats=False, cache=cache)
+            hit = run(self.car, 21.002, 105.8, 19.0, 105.8, 53, False, self.df_charge, emit_stats=False, cache=cache)
+            uncached = run(self.car, 21.002, 105.8, 19.0, 105.8, 53, False, self.df_charge, emit_stats=False)
+            self.assertEqual(hit['stats']['cache'], 'hit')
+            self.assertEqual((hit['stats']['engine'], hit['stats']['expanded'], hit['stats']['pushed']), ('cache', 0, 0))
+            # Cùng bước pin nhưng nhật ký sạc / thời gian / phí theo mức pin thật
+            self.assertEqual({k: v for k, v in hit.items() if k != 'stats'}, {k: v for k, v in uncached.items() if k != 'stats'})
+
+    def test_key_includes_index_versions(self):
+        base = route_cache_key(150, 0, 4, 75, True, ('astar',), 'v1', (('bot', 'a'),))
+        self.assertNotEqual(base, route_cache_key(150, 0, 4, 75, True, ('astar',), 'v1', (('bot', 'b'),)))
+        self.assertNotEqual(route_cache_key(150, 0, 4, 75, False, ('astar',), 'v1'),
+                            route_cache_key(150, 0, 4, 75, False, ('astar',), 'v1', (('transit', True),)))
+
+
+class TestStationCatalogue(unittest.TestCase):
+    def setUp(self):
+        use_temp_cache_dir(self)
+        # Hai trạm trùng tên 'Dup' ở hai nơi khác nhau; index không bắt đầu từ 0
+        self.df_charge = make_stations(names=['S0', 'Dup', 'S2', 'Dup', 'S4'], addresses=['A0', 'Bắc', 'A2', 'Nam', 'A4'], index=[10, 11, 12, 13, 14])
+        self.catalogue = StationCatalogue(self.df_charge)
+
+    def test_indexes(self):
+        self.assertEqual(self.catalogue.id_of('Dup'), 1)
+        self.assertEqual(self.catalogue.ids_of('Dup'), [1, 3])
+        self.assertIsNone(self.catalogue.id_of('Không có'))
+        self.assertEqual(self.catalogue.id_of_label(13), 3)
+        self.assertEqual(self.catalogue.id_at(19.50005, 105.74995), 3)
+        self.assertIsNone(self.catalogue.id_at(19.5002, 105.75))
+        self.assertEqual((self.catalogue.resolve(3), self.catalogue.resolve('S2'), self.catalogue.resolve(np.int64(4))), (3, 2, 4))
+        self.assertIsNone(self.catalogue.resolve(5))
+        self.assertEqual(self.catalogue.row(3), {'id': 3, 'name': 'Dup', 'address': 'Nam', 'lat': 19.5, 'lng': 105.75})
+        self.assertIs(get_station_catalogue(self.df_charge), get_station_catalogue(self.df_charge))
+
+    def test_lookups_hash_each_dataframe_once(self):
+        stations = get_station_arrays(self.df_charge)
+        with mock.patch('station_catalogue.station_data_version') as version, mock.patch('station_catalogue.catalogue_data_version') as content:
+            for _ in range(3):
+                self.assertIs(get_station_arrays(self.df_charge), stations)
+                self.assertIs(get_station_catalogue(self.df_charge), stations.catalogue)
+                self.assertEqual(find_nearest_station(19.5, 105.75, self.df_charge), 3)
+        version.assert_not_called()
+        content.assert_not_called()
+        # DataFrame khác cùng nội dung: băm một lần rồi dùng lại cùng StationArrays
+        self.assertIs(get_station_arrays(self.df_charge.copy()), stations)
+
+    def test_edited_address_or_labels_give_fresh_catalogue(self):
+        catalogue = get_station_catalogue(self.df_charge)
+        edited = self.df_charge.copy()
+        edited.loc[13, 'address'] = 'Nam (mới)'
+        relabelled = self.df_charge.set_axis([20, 21, 22, 23, 24])
+        for df in (edited, relabelled):
+            fresh = get_station_catalogue(df)
+            self.assertEqual(fresh.version, catalogue.version) # Đồ thị / chỉ mục tìm kiếm vẫn dùng lại được
+            self.assertNotEqual(fresh.content_version, catalogue.content_version)
+            self.assertNotEqual(route_map.static_layer_path(fresh, None, 'm'), route_map.static_layer_path(catalogue, None, 'm'))
+            self.assertIs(get_station_arrays(df).catalogue, fresh)
+        self.assertEqual(get_station_catalogue(edited).address(3), 'Nam (mới)')
+        self.assertEqual(get_station_catalogue(relabelled).id_of_label(23), 3)
+        self.assertEqual(get_station_arrays(relabelled).index.tolist(), [20, 21, 22, 23, 24])
+
+    def test_duplicate_names_resolved_by_id(self):
+        car = ElectricCar("Test", 100, 40, 100, 150, 2023)
+        # Bắt đầu sát trạm 'Dup' thứ hai (id 3): lộ trình phải đi từ đúng trạm đó
+        for run in (run_astar_search, run_ucs_search):
+            result = run(car, 19.5, 105.75, 21.0, 105.8, 80, False, self.df_charge, emit_stats=False)
+            self.assertNotIn('error', result)
+            station_ids = [step['station_id'] for step in result['path'][1:-1]]
+            self.assertEqual(station_ids[0], 3)
+            self.assertEqual(result['path'][1]['address'], 'Nam')
+            self.assertEqual(station_ids, sorted(station_ids, reverse=True))
+
+    def test_bot_check_carries_station_ids(self):
+        df_bot = pd.DataFrame({'name': ['BOT 1'], 'address': ['QL1'], 'fee': ['35.000'], 'lat': [20.01], 'lng': [105.8]})
+        route_points = [(21.0, 105.8), (20.0, 105.8), (19.0, 105.8)]
+        found = check_bot_stations(route_points, df_bot, [None, 2, None])
+        self.assertEqual(found[0]['segment_station_ids'], (None, 2))
+        self.assertNotIn('segment_station_ids', check_bot_stations(route_points, df_bot)[0])
+
+
+class TestTollEdges(unittest.TestCase):
+    def setUp(self):
+        use_temp_cache_dir(self)
+        # Trạm BOT nằm giữa S1 và S2; trạm S5 lệch về phía Đông cho phép đi vòng tránh BOT
+        self.df_charge = make_stations([(20.25, 106.3)])
+        self.df_bot = pd.DataFrame({'name': ['BOT 1'], 'address': ['QL1'], 'fee': ['35.000 VNĐ'], 'lat': [20.25], 'lng': [105.825]})
+        self.stations = get_station_arrays(self.df_charge)
+        self.graph = get_reachability_graph(self.stations, 100, 1.25, self.stations.version)
+        patch = mock.patch.object(toll_edges, 'default_bot_stations', return_value=self.df_bot)
+        patch.start()
+        self.addCleanup(patch.stop)
+        toll_edges.clear_toll_cache()
+
+    def tearDown(self):
+        toll_edges.clear_toll_cache()
+
+    def test_build_marks_both_directions(self):
+        toll = build_toll_edges(self.stations, self.graph, self.df_bot)
+        tolled_pairs = set()
+        for u in range(self.graph.num_nodes):
+            for edge in range(self.graph.indptr[u], self.graph.indptr[u + 1]):
+                if toll.tolled[edge]:
+                    tolled_pairs.add((u, int(self.graph.indices[edge])))
+                    self.assertEqual(toll.fee[edge], 35000)
+                    self.assertEqual(toll.bots_of(edge).tolist(), [0])
+        self.assertEqual(tolled_pairs, {(1, 2), (2, 1)})
+        self.assertEqual(toll.num_tolled, 2)
+
+    def test_cache_roundtrip(self):
+        built = get_toll_edges(self.stations, self.graph)
+        self.assertIs(get_toll_edges(self.stations, self.graph), built)
+        toll_edges.clear_toll_cache()
+        with mock.patch.object(toll_edges, 'build_toll_edges') as rebuild:
+            loaded = get_toll_edges(self.stations, self.graph, self.df_bot)
+        rebuild.assert_not_called()
+        np.testing.assert_array_equal(loaded.tolled, built.tolled)
+        np.testing.assert_array_equal(loaded.edge_bots, built.edge_bots)
+
+    def test_avoid_toll_detours(self):
+        searches = (astar_charging_stations, ucs_charging_stations, bidirectional_charging_stations)
+        for search in searches:
+            path, _, _ = search(self.df_charge, 'S0', 'S4', 100, 30)
+            self.assertEqual(path, [0, 1, 2, 3, 4])
+            path, _, dist = search(self.df_charge, 'S0', 'S4', 100, 30, avoid_toll=True)
+            self.assertEqual(path, [0, 1, 5, 2, 3, 4])
+        tree = dijkstra_charging_tree(self.df_charge, 'S0', 100, 30, avoid_toll=True)
+        path, _, tree_dist = tree.route('S4')
+        self.assertEqual(path, [0, 1, 5, 2, 3, 4])
+        self.assertAlmostEqual(tree_dist, dist, places=6)
+
+    def test_avoid_toll_falls_back_to_least_fee_route(self):
+        # Không có trạm đi vòng: tránh hoàn toàn BOT không ra đường -> lộ trình dự phòng qua BOT kèm cảnh báo
+        df_charge = make_stations()
+        car = ElectricCar("Test", 100, 40, 100, 100, 2023)
+        for run in (run_astar_search, run_ucs_search):
+            for bidirectional in (False, True):
+                result = run(car, 21.0, 105.8, 19.0, 105.8, 100, True, df_charge, bidirectional=bidirectional, emit_stats=False)
+                self.assertEqual(result.get('canh_bao_bot'), NO_TOLL_FREE_ROUTE_WARNING)
+                self.assertTrue(result['stats']['toll_fallback'])
+                self.assertAlmostEqual(result['total_dist'], run(car, 21.0, 105.8, 19.0, 105.8, 100, False, df_charge, emit_stats=False)['total_dist'])
+        # Đích tránh được BOT không bị ảnh hưởng
+        near, far = run_ucs_one_to_many(car, 21.0, 105.8, [(20.5, 105.85), (19.0, 105.8)], 100, True, df_charge, emit_stats=False)
+        self.assertNotIn('canh_bao_bot', near)
+        self.assertEqual(far['canh_bao_bot'], NO_TOLL_FREE_ROUTE_WARNING)
+
+
+class TestBotCheck(unittest.TestCase):
+    def setUp(self):
+        self.df_bot = pd.DataFrame({
+            'name': ['Giữa chặng', 'Xa', 'Cuối', 'Đầu'],
+            'address': ['QL1', 'QL2', 'QL3', 'QL4'],
+            'fee': ['35.000 VNĐ', '10.000', '15.000 VNĐ', '0'],
+            'lat': [20.0, 20.0, 18.0, 21.001],
+            'lng': [105.83, 106.5, 105.8, 105.8]
+        })
+
+    def test_detects_plaza_in_middle_of_leg(self):
+        # BOT 'Giữa chặng' cách cả hai đầu chặng ~110 km nhưng chỉ cách đường đi ~3 km
+        found = check_bot_stations([(21.0, 105.8), (19.0, 105.8), (18.0, 105.8)], self.df_bot, [None, 7, None])
+        self.assertEqual([bot['name'] for bot in found], ['Giữa chặng', 'Đầu', 'Cuối'])
+        self.assertEqual(found[0]['segment_station_ids'], (None, 7))
+        self.assertEqual(found[2]['segment_station_ids'], (7, None))
+        self.assertEqual([bot['fee_vnd'] for bot in found], [35000, 0, 15000])
+        self.assertEqual(check_bot_stations([(21.0, 105.8)], self.df_bot), [])
+
+    def test_point_segment_distance(self):
+        self.assertEqual(parse_fee('35.000 VNĐ'), 35000)
+        # Hình chiếu nằm trong đoạn: khoảng cách vuông góc; ngoài đoạn: khoảng cách tới đầu mút gần nhất
+        d = point_segment_distance_km(np.array([[21.0]]), np.array([[105.8]]), np.array([[20.0]]), np.array([[105.8]]),
+                                      np.array([[20.5, 22.0]]), np.array([[105.81, 105.8]]))
+        self.assertEqual(d.shape, (1, 2))
+        self.assertAlmostEqual(d[0, 0], haversine(20.5, 105.8, 20.5, 105.81), places=3)
+        self.assertAlmostEqual(d[0, 1], haversine(21.0, 105.8, 22.0, 105.8), places=6)
+        # Đoạn suy biến (A trùng B) = khoảng cách điểm - điểm
+        self.assertAlmostEqual(float(point_segment_distance_km(20.0, 105.8, 20.0, 105.8, 20.1, 105.9)),
+                               haversine(20.0, 105.8, 20.1, 105.9), places=6)
+
+    def test_matches_endpoint_check_on_dense_polyline(self):
+        # Với polyline dày (bước ~1 km) kết quả trùng với cách kiểm tra cũ theo đầu mút
+        rng = np.random.default_rng(0)
+        lats = np.linspace(21.0, 18.0, 400)
+        route_points = list(zip(lats.tolist(), (105.8 + rng.uniform(-0.01, 0.01, 400)).tolist()))
+        expected = {name for name, lat, lng in zip(self.df_bot['name'], self.df_bot['lat'], self.df_bot['lng'])
+                    if any(haversine(a, b, lat, lng) < 5.0 for a, b in route_points)}
+        self.assertEqual({bot['name'] for bot in check_bot_stations(route_points, self.df_bot)}, expected)
+
+    def test_fee_parsed_at_load(self):
+        df_bot = load_bot_stations(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'BOT.csv'))
+        self.assertFalse(df_bot.empty)
+        self.assertEqual(df_bot['fee_vnd'].tolist(), [parse_fee(fee) for fee in df_bot['fee']])
+        self.assertTrue(all(fee > 0 for fee in df_bot['fee_vnd']))
+
+
+class TestDataLoader(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = os.path.dirname(os.path.abspath(__file__))
+        self.stations_csv = os.path.join(self.tmp.name, 'charging_stations.csv')
+        self.bot_csv = os.path.join(self.tmp.name, 'BOT.csv')
+        shutil.copy(os.path.join(root, 'charging_stations.csv'), self.stations_csv)
+        shutil.copy(os.path.join(root, 'BOT.csv'), self.bot_csv)
+        data_loader.clear_dataset_cache()
+
+    def tearDown(self):
+        data_loader.clear_dataset_cache()
+        self.tmp.cleanup()
+
+    def load_fresh(self, filename, kind):
+        """Nạp như một lần khởi động mới (bỏ cache bộ nhớ), đếm số lần phải đọc CSV."""
+        data_loader.clear_dataset_cache()
+        reader = mock.Mock(side_effect=data_loader.READERS[kind])
+        with mock.patch.dict(data_loader.READERS, {kind: reader}):
+            df = data_loader.load_dataset(filename, kind)
+        return df, reader.call_count
+
+    def test_binary_cache_matches_csv(self):
+        for filename, kind in ((self.stations_csv, 'stations'), (self.bot_csv, 'bot')):
+            expected = data_loader.READERS[kind](filename)
+            cold, reads_cold = self.load_fresh(filename, kind)
+            warm, reads_warm = self.load_fresh(filename, kind)
+            self.assertEqual((reads_cold, reads_warm), (1, 0))
+            self.assertTrue(os.path.exists(data_loader.cache_path_for(filename, kind)))
+            pd.testing.assert_frame_equal(warm, expected)
+            # Cột số là view chỉ đọc trên file cache (không sao chép)
+            self.assertFalse(warm['lat'].to_numpy().flags.writeable)
+        self.assertEqual(warm['fee_vnd'].dtype, np.int64)
+        self.assertIs(data_loader.load_dataset(self.bot_csv, 'bot'), warm)
+
+    def test_invalidation_by_mtime_and_hash(self):
+        self.load_fresh(self.stations_csv, 'stations')
+        # Chỉ đổi mtime, nội dung giữ nguyên -> vẫn dùng cache
+        stat = os.stat(self.stations_csv)
+        os.utime(self.stations_csv, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        _, reads = self.load_fresh(self.stations_csv, 'stations')
+        self.assertEqual(reads, 0)
+        # Nội dung thay đổi -> đọc lại CSV
+        with open(self.stations_csv, 'a', encoding='utf-8') as f:
+            f.write('\nTrạm mới,Địa chỉ mới,10.5,106.5,VinFast DC 30kW\n')
+        os.utime(self.stations_csv, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2 * 10 ** 9))
+        df, reads = self.load_fresh(self.stations_csv, 'stations')
+        self.assertEqual(reads, 1)
+        self.assertEqual(df['name'].iloc[-1], 'Trạm mới')
+        _, reads = self.load_fresh(self.stations_csv, 'stations')
+        self.assertEqual(reads, 0)
+
+
+@unittest.skipUnless(importlib.util.find_spec('tkinter'), "Thiếu tkinter")
+class TestStartupImports(unittest.TestCase):
+    IMPORT_BUDGET_SECONDS = 0.5
+    HEAVY_MODULES = ('pandas', 'numpy', 'folium', 'geopy', 'fpdf', 'file', 'pdf_utils')
+
+    def test_main_import_budget(self):
+        """import main trong tiến trình mới: không kéo theo module nặng và nằm trong ngân sách thời gian"""
+        code = ("import json, sys, time\n"
+                "t0 = time.perf_counter()\n"
+                "import main\n"
+                "elapsed = time.perf_counter() - t0\n"
+                f"print(json.dumps({{'elapsed': elapsed, 'heavy': [m for m in {self.HEAVY_MODULES!r} if m in sys.modules]}}))")
+        root = os.path.dirname(os.path.abspath(__file__))
+        out = subprocess.run([sys.executable, '-c', code], cwd=root, capture_output=True, text=True, check=True).stdout
+        report = json.loads(out.strip().splitlines()[-1])
+        self.assertEqual(report['heavy'], [])
+        self.assertLess(report['elapsed'], self.IMPORT_BUDGET_SECONDS)
+
+    def test_poll_search_ignores_stale_progress(self):
+        """Tiến độ và kết quả của lần tìm kiếm cũ (control khác) không được hiển thị"""
+        import main
+        from search_control import SearchControl
+        old, current = SearchControl(), SearchControl()
+        app = mock.Mock(_search_queue=queue.Queue())
+        app._search_queue.put(('progress', old, {'expanded': 1, 'best_f': 1.0, 'elapsed_ms': 1}))
+        app._search_queue.put(('done', old, ({}, 0.0)))
+        main.ElectricCarRoutingApp._poll_search(app, current, ())
+        app.lbl_search_progress.config.assert_not_called()
+        app.master.after.assert_called_once()
+        app._search_queue.put(('progress', current, {'expanded': 1234, 'best_f': 56.0, 'elapsed_ms': 1500}))
+        main.ElectricCarRoutingApp._poll_search(app, current, ())
+        self.assertIn('1,234', app.lbl_search_progress.config.call_args.kwargs['text'])
+        app._show_search_result.assert_not_called()
+
+
+class TestSearchControl(unittest.TestCase):
+    def setUp(self):
+        use_temp_cache_dir(self)
+        self.df_charge = make_stations()
+        self.car = ElectricCar("Test", 100, 40, 100, 150, 2023)
+
+    def test_cancelled_search_stops(self):
+        control = SearchControl()
+        control.cancel()
+        searches = (lambda stats: astar_charging_stations(self.df_charge, 'S0', 'S4', 100, 30, use_transit=False, stats=stats, control=control),
+                    lambda stats: ucs_charging_stations(self.df_charge, 'S0', 'S4', 100, 30, stats=stats, control=control),
+                    lambda stats: bidirectional_charging_stations(self.df_charge, 'S0', 'S4', 100, 30, stats=stats, control=control),
+                    lambda stats: anytime_astar_charging_stations(self.df_charge, 'S0', 'S4', 100, 30, stats=stats, control=control))
+        for search in searches:
+            stats = {}
+            self.assertEqual(search(stats), (None, None, None))
+            self.assertTrue(stats['cancelled'])
+
+    def test_progress_reports(self):
+        progress = []
+        control = SearchControl(on_progress=progress.append, progress_interval=0)
+        stats = {}
+        _, _, dist = astar_charging_stations(self.df_charge, 'S0', 'S4', 100, 30, use_transit=False, stats=stats, control=control)
+        self.assertIsNotNone(dist)
+        self.assertNotIn('cancelled', stats)
+        self.assertEqual(len(progress), stats['popped'])
+        self.assertEqual([p['popped'] for p in progress], list(range(1, len(progress) + 1)))
+        self.assertLessEqual(progress[0]['best_f'], dist + 1e-9)
+        # Hủy từ callback (như khi bấm Hủy giữa chừng)
+        control = SearchControl(on_progress=lambda p: control.cancel(), progress_interval=0)
+        stats = {}
+        self.assertEqual(ucs_charging_stations(self.df_charge, 'S0', 'S4', 100, 30, stats=stats, control=control), (None, None, None))
+        self.assertEqual(stats['popped'], 2)
+
+    def test_run_search_cancelled_not_cached(self):
+        cache = RouteCache()
+        for run in (run_astar_search, run_ucs_search):
+            control = SearchControl()
+            control.cancel()
+            result = run(self.car, 21.0, 105.8, 19.0, 105.8, 50, False, self.df_charge, emit_stats=False, cache=cache, control=control)
+            self.assertEqual(result['error'], "Đã hủy tìm kiếm.")
+            self.assertTrue(result['stats']['cancelled'])
+        self.assertEqual(len(cache), 0)
+        result = run_astar_search(self.car, 21.0, 105.8, 19.0, 105.8, 50, False, self.df_charge, emit_stats=False, cache=cache, control=SearchControl())
+        self.assertNotIn('error', result)
+
+
+class _StubLocation:
+    def __init__(self, latitude=None, longitude=None, address=None):
+        self.latitude, self.longitude, self.address = latitude, longitude, address
+
+
+class _StubGeocoder:
+    """Geocoder giả kiểu geopy: đếm số lần gọi, không truy cập mạng"""
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    def geocode(self, query, timeout=None):
+        self.calls.append(('geocode', query))
+        if self.fail:
+            raise TimeoutError("stub timeout")
+        return _StubLocation(21.0285, 105.854) if 'hà nội' in query.lower() else None
+
+    def reverse(self, point, exactly_one=True, timeout=None):
+        self.calls.append(('reverse', point))
+        if self.fail:
+            raise TimeoutError("stub timeout")
+        return _StubLocation(address=f"Địa chỉ {point[0]:.3f},{point[1]:.3f}")
+
+
+class TestGeocoding(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'geocode.sqlite')
+        self.now = [1000.0]
+        self.unlimited = TokenBucket(rate=1e9, capacity=1e9)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def _service(self, geocoder, **kwargs):
+        cache = GeocodeCache(self.path, ttl=100, negative_ttl=10, clock=lambda: self.now[0])
+        service = GeocodingService(geocoder, cache=cache, rate_limiter=kwargs.get('rate_limiter', self.unlimited))
+        self.addCleanup(service.close)
+        return service
+
+    def test_keys(self):
+        self.assertEqual(normalize_address("  Hà  Nội ,Việt Nam, "), "hà nội, việt nam")
+        self.assertEqual(coord_key(21.0000004, 105.8), coord_key(21.0, 105.8000001))
+
+    def test_cache_persists_with_ttl(self):
+        stub = _StubGeocoder()
+        service = self._service(stub)
+        self.assertEqual(service.geocode("Hà Nội"), (21.0285, 105.854))
+        self.assertEqual(service.geocode(" hà  nội "), (21.0285, 105.854))
+        self.assertIsNone(service.geocode("Nơi không có"))
+        self.assertEqual(service.reverse(21.0, 105.8), "Địa chỉ 21.000,105.800")
+        self.assertEqual(len(stub.calls), 3)
+        # Cache nằm trên đĩa: phiên mới không gọi lại geocoder
+        other = self._service(_StubGeocoder())
+        self.assertEqual(other.geocode("HÀ NỘI"), (21.0285, 105.854))
+        self.assertIsNone(other.geocode("Nơi không có"))
+        self.assertEqual(other.requests, 0)
+        # Hết hạn: "không tìm thấy" sau 10 giây, kết quả tìm thấy sau 100 giây
+        self.now[0] += 50
+        self.assertEqual(other.geocode("Hà Nội"), (21.0285, 105.854))
+        self.assertIsNone(other.geocode("Nơi không có"))
+        self.assertEqual(other.requests, 1)
+        self.now[0] += 100
+        other.geocode("Hà Nội")
+        self.assertEqual(other.requests, 2)
+
+    def test_errors_not_cached(self):
+        service = self._service(_StubGeocoder(fail=True))
+        with self.assertRaises(TimeoutError):
+            service.geocode("Hà Nội")
+        self.assertEqual(len(service.cache), 0)
+
+    def test_token_bucket(self):
+        clock = [0.0]
+        sleeps = []
+        def sleep(seconds):
+            sleeps.append(seconds)
+            clock[0] += seconds
+        bucket = TokenBucket(rate=1.0, capacity=1.0, clock=lambda: clock[0], sleep=sleep)
+        self.assertEqual(bucket.acquire(), 0.0)
+        self.assertAlmostEqual(bucket.acquire(), 1.0)
+        self.assertFalse(bucket.try_acquire())
+        clock[0] += 1.0
+        self.assertTrue(bucket.try_acquire())
+        self.assertAlmostEqual(sum(sleeps), 1.0)
+
+    def test_async_lookup(self):
+        stub = _StubGeocoder()
+        service = self._service(stub)
+        main_thread = threading.get_ident()
+        threads = []
+        original = stub.reverse
+        stub.reverse = lambda *args, **kwargs: threads.append(threading.get_ident()) or original(*args, **kwargs)
+        futures = [service.reverse_async(21.0, 105.8), service.geocode_async("Hà Nội")]
+        self.assertEqual(futures[0].result(timeout=5), "Địa chỉ 21.000,105.800")
+        self.assertEqual(futures[1].result(timeout=5), (21.0285, 105.854))
+        self.assertNotIn(main_thread, threads)
+        cached = service.reverse_async(21.0, 105.8)
+        self.assertTrue(cached.done()) # Có sẵn trong cache: Future xong ngay
+        self.assertEqual(cached.result(), "Địa chỉ 21.000,105.800")
+        self.assertEqual(service.requests, 2)
+
+
+class TestOfflineGeocoder(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        self.df_charge = pd.DataFrame({'name': ['Trạm A', 'Trạm B'], 'address': ['Phố Huế, Hà Nội', np.nan],
+                                       'lat': [21.0, 16.05], 'lng': [105.85, 108.2]})
+        self.df_bot = pd.DataFrame({'name': ['BOT 1'], 'address': ['Km213, Duy Tiên, Hà Nam'], 'lat': [20.63], 'lng': [105.93]})
+        self.gazetteer = os.path.join(self.tmp, 'gazetteer.csv')
+        pd.DataFrame({'name': ['Tỉnh Nghệ An'], 'lat': [18.67], 'lng': [105.68]}).to_csv(self.gazetteer, index=False)
+
+    def test_nearest(self):
+        geocoder = build_offline_geocoder(self.df_charge, self.df_bot, self.gazetteer)
+        self.assertEqual(len(geocoder), 4)
+        place = geocoder.nearest(21.001, 105.85)
+        self.assertEqual((place.address, place.source), ('Phố Huế, Hà Nội', 'station'))
+        self.assertAlmostEqual(place.distance_km, 0.111, places=2)
+        self.assertEqual(geocoder.nearest(16.05, 108.2).address, 'Trạm B') # Thiếu địa chỉ -> tên trạm
+        self.assertEqual(geocoder.nearest(20.6, 105.9).source, 'bot')
+        self.assertEqual(geocoder.nearest(18.7, 105.7).address, 'Tỉnh Nghệ An')
+        self.assertIsNone(OfflineGeocoder.from_frames().nearest(21.0, 105.8))
+
+    def test_service_prefers_offline(self):
+        stub = _StubGeocoder()
+        geocoder = build_offline_geocoder(self.df_charge, self.df_bot, gazetteer_file=None)
+        service = GeocodingService(stub, cache=GeocodeCache(':memory:'), rate_limiter=TokenBucket(rate=1e9, capacity=1e9),
+                                   offline=geocoder, offline_max_km=1.0)
+        self.addCleanup(service.close)
+        self.assertEqual(service.reverse(21.001, 105.85), 'Phố Huế, Hà Nội')
+        future = service.reverse_async(21.001, 105.85)
+        self.assertTrue(future.done())
+        self.assertEqual(stub.calls, [])
+        self.assertEqual(service.offline_hits, 2)
+        # Xa mọi nơi đã biết -> hỏi geocoder trực tuyến
+        self.assertEqual(service.reverse(19.0, 105.0), "Địa chỉ 19.000,105.000")
+        self.assertEqual(len(stub.calls), 1)
+        # Mất mạng -> nơi đã biết gần nhất kèm khoảng cách
+        stub.fail = True
+        self.assertTrue(service.reverse(20.8, 105.9).startswith("Gần Km213, Duy Tiên, Hà Nam (~"))
+
+
+class TestRouteMap(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        self.df_charge = pd.DataFrame({'name': ['S0', 'S1', 'S2'], 'address': ['A0', 'A1', 'A2'],
+                                       'lat': [21.0, 20.5, 20.0], 'lng': [105.8, 105.85, 105.8]})
+        self.df_bot = pd.DataFrame({'name': ['BOT 1'], 'address': ['Km1'], 'fee': ['15.000 VNĐ'], 'lat': [20.7], 'lng': [105.82]})
+        self.route = [(21.01, 105.8), (20.5, 105.85), (19.99, 105.8)]
+
+    def test_static_layer_reused_and_unique_route_files(self):
+        paths = [route_map.render_route_map(self.route, self.df_charge, [{'name': 'BOT 1', 'lat': 20.7, 'lng': 105.82, 'fee': '15.000 VNĐ'}],
+                                            [None, 1, None], df_bot=self.df_bot, map_dir=self.tmp) for _ in range(3)]
+        self.assertEqual(len(set(paths)), 3)
+        static = [name for name in os.listdir(self.tmp) if name.startswith('stations_')]
+        self.assertEqual(len(static), 1)
+        with open(os.path.join(self.tmp, static[0]), encoding='utf-8') as f:
+            layer = json.loads(f.read().split('=', 1)[1].rstrip().rstrip(';'))
+        self.assertEqual([feature['properties']['kind'] for feature in layer['features']], ['station'] * 3 + ['bot'])
+        with open(paths[0], encoding='utf-8') as f:
+            html = f.read()
+        self.assertIn(f'src="{static[0]}"', html)
+        self.assertIn("Trạm Sạc: S1", html)
+        self.assertIn("Trạm BOT: BOT 1", html)
+        self.assertNotIn("S2", html) # Trạm không dừng chỉ có trong lớp tĩnh
+        # Dữ liệu trạm đổi -> lớp tĩnh mới
+        changed = self.df_charge.assign(name=['S0', 'S1', 'S3'])
+        route_map.render_route_map(self.route, changed, [], None, df_bot=self.df_bot, map_dir=self.tmp)
+        self.assertEqual(len([name for name in os.listdir(self.tmp) if name.startswith('stations_')]), 2)
+
+    def test_prune_and_overlay_lookup(self):
+        for _ in range(5):
+            route_map.render_route_map(self.route, self.df_charge, [], None, map_dir=self.tmp)
+        route_map.prune_route_maps(self.tmp, keep=2)
+        self.assertEqual(len([name for name in os.listdir(self.tmp) if name.startswith('route_map_')]), 2)
+        overlay = route_map.route_overlay([(21.0, 105.8), (20.50001, 105.85), (20.0, 105.8)], get_station_catalogue(self.df_charge), [])
+        self.assertEqual([marker['color'] for marker in overlay['markers']], ['green', 'orange', 'red'])
+        self.assertEqual(route_map.render_route_map([], self.df_charge, [], map_dir=self.tmp), "")
+
+
+class TestPdfRenderer(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        self.font_cache = os.path.join(self.tmp, 'fonts')
+        self.renderer = pdf_renderer.PdfRenderer(output_dir=self.tmp, cache_dir=self.font_cache)
+        self.report = pdf_renderer.RouteReport(
+            model='VinFast VF8', pin=80, start_coords='21.0285, 105.854', end_coords='10.771, 106.701',
+            summary="Tổng quãng đường di chuyển: 1700.00 km\nTổng phí BOT: 0 VND", details="Trạm sạc Hà Nội -> Đà Nẵng",
+            stations=[{'id': 3, 'name': 'Trạm Ạ', 'address': 'Huế', 'lat': 16.46, 'lng': 107.59}],
+            start_address='Hà Nội, Việt Nam', end_address='TP Hồ Chí Minh')
+
+    def test_export_unique_files_named_by_address(self):
+        paths = [self.renderer.export(self.report) for _ in range(3)]
+        self.assertEqual(len(set(paths)), 3)
+        name = os.path.basename(paths[0])
+        self.assertIn('-VinFastVF8-80-HàNội-ViệtNam-TPHồChíMinh', name)
+        # Thiếu địa chỉ -> dùng tọa độ
+        self.assertIn('21.0285-105.854', pdf_renderer.report_filename(self.report._replace(start_address=None)))
+        with open(paths[0], 'rb') as f:
+            self.assertEqual(f.read().count(b'/FontFile2'), 1) # Một font nhúng, không nhúng lại cho kiểu đậm
+
+    def test_metrics_disk_cache_and_subset_cache(self):
+        self.renderer.export(self.report)
+        self.renderer.export(self.report)
+        self.assertEqual((self.renderer.face.subset_misses, self.renderer.face.subset_hits), (1, 1))
+        self.assertTrue(os.listdir(self.font_cache))
+        with mock.patch.object(TTFontFile, 'getMetrics', side_effect=AssertionError("đọc lại file font")):
+            face = pdf_renderer.FontFace(cache_dir=self.font_cache)
+        self.assertEqual(face.metrics['cw'], self.renderer.face.metrics['cw'])
+
+    def test_embedded_font_matches_fpdf_subset(self):
+        used = sorted(set(map(ord, "KẾT QUẢ Hà Nội")))
+        fontstream, size, widths, _ = self.renderer.face.subset_parts(used)
+        expected = TTFontFile().makeSubset(pdf_renderer.FONT_PATH, used)
+        self.assertEqual(zlib.decompress(fontstream), expected)
+        self.assertEqual(size, len(expected))
+        self.assertTrue(widths.startswith('/W ['))
+
+
+class TestCatalogueExport(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        self.csv = os.path.join(self.tmp, 'stations.csv')
+        with open(self.csv, 'w', encoding='utf-8') as f:
+            f.write("name,address,lat,lng, type\n")
+            for i in range(300):
+                lat, lng = (21.0, 105.8) if i % 3 else (10.7, 106.7)
+                f.write(f"Trạm số {i},Đường Cù Chính Lan P. Đồng Tiến TP. Hòa Bình {'rất dài ' * (i % 5)},{lat + i / 1e4},{lng}, VinFast DC 30kW\n")
+
+    def assert_valid_pdf(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        start = int(re.search(rb'startxref\n(\d+)', data).group(1))
+        count = int(re.match(rb'xref\n0 (\d+)\n', data[start:]).group(1))
+        entries = data[start:].split(b'\n')[3:count + 2]
+        for n, entry in enumerate(entries, 1): # Mỗi mục xref trỏ đúng tới đầu đối tượng
+            self.assertTrue(data[int(entry[:10]):].startswith(b'%d 0 obj' % n))
+        self.assertEqual(data.count(b'/FontFile2'), 1)
+        return data
+
+    def test_streamed_table_spans_pages(self):
+        pdf_path = os.path.join(self.tmp, 'all.pdf')
+        self.assertEqual(export_pdf.export_charging_stations_to_pdf(self.csv, pdf_path, chunk_rows=64), 300)
+        data = self.assert_valid_pdf(pdf_path)
+        pages = int(re.search(rb'/Type /Pages\n/Kids \[[^\]]*\]\n/Count (\d+)', data).group(1))
+        self.assertGreater(pages, 5)
+        self.assertEqual(export_pdf.export_charging_stations_to_pdf(os.path.join(self.tmp, 'missing.csv'), pdf_path), -1)
+
+    def test_pages_released_while_writing(self):
+        document = export_pdf.CatalogueDocument(os.path.join(self.tmp, 'doc.pdf'))
+        for chunk in export_pdf.read_station_chunks(self.csv, 50):
+            for values in export_pdf._rows(chunk):
+                document.add_row(values)
+        pdf = document.pdf
+        self.assertGreater(pdf.page, 5)
+        self.assertTrue(all(content == '' for n, content in pdf.pages.items() if n < pdf.page))
+        subset = pdf.fonts[pdf_renderer.FONT_FAMILY.lower()]['subset']
+        self.assertLess(len(subset), 200) # Không tăng theo số dòng đã ghi
+        document.close()
+        self.assert_valid_pdf(document.path)
+
+    def test_split_by_province(self):
+        gazetteer = os.path.join(self.tmp, 'gazetteer.csv')
+        pd.DataFrame({'name': ['Hà Nội', 'TP Hồ Chí Minh'], 'lat': [21.03, 10.78], 'lng': [105.85, 106.70]}).to_csv(gazetteer, index=False)
+        out_dir = os.path.join(self.tmp, 'provinces')
+        result = export_pdf.export_charging_stations_by_province(self.csv, out_dir, chunk_rows=64, gazetteer_file=gazetteer)
+        self.assertEqual({province: rows for province, (_, rows) in result.items()}, {'Hà Nội': 200, 'TP Hồ Chí Minh': 100})
+        for path, _ in result.values():
+            self.assert_valid_pdf(path)
+        # Cột province trong CSV được ưu tiên hơn gazetteer
+        with_column = os.path.join(self.tmp, 'with_province.csv')
+        pd.read_csv(self.csv).assign(province='Hòa Bình').to_csv(with_column, index=False)
+        result = export_pdf.export_charging_stations_by_province(with_column, out_dir, gazetteer_file=gazetteer)
+        self.assertEqual(list(result), ['Hòa Bình'])
+
+
+class TestRoutingService(unittest.TestCase):
+    def setUp(self):
+        use_temp_cache_dir(self)
+        df_charge = make_stations()
+        df_bot = pd.DataFrame({'name': ['BOT 1'], 'address': ['Km1'], 'fee': ['15.000 VNĐ'], 'fee_vnd': [15000],
+                               'lat': [20.25], 'lng': [105.83]})
+        self.service = service.RoutingService(df_charge, df_bot, workers=2, prepare_graphs=False)
+        self.server = service.BackgroundServer(self.service)
+        self.addCleanup(self.service.close)
+        self.addCleanup(self.server.stop)
+        self.conn = http.client.HTTPConnection('127.0.0.1', self.server.port, timeout=30)
+        self.addCleanup(self.conn.close)
+
+    def call(self, method, path, body=None):
+        self.conn.request(method, path, body=json.dumps(body) if body is not None else None)
+        response = self.conn.getresponse()
+        return response.status, json.loads(response.read())
+
+    def test_endpoints_over_keep_alive_connection(self):
+        route = {'car': 'VinFast VF e34', 'start': [21.0, 105.8], 'end': [19.0, 105.8], 'battery_percent': 80}
+        status, result = self.call('POST', '/route', route)
+        self.assertEqual(status, 200)
+        self.assertNotIn('error', result)
+        self.assertEqual([bot['name'] for bot in result['bot_stations']], ['BOT 1'])
+        self.assertEqual(result['total_bot_fee'], 15000)
+
+        status, batch = self.call('POST', '/route/batch', {'requests': [route, {**route, 'algorithm': 'ucs'}, {**route, 'algorithm': 'bidirectional'}]})
+        self.assertEqual(status, 200)
+        for other in batch['results']:
+            self.assertAlmostEqual(other['total_dist'], result['total_dist'], places=6)
+
+        status, nearest = self.call('GET', '/nearest?lat=20.49&lng=105.85&k=2')
+        self.assertEqual([station['name'] for station in nearest['stations']], ['S1', 'S2'])
+        status, bots = self.call('POST', '/bot-check', {'points': [[21.0, 105.8], [19.0, 105.8]]})
+        self.assertEqual(bots['total_bot_fee'], 15000)
+
+        self.assertEqual(self.call('POST', '/route', {**route, 'car': 'Không có'})[0], 400)
+        self.assertEqual(self.call('GET', '/route')[0], 405)
+        self.assertEqual(self.call('GET', '/khong-co')[0], 404)
+        status, stats = self.call('GET', '/stats')
+        self.assertEqual(stats['endpoints']['POST /route']['count'], 2)
+        self.assertEqual(stats['endpoints']['POST /route']['errors'], 1)
+        self.assertIn('p99_ms', stats['endpoints']['GET /nearest'])
+
+    def test_invalid_inputs_and_worker_errors(self):
+        for query in ('lat=nan&lng=105.8', 'lat=20&lng=inf', 'lat=91&lng=105.8'):
+            status, response = self.call('GET', f'/nearest?{query}')
+            self.assertEqual(status, 400, query)
+            self.assertIn('error', response)
+        route = {'car': 'VinFast VF e34', 'start': [21.0, 105.8], 'end': [19.0, 105.8]}
+        self.assertEqual(self.call('POST', '/route', {**route, 'battery_percent': 0})[0], 400)
+        # 0.5 % hợp lệ và được giữ nguyên (không bị cắt thành 0 %)
+        self.assertEqual(self.service._route_request({**route, 'battery_percent': 0.5}).battery_percent, 0.5)
+        # avoid_toll chỉ nhận boolean JSON: "false" không được hiểu thành True
+        for value in ('false', 'true', 0, 1, None):
+            self.assertEqual(self.call('POST', '/route', {**route, 'avoid_toll': value})[0], 400, value)
+        self.assertTrue(self.service._route_request({**route, 'avoid_toll': True}).qua_tram_thu_phi)
+        self.assertFalse(self.service._route_request(route).qua_tram_thu_phi)
+        # Chế độ tiến trình: lỗi của tiến trình con trả về {"error"} như chế độ luồng, không thành 500
+        pool = mock.Mock()
+        pool.submit.return_value.result.side_effect = RuntimeError('tiến trình con lỗi')
+        with mock.patch.object(self.service, 'pool', pool):
+            status, response = self.call('POST', '/route', route)
+        self.assertEqual(status, 200)
+        self.assertIn('tiến trình con lỗi', response['error'])
+
+    def test_process_mode_skips_route_cache(self):
+        route = {'car': 'VinFast VF e34', 'start': [21.0, 105.8], 'end': [19.0, 105.8], 'battery_percent': 80}
+        process_service = service.RoutingService(self.service.df_charge, self.service.df_bot, workers=1, processes=True, prepare_graphs=False)
+        self.addCleanup(process_service.close)
+        request = process_service._route_request(route)
+        results = [process_service._plan_sync(request) for _ in range(2)]
+        expected = self.service._plan_sync(self.service._route_request(route))
+        for result in results:
+            self.assertAlmostEqual(result['total_dist'], expected['total_dist'], places=6)
+            self.assertEqual(result['total_bot_fee'], expected['total_bot_fee'])
+        # Tiến trình con tìm lại từ đầu mỗi lần: cache của tiến trình chính không được dùng
+        self.assertEqual(process_service.route_cache.stats()['misses'], 0)
+        self.assertNotEqual(results[1]['stats'].get('cache'), 'hit')
+        stats = asyncio.run(process_service.stats({}, None))
+        self.assertFalse(stats['route_cache']['enabled'])
+        self.assertFalse(asyncio.run(process_service.health({}, None))['route_cache'])
+        self.assertTrue(asyncio.run(self.service.stats({}, None))['route_cache']['enabled'])
+
+    def test_malformed_request_closes_connection(self):
+        with socket.create_connection(('127.0.0.1', self.server.port), timeout=10) as sock:
+            sock.sendall(b"khong phai HTTP\r\n\r\n")
+            data = b''
+            while chunk := sock.recv(4096):
+                data += chunk
+        self.assertTrue(data.startswith(b"HTTP/1.1 400"))
+
+    def test_latency_percentiles(self):
+        recorder = service.LatencyRecorder(window=100)
+        for ms in range(1, 201):
+            recorder.record('GET /x', ms / 1000, ok=ms % 50 != 0)
+        report = recorder.snapshot()['GET /x']
+        self.assertEqual((report['count'], report['errors']), (200, 4))
+        self.assertAlmostEqual(report['p50_ms'], 150.5) # Chỉ 100 mẫu gần nhất (101..200 ms)
+        self.assertAlmostEqual(report['max_ms'], 200.0)
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
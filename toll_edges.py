@@ -0,0 +1,173 @@
+"""
+Chỉ mục cạnh đi qua trạm thu phí (BOT) trên đồ thị trạm kề (station_graph.py).
+
+Mỗi cạnh của đồ thị được coi là cung đường tròn lớn giữa hai trạm sạc. Một trạm BOT (BOT.csv) được tính là
+nằm trên cạnh nếu khoảng cách điểm - đoạn nhỏ hơn BOT_PROXIMITY_THRESHOLD (km), tính vector hóa bằng
+pdf_utils.point_segment_distance_km (cùng phép đo với check_bot_stations).
+Kết quả lưu theo thứ tự cạnh CSR của đồ thị:
+- tolled: bitset (bool / packbits trên đĩa) - cạnh có ít nhất một trạm BOT
+- fee: tổng phí các trạm BOT trên cạnh (VND)
+- (edge, bot): cặp thưa cạnh - trạm BOT (sắp theo cạnh)
+nên tìm kiếm kiểm tra / cộng phí cho một cạnh với chi phí O(1).
+Cache trong bộ nhớ và trên đĩa (.cache/), khóa theo dữ liệu trạm sạc, quãng đường và dữ liệu BOT.
+"""
+import hashlib
+import os
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import data_loader
+import station_graph
+from pdf_utils import BOT_PROXIMITY_THRESHOLD, load_bot_stations, parse_fee, point_segment_distance_km
+
+FORMAT_VERSION = 2
+EDGE_CHUNK = 8192 # Số cạnh xử lý mỗi lượt (ma trận cạnh x trạm BOT)
+
+# Cache trong bộ nhớ: (phiên bản trạm sạc, quãng đường, ROAD_FACTOR, phiên bản BOT) -> TollEdges
+_toll_cache: Dict[Tuple[str, float, float, str], 'TollEdges'] = {}
+
+
+def bot_data_version(df_bot: pd.DataFrame) -> str:
+    """Hash nội dung dữ liệu BOT (tên, tọa độ, phí) dùng làm khóa cache."""
+    h = hashlib.sha1()
+    h.update(str(len(df_bot)).encode())
+    if len(df_bot):
+        h.update(np.ascontiguousarray(df_bot['lat'].to_numpy(dtype=np.float64)).tobytes())
+        h.update(np.ascontiguousarray(df_bot['lng'].to_numpy(dtype=np.float64)).tobytes())
+        h.update('\x1f'.join(map(str, df_bot['name'].tolist() + df_bot['fee'].tolist())).encode('utf-8'))
+    return h.hexdigest()
+
+
+class TollEdges:
+    """Bitset cạnh có BOT + phí theo cạnh, cùng thứ tự với graph.indices / graph.dist."""
+    __slots__ = ('tolled', 'fee', 'edge_bots')
+
+    def __init__(self, tolled: np.ndarray, fee: np.ndarray, edge_bots: np.ndarray):
+        self.tolled = tolled
+        self.fee = fee
+        self.edge_bots = edge_bots # (số cặp, 2): [chỉ số cạnh, chỉ số trạm BOT], sắp theo cạnh
+
+    @property
+    def num_tolled(self) -> int:
+        return int(np.count_nonzero(self.tolled))
+
+    def bots_of(self, edge: int) -> np.ndarray:
+        """Chỉ số (hàng trong df_bot) các trạm BOT trên cạnh edge."""
+        lo, hi = np.searchsorted(self.edge_bots[:, 0], [edge, edge + 1])
+        return self.edge_bots[lo:hi, 1]
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, tolled=np.packbits(self.tolled), fee=self.fee, edge_bots=self.edge_bots,
+                 meta=np.array([FORMAT_VERSION, len(self.tolled)], dtype=np.int64))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'TollEdges':
+        with np.load(path) as data:
+            version, num_edges = data['meta'].tolist()
+            if version != FORMAT_VERSION:
+                raise ValueError(f"Phiên bản file không khớp: {version}")
+            tolled = np.unpackbits(data['tolled'], count=num_edges).astype(bool)
+            return cls(tolled, data['fee'], data['edge_bots'])
+
+
+def build_toll_edges(stations, graph, df_bot: pd.DataFrame) -> TollEdges:
+    """
+    Dựng chỉ mục cho mọi cạnh của graph. Chỉ tính trên nửa cạnh (u < v) rồi sao chép sang cạnh ngược
+    để kết quả đối xứng tuyệt đối.
+    """
+    num_edges = graph.num_edges
+    tolled = np.zeros(num_edges, dtype=bool)
+    fee = np.zeros(num_edges, dtype=np.float64)
+    if df_bot is None or df_bot.empty or num_edges == 0:
+        return TollEdges(tolled, fee, np.zeros((0, 2), dtype=np.int64))
+
+    n = graph.num_nodes
+    src = np.repeat(np.arange(n, dtype=np.int64), np.diff(graph.indptr))
+    dst = graph.indices.astype(np.int64)
+    upper = np.flatnonzero(src < dst)
+    bot_lat = df_bot['lat'].to_numpy(dtype=np.float64)[None, :]
+    bot_lng = df_bot['lng'].to_numpy(dtype=np.float64)[None, :]
+    if 'fee_vnd' in df_bot.columns:
+        bot_fee = df_bot['fee_vnd'].to_numpy(dtype=np.float64)
+    else:
+        bot_fee = np.array([parse_fee(value) for value in df_bot['fee'].tolist()], dtype=np.float64)
+
+    edge_parts, bot_parts = [], []
+    for lo in range(0, len(upper), EDGE_CHUNK):
+        edges = upper[lo:lo + EDGE_CHUNK]
+        a, b = src[edges], dst[edges]
+        d = point_segment_distance_km(stations.lat[a][:, None], stations.lng[a][:, None],
+                                      stations.lat[b][:, None], stations.lng[b][:, None], bot_lat, bot_lng)
+        rows, cols = np.nonzero(d < BOT_PROXIMITY_THRESHOLD)
+        edge_parts.append(edges[rows])
+        bot_parts.append(cols)
+    edge_idx = np.concatenate(edge_parts)
+    bot_idx = np.concatenate(bot_parts).astype(np.int64)
+
+    # Cạnh ngược (v -> u): danh sách kề sắp tăng nên khóa src * n + dst của CSR đã sắp xếp
+    keys = src * n + dst
+    reverse_idx = np.searchsorted(keys, dst[edge_idx] * n + src[edge_idx])
+    edge_idx = np.concatenate((edge_idx, reverse_idx))
+    bot_idx = np.concatenate((bot_idx, bot_idx))
+    order = np.lexsort((bot_idx, edge_idx))
+    edge_bots = np.column_stack((edge_idx[order], bot_idx[order]))
+
+    tolled[edge_idx] = True
+    np.add.at(fee, edge_idx, bot_fee[bot_idx])
+    return TollEdges(tolled, fee, edge_bots)
+
+
+def toll_cache_path(version: str, max_km: float, road_factor: float, bot_version: str, cache_dir: Optional[str] = None) -> str:
+    cache_dir = cache_dir or station_graph.CACHE_DIR
+    return os.path.join(cache_dir, f"toll_v{FORMAT_VERSION}_{version[:16]}_{max_km:g}km_rf{road_factor:g}_bot{bot_version[:12]}.npz")
+
+
+def default_bot_stations() -> pd.DataFrame:
+    """BOT.csv cạnh mã nguồn (dùng chung bản đã nạp của data_loader.py)."""
+    return load_bot_stations(data_loader.BOT_FILE)
+
+
+def default_bot_version() -> str:
+    """Phiên bản dữ liệu BOT mặc định (khóa cache cho kết quả phụ thuộc chỉ mục cạnh có BOT)."""
+    return bot_data_version(default_bot_stations())
+
+
+def get_toll_edges(stations, graph, df_bot: Optional[pd.DataFrame] = None, cache_dir: Optional[str] = None) -> TollEdges:
+    """Lấy chỉ mục cạnh có BOT cho (dữ liệu trạm, đồ thị): bộ nhớ -> đĩa -> dựng mới (và ghi ra đĩa)."""
+    if df_bot is None:
+        df_bot = default_bot_stations()
+    bot_version = bot_data_version(df_bot)
+    key = (stations.version, float(graph.max_km), float(graph.road_factor), bot_version)
+    toll = _toll_cache.get(key)
+    if toll is not None:
+        return toll
+
+    path = toll_cache_path(stations.version, graph.max_km, graph.road_factor, bot_version, cache_dir)
+    if os.path.exists(path):
+        try:
+            toll = TollEdges.load(path)
+            if len(toll.tolled) != graph.num_edges:
+                toll = None # File cache không khớp đồ thị -> dựng lại
+        except Exception as e:
+            print(f"Lỗi khi đọc cache trạm thu phí {path}: {e}")
+            toll = None
+
+    if toll is None:
+        toll = build_toll_edges(stations, graph, df_bot)
+        try:
+            toll.save(path)
+        except OSError as e:
+            print(f"Không ghi được cache trạm thu phí {path}: {e}")
+
+    _toll_cache[key] = toll
+    return toll
+
+
+def clear_toll_cache() -> None:
+    """Xóa cache trong bộ nhớ (không xóa file trên đĩa)."""
+    _toll_cache.clear()
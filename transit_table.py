@@ -0,0 +1,272 @@
+"""
+Contraction hierarchy (CH) tính trước cho đồ thị trạm kề của mỗi quãng đường xe
+(tên module / hàm "transit table" giữ nguyên để tương thích với file.py và các benchmark).
+
+Dựng offline: co lần lượt từng trạm theo thứ tự bậc nhỏ nhất trước (cập nhật lười bằng heap). Khi co trạm v,
+với mỗi cặp trạm kề (u, w) chưa co, thêm cạnh tắt u - w (qua v) nếu u -> v -> w ngắn hơn cạnh u - w hiện có
+và không có đường chứng kiến (witness) u -> x -> w qua một trạm kề x khác của v ngắn bằng hoặc hơn.
+Quãng đường là Haversine * ROAD_FACTOR nên thỏa bất đẳng thức tam giác: hai trạm đã kề nhau không bao giờ
+cần cạnh tắt, và số cạnh tắt rất nhỏ (vài trăm đến vài nghìn trên dữ liệu hiện tại).
+Kết quả lưu thưa: đồ thị "đi lên" dạng CSR (mỗi trạm chỉ giữ cạnh tới trạm co sau nó) + trạm giữa của cạnh tắt,
+bộ nhớ O(số cạnh + số cạnh tắt) - không còn ma trận n x n.
+
+Truy vấn: Dijkstra hai chiều chỉ đi lên trên đồ thị đó, gặp nhau ở trạm có thứ hạng cao nhất của đường ngắn nhất,
+rồi bung cạnh tắt thành dãy trạm. Kết quả là đường ngắn nhất trên toàn đồ thị (bằng Dijkstra), không phải
+kết quả A* (10 trạm/bước), nên chỉ dùng khi bật rõ ràng: astar_charging_stations(..., use_transit=True)
+hoặc file.USE_TRANSIT_TABLE = True.
+
+File .npz trong .cache/ (tên chứa hash dữ liệu trạm + quãng đường + ROAD_FACTOR), nạp lười ở truy vấn đầu tiên.
+Thiếu file hoặc file không khớp dữ liệu (stale) -> trả về None để file.py quay về A* thông thường.
+
+Dựng trước cho toàn bộ xe: python transit_table.py
+"""
+import heapq
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import station_graph
+from station_graph import ReachabilityGraph
+
+FORMAT_VERSION = 2 # Tăng khi đổi cách dựng -> file cũ tự động bị coi là cũ (stale)
+INF = float('inf')
+
+# Cache trong bộ nhớ: (version, max_km, road_factor) -> TransitTable
+_transit_cache: Dict[Tuple[str, float, float], 'TransitTable'] = {}
+
+
+class TransitTable:
+    """
+    Contraction hierarchy dạng CSR: cạnh đi lên của trạm u là indices[indptr[u]:indptr[u+1]] (sắp tăng theo trạm),
+    dist là quãng đường, middle là trạm bị co tạo ra cạnh tắt (-1 với cạnh gốc của đồ thị).
+    """
+    __slots__ = ('indptr', 'indices', 'dist', 'middle')
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, dist: np.ndarray, middle: np.ndarray):
+        self.indptr = indptr
+        self.indices = indices
+        self.dist = dist
+        self.middle = middle
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.indptr) - 1
+
+    @property
+    def num_shortcuts(self) -> int:
+        return int(np.count_nonzero(self.middle >= 0))
+
+    def _edge(self, a: int, b: int) -> int:
+        """Chỉ số cạnh a - b (lưu ở trạm có thứ hạng thấp hơn)."""
+        for low, high in ((a, b), (b, a)):
+            lo, hi = self.indptr[low], self.indptr[low + 1]
+            i = lo + int(np.searchsorted(self.indices[lo:hi], high))
+            if i < hi and self.indices[i] == high:
+                return i
+        raise KeyError((a, b))
+
+    def _unpack(self, a: int, b: int, out: List[int]) -> None:
+        """Thêm các trạm sau a trên cạnh a - b (bung cạnh tắt đệ quy) vào out."""
+        stack = [(a, b)]
+        while stack:
+            u, w = stack.pop()
+            mid = int(self.middle[self._edge(u, w)])
+            if mid < 0:
+                out.append(w)
+            else:
+                stack.append((mid, w))
+                stack.append((u, mid))
+
+    def path(self, source: int, target: int) -> Optional[List[int]]:
+        """Dãy vị trí trạm từ source tới target (gồm cả hai đầu), None nếu không có đường."""
+        if source == target:
+            return [source]
+        n = self.num_nodes
+        dist = (np.full(n, np.inf), np.full(n, np.inf))
+        parent = (np.full(n, -1, dtype=np.int64), np.full(n, -1, dtype=np.int64))
+        dist[0][source] = dist[1][target] = 0.0
+        heaps = ([(0.0, source)], [(0.0, target)])
+        best, meet = INF, -1
+        while heaps[0] or heaps[1]:
+            side = 0 if heaps[0] and (not heaps[1] or heaps[0][0][0] <= heaps[1][0][0]) else 1
+            d, u = heapq.heappop(heaps[side])
+            if d >= best:
+                heaps[side].clear() # Chiều này không thể cải thiện đường tốt nhất nữa
+                continue
+            if d > dist[side][u]:
+                continue
+            through = d + dist[1 - side][u]
+            if through < best:
+                best, meet = through, u
+            lo, hi = self.indptr[u], self.indptr[u + 1]
+            nbrs = self.indices[lo:hi]
+            new_d = d + self.dist[lo:hi]
+            better = new_d < dist[side][nbrs]
+            improved, improved_d = nbrs[better], new_d[better]
+            dist[side][improved] = improved_d
+            parent[side][improved] = u
+            for v, dv in zip(improved.tolist(), improved_d.tolist()):
+                heapq.heappush(heaps[side], (dv, v))
+        if meet < 0:
+            return None
+
+        up = [meet] # Chuỗi đi lên từ source tới meet (đảo ngược)
+        while parent[0][up[-1]] >= 0:
+            up.append(int(parent[0][up[-1]]))
+        down = [meet] # Chuỗi từ meet đi xuống target
+        while parent[1][down[-1]] >= 0:
+            down.append(int(parent[1][down[-1]]))
+        chain = up[::-1] + down[1:]
+        path = [chain[0]]
+        for a, b in zip(chain, chain[1:]):
+            self._unpack(a, b, path)
+        return path
+
+
+def build_transit_table(graph: ReachabilityGraph) -> TransitTable:
+    """
+    Co toàn bộ đồ thị thành contraction hierarchy (xem mô tả module).
+    Bộ nhớ O(số cạnh + số cạnh tắt); mỗi lần co dùng ma trận cục bộ bậc x bậc giữa các trạm kề của trạm bị co.
+    """
+    n = graph.num_nodes
+    alive = np.ones(n, dtype=bool)
+    degree = np.diff(graph.indptr).astype(np.int64) # Số trạm kề chưa co (cạnh gốc + cạnh tắt)
+    shortcuts: List[Dict[int, Tuple[float, int]]] = [{} for _ in range(n)] # u -> {w: (quãng đường, trạm giữa)}
+    up_nodes: List[np.ndarray] = [np.empty(0, dtype=np.int64)] * n
+    up_dist: List[np.ndarray] = [np.empty(0)] * n
+    up_middle: List[np.ndarray] = [np.empty(0, dtype=np.int64)] * n
+    heap = [(int(degree[v]), v) for v in range(n)]
+    heapq.heapify(heap)
+
+    while heap:
+        deg, v = heapq.heappop(heap)
+        if not alive[v] or deg != degree[v]:
+            continue # Mục cũ (bậc đã đổi)
+        alive[v] = False
+
+        # Trạm kề chưa co của v: cạnh gốc + cạnh tắt, giữ quãng đường nhỏ nhất cho mỗi trạm
+        nbrs, legs = graph.neighbors(v)
+        extra = [(w, d, mid) for w, (d, mid) in shortcuts[v].items() if alive[w]]
+        ids = np.concatenate([nbrs, np.array([e[0] for e in extra], dtype=np.int64)])
+        dists = np.concatenate([legs, np.array([e[1] for e in extra], dtype=np.float64)])
+        middles = np.concatenate([np.full(len(nbrs), -1, dtype=np.int64), np.array([e[2] for e in extra], dtype=np.int64)])
+        keep = alive[ids]
+        ids, dists, middles = ids[keep], dists[keep], middles[keep]
+        order = np.lexsort((dists, ids))
+        ids, dists, middles = ids[order], dists[order], middles[order]
+        first = np.ones(len(ids), dtype=bool)
+        first[1:] = ids[1:] != ids[:-1]
+        ids, dists, middles = ids[first], dists[first], middles[first]
+        up_nodes[v], up_dist[v], up_middle[v] = ids, dists, middles
+        shortcuts[v] = {}
+
+        m = len(ids)
+        degree[ids] -= 1
+        if m > 1:
+            # Ma trận quãng đường hiện tại giữa các trạm kề của v
+            local = np.full((m, m), np.inf)
+            position = {u: i for i, u in enumerate(ids.tolist())}
+            for i, u in enumerate(ids.tolist()):
+                lo, hi = graph.indptr[u], graph.indptr[u + 1]
+                row = graph.indices[lo:hi]
+                found = np.minimum(np.searchsorted(row, ids), max(hi - lo - 1, 0))
+                match = row[found] == ids if hi > lo else np.zeros(m, dtype=bool)
+                local[i, match] = graph.dist[lo + found[match]]
+                for w, (d, _) in shortcuts[u].items():
+                    j = position.get(w)
+                    if j is not None and d < local[i, j]:
+                        local[i, j] = d
+            np.fill_diagonal(local, 0.0)
+            via = dists[:, None] + dists[None, :]
+            need = np.triu(via < local, 1)
+            for i in np.flatnonzero(need.any(axis=1)).tolist():
+                # Witness: u -> x -> w qua trạm kề x khác của v
+                witness = np.min(local[i][:, None] + local, axis=0)
+                need[i] &= via[i] < witness
+            for i, j in zip(*np.nonzero(need)):
+                u, w, d = int(ids[i]), int(ids[j]), float(via[i, j])
+                if local[i, j] == INF:
+                    degree[u] += 1
+                    degree[w] += 1
+                shortcuts[u][w] = shortcuts[w][u] = (d, v)
+        for u in ids.tolist():
+            heapq.heappush(heap, (int(degree[u]), u))
+
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(nodes) for nodes in up_nodes])
+    return TransitTable(indptr, np.concatenate(up_nodes).astype(np.int32), np.concatenate(up_dist),
+                        np.concatenate(up_middle).astype(np.int32))
+
+
+def transit_table_path(version: str, max_km: float, road_factor: float, cache_dir: Optional[str] = None) -> str:
+    cache_dir = cache_dir or station_graph.CACHE_DIR
+    return os.path.join(cache_dir, f"transit_v{FORMAT_VERSION}_{version[:16]}_{max_km:g}km_rf{road_factor:g}.npz")
+
+
+def save_transit_table(table: TransitTable, path: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp.npz'
+    np.savez(tmp_path, indptr=table.indptr, indices=table.indices, dist=table.dist, middle=table.middle,
+             meta=np.array([FORMAT_VERSION, table.num_nodes], dtype=np.int64))
+    os.replace(tmp_path, path)
+
+
+def load_transit_table(version: str, max_km: float, road_factor: float, num_nodes: int,
+                       cache_dir: Optional[str] = None) -> Optional[TransitTable]:
+    """
+    Nạp contraction hierarchy nếu đã được dựng offline cho đúng dữ liệu và quãng đường.
+    Trả về None khi chưa có file hoặc file không khớp (stale).
+    """
+    key = (version, float(max_km), float(road_factor))
+    table = _transit_cache.get(key)
+    if table is not None and table.num_nodes == num_nodes:
+        return table
+
+    path = transit_table_path(version, max_km, road_factor, cache_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            version_on_disk, nodes_on_disk = data['meta'].tolist()
+            if version_on_disk != FORMAT_VERSION or nodes_on_disk != num_nodes:
+                return None
+            table = TransitTable(data['indptr'], data['indices'], data['dist'], data['middle'])
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Lỗi khi đọc contraction hierarchy {path}: {e}")
+        return None
+
+    _transit_cache[key] = table
+    return table
+
+
+def precompute_transit_tables(stations, ranges: List[float], road_factor: float,
+                              cache_dir: Optional[str] = None) -> Dict[float, str]:
+    """Dựng và ghi contraction hierarchy cho từng quãng đường. Trả về dict: quãng đường -> đường dẫn file."""
+    paths = {}
+    for max_km in sorted(set(ranges)):
+        graph = station_graph.get_reachability_graph(stations, max_km, road_factor, stations.version,
+                                                     cache_dir=cache_dir or station_graph.CACHE_DIR)
+        path = transit_table_path(stations.version, max_km, road_factor, cache_dir)
+        save_transit_table(build_transit_table(graph), path)
+        _transit_cache.pop((stations.version, float(max_km), float(road_factor)), None)
+        paths[max_km] = path
+    return paths
+
+
+def clear_transit_cache() -> None:
+    """Xóa cache contraction hierarchy trong bộ nhớ (không xóa file trên đĩa)."""
+    _transit_cache.clear()
+
+
+if __name__ == "__main__":
+    import time
+    from data_loader import load_charging_stations
+    from file import get_station_arrays, ROAD_FACTOR
+    from models import cars
+
+    stations = get_station_arrays(load_charging_stations())
+
+    t0 = time.perf_counter()
+    written = precompute_transit_tables(stations, [car.max_km_per_charge for car in cars], ROAD_FACTOR)
+    print(f"Đã dựng {len(written)} contraction hierarchy cho {len(stations)} trạm trong {time.perf_counter() - t0:.1f}s")
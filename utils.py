@@ -33,7 +33,7 @@ def print_info(xe) -> None:
     print("----------------------------------\n")
 
 # Hàm kiểm tra điểm có đi qua trạm BOT nào không
-import pandas as pd
+import data_loader
 from math import radians, sin, cos, sqrt, atan2
 
 R_EARTH = 6371.0
@@ -58,25 +58,20 @@ def check_bot_stations_legacy(route_points, bot_file='BOT.csv', tol_km=5):
     Note: Use check_bot_stations from pdf_utils.py for production code.
     """
     try:
-        df_bot = pd.read_csv(bot_file)
+        # Dữ liệu BOT đã chuẩn hóa (name, address, fee, lat, lng), nạp một lần qua data_loader.py
+        df_bot = data_loader.load_bot_stations(bot_file)
         bot_stations = []
         # Làm tròn tọa độ lộ trình để tăng độ chính xác so với BOT
         route_points_rounded = [(round(lat, 4), round(lng, 4)) for lat, lng in route_points]
         for idx, row in df_bot.iterrows():
-            vido_kinhdo = row["Vĩ độ, Kinh độ"]
-            if isinstance(vido_kinhdo, str):
-                bot_lat, bot_lng = map(float, vido_kinhdo.split(','))
-            else:
-                bot_lat = row["Vĩ độ, Kinh độ"]
-                bot_lng = row["Vĩ độ, Kinh độ.1"] if "Vĩ độ, Kinh độ.1" in row else 0
-            bot_lat, bot_lng = round(bot_lat, 4), round(bot_lng, 4)
+            bot_lat, bot_lng = round(row['lat'], 4), round(row['lng'], 4)
             for lat, lng in route_points_rounded:
                 # Tăng khoảng cách kiểm tra lên 5km cho dễ test
                 if haversine(lat, lng, bot_lat, bot_lng) <= tol_km:
                     bot_stations.append({
-                        'name': row['Tên'],
-                        'address': row['Địa chỉ / Lý trình / Hành trình'],
-                        'fee': row['Mức thu (Xe điện/Nhóm 1)'],
+                        'name': row['name'],
+                        'address': row['address'],
+                        'fee': row['fee'],
                         'lat': bot_lat,
                         'lng': bot_lng
                     })